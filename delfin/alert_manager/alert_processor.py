@@ -15,9 +15,9 @@
 from oslo_log import log
 
 from delfin import context
-from delfin import db
 from delfin import exception
 from delfin.common import alert_util
+from delfin.common import storage_cache
 from delfin.drivers import api as driver_manager
 from delfin.exporter import base_exporter
 
@@ -34,7 +34,8 @@ class AlertProcessor(object):
     def process_alert_info(self, alert):
         """Fills alert model using driver manager interface."""
         ctxt = context.get_admin_context()
-        storage = db.storage_get(ctxt, alert['storage_id'])
+        storage = storage_cache.StorageMetadataCache().get(
+            ctxt, alert['storage_id'])
 
         try:
             alert_model = self.driver_manager.parse_alert(ctxt,
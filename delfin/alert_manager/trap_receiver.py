@@ -30,6 +30,7 @@ from delfin.alert_manager import constants
 from delfin.alert_manager import rpcapi
 from delfin.alert_manager import snmp_validator
 from delfin.common import constants as common_constants
+from delfin.common import storage_cache
 from delfin.db import api as db_api
 from delfin.i18n import _
 
@@ -301,6 +302,11 @@ class TrapReceiver(manager.Manager):
         for alert_source in alert_source_list:
             self.alert_rpc_api.check_snmp_config(ctxt, alert_source)
 
+    def remove_storage_in_cache(self, ctxt, storage_id):
+        LOG.info('Remove storage metadata in memory for storage id:{0}'
+                 .format(storage_id))
+        storage_cache.StorageMetadataCache().invalidate(storage_id)
+
     def check_snmp_config(self, ctxt, snmp_config):
         LOG.info("Received snmp config checking request for "
                  "storage: %s", snmp_config['storage_id'])
@@ -13,10 +13,13 @@
 #    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
 #    License for the specific language governing permissions and limitations
 #    under the License.
-import six
+import base64
+import datetime
 
+import six
 from oslo_config import cfg
 from oslo_log import log
+from oslo_serialization import jsonutils
 from oslo_utils import strutils
 
 from delfin.common import constants
@@ -77,11 +80,21 @@ def get_pagination_params(params, max_limit=None):
                    cause delfin.InvalidInput() exceptions to be raised. If no
                    offset is present we'll default to 0 and if no marker is
                    present we'll default to None.
+                   Instead of 'marker' and 'offset' an opaque 'cursor' may be
+                   given, as returned in 'next_cursor' of the previous page.
+                   An empty cursor requests the first page. The returned
+                   marker is then a dict of the sort key values of the last
+                   element seen.
     :param max_limit: Max value 'limit' return value can take
     :returns: Tuple (marker, limit, offset)
     """
     max_limit = max_limit or CONF.api_max_limit
     limit = _get_limit_param(params, max_limit)
+    if 'cursor' in params:
+        if 'marker' in params or 'offset' in params:
+            msg = _('cursor param can not be used with marker or offset')
+            raise exception.InvalidInput(msg)
+        return _get_cursor_param(params), limit, 0
     marker = _get_marker_param(params)
     offset = _get_offset_param(params)
     return marker, limit, offset
@@ -111,6 +124,60 @@ def _get_marker_param(params):
     return params.pop('marker', None)
 
 
+def _get_cursor_param(params):
+    """Decode the sort key values from request's cursor or fail."""
+    cursor = params.pop('cursor')
+    if not cursor:
+        return {}
+    try:
+        padding = '=' * (-len(cursor) % 4)
+        marker = jsonutils.loads(
+            base64.urlsafe_b64decode(six.b(cursor + padding)))
+    except (TypeError, ValueError):
+        raise exception.InvalidInput(_('Invalid cursor'))
+    if not isinstance(marker, dict):
+        raise exception.InvalidInput(_('Invalid cursor'))
+    return marker
+
+
+def encode_cursor(item, sort_keys):
+    """Return the opaque cursor pointing after the given item.
+
+    :param item: the last item of the returned page
+    :param sort_keys: the sort keys the page was listed with
+    :returns: cursor string
+    """
+    marker = {}
+    for key in list(sort_keys) + constants.KEYSET_SORT_KEYS:
+        value = item[key]
+        if isinstance(value, datetime.datetime):
+            value = value.isoformat()
+        marker[key] = value
+    cursor = base64.urlsafe_b64encode(six.b(jsonutils.dumps(marker)))
+    return cursor.decode('utf-8').rstrip('=')
+
+
+def add_next_cursor(view, items, marker, limit, sort_keys):
+    """Add the cursor of the next page to a list view.
+
+    The cursor is only added to pages listed by cursor, and only when the
+    page is full.
+
+    :param view: the view built from the listed items
+    :param items: the listed items
+    :param marker: the marker the items were listed with
+    :param limit: the maximum number of items of the page
+    :param sort_keys: the sort keys the items were listed with
+    :returns: the view
+    """
+    if isinstance(marker, dict):
+        next_cursor = None
+        if items and len(items) >= limit:
+            next_cursor = encode_cursor(items[-1], sort_keys)
+        view['next_cursor'] = next_cursor
+    return view
+
+
 def _get_offset_param(params):
     """Extract offset id from request's dictionary (defaults to 0) or fail."""
     offset = params.pop('offset', 0)
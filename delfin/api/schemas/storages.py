@@ -94,3 +94,30 @@ create = {
     ],
     'additionalProperties': False
 }
+
+update_collection_profile = {
+    'type': 'object',
+    'properties': {
+        'collection_profile': {
+            'type': 'object',
+            'patternProperties': {
+                '^[a-zA-Z0-9-_]{1,255}$': {
+                    'type': 'object',
+                    'properties': {
+                        'interval': {'type': 'integer', 'minimum': 1},
+                        'metrics': {
+                            'type': 'array',
+                            'items': {'type': 'string', 'minLength': 1,
+                                      'maxLength': 255},
+                            'uniqueItems': True
+                        }
+                    },
+                    'additionalProperties': False
+                }
+            },
+            'additionalProperties': False
+        }
+    },
+    'required': ['collection_profile'],
+    'additionalProperties': False
+}
@@ -42,7 +42,9 @@ class ControllerController(wsgi.Controller):
 
         controllers = db.controller_get_all(ctxt, marker, limit, sort_keys,
                                             sort_dirs, query_params, offset)
-        return controller_view.build_controllers(controllers)
+        view = controller_view.build_controllers(controllers)
+        return api_utils.add_next_cursor(view, controllers, marker, limit,
+                                         sort_keys)
 
     def show(self, req, id):
         ctxt = req.environ['delfin.context']
@@ -42,7 +42,9 @@ class DiskController(wsgi.Controller):
 
         disks = db.disk_get_all(ctxt, marker, limit, sort_keys,
                                 sort_dirs, query_params, offset)
-        return disk_view.build_disks(disks)
+        view = disk_view.build_disks(disks)
+        return api_utils.add_next_cursor(view, disks, marker, limit,
+                                         sort_keys)
 
     def show(self, req, id):
         ctxt = req.environ['delfin.context']
@@ -42,7 +42,9 @@ class FilesystemController(wsgi.Controller):
 
         filesystems = db.filesystem_get_all(ctxt, marker, limit, sort_keys,
                                             sort_dirs, query_params, offset)
-        return filesystem_view.build_filesystems(filesystems)
+        view = filesystem_view.build_filesystems(filesystems)
+        return api_utils.add_next_cursor(view, filesystems, marker, limit,
+                                         sort_keys)
 
     def show(self, req, id):
         ctxt = req.environ['delfin.context']
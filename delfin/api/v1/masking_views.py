@@ -49,7 +49,9 @@ class MaskingViewController(wsgi.Controller):
         masking_view_lists = db.masking_views_get_all(ctxt, marker, limit,
                                                       sort_keys, sort_dirs,
                                                       query_params, offset)
-        return masking_views.build_masking_views(masking_view_lists)
+        view = masking_views.build_masking_views(masking_view_lists)
+        return api_utils.add_next_cursor(view, masking_view_lists, marker,
+                                         limit, sort_keys)
 
 
 def create_resource():
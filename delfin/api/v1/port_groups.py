@@ -42,7 +42,9 @@ class PortGroupController(wsgi.Controller):
 
         port_groups = db.port_groups_get_all(
             ctxt, marker, limit, sort_keys, sort_dirs, query_params, offset)
-        return port_group_view.build_port_groups(port_groups)
+        view = port_group_view.build_port_groups(port_groups)
+        return api_utils.add_next_cursor(view, port_groups, marker, limit,
+                                         sort_keys)
 
 
 def create_resource():
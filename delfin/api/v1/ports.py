@@ -42,7 +42,9 @@ class PortController(wsgi.Controller):
 
         ports = db.port_get_all(ctxt, marker, limit, sort_keys,
                                 sort_dirs, query_params, offset)
-        return port_view.build_ports(ports)
+        view = port_view.build_ports(ports)
+        return api_utils.add_next_cursor(view, ports, marker, limit,
+                                         sort_keys)
 
     def show(self, req, id):
         ctxt = req.environ['delfin.context']
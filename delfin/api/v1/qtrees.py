@@ -43,7 +43,9 @@ class QtreeController(wsgi.Controller):
 
         qtrees = db.qtree_get_all(ctxt, marker, limit, sort_keys,
                                   sort_dirs, query_params, offset)
-        return qtree_view.build_qtrees(qtrees)
+        view = qtree_view.build_qtrees(qtrees)
+        return api_utils.add_next_cursor(view, qtrees, marker, limit,
+                                         sort_keys)
 
     def show(self, req, id):
         ctxt = req.environ['delfin.context']
@@ -44,7 +44,9 @@ class QuotaController(wsgi.Controller):
 
         quotas = db.quota_get_all(ctxt, marker, limit, sort_keys,
                                   sort_dirs, query_params, offset)
-        return quota_view.build_quotas(quotas)
+        view = quota_view.build_quotas(quotas)
+        return api_utils.add_next_cursor(view, quotas, marker, limit,
+                                         sort_keys)
 
     def show(self, req, id):
         ctxt = req.environ['delfin.context']
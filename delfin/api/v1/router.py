@@ -57,6 +57,16 @@ class APIRouter(common.APIRouter):
                        action="get_capabilities",
                        conditions={"method": ["GET"]})
 
+        mapper.connect("storages", "/storages/{id}/collection-profile",
+                       controller=self.resources['storages'],
+                       action="get_collection_profile",
+                       conditions={"method": ["GET"]})
+
+        mapper.connect("storages", "/storages/{id}/collection-profile",
+                       controller=self.resources['storages'],
+                       action="update_collection_profile",
+                       conditions={"method": ["PUT"]})
+
         self.resources['access_info'] = access_info.create_resource()
         mapper.connect("storages", "/storages/{id}/access-info",
                        controller=self.resources['access_info'],
@@ -42,7 +42,9 @@ class ShareController(wsgi.Controller):
 
         shares = db.share_get_all(ctxt, marker, limit, sort_keys,
                                   sort_dirs, query_params, offset)
-        return share_view.build_shares(shares)
+        view = share_view.build_shares(shares)
+        return api_utils.add_next_cursor(view, shares, marker, limit,
+                                         sort_keys)
 
     def show(self, req, id):
         ctxt = req.environ['delfin.context']
@@ -42,8 +42,10 @@ class StorageHostGroupController(wsgi.Controller):
 
         storage_host_groups = db.storage_host_groups_get_all(
             ctxt, marker, limit, sort_keys, sort_dirs, query_params, offset)
-        return storage_host_group_view\
-            .build_storage_host_groups(storage_host_groups)
+        view = storage_host_group_view.build_storage_host_groups(
+            storage_host_groups)
+        return api_utils.add_next_cursor(view, storage_host_groups, marker,
+                                         limit, sort_keys)
 
 
 def create_resource():
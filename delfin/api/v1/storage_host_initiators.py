@@ -45,8 +45,10 @@ class StorageHostInitiatorController(wsgi.Controller):
 
         storage_host_initiators = db.storage_host_initiators_get_all(
             ctxt, marker, limit, sort_keys, sort_dirs, query_params, offset)
-        return storage_host_initiator_view.build_storage_host_initiators(
+        view = storage_host_initiator_view.build_storage_host_initiators(
             storage_host_initiators)
+        return api_utils.add_next_cursor(view, storage_host_initiators,
+                                         marker, limit, sort_keys)
 
 
 def create_resource():
@@ -60,7 +60,9 @@ class StorageHostController(wsgi.Controller):
             storage_host['storage_host_initiators'] \
                 = self._fill_storage_host_initiators(ctxt, storage_host, id)
 
-        return storage_host_view.build_storage_hosts(storage_hosts)
+        view = storage_host_view.build_storage_hosts(storage_hosts)
+        return api_utils.add_next_cursor(view, storage_hosts, marker, limit,
+                                         sort_keys)
 
 
 def create_resource():
@@ -46,7 +46,9 @@ class StoragePoolController(wsgi.Controller):
 
         storage_pools = db.storage_pool_get_all(
             ctxt, marker, limit, sort_keys, sort_dirs, query_params, offset)
-        return storage_pool_view.build_storage_pools(storage_pools)
+        view = storage_pool_view.build_storage_pools(storage_pools)
+        return api_utils.add_next_cursor(view, storage_pools, marker, limit,
+                                         sort_keys)
 
 
 def create_resource():
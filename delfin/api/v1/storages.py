@@ -13,6 +13,7 @@
 # limitations under the License.
 
 import copy
+import datetime
 import six
 
 from oslo_config import cfg
@@ -22,6 +23,7 @@ from oslo_utils import timeutils
 from delfin import coordination
 from delfin import db
 from delfin import exception
+from delfin.alert_manager import rpcapi as alert_rpcapi
 from delfin.api import api_utils
 from delfin.api import validation
 from delfin.api.common import wsgi
@@ -42,6 +44,7 @@ class StorageController(wsgi.Controller):
     def __init__(self):
         super().__init__()
         self.task_rpcapi = task_rpcapi.TaskAPI()
+        self.alert_rpcapi = alert_rpcapi.AlertAPI()
         self.driver_api = driverapi.API()
         self.search_options = ['name', 'vendor', 'model', 'status',
                                'serial_number']
@@ -63,7 +66,9 @@ class StorageController(wsgi.Controller):
 
         storages = db.storage_get_all(ctxt, marker, limit, sort_keys,
                                       sort_dirs, query_params, offset)
-        return storage_view.build_storages(storages)
+        view = storage_view.build_storages(storages)
+        return api_utils.add_next_cursor(view, storages, marker, limit,
+                                         sort_keys)
 
     def show(self, req, id):
         ctxt = req.environ['delfin.context']
@@ -109,8 +114,9 @@ class StorageController(wsgi.Controller):
             capabilities = self.driver_api.get_capabilities(
                 context=ctxt, storage_id=storage['id'])
             validation.validate_capabilities(capabilities)
-            _create_performance_monitoring_task(ctxt, storage['id'],
-                                                capabilities)
+            task = _create_performance_monitoring_task(ctxt, storage['id'],
+                                                       capabilities)
+            self.task_rpcapi.schedule_telemetry_task(ctxt, task['id'])
         except exception.EmptyResourceMetrics:
             msg = _("Resource metric provided by capabilities is empty for "
                     "storage: %s") % storage['id']
@@ -141,6 +147,7 @@ class StorageController(wsgi.Controller):
                                                         '.'
                                                         + subclass.__name__)
         self.task_rpcapi.remove_storage_in_cache(ctxt, storage['id'])
+        self.alert_rpcapi.remove_storage_in_cache(ctxt, storage['id'])
 
     @wsgi.response(202)
     def sync_all(self, req):
@@ -165,12 +172,8 @@ class StorageController(wsgi.Controller):
                          % (storage['id'], e.msg))
                 continue
             else:
-                for subclass in \
-                        resources.StorageResourceTask.__subclasses__():
-                    self.task_rpcapi.sync_storage_resource(
-                        ctxt,
-                        storage['id'],
-                        subclass.__module__ + '.' + subclass.__name__)
+                self.task_rpcapi.sync_storage_resources(
+                    ctxt, storage['id'], _get_resource_tasks())
 
     @wsgi.response(202)
     def sync(self, req, id):
@@ -183,11 +186,8 @@ class StorageController(wsgi.Controller):
         storage = db.storage_get(ctxt, id)
         resource_count = len(resources.StorageResourceTask.__subclasses__())
         _set_synced_if_ok(ctxt, storage['id'], resource_count)
-        for subclass in resources.StorageResourceTask.__subclasses__():
-            self.task_rpcapi.sync_storage_resource(
-                ctxt,
-                storage['id'],
-                subclass.__module__ + '.' + subclass.__name__)
+        self.task_rpcapi.sync_storage_resources(ctxt, storage['id'],
+                                                _get_resource_tasks())
 
     def _storage_exist(self, context, access_info):
         access_info_dict = copy.deepcopy(access_info)
@@ -238,33 +238,93 @@ class StorageController(wsgi.Controller):
 
         return storage_view.build_capabilities(storage_info, capabilities)
 
+    @wsgi.response(200)
+    def get_collection_profile(self, req, id):
+        """Show the performance collection profile of the storage."""
+        ctx = req.environ['delfin.context']
+        task = _get_performance_monitoring_task(ctx, id)
+        profile = task_telemetry.get_collection_profile(task['args'])[1]
+        return storage_view.build_collection_profile(profile)
+
+    @wsgi.response(200)
+    @validation.schema(schema_storages.update_collection_profile)
+    def update_collection_profile(self, req, id, body):
+        """Set the collection intervals and metrics of each resource type.
+
+        The resource types and metrics must be in the capabilities the
+        performance monitoring of the storage was started with.
+        """
+        ctx = req.environ['delfin.context']
+        task = _get_performance_monitoring_task(ctx, id)
+        resource_metrics = task_telemetry.get_collection_profile(
+            task['args'])[0]
+
+        profile = body['collection_profile']
+        for resource_type, type_profile in profile.items():
+            if resource_type not in resource_metrics:
+                msg = _('Resource type %s is not supported by the '
+                        'storage') % resource_type
+                raise exception.InvalidInput(msg)
+            unsupported = set(type_profile.get('metrics', [])) - \
+                set(resource_metrics[resource_type])
+            if unsupported:
+                msg = _('Metrics %(metrics)s of resource type %(type)s are '
+                        'not supported by the storage') % \
+                    {'metrics': ', '.join(sorted(unsupported)),
+                     'type': resource_type}
+                raise exception.InvalidInput(msg)
+
+        args = resource_metrics
+        if profile:
+            args = {'resource_metrics': resource_metrics,
+                    'collection_profile': profile}
+        db.task_update(ctx, task['id'], {
+            'args': args,
+            'interval': task_telemetry.get_task_interval(profile)})
+        # Reschedule the task at its new interval
+        self.task_rpcapi.schedule_telemetry_task(ctx, task['id'])
+        return storage_view.build_collection_profile(profile)
+
 
 def create_resource():
     return wsgi.Resource(StorageController())
 
 
-@coordination.synchronized('{storage_id}')
+def _get_resource_tasks():
+    return [subclass.__module__ + '.' + subclass.__name__
+            for subclass in resources.StorageResourceTask.__subclasses__()]
+
+
 def _set_synced_if_ok(context, storage_id, resource_count):
+    # If last synchronization was within
+    # CONF.sync_task_expiration(in seconds), and the sync status
+    # is bigger than 0, it means some sync task is still running,
+    # the new sync task should not launch
+    expired_before = timeutils.utcnow() - datetime.timedelta(
+        seconds=CONF.sync_task_expiration)
+    sync_status = resource_count * constants.ResourceSync.START
+    if db.storage_sync_status_start(context, storage_id, sync_status,
+                                    expired_before):
+        return
     try:
-        storage = db.storage_get(context, storage_id)
+        db.storage_get(context, storage_id)
     except exception.StorageNotFound:
         msg = 'Storage %s not found when try to set sync_status' \
               % storage_id
         raise exception.InvalidInput(message=msg)
-    else:
-        last_update = storage['updated_at'] or storage['created_at']
-        current_time = timeutils.utcnow()
-        interval = (current_time - last_update).seconds
-        # If last synchronization was within
-        # CONF.sync_task_expiration(in seconds), and the sync status
-        # is bigger than 0, it means some sync task is still running,
-        # the new sync task should not launch
-        if interval < CONF.sync_task_expiration and \
-                storage['sync_status'] > 0:
-            raise exception.StorageIsSyncing(storage['id'])
-        storage['sync_status'] = resource_count * constants.ResourceSync.START
-        storage['updated_at'] = current_time
-        db.storage_update(context, storage['id'], storage)
+    raise exception.StorageIsSyncing(storage_id)
+
+
+def _get_performance_monitoring_task(context, storage_id):
+    db.storage_get(context, storage_id)
+    filters = {'storage_id': storage_id,
+               'method': constants.TelemetryCollection.PERFORMANCE_TASK_METHOD}
+    tasks = db.task_get_all(context, filters=filters)
+    if not tasks:
+        msg = _('Performance monitoring is not enabled for storage '
+                '%s') % storage_id
+        raise exception.InvalidInput(msg)
+    return tasks[0]
 
 
 def _create_performance_monitoring_task(context, storage_id, capabilities):
@@ -279,4 +339,4 @@ def _create_performance_monitoring_task(context, storage_id, capabilities):
     task.update(args=capabilities.get('resource_metrics'))
     task.update(interval=CONF.telemetry.performance_collection_interval)
     task.update(method=constants.TelemetryCollection.PERFORMANCE_TASK_METHOD)
-    db.task_create(context=context, values=task)
+    return db.task_create(context=context, values=task)
@@ -42,7 +42,9 @@ class VolumeGroupController(wsgi.Controller):
 
         volume_groups = db.volume_groups_get_all(
             ctxt, marker, limit, sort_keys, sort_dirs, query_params, offset)
-        return volume_group_view.build_volume_groups(volume_groups)
+        view = volume_group_view.build_volume_groups(volume_groups)
+        return api_utils.add_next_cursor(view, volume_groups, marker, limit,
+                                         sort_keys)
 
 
 def create_resource():
@@ -42,7 +42,9 @@ class VolumeController(wsgi.Controller):
 
         volumes = db.volume_get_all(ctxt, marker, limit, sort_keys,
                                     sort_dirs, query_params, offset)
-        return volume_view.build_volumes(volumes)
+        view = volume_view.build_volumes(volumes)
+        return api_utils.add_next_cursor(view, volumes, marker, limit,
+                                         sort_keys)
 
     def show(self, req, id):
         ctxt = req.environ['delfin.context']
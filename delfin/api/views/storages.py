@@ -44,3 +44,8 @@ def build_capabilities(storage_info, capabilities):
     view['metadata'] = metadata
     view['spec'] = capabilities
     return view
+
+
+def build_collection_profile(profile):
+    """build collection profile API response"""
+    return dict(collection_profile=profile)
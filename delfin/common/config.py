@@ -80,6 +80,10 @@ global_opts = [
     cfg.StrOpt('delfin_task_topic',
                default='delfin-task',
                help='The topic task manager nodes listen on.'),
+    cfg.StrOpt('task_manager_rpc_version_cap',
+               help='Maximum version of the task manager RPC API to send. '
+                    'Set it to the version of the oldest task manager, e.g. '
+                    '1.0, during a rolling upgrade.'),
     cfg.StrOpt('delfin_alert_topic',
                default='delfin-alert',
                help='The topic alert manager nodes listen on.'),
@@ -114,6 +118,55 @@ telemetry_opts = [
                default=constants.TelemetryCollection
                .DEF_PERFORMANCE_COLLECTION_INTERVAL,
                help='default interval (in sec) for performance collection'),
+    cfg.BoolOpt('partitioned_scheduling',
+                default=False,
+                help='Schedule performance collection tasks on every task '
+                     'node, each node owning a consistent hash partition '
+                     'of the tasks, instead of on the elected leader only'),
+    cfg.BoolOpt('async_collection',
+                default=False,
+                help='Cast performance collections to the task manager '
+                     'without waiting for them, the task manager records '
+                     'the result of each collection in the database'),
+    cfg.BoolOpt('phase_spread_collection',
+                default=False,
+                help='Start the collection of each storage at a fixed '
+                     'offset within the collection interval, derived from '
+                     'the storage id, instead of one interval after the '
+                     'task is scheduled'),
+    cfg.IntOpt('collection_start_jitter',
+               default=0,
+               min=0,
+               help='Maximum random delay (in sec) added to the start of '
+                    'a collection task, it is bounded by the interval'),
+    cfg.IntOpt('max_backfill_duration',
+               default=86400,
+               min=0,
+               help='Maximum duration (in sec) of metrics collected again '
+                    'after collections failed or were missed, older '
+                    'metrics are skipped'),
+    cfg.IntOpt('retry_queue_size',
+               default=1000,
+               min=1,
+               help='Maximum number of failed collections held in memory '
+                    'by the retry queue, the others wait in the database'),
+    cfg.IntOpt('retry_backoff_base',
+               default=60,
+               min=1,
+               help='Delay (in sec) before the first retry of a failed '
+                    'collection, doubled on every retry'),
+    cfg.IntOpt('retry_backoff_max',
+               default=3600,
+               min=1,
+               help='Maximum delay (in sec) between two retries of a '
+                    'failed collection'),
+    cfg.IntOpt('task_reconcile_interval',
+               default=1800,
+               min=0,
+               help='Interval (in sec) at which the scheduler scans all '
+                    'the tasks and failed tasks in the database. Tasks are '
+                    'scheduled and unscheduled on storage registration and '
+                    'deletion, the scan catches up with the missed ones'),
 ]
 
 CONF.register_opts(telemetry_opts, "telemetry")
@@ -20,6 +20,10 @@ from pysnmp.entity import config
 # The maximum value a signed INT type may have
 DB_MAX_INT = 0x7FFFFFFF
 
+# Sort keys appended to every keyset (cursor) paginated list, 'id' makes the
+# sort order unique
+KEYSET_SORT_KEYS = ['created_at', 'id']
+
 # Valid access type supported currently.
 ACCESS_TYPE = ['rest', 'ssh', 'cli', 'smis']
 
@@ -364,8 +368,8 @@ class TelemetryCollection(object):
                               "PerformanceCollectionHandler"
     """Performance monitoring job interval"""
     PERIODIC_JOB_INTERVAL = 180
-    """Failed Performance monitoring job interval"""
-    FAILED_JOB_SCHEDULE_INTERVAL = 240
+    """Failed Performance monitoring retry queue polling interval"""
+    FAILED_JOB_SCHEDULE_INTERVAL = 30
     """Failed Performance monitoring retry count"""
     MAX_FAILED_JOB_RETRY_COUNT = 5
     """Default performance collection interval"""
@@ -0,0 +1,222 @@
+# Copyright 2021 The SODA Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Columnar batch of performance metrics.
+
+Drivers used to return one constants.metric_struct per series, each one
+with its own labels dict and {timestamp: value} dict. A MetricBatch keeps
+the label sets once, shared by all the series having the same labels, and
+the samples of all the series in two contiguous arrays::
+
+    batch = MetricBatch()
+    batch.append('iops', {'resource_type': 'volume', 'resource_id': 'v1'},
+                 {1616560337249: 96.1, 1616560397249: 90.0})
+    for name, labels, samples in batch.series():
+        for timestamp, value in samples:
+            ...
+
+Lists of metric_struct returned by legacy drivers are converted with
+as_batch, and a batch iterates as metric_struct items for the consumers
+which need them.
+
+The kind of every sample is kept in a separate array, so that consumers
+get the values the driver returned: ints are read back as ints, None as
+None and NaN as NaN. Ints too large to be exact as floats and values which
+are not numbers are kept aside.
+"""
+
+from array import array
+import math
+
+import six
+
+from delfin.common.constants import metric_struct
+
+# Kinds of the samples
+FLOAT = 0
+INT = 1
+NONE = 2
+OTHER = 3
+# Ints up to this magnitude are exact in the values array
+MAX_EXACT_INT = 2 ** 53
+
+
+def is_number(value):
+    """Return True for a sample value which is a number and not NaN."""
+    if isinstance(value, bool) or \
+            not isinstance(value, (float,) + six.integer_types):
+        return False
+    return not (isinstance(value, float) and math.isnan(value))
+
+
+def _get_kind(value):
+    if isinstance(value, float):
+        return FLOAT
+    if isinstance(value, six.integer_types) and \
+            not isinstance(value, bool):
+        return INT if -MAX_EXACT_INT <= value <= MAX_EXACT_INT else OTHER
+    if value is None:
+        return NONE
+    return OTHER
+
+
+class MetricBatch(object):
+    """Series of metrics with interned label sets and array samples."""
+
+    def __init__(self):
+        # Per series: name and index of its label set
+        self.names = []
+        self.label_ids = array('l')
+        # The samples of series i are in [offsets[i], offsets[i + 1])
+        self.offsets = array('q', [0])
+        self.timestamps = array('q')
+        self.values = array('d')
+        self.kinds = array('b')
+        self.label_sets = []
+        self._label_index = {}
+        # Sample index -> value of kind OTHER, stored as 0 in values
+        self._others = {}
+
+    def __len__(self):
+        return len(self.names)
+
+    def __iter__(self):
+        """Iterate the series as metric_struct items."""
+        for name, labels, samples in self.series():
+            yield metric_struct(name=name, labels=dict(labels),
+                                values=dict(samples))
+
+    def __getitem__(self, index):
+        """Return the series at index as a metric_struct."""
+        name = self.names[index]
+        if index < 0:
+            index += len(self.names)
+        start, end = self.offsets[index], self.offsets[index + 1]
+        return metric_struct(
+            name=name, labels=dict(self.label_sets[self.label_ids[index]]),
+            values=dict(self._samples(start, end)))
+
+    def __repr__(self):
+        return '<MetricBatch series=%d samples=%d label_sets=%d>' % (
+            len(self.names), len(self.timestamps), len(self.label_sets))
+
+    def intern_labels(self, labels):
+        """Return the index of the label set, adding it when new."""
+        try:
+            key = tuple(sorted(labels.items()))
+            label_id = self._label_index.get(key)
+        except TypeError:
+            # Unhashable label values are not shared
+            key = label_id = None
+        if label_id is None:
+            label_id = len(self.label_sets)
+            self.label_sets.append(dict(labels))
+            if key is not None:
+                self._label_index[key] = label_id
+        return label_id
+
+    def append(self, name, labels, values):
+        """Add a series.
+
+        :param values: dict of {timestamp: value}, or (timestamp, value)
+                       pairs
+        """
+        if isinstance(values, dict):
+            values = values.items()
+        for timestamp, value in values:
+            self.timestamps.append(int(timestamp))
+            kind = _get_kind(value)
+            if kind == OTHER:
+                self._others[len(self.values)] = value
+            self.values.append(value if kind <= INT else 0)
+            self.kinds.append(kind)
+        self.names.append(name)
+        self.label_ids.append(self.intern_labels(labels))
+        self.offsets.append(len(self.timestamps))
+
+    def extend(self, metrics):
+        """Add the series of a MetricBatch or of a list of metric_struct."""
+        if not isinstance(metrics, MetricBatch):
+            for metric in metrics:
+                self.append(metric.name, metric.labels, metric.values)
+            return
+
+        base = len(self.timestamps)
+        label_ids = [self.intern_labels(labels)
+                     for labels in metrics.label_sets]
+        for index, value in list(metrics._others.items()):
+            self._others[base + index] = value
+        self.names.extend(metrics.names)
+        self.label_ids.extend([label_ids[i] for i in metrics.label_ids])
+        self.offsets.extend([base + offset
+                             for offset in metrics.offsets[1:]])
+        self.timestamps.extend(metrics.timestamps)
+        self.values.extend(metrics.values)
+        self.kinds.extend(metrics.kinds)
+
+    def update_labels(self, **labels):
+        """Set labels on every series, once per shared label set."""
+        for label_set in self.label_sets:
+            label_set.update(labels)
+        self._label_index = dict(
+            (tuple(sorted(label_set.items())), label_id)
+            for label_id, label_set in enumerate(self.label_sets))
+
+    def series(self):
+        """Iterate (name, labels, samples) of every series.
+
+        The labels dict is shared with the other series of the same label
+        set, samples iterates the (timestamp, value) pairs of the series.
+        """
+        for index, name in enumerate(self.names):
+            start, end = self.offsets[index], self.offsets[index + 1]
+            yield (name, self.label_sets[self.label_ids[index]],
+                   self._samples(start, end))
+
+    def _samples(self, start, end):
+        if self.kinds[start:end].count(FLOAT) == end - start:
+            return zip(self.timestamps[start:end], self.values[start:end])
+        return [(self.timestamps[index], self._get_value(index))
+                for index in range(start, end)]
+
+    def _get_value(self, index):
+        kind = self.kinds[index]
+        if kind == FLOAT:
+            return self.values[index]
+        if kind == INT:
+            return int(self.values[index])
+        if kind == NONE:
+            return None
+        return self._others[index]
+
+    def to_metrics(self):
+        """Return the series as a list of metric_struct."""
+        return list(self)
+
+
+def as_batch(metrics):
+    """Return metrics as a MetricBatch, converting a legacy list."""
+    if isinstance(metrics, MetricBatch):
+        return metrics
+    batch = MetricBatch()
+    batch.extend(metrics or [])
+    return batch
+
+
+def iter_series(metrics):
+    """Iterate (name, labels, samples) of a MetricBatch or a legacy list."""
+    if isinstance(metrics, MetricBatch):
+        return metrics.series()
+    return ((metric.name, metric.labels, metric.values.items())
+            for metric in metrics)
@@ -21,6 +21,7 @@
 import datetime
 
 from oslo_log import log as logging
+from oslo_utils import timeutils
 from six.moves import range
 import sqlalchemy
 import sqlalchemy.sql as sa_sql
@@ -57,6 +58,72 @@ def _get_default_column_value(model, column_name):
     return _TYPE_SCHEMA[attr_type.__visit_name__]
 
 
+def _is_nullable(model, column_name):
+    column = getattr(model, column_name).property.columns[0]
+    return column.nullable and column.default is None
+
+
+def _get_keyset_value(model, column_name, value):
+    """Convert a marker value decoded from a cursor to the column type."""
+    if value is None:
+        return None
+    attr = getattr(model, column_name)
+    if attr.type.__visit_name__ == 'datetime' and \
+            not isinstance(value, datetime.datetime):
+        try:
+            value = timeutils.normalize_time(timeutils.parse_isotime(value))
+        except ValueError:
+            raise exception.InvalidInput(_('Invalid cursor'))
+    return value
+
+
+def _keyset_equal(attr, value):
+    if value is None:
+        return attr.is_(None)
+    return attr == value
+
+
+def _keyset_after(attr, value, sort_dir, nullable):
+    """Return the criterion of the rows after value in the sort order.
+
+    NULL sorts before any value in ascending order, as in SQLite and MySQL.
+    """
+    if sort_dir == 'asc':
+        if value is None:
+            return attr.isnot(None)
+        return attr > value
+    if sort_dir == 'desc':
+        if value is None:
+            return sqlalchemy.sql.false()
+        if nullable:
+            return sqlalchemy.sql.or_(attr < value, attr.is_(None))
+        return attr < value
+    raise ValueError(_("Unknown sort direction, "
+                       "must be 'desc' or 'asc'"))
+
+
+def _keyset_criteria(model, sort_keys, sort_dirs, marker_values):
+    """Build the lexicographic criteria from a dict of marker values.
+
+    The columns are compared directly, NULL markers with IS NULL, so that
+    the database can seek through an index on the sort keys.
+    """
+    try:
+        values = [_get_keyset_value(model, key, marker_values[key])
+                  for key in sort_keys]
+    except KeyError:
+        raise exception.InvalidInput(_('Cursor does not match sort keys'))
+    attrs = [getattr(model, key) for key in sort_keys]
+
+    criteria_list = []
+    for i in range(0, len(sort_keys)):
+        crit_attrs = [_keyset_equal(attrs[j], values[j]) for j in range(0, i)]
+        crit_attrs.append(_keyset_after(attrs[i], values[i], sort_dirs[i],
+                                        _is_nullable(model, sort_keys[i])))
+        criteria_list.append(sqlalchemy.sql.and_(*crit_attrs))
+    return sqlalchemy.sql.or_(*criteria_list)
+
+
 # TODO(wangxiyuan): Use oslo_db.sqlalchemy.utils.paginate_query once it is
 # stable and afforded by the minimum version in requirement.txt.
 # copied from glance/db/sqlalchemy/api.py
@@ -79,12 +146,17 @@ def paginate_query(query, model, limit, sort_keys, marker=None,
     marker, then the actual marker object must be fetched from the db and
     passed in to us as marker.
 
+    Alternatively the marker can be a dict of the sort key values of the last
+    row (keyset pagination). No marker object has to be fetched then, and
+    the criteria compare the columns directly so an index on the sort keys
+    can be used to seek to the next page.
+
     :param query: the query object to which we should add paging/sorting
     :param model: the ORM model class
     :param limit: maximum number of items to return
     :param sort_keys: array of attributes by which results should be sorted
-    :param marker: the last item of the previous page; we returns the next
-                    results after this value.
+    :param marker: the last item of the previous page, or a dict of its sort
+                   key values; we returns the next results after this value.
     :param sort_dir: direction in which results should be sorted (asc, desc)
     :param sort_dirs: per-column array of sort_dirs, corresponding to sort_keys
     :param offset: the number of items to skip from the marker or from the
@@ -125,7 +197,11 @@ def paginate_query(query, model, limit, sort_keys, marker=None,
         query = query.order_by(sort_dir_func(sort_key_attr))
 
     # Add pagination
-    if marker is not None:
+    if isinstance(marker, dict):
+        if marker:
+            query = query.filter(_keyset_criteria(model, sort_keys,
+                                                  sort_dirs, marker))
+    elif marker is not None:
         marker_values = []
         for sort_key in sort_keys:
             v = getattr(marker, sort_key)
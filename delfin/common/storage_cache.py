@@ -0,0 +1,91 @@
+# Copyright 2021 The SODA Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Process local cache of the storage metadata.
+
+Performance collection, alert sync and trap processing label what they
+export with the name, vendor, model and serial number of the storage.
+Those are read from the storage table once per storage_metadata_cache_ttl
+seconds instead of on every collection or alert. An entry is dropped when
+the storage is synced or removed by this process, and on every task and
+alert manager serving the remove_storage_in_cache RPC: the storage sync
+fans it out to the alert managers, which label the traps they receive.
+"""
+
+import threading
+import time
+
+import six
+from oslo_config import cfg
+from oslo_log import log
+
+from delfin import db
+from delfin import utils
+
+LOG = log.getLogger(__name__)
+CONF = cfg.CONF
+
+storage_cache_opts = [
+    cfg.IntOpt('storage_metadata_cache_ttl',
+               default=300,
+               min=0,
+               help='Seconds to keep the storage metadata used to label '
+                    'performance metrics and alerts, 0 disables the cache'),
+]
+
+CONF.register_opts(storage_cache_opts)
+
+STORAGE_METADATA_KEYS = ('id', 'name', 'vendor', 'model', 'serial_number')
+
+
+@six.add_metaclass(utils.Singleton)
+class StorageMetadataCache(object):
+    """Cache of the storage metadata keyed by storage_id."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # storage_id -> (expires_at, metadata)
+        self._entries = {}
+
+    def get(self, context, storage_id):
+        """Return the metadata of the storage, from db on a cache miss.
+
+        The returned dict is shared by the callers and must not be modified.
+
+        :raises StorageNotFound: when the storage does not exist
+        """
+        ttl = CONF.storage_metadata_cache_ttl
+        now = time.time()
+        if ttl:
+            with self._lock:
+                entry = self._entries.get(storage_id)
+                if entry and entry[0] > now:
+                    return entry[1]
+
+        storage = db.storage_get(context, storage_id)
+        metadata = dict((key, storage[key]) for key in STORAGE_METADATA_KEYS)
+        if ttl:
+            with self._lock:
+                self._entries[storage_id] = (now + ttl, metadata)
+        return metadata
+
+    def invalidate(self, storage_id):
+        with self._lock:
+            if self._entries.pop(storage_id, None):
+                LOG.debug('Removed metadata of storage %s from cache',
+                          storage_id)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
@@ -191,6 +191,63 @@ class LeaderElectionCoordinator(Coordinator):
         return False
 
 
+class PartitionCoordinator(Coordinator):
+    """Coordinator sharing objects among the members of a tooz group.
+
+    Every member owns the objects mapped to it on the consistent hash ring
+    of the group, the ring is updated when members join or leave.
+    """
+
+    def __init__(self, agent_id=None):
+        super(PartitionCoordinator, self). \
+            __init__(agent_id=agent_id, prefix="partition")
+        self.partitioner = None
+
+    def start(self):
+        """Connect to coordination back end."""
+        if self.started:
+            return
+
+        member_id = (self.prefix + "-" + self.agent_id).encode('ascii')
+        LOG.info('Started Coordinator (Agent ID: %(agent)s, '
+                 'prefix: %(prefix)s)', {'agent': self.agent_id,
+                                         'prefix': self.prefix})
+
+        backend_url = _get_redis_backend_url()
+        self.coordinator = coordination.get_coordinator(
+            backend_url, member_id,
+            timeout=CONF.coordination.lease_timeout)
+        self.coordinator.start()
+        self.started = True
+
+    def join_partitioned_group(self, group):
+        self.partitioner = self.coordinator.join_partitioned_group(group)
+
+    def belongs_to_self(self, obj):
+        if not self.partitioner:
+            return False
+        return self.partitioner.belongs_to_self(obj)
+
+    def get_members(self):
+        """Members of the hash ring, updated when members join or leave."""
+        if not self.partitioner:
+            return frozenset()
+        return frozenset(self.partitioner.ring.nodes)
+
+    def send_heartbeat(self):
+        return self.coordinator.heartbeat()
+
+    def run_watchers(self):
+        return self.coordinator.run_watchers()
+
+    def stop(self):
+        """Disconnect from coordination back end."""
+        if self.partitioner:
+            self.partitioner.stop()
+            self.partitioner = None
+        super(PartitionCoordinator, self).stop()
+
+
 class Lock(locking.Lock):
     """Lock with dynamic name.
 
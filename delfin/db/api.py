@@ -103,6 +103,27 @@ def storage_update(context, storage_id, values):
     return IMPL.storage_update(context, storage_id, values)
 
 
+def storage_sync_status_decrease(context, storage_id, value):
+    """Atomically decrease the sync_status of a storage being synced.
+
+    :returns: number of storages updated, 0 if the storage does not exist
+              or is not being synced
+    """
+    return IMPL.storage_sync_status_decrease(context, storage_id, value)
+
+
+def storage_sync_status_start(context, storage_id, value, expired_before):
+    """Atomically set the sync_status of a storage not being synced.
+
+    :param expired_before: a storage with positive sync_status not updated
+                           since this time is considered not being synced
+    :returns: number of storages updated, 0 if the storage does not exist
+              or is being synced
+    """
+    return IMPL.storage_sync_status_start(context, storage_id, value,
+                                          expired_before)
+
+
 def storage_delete(context, storage_id):
     """Delete a storage device."""
     return IMPL.storage_delete(context, storage_id)
@@ -742,6 +763,20 @@ def task_update(context, task_id, values):
     return IMPL.task_update(context, task_id, values)
 
 
+def task_collected_end_time_advance(context, task_id, end_time,
+                                    start_time=None):
+    """Atomically move the collected_end_time of a task forward.
+
+    When start_time is given, it is moved only if the task is collected up
+    to start_time, so that no gap is left before end_time.
+
+    :returns: number of tasks updated, 0 if the task does not exist or was
+              already collected up to end_time
+    """
+    return IMPL.task_collected_end_time_advance(context, task_id, end_time,
+                                                start_time=start_time)
+
+
 def task_get(context, task_id):
     """Get a task or raise an exception if it does not exist."""
     return IMPL.task_get(context, task_id)
@@ -1332,3 +1367,23 @@ def vol_grp_vol_rels_delete_by_storage(context, storage_id):
     """Delete all the volume grp volume relations of a device."""
     return IMPL.vol_grp_vol_rels_delete_by_storage(context,
                                                    storage_id)
+
+
+def sync_watermark_get(context, storage_id, resource_type):
+    """Get the incremental sync watermark of a resource type of a storage.
+
+    :returns: the watermark record or None if the resource type was never
+              synced incrementally
+    """
+    return IMPL.sync_watermark_get(context, storage_id, resource_type)
+
+
+def sync_watermark_update(context, storage_id, resource_type, values):
+    """Create or update the incremental sync watermark of a resource type."""
+    return IMPL.sync_watermark_update(context, storage_id, resource_type,
+                                      values)
+
+
+def sync_watermark_delete_by_storage(context, storage_id):
+    """Delete all the incremental sync watermarks of a storage device."""
+    return IMPL.sync_watermark_delete_by_storage(context, storage_id)
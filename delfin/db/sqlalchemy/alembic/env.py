@@ -0,0 +1,61 @@
+# Copyright 2021 The SODA Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from alembic import context
+from oslo_config import cfg
+from sqlalchemy import create_engine
+
+from delfin.db.sqlalchemy import models
+
+CONF = cfg.CONF
+
+target_metadata = models.BASE.metadata
+
+
+def run_migrations_offline():
+    """Run migrations in 'offline' mode, emitting the SQL as script."""
+    context.configure(url=CONF.database.connection,
+                      target_metadata=target_metadata,
+                      literal_binds=True)
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_online():
+    """Run migrations in 'online' mode.
+
+    The connection is passed in by delfin.db.sqlalchemy.migration, when
+    invoked from alembic command line an engine is created from config.
+    """
+    connection = context.config.attributes.get('connection')
+    if connection is None:
+        engine = create_engine(CONF.database.connection)
+        with engine.connect() as connection:
+            _run_migrations(connection)
+    else:
+        _run_migrations(connection)
+
+
+def _run_migrations(connection):
+    context.configure(connection=connection,
+                      target_metadata=target_metadata,
+                      render_as_batch=True)
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
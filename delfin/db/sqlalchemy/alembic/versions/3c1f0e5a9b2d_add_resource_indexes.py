@@ -0,0 +1,85 @@
+# Copyright 2021 The SODA Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Add storage_id and native id indexes to resource tables
+
+Revision ID: 3c1f0e5a9b2d
+Revises:
+Create Date: 2021-06-15 10:21:37.461752
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '3c1f0e5a9b2d'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+_RESOURCE_TABLES = {
+    'volumes': 'native_volume_id',
+    'storage_pools': 'native_storage_pool_id',
+    'disks': 'native_disk_id',
+    'controllers': 'native_controller_id',
+    'ports': 'native_port_id',
+    'filesystems': 'native_filesystem_id',
+    'qtrees': 'native_qtree_id',
+    'quota': 'native_quota_id',
+    'shares': 'native_share_id',
+    'storage_host_initiators': 'native_storage_host_initiator_id',
+    'storage_hosts': 'native_storage_host_id',
+    'storage_host_groups': 'native_storage_host_group_id',
+    'port_groups': 'native_port_group_id',
+    'volume_groups': 'native_volume_group_id',
+    'masking_views': 'native_masking_view_id',
+    'storage_host_grp_host_rels': None,
+    'port_grp_port_rels': None,
+    'vol_grp_vol_rels': None,
+}
+
+
+def _indexes():
+    for table, native_id in _RESOURCE_TABLES.items():
+        yield (table, 'ix_%s_storage_created_id' % table,
+               ['storage_id', 'created_at', 'id'])
+        if native_id:
+            yield (table, 'ix_%s_storage_native_id' % table,
+                   ['storage_id', native_id])
+    yield 'alert_source', 'ix_alert_source_host', ['host']
+    yield 'tasks', 'ix_tasks_storage_id', ['storage_id']
+    yield 'failed_tasks', 'ix_failed_tasks_storage_id', ['storage_id']
+    yield 'failed_tasks', 'ix_failed_tasks_task_id', ['task_id']
+
+
+def upgrade():
+    # Tables created by register_db on a fresh deployment already have
+    # the indexes, so only create the missing ones.
+    inspector = sa.inspect(op.get_bind())
+    tables = set(inspector.get_table_names())
+    existing = {}
+    for table, name, columns in _indexes():
+        if table not in tables:
+            continue
+        if table not in existing:
+            existing[table] = {index['name']
+                               for index in inspector.get_indexes(table)}
+        if name not in existing[table]:
+            op.create_index(name, table, columns)
+
+
+def downgrade():
+    for table, name, columns in _indexes():
+        op.drop_index(name, table_name=table)
@@ -0,0 +1,45 @@
+# Copyright 2021 The SODA Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Add collected_end_time to tasks
+
+Revision ID: 5e7b9d2c4a16
+Revises: 8a2d6c4f1b7e
+Create Date: 2021-06-29 10:41:37.502114
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '5e7b9d2c4a16'
+down_revision = '8a2d6c4f1b7e'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # register_db creates the tables with the column before migrating
+    inspector = sa.inspect(op.get_bind())
+    if 'tasks' not in inspector.get_table_names():
+        return
+    columns = [column['name'] for column in inspector.get_columns('tasks')]
+    if 'collected_end_time' in columns:
+        return
+    op.add_column('tasks', sa.Column('collected_end_time', sa.BigInteger()))
+
+
+def downgrade():
+    op.drop_column('tasks', 'collected_end_time')
@@ -0,0 +1,53 @@
+# Copyright 2021 The SODA Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Add sync_watermarks table
+
+Revision ID: 8a2d6c4f1b7e
+Revises: 3c1f0e5a9b2d
+Create Date: 2021-06-22 14:05:12.318906
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '8a2d6c4f1b7e'
+down_revision = '3c1f0e5a9b2d'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # register_db creates the table before migrating
+    inspector = sa.inspect(op.get_bind())
+    if 'sync_watermarks' in inspector.get_table_names():
+        return
+    op.create_table(
+        'sync_watermarks',
+        sa.Column('created_at', sa.DateTime()),
+        sa.Column('updated_at', sa.DateTime()),
+        sa.Column('id', sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column('storage_id', sa.String(36)),
+        sa.Column('resource_type', sa.String(36)),
+        sa.Column('watermark', sa.String(255)),
+        sa.Column('last_full_sync_at', sa.DateTime()),
+        mysql_engine='InnoDB')
+    op.create_index('ix_sync_watermarks_storage_resource', 'sync_watermarks',
+                    ['storage_id', 'resource_type'], unique=True)
+
+
+def downgrade():
+    op.drop_table('sync_watermarks')
@@ -19,6 +19,7 @@
 
 """Implementation of SQLAlchemy backend."""
 
+import collections
 import sys
 
 import six
@@ -32,7 +33,9 @@ from oslo_utils import uuidutils, timeutils
 from sqlalchemy import create_engine
 
 from delfin import exception
+from delfin.common import constants
 from delfin.common import sqlalchemyutils
+from delfin.db.sqlalchemy import migration
 from delfin.db.sqlalchemy import models
 from delfin.db.sqlalchemy.models import Storage, AccessInfo
 from delfin.i18n import _
@@ -42,6 +45,8 @@ LOG = log.getLogger(__name__)
 _FACADE = None
 
 _DEFAULT_SQL_CONNECTION = 'sqlite:///'
+# Max rows sent to database in one bulk insert/update/delete statement
+BULK_CHUNK_SIZE = 1000
 db_options.set_defaults(cfg.CONF,
                         connection=_DEFAULT_SQL_CONNECTION)
 
@@ -81,13 +86,14 @@ def get_backend():
 
 
 def register_db():
-    """Create database and tables."""
+    """Create database and tables, then upgrade to latest schema version."""
     models = (Storage,
               AccessInfo
               )
     engine = create_engine(CONF.database.connection, echo=False)
     for model in models:
         model.metadata.create_all(engine)
+    migration.db_sync(engine)
 
 
 def _process_model_like_filter(model, query, filters):
@@ -118,13 +124,23 @@ def apply_like_filters(model):
         def _decorator(query, filters):
             exact_filters = filters.copy()
             regex_filters = {}
+            in_filters = {}
             for key, value in filters.items():
                 # NOTE(tommylikehu): For inexact match, the filter keys
                 # are in the format of 'key~=value'
                 if key.endswith('~'):
                     exact_filters.pop(key)
                     regex_filters[key.rstrip('~')] = value
+                # Filter values given as list, tuple or set match any item
+                elif isinstance(value, (list, tuple, set)):
+                    exact_filters.pop(key)
+                    in_filters[key] = value
             query = process_exact_filters(query, exact_filters)
+            if query is not None:
+                for key, value in in_filters.items():
+                    if not hasattr(model, key):
+                        return None
+                    query = query.filter(getattr(model, key).in_(value))
             return _process_model_like_filter(model, query, regex_filters)
 
         return _decorator
@@ -155,6 +171,87 @@ def is_valid_model_filters(model, filters, exclude_list=None):
     return True
 
 
+def _chunks(items):
+    """Split a list into sub lists with at most BULK_CHUNK_SIZE items."""
+    size = BULK_CHUNK_SIZE
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def _resources_create(context, model, resources):
+    """Insert multiple rows of a resource model with bulk statements."""
+    resource_refs = []
+    for resource in resources:
+        if not resource.get('id'):
+            resource['id'] = uuidutils.generate_uuid()
+
+        resource_ref = model()
+        resource_ref.update(resource)
+        resource_refs.append(resource_ref)
+
+    LOG.debug('adding {0} new rows to {1}'.format(len(resource_refs),
+                                                  model.__tablename__))
+    session = get_session()
+    with session.begin():
+        for chunk in _chunks(resource_refs):
+            session.bulk_save_objects(chunk)
+
+    return resource_refs
+
+
+def _resources_update(context, model, resources):
+    """Update multiple rows of a resource model with executemany statements.
+
+    Rows are grouped by the set of columns being updated, so that each
+    group is sent as one UPDATE statement with many parameter sets.
+    """
+    columns = set(model.__table__.columns.keys())
+    columns.discard('id')
+    resources_by_columns = collections.defaultdict(list)
+    updated = []
+    for resource in resources:
+        if not resource.get('id'):
+            LOG.error('Cannot update {0} row without id'
+                      .format(model.__tablename__))
+            continue
+        params = {key: value for key, value in resource.items()
+                  if key in columns}
+        params['_id'] = resource['id']
+        resources_by_columns[tuple(sorted(params))].append(params)
+        updated.append(resource)
+
+    LOG.debug('updating {0} rows of {1}'.format(len(updated),
+                                                model.__tablename__))
+    statement = model.__table__.update().where(
+        model.__table__.c.id == sqlalchemy.bindparam('_id'))
+    session = get_session()
+    with session.begin():
+        for params_list in resources_by_columns.values():
+            for chunk in _chunks(params_list):
+                result = session.execute(statement, chunk)
+                if result.rowcount != len(chunk):
+                    LOG.warning('{0} rows of {1} to update, {2} found'
+                                .format(len(chunk), model.__tablename__,
+                                        result.rowcount))
+
+    return updated
+
+
+def _resources_delete(context, model, resource_id_list):
+    """Delete multiple rows of a resource model by chunked IN queries."""
+    LOG.debug('deleting {0} rows of {1}'.format(len(resource_id_list),
+                                                model.__tablename__))
+    session = get_session()
+    with session.begin():
+        for chunk in _chunks(list(resource_id_list)):
+            result = model_query(context, model, session=session) \
+                .filter(model.id.in_(chunk)) \
+                .delete(synchronize_session=False)
+            if result != len(chunk):
+                LOG.warning('{0} rows of {1} to delete, {2} found'
+                            .format(len(chunk), model.__tablename__, result))
+
+
 def access_info_create(context, values):
     """Create a storage access information."""
     if not values.get('storage_id'):
@@ -257,6 +354,44 @@ def storage_update(context, storage_id, values):
     return result
 
 
+def storage_sync_status_decrease(context, storage_id, value):
+    """Decrease the sync_status of a storage being synced by value.
+
+    The check and the update are done in one statement, so sync tasks
+    finishing at the same time need no lock.
+    """
+    session = get_session()
+    with session.begin():
+        query = _storage_get_query(context, session)
+        result = query.filter(
+            models.Storage.id == storage_id,
+            models.Storage.sync_status > 0
+        ).update({'sync_status': models.Storage.sync_status - value},
+                 synchronize_session=False)
+    return result
+
+
+def storage_sync_status_start(context, storage_id, value, expired_before):
+    """Set the sync_status of a storage unless it is being synced.
+
+    A storage is being synced when its sync_status is positive and it was
+    updated after expired_before.
+    """
+    last_update = sqlalchemy.func.coalesce(models.Storage.updated_at,
+                                           models.Storage.created_at)
+    session = get_session()
+    with session.begin():
+        query = _storage_get_query(context, session)
+        result = query.filter(
+            models.Storage.id == storage_id,
+            sqlalchemy.or_(models.Storage.sync_status.is_(None),
+                           models.Storage.sync_status <= 0,
+                           last_update <= expired_before)
+        ).update({'sync_status': value, 'updated_at': timeutils.utcnow()},
+                 synchronize_session=False)
+    return result
+
+
 def storage_get(context, storage_id):
     """Retrieve a storage device."""
     return _storage_get(context, storage_id)
@@ -350,37 +485,12 @@ def volume_create(context, values):
 
 def volumes_create(context, volumes):
     """Create multiple volumes."""
-    session = get_session()
-    vol_refs = []
-    with session.begin():
-
-        for vol in volumes:
-            LOG.debug('adding new volume for native_volume_id {0}:'
-                      .format(vol.get('native_volume_id')))
-            if not vol.get('id'):
-                vol['id'] = uuidutils.generate_uuid()
-
-            vol_ref = models.Volume()
-            vol_ref.update(vol)
-            vol_refs.append(vol_ref)
-
-        session.add_all(vol_refs)
-
-    return vol_refs
+    return _resources_create(context, models.Volume, volumes)
 
 
 def volumes_delete(context, volumes_id_list):
     """Delete multiple volumes."""
-    session = get_session()
-    with session.begin():
-        for vol_id in volumes_id_list:
-            LOG.debug('deleting volume {0}:'.format(vol_id))
-            query = _volume_get_query(context, session)
-            result = query.filter_by(id=vol_id).delete()
-
-            if not result:
-                LOG.error(exception.VolumeNotFound(vol_id))
-    return
+    _resources_delete(context, models.Volume, volumes_id_list)
 
 
 def volume_update(context, vol_id, values):
@@ -393,16 +503,7 @@ def volume_update(context, vol_id, values):
 
 def volumes_update(context, volumes):
     """Update multiple volumes."""
-    session = get_session()
-    with session.begin():
-        for vol in volumes:
-            LOG.debug('updating volume {0}:'.format(vol.get('id')))
-            query = _volume_get_query(context, session)
-            result = query.filter_by(id=vol.get('id')
-                                     ).update(vol)
-
-            if not result:
-                LOG.error(exception.VolumeNotFound(vol.get('id')))
+    _resources_update(context, models.Volume, volumes)
 
 
 def volume_get(context, volume_id):
@@ -475,38 +576,12 @@ def storage_pool_create(context, values):
 
 def storage_pools_create(context, storage_pools):
     """Create a storage_pool from the values dictionary."""
-    session = get_session()
-    storage_pool_refs = []
-    with session.begin():
-
-        for storage_pool in storage_pools:
-            LOG.debug('adding new storage_pool for native_storage_pool_id {0}:'
-                      .format(storage_pool.get('native_storage_pool_id')))
-            if not storage_pool.get('id'):
-                storage_pool['id'] = uuidutils.generate_uuid()
-
-            storage_pool_ref = models.StoragePool()
-            storage_pool_ref.update(storage_pool)
-            storage_pool_refs.append(storage_pool_ref)
-
-        session.add_all(storage_pool_refs)
-
-    return storage_pool_refs
+    return _resources_create(context, models.StoragePool, storage_pools)
 
 
 def storage_pools_delete(context, storage_pools_id_list):
     """Delete multiple storage_pools with the storage_pools dictionary."""
-    session = get_session()
-    with session.begin():
-        for storage_pool_id in storage_pools_id_list:
-            LOG.debug('deleting storage_pool {0}:'.format(storage_pool_id))
-            query = _storage_pool_get_query(context, session)
-            result = query.filter_by(id=storage_pool_id).delete()
-
-            if not result:
-                LOG.error(exception.StoragePoolNotFound(storage_pool_id))
-
-    return
+    _resources_delete(context, models.StoragePool, storage_pools_id_list)
 
 
 def storage_pool_update(context, storage_pool_id, values):
@@ -525,25 +600,7 @@ def storage_pool_update(context, storage_pool_id, values):
 
 def storage_pools_update(context, storage_pools):
     """Update multiple storage_pools withe the storage_pools dictionary."""
-    session = get_session()
-
-    with session.begin():
-        storage_pool_refs = []
-
-        for storage_pool in storage_pools:
-            LOG.debug('updating storage_pool {0}:'.format(
-                storage_pool.get('id')))
-            query = _storage_pool_get_query(context, session)
-            result = query.filter_by(id=storage_pool.get('id')
-                                     ).update(storage_pool)
-
-            if not result:
-                LOG.error(exception.StoragePoolNotFound(storage_pool.get(
-                    'id')))
-            else:
-                storage_pool_refs.append(result)
-
-    return storage_pool_refs
+    return _resources_update(context, models.StoragePool, storage_pools)
 
 
 def storage_pool_get(context, storage_pool_id):
@@ -585,61 +642,17 @@ def _process_storage_pool_info_filters(query, filters):
 
 def controllers_create(context, controllers):
     """Create multiple controllers."""
-    session = get_session()
-    controllers_refs = []
-    with session.begin():
-
-        for controller in controllers:
-            LOG.debug('adding new controller for native_controller_id {0}:'
-                      .format(controller.get('native_controller_id')))
-            if not controller.get('id'):
-                controller['id'] = uuidutils.generate_uuid()
-
-            controller_ref = models.Controller()
-            controller_ref.update(controller)
-            controllers_refs.append(controller_ref)
-
-        session.add_all(controllers_refs)
-
-    return controllers_refs
+    return _resources_create(context, models.Controller, controllers)
 
 
 def controllers_update(context, controllers):
     """Update multiple controllers."""
-    session = get_session()
-
-    with session.begin():
-        controller_refs = []
-
-        for controller in controllers:
-            LOG.debug('updating controller {0}:'.format(
-                controller.get('id')))
-            query = _controller_get_query(context, session)
-            result = query.filter_by(id=controller.get('id')
-                                     ).update(controller)
-
-            if not result:
-                LOG.error(exception.ControllerNotFound(controller.get(
-                    'id')))
-            else:
-                controller_refs.append(result)
-
-    return controller_refs
+    return _resources_update(context, models.Controller, controllers)
 
 
 def controllers_delete(context, controllers_id_list):
     """Delete multiple controllers."""
-    session = get_session()
-    with session.begin():
-        for controller_id in controllers_id_list:
-            LOG.debug('deleting controller {0}:'.format(controller_id))
-            query = _controller_get_query(context, session)
-            result = query.filter_by(id=controller_id).delete()
-
-            if not result:
-                LOG.error(exception.ControllerNotFound(controller_id))
-
-    return
+    _resources_delete(context, models.Controller, controllers_id_list)
 
 
 def _controller_get_query(context, session=None):
@@ -727,60 +740,17 @@ def _process_controller_info_filters(query, filters):
 
 def ports_create(context, ports):
     """Create multiple ports."""
-    session = get_session()
-    ports_refs = []
-    with session.begin():
-
-        for port in ports:
-            LOG.debug('adding new port for native_port_id {0}:'
-                      .format(port.get('native_port_id')))
-            if not port.get('id'):
-                port['id'] = uuidutils.generate_uuid()
-
-            port_ref = models.Port()
-            port_ref.update(port)
-            ports_refs.append(port_ref)
-
-        session.add_all(ports_refs)
-
-    return ports_refs
+    return _resources_create(context, models.Port, ports)
 
 
 def ports_update(context, ports):
     """Update multiple ports."""
-    session = get_session()
-
-    with session.begin():
-        port_refs = []
-
-        for port in ports:
-            LOG.debug('updating port {0}:'.format(
-                port.get('id')))
-            query = _port_get_query(context, session)
-            result = query.filter_by(id=port.get('id')
-                                     ).update(port)
-
-            if not result:
-                LOG.error(exception.PortNotFound(port.get(
-                    'id')))
-            else:
-                port_refs.append(result)
-
-    return port_refs
+    return _resources_update(context, models.Port, ports)
 
 
 def ports_delete(context, ports_id_list):
     """Delete multiple ports."""
-    session = get_session()
-    with session.begin():
-        for port_id in ports_id_list:
-            LOG.debug('deleting port {0}:'.format(port_id))
-            query = _port_get_query(context, session)
-            result = query.filter_by(id=port_id).delete()
-
-            if not result:
-                LOG.error(exception.PortNotFound(port_id))
-    return
+    _resources_delete(context, models.Port, ports_id_list)
 
 
 def _port_get_query(context, session=None):
@@ -869,61 +839,17 @@ def _process_port_info_filters(query, filters):
 
 def disks_create(context, disks):
     """Create multiple disks."""
-    session = get_session()
-    disks_refs = []
-    with session.begin():
-
-        for disk in disks:
-            LOG.debug('adding new disk for native_disk_id {0}:'
-                      .format(disk.get('native_disk_id')))
-            if not disk.get('id'):
-                disk['id'] = uuidutils.generate_uuid()
-
-            disk_ref = models.Disk()
-            disk_ref.update(disk)
-            disks_refs.append(disk_ref)
-
-        session.add_all(disks_refs)
-
-    return disks_refs
+    return _resources_create(context, models.Disk, disks)
 
 
 def disks_update(context, disks):
     """Update multiple disks."""
-    session = get_session()
-
-    with session.begin():
-        disk_refs = []
-
-        for disk in disks:
-            LOG.debug('updating disk {0}:'.format(
-                disk.get('id')))
-            query = _disk_get_query(context, session)
-            result = query.filter_by(id=disk.get('id')
-                                     ).update(disk)
-
-            if not result:
-                LOG.error(exception.DiskNotFound(disk.get(
-                    'id')))
-            else:
-                disk_refs.append(result)
-
-    return disk_refs
+    return _resources_update(context, models.Disk, disks)
 
 
 def disks_delete(context, disks_id_list):
     """Delete multiple disks."""
-    session = get_session()
-    with session.begin():
-        for disk_id in disks_id_list:
-            LOG.debug('deleting disk {0}:'.format(disk_id))
-            query = _disk_get_query(context, session)
-            result = query.filter_by(id=disk_id).delete()
-
-            if not result:
-                LOG.error(exception.DiskNotFound(disk_id))
-
-    return
+    _resources_delete(context, models.Disk, disks_id_list)
 
 
 def _disk_get_query(context, session=None):
@@ -1012,60 +938,17 @@ def _process_disk_info_filters(query, filters):
 
 def filesystems_create(context, filesystems):
     """Create multiple filesystems."""
-    session = get_session()
-    filesystems_refs = []
-    with session.begin():
-
-        for filesystem in filesystems:
-            LOG.debug('adding new filesystem for native_filesystem_id {0}:'
-                      .format(filesystem.get('native_filesystem_id')))
-            if not filesystem.get('id'):
-                filesystem['id'] = uuidutils.generate_uuid()
-
-            filesystem_ref = models.Filesystem()
-            filesystem_ref.update(filesystem)
-            filesystems_refs.append(filesystem_ref)
-
-        session.add_all(filesystems_refs)
-
-    return filesystems_refs
+    return _resources_create(context, models.Filesystem, filesystems)
 
 
 def filesystems_update(context, filesystems):
     """Update multiple filesystems."""
-    session = get_session()
-
-    with session.begin():
-        filesystem_refs = []
-
-        for filesystem in filesystems:
-            LOG.debug('updating filesystem {0}:'.format(
-                filesystem.get('id')))
-            query = _filesystem_get_query(context, session)
-            result = query.filter_by(id=filesystem.get('id')
-                                     ).update(filesystem)
-
-            if not result:
-                LOG.error(exception.FilesystemNotFound(filesystem.get(
-                    'id')))
-            else:
-                filesystem_refs.append(result)
-
-    return filesystem_refs
+    return _resources_update(context, models.Filesystem, filesystems)
 
 
 def filesystems_delete(context, filesystems_id_list):
     """Delete multiple filesystems."""
-    session = get_session()
-    with session.begin():
-        for filesystem_id in filesystems_id_list:
-            LOG.debug('deleting filesystem {0}:'.format(filesystem_id))
-            query = _filesystem_get_query(context, session)
-            result = query.filter_by(id=filesystem_id).delete()
-
-            if not result:
-                LOG.error(exception.FilesystemNotFound(filesystem_id))
-    return
+    _resources_delete(context, models.Filesystem, filesystems_id_list)
 
 
 def _filesystem_get_query(context, session=None):
@@ -1154,60 +1037,17 @@ def _process_filesystem_info_filters(query, filters):
 
 def quotas_create(context, quotas):
     """Create multiple quotas."""
-    session = get_session()
-    quotas_refs = []
-    with session.begin():
-
-        for quota in quotas:
-            LOG.debug('adding new quota for native_quota_id {0}:'
-                      .format(quota.get('native_quota_id')))
-            if not quota.get('id'):
-                quota['id'] = uuidutils.generate_uuid()
-
-            quota_ref = models.Quota()
-            quota_ref.update(quota)
-            quotas_refs.append(quota_ref)
-
-        session.add_all(quotas_refs)
-
-    return quotas_refs
+    return _resources_create(context, models.Quota, quotas)
 
 
 def quotas_update(context, quotas):
     """Update multiple quotas."""
-    session = get_session()
-
-    with session.begin():
-        quota_refs = []
-
-        for quota in quotas:
-            LOG.debug('updating quota {0}:'.format(
-                quota.get('id')))
-            query = _quota_get_query(context, session)
-            result = query.filter_by(id=quota.get('id')
-                                     ).update(quota)
-
-            if not result:
-                LOG.error(exception.QuotaNotFound(quota.get(
-                    'id')))
-            else:
-                quota_refs.append(result)
-
-    return quota_refs
+    return _resources_update(context, models.Quota, quotas)
 
 
 def quotas_delete(context, quotas_id_list):
     """Delete multiple quotas."""
-    session = get_session()
-    with session.begin():
-        for quota_id in quotas_id_list:
-            LOG.debug('deleting quota {0}:'.format(quota_id))
-            query = _quota_get_query(context, session)
-            result = query.filter_by(id=quota_id).delete()
-
-            if not result:
-                LOG.error(exception.QuotaNotFound(quota_id))
-    return
+    _resources_delete(context, models.Quota, quotas_id_list)
 
 
 def _quota_get_query(context, session=None):
@@ -1296,60 +1136,17 @@ def _process_quota_info_filters(query, filters):
 
 def qtrees_create(context, qtrees):
     """Create multiple qtrees."""
-    session = get_session()
-    qtrees_refs = []
-    with session.begin():
-
-        for qtree in qtrees:
-            LOG.debug('adding new qtree for native_qtree_id {0}:'
-                      .format(qtree.get('native_qtree_id')))
-            if not qtree.get('id'):
-                qtree['id'] = uuidutils.generate_uuid()
-
-            qtree_ref = models.Qtree()
-            qtree_ref.update(qtree)
-            qtrees_refs.append(qtree_ref)
-
-        session.add_all(qtrees_refs)
-
-    return qtrees_refs
+    return _resources_create(context, models.Qtree, qtrees)
 
 
 def qtrees_update(context, qtrees):
     """Update multiple qtrees."""
-    session = get_session()
-
-    with session.begin():
-        qtree_refs = []
-
-        for qtree in qtrees:
-            LOG.debug('updating qtree {0}:'.format(
-                qtree.get('id')))
-            query = _qtree_get_query(context, session)
-            result = query.filter_by(id=qtree.get('id')
-                                     ).update(qtree)
-
-            if not result:
-                LOG.error(exception.QtreeNotFound(qtree.get(
-                    'id')))
-            else:
-                qtree_refs.append(result)
-
-    return qtree_refs
+    return _resources_update(context, models.Qtree, qtrees)
 
 
 def qtrees_delete(context, qtrees_id_list):
     """Delete multiple qtrees."""
-    session = get_session()
-    with session.begin():
-        for qtree_id in qtrees_id_list:
-            LOG.debug('deleting qtree {0}:'.format(qtree_id))
-            query = _qtree_get_query(context, session)
-            result = query.filter_by(id=qtree_id).delete()
-
-            if not result:
-                LOG.error(exception.QtreeNotFound(qtree_id))
-    return
+    _resources_delete(context, models.Qtree, qtrees_id_list)
 
 
 def _qtree_get_query(context, session=None):
@@ -1438,60 +1235,17 @@ def _process_qtree_info_filters(query, filters):
 
 def shares_create(context, shares):
     """Create multiple shares."""
-    session = get_session()
-    shares_refs = []
-    with session.begin():
-
-        for share in shares:
-            LOG.debug('adding new share for native_share_id {0}:'
-                      .format(share.get('native_share_id')))
-            if not share.get('id'):
-                share['id'] = uuidutils.generate_uuid()
-
-            share_ref = models.Share()
-            share_ref.update(share)
-            shares_refs.append(share_ref)
-
-        session.add_all(shares_refs)
-
-    return shares_refs
+    return _resources_create(context, models.Share, shares)
 
 
 def shares_update(context, shares):
     """Update multiple shares."""
-    session = get_session()
-
-    with session.begin():
-        share_refs = []
-
-        for share in shares:
-            LOG.debug('updating share {0}:'.format(
-                share.get('id')))
-            query = _share_get_query(context, session)
-            result = query.filter_by(id=share.get('id')
-                                     ).update(share)
-
-            if not result:
-                LOG.error(exception.ShareNotFound(share.get(
-                    'id')))
-            else:
-                share_refs.append(result)
-
-    return share_refs
+    return _resources_update(context, models.Share, shares)
 
 
 def shares_delete(context, shares_id_list):
     """Delete multiple shares."""
-    session = get_session()
-    with session.begin():
-        for share_id in shares_id_list:
-            LOG.debug('deleting share {0}:'.format(share_id))
-            query = _share_get_query(context, session)
-            result = query.filter_by(id=share_id).delete()
-
-            if not result:
-                LOG.error(exception.ShareNotFound(share_id))
-    return
+    _resources_delete(context, models.Share, shares_id_list)
 
 
 def _share_get_query(context, session=None):
@@ -1701,6 +1455,32 @@ def task_update(context, tasks_id, values):
     return result
 
 
+def task_collected_end_time_advance(context, task_id, end_time,
+                                    start_time=None):
+    """Move the collected_end_time of a task forward to end_time.
+
+    The check and the update are done in one statement, so results of
+    collections finishing out of order never move it backwards. With
+    start_time, it is moved only from a collected_end_time not before
+    start_time.
+    """
+    session = get_session()
+    with session.begin():
+        collected_end_time = models.Task.collected_end_time
+        if start_time is None:
+            condition = collected_end_time < end_time
+        else:
+            condition = sqlalchemy.and_(collected_end_time >= start_time,
+                                        collected_end_time < end_time)
+        query = _task_get_query(context, session)
+        result = query.filter(
+            models.Task.id == task_id,
+            sqlalchemy.or_(collected_end_time.is_(None), condition)
+        ).update({'collected_end_time': end_time},
+                 synchronize_session=False)
+    return result
+
+
 def _task_get(context, task_id, session=None):
     result = (_task_get_query(context, session=session)
               .filter_by(id=task_id)
@@ -1869,56 +1649,20 @@ def _storage_host_initiators_get(context, storage_host_initiator_id,
 
 def storage_host_initiators_create(context, storage_host_initiators):
     """Create multiple storage initiators."""
-    session = get_session()
-    initiator_refs = []
-    with session.begin():
-
-        for initiator in storage_host_initiators:
-            LOG.debug('Adding new storage host initiator for '
-                      'native_storage_host_initiator_id {0}:'
-                      .format(initiator
-                              .get('native_storage_host_initiator_id')))
-            if not initiator.get('id'):
-                initiator['id'] = uuidutils.generate_uuid()
-
-            initiator_ref = models.StorageHostInitiator()
-            initiator_ref.update(initiator)
-            initiator_refs.append(initiator_ref)
-
-        session.add_all(initiator_refs)
-
-    return initiator_refs
+    return _resources_create(context, models.StorageHostInitiator,
+                             storage_host_initiators)
 
 
 def storage_host_initiators_delete(context, storage_host_initiators_id_list):
     """Delete multiple storage initiators."""
-    session = get_session()
-    with session.begin():
-        for initiator_id in storage_host_initiators_id_list:
-            LOG.debug('Deleting storage host initiator{0}:'
-                      .format(initiator_id))
-            query = _storage_host_initiators_get_query(context, session)
-            result = query.filter_by(id=initiator_id).delete()
-
-            if not result:
-                LOG.error(exception.StorageHostInitiatorNotFound(initiator_id))
-    return
+    _resources_delete(context, models.StorageHostInitiator,
+                      storage_host_initiators_id_list)
 
 
 def storage_host_initiators_update(context, storage_host_initiators):
     """Update multiple storage initiators."""
-    session = get_session()
-    with session.begin():
-        for initiator in storage_host_initiators:
-            LOG.debug('Updating storage host initiator{0}:'
-                      .format(initiator.get('id')))
-            query = _storage_host_initiators_get_query(context, session)
-            result = query.filter_by(id=initiator.get('id')
-                                     ).update(initiator)
-
-            if not result:
-                LOG.error(exception.StorageHostInitiatorNotFound(initiator
-                                                                 .get('id')))
+    _resources_update(context, models.StorageHostInitiator,
+                      storage_host_initiators)
 
 
 def storage_host_initiators_get(context, storage_host_initiator_id):
@@ -1980,53 +1724,17 @@ def _storage_hosts_get(context, storage_host_id, session=None):
 
 def storage_hosts_create(context, storage_hosts):
     """Create multiple storage hosts."""
-    session = get_session()
-    host_refs = []
-    with session.begin():
-
-        for host in storage_hosts:
-            LOG.debug('Adding new storage host for '
-                      'native_host_id {0}:'
-                      .format(host.get('native_host_id')))
-            if not host.get('id'):
-                host['id'] = uuidutils.generate_uuid()
-
-            host_ref = models.StorageHost()
-            host_ref.update(host)
-            host_refs.append(host_ref)
-
-        session.add_all(host_refs)
-
-    return host_refs
+    return _resources_create(context, models.StorageHost, storage_hosts)
 
 
 def storage_hosts_delete(context, storage_hosts_id_list):
     """Delete multiple storage hosts."""
-    session = get_session()
-    with session.begin():
-        for host_id in storage_hosts_id_list:
-            LOG.debug('Deleting volume {0}:'.format(host_id))
-            query = _storage_hosts_get_query(context, session)
-            result = query.filter_by(id=host_id).delete()
-
-            if not result:
-                LOG.error(exception.StorageHostNotFound(host_id))
-    return
+    _resources_delete(context, models.StorageHost, storage_hosts_id_list)
 
 
 def storage_hosts_update(context, storage_hosts):
     """Update multiple storage hosts."""
-    session = get_session()
-    with session.begin():
-        for host in storage_hosts:
-            LOG.debug('Updating storage hosts {0}:'.format(host.get('id')))
-            query = _storage_hosts_get_query(context, session)
-            result = query.filter_by(id=host.get('id')
-                                     ).update(host)
-
-            if not result:
-                LOG.error(exception.StorageHostNotFound(host
-                                                        .get('id')))
+    _resources_update(context, models.StorageHost, storage_hosts)
 
 
 def storage_hosts_get(context, storage_host_id):
@@ -2083,54 +1791,19 @@ def _storage_host_groups_get(context, storage_host_grp_id, session=None):
 
 def storage_host_groups_create(context, storage_host_groups):
     """Create multiple storage host groups."""
-    session = get_session()
-    host_groups_refs = []
-    with session.begin():
-
-        for host_group in storage_host_groups:
-            LOG.debug('Adding new storage host group for '
-                      'native_storage_host_group_id {0}:'
-                      .format(host_group.get('native_storage_host_group_id')))
-            if not host_group.get('id'):
-                host_group['id'] = uuidutils.generate_uuid()
-
-            host_group_ref = models.StorageHostGroup()
-            host_group_ref.update(host_group)
-            host_groups_refs.append(host_group_ref)
-
-        session.add_all(host_groups_refs)
-
-    return host_groups_refs
+    return _resources_create(context, models.StorageHostGroup,
+                             storage_host_groups)
 
 
 def storage_host_groups_delete(context, storage_host_groups_id_list):
     """Delete multiple storage host groups."""
-    session = get_session()
-    with session.begin():
-        for host_group_id in storage_host_groups_id_list:
-            LOG.debug('Deleting storage host group {0}:'.format(host_group_id))
-            query = _storage_host_groups_get_query(context, session)
-            result = query.filter_by(id=host_group_id).delete()
-
-            if not result:
-                LOG.error(exception.StorageHostGroupNotFound(host_group_id))
-    return
+    _resources_delete(context, models.StorageHostGroup,
+                      storage_host_groups_id_list)
 
 
 def storage_host_groups_update(context, storage_host_groups):
     """Update multiple storage host groups."""
-    session = get_session()
-    with session.begin():
-        for host_group in storage_host_groups:
-            LOG.debug('Updating storage host groups {0}:'
-                      .format(host_group.get('id')))
-            query = _storage_host_groups_get_query(context, session)
-            result = query.filter_by(id=host_group.get('id')
-                                     ).update(host_group)
-
-            if not result:
-                LOG.error(exception.StorageHostGroupNotFound(host_group
-                                                             .get('id')))
+    _resources_update(context, models.StorageHostGroup, storage_host_groups)
 
 
 def storage_host_groups_get(context, storage_host_group_id):
@@ -2189,54 +1862,17 @@ def _port_groups_get(context, port_grp_id, session=None):
 
 def port_groups_create(context, port_groups):
     """Create multiple port groups."""
-    session = get_session()
-    port_groups_refs = []
-    with session.begin():
-
-        for port_group in port_groups:
-            LOG.debug('Adding new port group for '
-                      'native_port_group_id {0}:'
-                      .format(port_group.get('native_port_group_id')))
-            if not port_group.get('id'):
-                port_group['id'] = uuidutils.generate_uuid()
-
-            port_group_ref = models.PortGroup()
-            port_group_ref.update(port_group)
-            port_groups_refs.append(port_group_ref)
-
-        session.add_all(port_groups_refs)
-
-    return port_groups_refs
+    return _resources_create(context, models.PortGroup, port_groups)
 
 
 def port_groups_delete(context, port_groups_id_list):
     """Delete multiple port groups."""
-    session = get_session()
-    with session.begin():
-        for port_group_id in port_groups_id_list:
-            LOG.debug('Deleting port group {0}:'.format(port_group_id))
-            query = _port_groups_get_query(context, session)
-            result = query.filter_by(id=port_group_id).delete()
-
-            if not result:
-                LOG.error(exception.PortGroupNotFound(port_group_id))
-    return
+    _resources_delete(context, models.PortGroup, port_groups_id_list)
 
 
 def port_groups_update(context, port_groups):
     """Update multiple port groups."""
-    session = get_session()
-    with session.begin():
-        for port_group in port_groups:
-            LOG.debug('Updating port groups {0}:'
-                      .format(port_group.get('id')))
-            query = _port_groups_get_query(context, session)
-            result = query.filter_by(id=port_group.get('id')
-                                     ).update(port_group)
-
-            if not result:
-                LOG.error(exception.PortGroupNotFound(port_group
-                                                      .get('id')))
+    _resources_update(context, models.PortGroup, port_groups)
 
 
 def port_groups_get(context, port_group_id):
@@ -2294,54 +1930,17 @@ def _volume_groups_get(context, volume_grp_id, session=None):
 
 def volume_groups_create(context, volume_groups):
     """Create multiple volume groups."""
-    session = get_session()
-    volume_groups_refs = []
-    with session.begin():
-
-        for volume_group in volume_groups:
-            LOG.debug('Adding new volume group for '
-                      'native_volume_group_id {0}:'
-                      .format(volume_group.get('native_volume_group_id')))
-            if not volume_group.get('id'):
-                volume_group['id'] = uuidutils.generate_uuid()
-
-            volume_group_ref = models.VolumeGroup()
-            volume_group_ref.update(volume_group)
-            volume_groups_refs.append(volume_group_ref)
-
-        session.add_all(volume_groups_refs)
-
-    return volume_groups_refs
+    return _resources_create(context, models.VolumeGroup, volume_groups)
 
 
 def volume_groups_delete(context, volume_groups_id_list):
     """Delete multiple volume groups."""
-    session = get_session()
-    with session.begin():
-        for volume_group_id in volume_groups_id_list:
-            LOG.debug('Deleting volume group {0}:'.format(volume_group_id))
-            query = _volume_groups_get_query(context, session)
-            result = query.filter_by(id=volume_group_id).delete()
-
-            if not result:
-                LOG.error(exception.VolumeGroupNotFound(volume_group_id))
-    return
+    _resources_delete(context, models.VolumeGroup, volume_groups_id_list)
 
 
 def volume_groups_update(context, volume_groups):
     """Update multiple volume groups."""
-    session = get_session()
-    with session.begin():
-        for volume_group in volume_groups:
-            LOG.debug('Updating volume groups {0}:'
-                      .format(volume_group.get('id')))
-            query = _volume_groups_get_query(context, session)
-            result = query.filter_by(id=volume_group.get('id')
-                                     ).update(volume_group)
-
-            if not result:
-                LOG.error(exception.VolumeGroupNotFound(volume_group
-                                                        .get('id')))
+    _resources_update(context, models.VolumeGroup, volume_groups)
 
 
 def volume_groups_get(context, volume_group_id):
@@ -2400,54 +1999,17 @@ def _masking_views_get(context, masking_view_id, session=None):
 
 def masking_views_create(context, masking_views):
     """Create multiple masking views."""
-    session = get_session()
-    masking_views_refs = []
-    with session.begin():
-
-        for masking_view in masking_views:
-            LOG.debug('Adding new masking view for '
-                      'native_masking_view_id {0}:'
-                      .format(masking_view.get('native_masking_view_id')))
-            if not masking_view.get('id'):
-                masking_view['id'] = uuidutils.generate_uuid()
-
-            masking_view_ref = models.MaskingView()
-            masking_view_ref.update(masking_view)
-            masking_views_refs.append(masking_view_ref)
-
-        session.add_all(masking_views_refs)
-
-    return masking_views_refs
+    return _resources_create(context, models.MaskingView, masking_views)
 
 
 def masking_views_delete(context, masking_views_id_list):
     """Delete multiple masking views."""
-    session = get_session()
-    with session.begin():
-        for masking_view_id in masking_views_id_list:
-            LOG.debug('Deleting masking view {0}:'.format(masking_view_id))
-            query = _masking_views_get_query(context, session)
-            result = query.filter_by(id=masking_view_id).delete()
-
-            if not result:
-                LOG.error(exception.MaskingViewNotFound(masking_view_id))
-    return
+    _resources_delete(context, models.MaskingView, masking_views_id_list)
 
 
 def masking_views_update(context, masking_views):
     """Update multiple masking views."""
-    session = get_session()
-    with session.begin():
-        for masking_view in masking_views:
-            LOG.debug('Updating masking views {0}:'
-                      .format(masking_view.get('id')))
-            query = _masking_views_get_query(context, session)
-            result = query.filter_by(id=masking_view.get('id')
-                                     ).update(masking_view)
-
-            if not result:
-                LOG.error(exception.MaskingViewNotFound(masking_view
-                                                        .get('id')))
+    _resources_update(context, models.MaskingView, masking_views)
 
 
 def masking_views_get(context, masking_view_id):
@@ -2507,65 +2069,22 @@ def _storage_host_grp_host_rels_get(context, host_grp_host_relation_id,
     return result
 
 
-def storage_host_grp_host_rels_create(context,
-                                      host_grp_host_relations):
+def storage_host_grp_host_rels_create(context, host_grp_host_relations):
     """Create multiple storage host grp host relations."""
-    session = get_session()
-    host_grp_host_relation_refs = []
-    with session.begin():
+    return _resources_create(context, models.StorageHostGrpHostRel,
+                             host_grp_host_relations)
 
-        for host_grp_host_relation in host_grp_host_relations:
-            LOG.debug('Adding new storage host group host relation for '
-                      'native storage host group id {0}:'
-                      .format(host_grp_host_relation
-                              .get('native_storage_host_group_id')))
-            if not host_grp_host_relation.get('id'):
-                host_grp_host_relation['id'] = uuidutils.generate_uuid()
 
-            host_grp_host_relation_ref \
-                = models.StorageHostGrpHostRel()
-            host_grp_host_relation_ref.update(host_grp_host_relation)
-            host_grp_host_relation_refs.append(host_grp_host_relation_ref)
-
-        session.add_all(host_grp_host_relation_refs)
-
-    return host_grp_host_relation_refs
-
-
-def storage_host_grp_host_rels_delete(context,
-                                      host_grp_host_relations_list):
+def storage_host_grp_host_rels_delete(context, host_grp_host_relations_list):
     """Delete multiple storage host grp host relations."""
-    session = get_session()
-    with session.begin():
-        for host_grp_host_relation_id in host_grp_host_relations_list:
-            LOG.debug('deleting storage host grp host relation {0}:'.format(
-                host_grp_host_relation_id))
-            query = _storage_host_grp_host_rels_get_query(context,
-                                                          session)
-            result = query.filter_by(id=host_grp_host_relation_id).delete()
-
-            if not result:
-                LOG.error(exception.StorageHostGrpHostRelNotFound(
-                    host_grp_host_relation_id))
-    return
+    _resources_delete(context, models.StorageHostGrpHostRel,
+                      host_grp_host_relations_list)
 
 
-def storage_host_grp_host_rels_update(context,
-                                      host_grp_host_relations_list):
+def storage_host_grp_host_rels_update(context, host_grp_host_relations_list):
     """Update multiple storage host grp host relations."""
-    session = get_session()
-    with session.begin():
-        for host_grp_host_relation in host_grp_host_relations_list:
-            LOG.debug('Updating storage host grp host relations {0}:'
-                      .format(host_grp_host_relation.get('id')))
-            query = _storage_host_grp_host_rels_get_query(context,
-                                                          session)
-            result = query.filter_by(id=host_grp_host_relation.get('id')
-                                     ).update(host_grp_host_relation)
-
-            if not result:
-                LOG.error(exception.StorageHostGrpHostRelNotFound(
-                    host_grp_host_relation.get('id')))
+    _resources_update(context, models.StorageHostGrpHostRel,
+                      host_grp_host_relations_list)
 
 
 def storage_host_grp_host_rels_get(context, host_grp_host_relation_id):
@@ -2629,61 +2148,18 @@ def _port_grp_port_rels_get(context, port_grp_port_relation_id,
 
 def port_grp_port_rels_create(context, port_grp_port_rels):
     """Create multiple port grp port relations."""
-    session = get_session()
-    port_grp_port_relation_refs = []
-    with session.begin():
-
-        for port_grp_port_relation in port_grp_port_rels:
-            LOG.debug('adding new port group port relation for '
-                      'native port group id {0}:'
-                      .format(port_grp_port_relation
-                              .get('native_port_group_id')))
-            if not port_grp_port_relation.get('id'):
-                port_grp_port_relation['id'] = uuidutils.generate_uuid()
-
-            port_grp_port_relation_ref \
-                = models.PortGrpPortRel()
-            port_grp_port_relation_ref.update(port_grp_port_relation)
-            port_grp_port_relation_refs.append(port_grp_port_relation_ref)
+    return _resources_create(context, models.PortGrpPortRel,
+                             port_grp_port_rels)
 
-        session.add_all(port_grp_port_relation_refs)
 
-    return port_grp_port_relation_refs
-
-
-def port_grp_port_rels_delete(context,
-                              port_grp_port_rels_list):
+def port_grp_port_rels_delete(context, port_grp_port_rels_list):
     """Delete multiple port grp port relations."""
-    session = get_session()
-    with session.begin():
-        for port_grp_port_relation_id in port_grp_port_rels_list:
-            LOG.debug('deleting port grp port relation {0}:'.format(
-                port_grp_port_relation_id))
-            query = _port_grp_port_rels_get_query(context, session)
-            result = query.filter_by(id=port_grp_port_relation_id).delete()
-
-            if not result:
-                LOG.error(exception.PortGrpPortRelNotFound(
-                    port_grp_port_relation_id))
-    return
+    _resources_delete(context, models.PortGrpPortRel, port_grp_port_rels_list)
 
 
-def port_grp_port_rels_update(context,
-                              port_grp_port_rels_list):
+def port_grp_port_rels_update(context, port_grp_port_rels_list):
     """Update multiple port grp port relations."""
-    session = get_session()
-    with session.begin():
-        for port_grp_port_relation in port_grp_port_rels_list:
-            LOG.debug('Updating port grp port relations {0}:'
-                      .format(port_grp_port_relation.get('id')))
-            query = _port_grp_port_rels_get_query(context,
-                                                  session)
-            result = query.filter_by(id=port_grp_port_relation.get('id')
-                                     ).update(port_grp_port_relation)
-
-            if not result:
-                LOG.error(exception.PortGrpPortRelNotFound(
-                    port_grp_port_relation.get('id')))
+    _resources_update(context, models.PortGrpPortRel, port_grp_port_rels_list)
 
 
 def port_grp_port_rels_get(context, port_grp_port_relation_id):
@@ -2748,62 +2224,17 @@ def _vol_grp_vol_rels_get(context, volume_grp_volume_relation_id,
 
 def vol_grp_vol_rels_create(context, vol_grp_vol_rels):
     """Create multiple volume grp volume relations."""
-    session = get_session()
-    volume_grp_volume_relation_refs = []
-    with session.begin():
-
-        for volume_grp_volume_relation in vol_grp_vol_rels:
-            LOG.debug('adding new volume group volume relation for '
-                      'native volume group  id {0}:'
-                      .format(volume_grp_volume_relation
-                              .get('native_volume_group_id')))
-            if not volume_grp_volume_relation.get('id'):
-                volume_grp_volume_relation['id'] = uuidutils.generate_uuid()
-
-            volume_grp_volume_relation_ref \
-                = models.VolGrpVolRel()
-            volume_grp_volume_relation_ref.update(volume_grp_volume_relation)
-            volume_grp_volume_relation_refs.append(
-                volume_grp_volume_relation_ref)
-
-        session.add_all(volume_grp_volume_relation_refs)
-
-    return volume_grp_volume_relation_refs
+    return _resources_create(context, models.VolGrpVolRel, vol_grp_vol_rels)
 
 
-def vol_grp_vol_rels_delete(context,
-                            vol_grp_vol_rels_list):
+def vol_grp_vol_rels_delete(context, vol_grp_vol_rels_list):
     """Delete multiple volume grp volume relations."""
-    session = get_session()
-    with session.begin():
-        for volume_grp_volume_relation_id in vol_grp_vol_rels_list:
-            LOG.debug('deleting volume grp volume relation {0}:'.format(
-                volume_grp_volume_relation_id))
-            query = _vol_grp_vol_rels_get_query(context, session)
-            result = query.filter_by(id=volume_grp_volume_relation_id).delete()
-
-            if not result:
-                LOG.error(exception.VolGrpVolRelationNotFound(
-                    volume_grp_volume_relation_id))
-    return
+    _resources_delete(context, models.VolGrpVolRel, vol_grp_vol_rels_list)
 
 
-def vol_grp_vol_rels_update(context,
-                            vol_grp_vol_rels_list):
+def vol_grp_vol_rels_update(context, vol_grp_vol_rels_list):
     """Update multiple volume grp volume relations."""
-    session = get_session()
-    with session.begin():
-        for volume_grp_volume_relation in vol_grp_vol_rels_list:
-            LOG.debug('Updating volume grp volume relations {0}:'
-                      .format(volume_grp_volume_relation.get('id')))
-            query = _vol_grp_vol_rels_get_query(context,
-                                                session)
-            result = query.filter_by(id=volume_grp_volume_relation.get('id')
-                                     ).update(volume_grp_volume_relation)
-
-            if not result:
-                LOG.error(exception.VolGrpVolRelationNotFound(
-                    volume_grp_volume_relation.get('id')))
+    _resources_update(context, models.VolGrpVolRel, vol_grp_vol_rels_list)
 
 
 def vol_grp_vol_rels_get(context, volume_grp_volume_relation_id):
@@ -2849,6 +2280,39 @@ def vol_grp_vol_rels_delete_by_storage(context, storage_id):
         .filter_by(storage_id=storage_id).delete()
 
 
+def _sync_watermark_get_query(context, session=None):
+    return model_query(context, models.SyncWatermark, session=session)
+
+
+def sync_watermark_get(context, storage_id, resource_type):
+    """Get the sync watermark of a resource type of a storage or None."""
+    return (_sync_watermark_get_query(context)
+            .filter_by(storage_id=storage_id, resource_type=resource_type)
+            .first())
+
+
+def sync_watermark_update(context, storage_id, resource_type, values):
+    """Create or update the sync watermark of a resource type."""
+    session = get_session()
+    with session.begin():
+        result = (_sync_watermark_get_query(context, session)
+                  .filter_by(storage_id=storage_id,
+                             resource_type=resource_type)
+                  .first())
+        if not result:
+            result = models.SyncWatermark(storage_id=storage_id,
+                                          resource_type=resource_type)
+            session.add(result)
+        result.update(values)
+    return result
+
+
+def sync_watermark_delete_by_storage(context, storage_id):
+    """Delete all the sync watermarks of a storage device."""
+    _sync_watermark_get_query(context).filter_by(
+        storage_id=storage_id).delete()
+
+
 PAGINATION_HELPERS = {
     models.AccessInfo: (_access_info_get_query, _process_access_info_filters,
                         _access_info_get),
@@ -2999,8 +2463,9 @@ def _generate_paginate_query(context, session, paginate_type, marker,
 
     :param context: context to query under
     :param session: the session to use
-    :param marker: the last item of the previous page; we returns the next
-                    results after this value.
+    :param marker: the id of the last item of the previous page, or a dict
+                   of its sort key values; we returns the next results after
+                   this value.
     :param limit: maximum number of items to return
     :param sort_keys: list of attributes by which results should be sorted,
                       paired with corresponding item in sort_dirs
@@ -3016,9 +2481,13 @@ def _generate_paginate_query(context, session, paginate_type, marker,
     """
     get_query, process_filters, get = PAGINATION_HELPERS[paginate_type]
 
-    sort_keys, sort_dirs = process_sort_params(sort_keys,
-                                               sort_dirs,
-                                               default_dir='desc')
+    # A dict marker carries the sort key values of the last row seen (keyset
+    # pagination), 'id' is added so that the sort order is unique.
+    keyset = isinstance(marker, dict)
+    sort_keys, sort_dirs = process_sort_params(
+        sort_keys, sort_dirs,
+        default_keys=constants.KEYSET_SORT_KEYS if keyset else None,
+        default_dir='desc')
     query = get_query(context, session=session)
 
     if filters:
@@ -3026,8 +2495,8 @@ def _generate_paginate_query(context, session, paginate_type, marker,
         if query is None:
             return None
 
-    marker_object = None
-    if marker is not None:
+    marker_object = marker
+    if marker is not None and not keyset:
         marker_object = get(context, marker, session)
 
     return sqlalchemyutils.paginate_query(query, paginate_type, limit,
@@ -0,0 +1,44 @@
+# Copyright 2021 The SODA Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Database schema versioning and migration, backed by alembic."""
+
+import os
+
+from alembic import command as alembic_command
+from alembic import config as alembic_config
+from alembic import migration as alembic_migration
+
+
+def _alembic_config():
+    path = os.path.join(os.path.dirname(__file__), 'alembic')
+    config = alembic_config.Config()
+    config.set_main_option('script_location', path)
+    return config
+
+
+def db_sync(engine, version=None):
+    """Upgrade the database schema to the given version, latest by default.
+    """
+    config = _alembic_config()
+    with engine.begin() as connection:
+        config.attributes['connection'] = connection
+        alembic_command.upgrade(config, version or 'head')
+
+
+def db_version(engine):
+    """Return the current schema version of the database."""
+    with engine.connect() as connection:
+        context = alembic_migration.MigrationContext.configure(connection)
+        return context.get_current_revision()
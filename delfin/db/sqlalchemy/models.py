@@ -24,6 +24,7 @@ from oslo_config import cfg
 from oslo_db.sqlalchemy import models
 from oslo_db.sqlalchemy.types import JsonEncodedDict
 from sqlalchemy import Column, Integer, String, Boolean, BigInteger, DateTime
+from sqlalchemy import Index
 from sqlalchemy.ext.declarative import declarative_base
 
 from delfin.common import constants
@@ -31,11 +32,28 @@ from delfin.common import constants
 CONF = cfg.CONF
 BASE = declarative_base()
 
+_TABLE_KWARGS = {'mysql_engine': 'InnoDB'}
+
+
+def _resource_table_args(table_name, native_id=None):
+    """Build the indexes for a table of resources owned by a storage.
+
+    (storage_id, created_at, id) serves listing resources of a storage in
+    the default sort order, (storage_id, <native id>) serves the lookups
+    done by resource sync.
+    """
+    indexes = [Index('ix_%s_storage_created_id' % table_name,
+                     'storage_id', 'created_at', 'id')]
+    if native_id:
+        indexes.append(Index('ix_%s_storage_native_id' % table_name,
+                             'storage_id', native_id))
+    return tuple(indexes) + (_TABLE_KWARGS,)
+
 
 class DelfinBase(models.ModelBase,
                  models.TimestampMixin):
     """Base class for Delfin Models."""
-    __table_args__ = {'mysql_engine': 'InnoDB'}
+    __table_args__ = _TABLE_KWARGS
     metadata = None
 
     def to_dict(self):
@@ -85,6 +103,7 @@ class Storage(BASE, DelfinBase):
 class Volume(BASE, DelfinBase):
     """Represents a volume object."""
     __tablename__ = 'volumes'
+    __table_args__ = _resource_table_args(__tablename__, 'native_volume_id')
     id = Column(String(36), primary_key=True)
     native_volume_id = Column(String(255))
     name = Column(String(255))
@@ -104,6 +123,8 @@ class Volume(BASE, DelfinBase):
 class StoragePool(BASE, DelfinBase):
     """Represents a storage_pool object."""
     __tablename__ = 'storage_pools'
+    __table_args__ = _resource_table_args(
+        __tablename__, 'native_storage_pool_id')
     id = Column(String(36), primary_key=True)
     native_storage_pool_id = Column(String(255))
     name = Column(String(255))
@@ -120,6 +141,7 @@ class StoragePool(BASE, DelfinBase):
 class Disk(BASE, DelfinBase):
     """Represents a disk object."""
     __tablename__ = 'disks'
+    __table_args__ = _resource_table_args(__tablename__, 'native_disk_id')
     id = Column(String(36), primary_key=True)
     native_disk_id = Column(String(255))
     name = Column(String(255))
@@ -141,6 +163,8 @@ class Disk(BASE, DelfinBase):
 class Controller(BASE, DelfinBase):
     """Represents a controller object."""
     __tablename__ = 'controllers'
+    __table_args__ = _resource_table_args(
+        __tablename__, 'native_controller_id')
     id = Column(String(36), primary_key=True)
     native_controller_id = Column(String(255))
     name = Column(String(255))
@@ -155,6 +179,7 @@ class Controller(BASE, DelfinBase):
 class Port(BASE, DelfinBase):
     """Represents a port object."""
     __tablename__ = 'ports'
+    __table_args__ = _resource_table_args(__tablename__, 'native_port_id')
     id = Column(String(36), primary_key=True)
     native_port_id = Column(String(255))
     name = Column(String(255))
@@ -178,6 +203,8 @@ class Port(BASE, DelfinBase):
 class Filesystem(BASE, DelfinBase):
     """Represents a filesystem object."""
     __tablename__ = 'filesystems'
+    __table_args__ = _resource_table_args(
+        __tablename__, 'native_filesystem_id')
     id = Column(String(36), primary_key=True)
     native_filesystem_id = Column(String(255))
     name = Column(String(255))
@@ -197,6 +224,7 @@ class Filesystem(BASE, DelfinBase):
 class Qtree(BASE, DelfinBase):
     """Represents a qtree object."""
     __tablename__ = 'qtrees'
+    __table_args__ = _resource_table_args(__tablename__, 'native_qtree_id')
     id = Column(String(36), primary_key=True)
     native_qtree_id = Column(String(255))
     name = Column(String(255))
@@ -209,6 +237,7 @@ class Qtree(BASE, DelfinBase):
 class Quota(BASE, DelfinBase):
     """Represents a qtree object."""
     __tablename__ = 'quota'
+    __table_args__ = _resource_table_args(__tablename__, 'native_quota_id')
     id = Column(String(36), primary_key=True)
     native_quota_id = Column(String(255))
     type = Column(String(255))
@@ -227,6 +256,7 @@ class Quota(BASE, DelfinBase):
 class Share(BASE, DelfinBase):
     """Represents a share object."""
     __tablename__ = 'shares'
+    __table_args__ = _resource_table_args(__tablename__, 'native_share_id')
     id = Column(String(36), primary_key=True)
     native_share_id = Column(String(255))
     name = Column(String(255))
@@ -240,6 +270,8 @@ class Share(BASE, DelfinBase):
 class AlertSource(BASE, DelfinBase):
     """Represents an alert source configuration."""
     __tablename__ = 'alert_source'
+    __table_args__ = (Index('ix_alert_source_host', 'host'),
+                      _TABLE_KWARGS)
     storage_id = Column(String(36), primary_key=True)
     host = Column(String(255))
     version = Column(String(255))
@@ -260,12 +292,16 @@ class AlertSource(BASE, DelfinBase):
 class Task(BASE, DelfinBase):
     """Represents a task attributes."""
     __tablename__ = 'tasks'
+    __table_args__ = (Index('ix_tasks_storage_id', 'storage_id'),
+                      _TABLE_KWARGS)
     id = Column(Integer, primary_key=True, autoincrement=True)
     storage_id = Column(String(36))
     interval = Column(Integer)
     method = Column(String(255))
     args = Column(JsonEncodedDict)
     last_run_time = Column(Integer)
+    # End time (epoch in ms) of the last collected and exported metrics
+    collected_end_time = Column(BigInteger)
     job_id = Column(String(36))
     deleted_at = Column(DateTime)
     deleted = Column(Boolean, default=False)
@@ -274,6 +310,9 @@ class Task(BASE, DelfinBase):
 class FailedTask(BASE, DelfinBase):
     """Represents a failed task attributes."""
     __tablename__ = 'failed_tasks'
+    __table_args__ = (Index('ix_failed_tasks_storage_id', 'storage_id'),
+                      Index('ix_failed_tasks_task_id', 'task_id'),
+                      _TABLE_KWARGS)
     id = Column(Integer, primary_key=True, autoincrement=True)
     storage_id = Column(String(36))
     task_id = Column(Integer)
@@ -291,6 +330,8 @@ class FailedTask(BASE, DelfinBase):
 class StorageHostInitiator(BASE, DelfinBase):
     """Represents the storage host initiator attributes."""
     __tablename__ = 'storage_host_initiators'
+    __table_args__ = _resource_table_args(
+        __tablename__, 'native_storage_host_initiator_id')
     id = Column(String(36), primary_key=True)
     storage_id = Column(String(36))
     name = Column(String(255))
@@ -305,6 +346,8 @@ class StorageHostInitiator(BASE, DelfinBase):
 class StorageHost(BASE, DelfinBase):
     """Represents the storage host attributes."""
     __tablename__ = 'storage_hosts'
+    __table_args__ = _resource_table_args(
+        __tablename__, 'native_storage_host_id')
     id = Column(String(36), primary_key=True)
     storage_id = Column(String(36))
     name = Column(String(255))
@@ -318,6 +361,8 @@ class StorageHost(BASE, DelfinBase):
 class StorageHostGroup(BASE, DelfinBase):
     """Represents the storage host group attributes."""
     __tablename__ = 'storage_host_groups'
+    __table_args__ = _resource_table_args(
+        __tablename__, 'native_storage_host_group_id')
     id = Column(String(36), primary_key=True)
     storage_id = Column(String(36))
     name = Column(String(255))
@@ -328,6 +373,8 @@ class StorageHostGroup(BASE, DelfinBase):
 class PortGroup(BASE, DelfinBase):
     """Represents the port group attributes."""
     __tablename__ = 'port_groups'
+    __table_args__ = _resource_table_args(
+        __tablename__, 'native_port_group_id')
     id = Column(String(36), primary_key=True)
     storage_id = Column(String(36))
     name = Column(String(255))
@@ -338,6 +385,8 @@ class PortGroup(BASE, DelfinBase):
 class VolumeGroup(BASE, DelfinBase):
     """Represents the volume group attributes."""
     __tablename__ = 'volume_groups'
+    __table_args__ = _resource_table_args(
+        __tablename__, 'native_volume_group_id')
     id = Column(String(36), primary_key=True)
     storage_id = Column(String(36))
     name = Column(String(255))
@@ -348,6 +397,8 @@ class VolumeGroup(BASE, DelfinBase):
 class MaskingView(BASE, DelfinBase):
     """Represents the masking view attributes."""
     __tablename__ = 'masking_views'
+    __table_args__ = _resource_table_args(
+        __tablename__, 'native_masking_view_id')
     id = Column(String(36), primary_key=True)
     storage_id = Column(String(36))
     name = Column(String(255))
@@ -366,6 +417,7 @@ class StorageHostGrpHostRel(BASE, DelfinBase):
     attributes.
     """
     __tablename__ = 'storage_host_grp_host_rels'
+    __table_args__ = _resource_table_args(__tablename__)
     id = Column(String(36), primary_key=True)
     storage_id = Column(String(36))
     name = Column(String(255))
@@ -377,6 +429,7 @@ class StorageHostGrpHostRel(BASE, DelfinBase):
 class PortGrpPortRel(BASE, DelfinBase):
     """Represents port group and port relation attributes."""
     __tablename__ = 'port_grp_port_rels'
+    __table_args__ = _resource_table_args(__tablename__)
     id = Column(String(36), primary_key=True)
     storage_id = Column(String(36))
     name = Column(String(255))
@@ -388,9 +441,23 @@ class PortGrpPortRel(BASE, DelfinBase):
 class VolGrpVolRel(BASE, DelfinBase):
     """Represents the volume group and volume relation attributes."""
     __tablename__ = 'vol_grp_vol_rels'
+    __table_args__ = _resource_table_args(__tablename__)
     id = Column(String(36), primary_key=True)
     storage_id = Column(String(36))
     name = Column(String(255))
     description = Column(String(255))
     native_volume_group_id = Column(String(255))
     native_volume_id = Column(String(255))
+
+
+class SyncWatermark(BASE, DelfinBase):
+    """Represents the incremental sync position of a storage resource."""
+    __tablename__ = 'sync_watermarks'
+    __table_args__ = (Index('ix_sync_watermarks_storage_resource',
+                            'storage_id', 'resource_type', unique=True),
+                      _TABLE_KWARGS)
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    storage_id = Column(String(36))
+    resource_type = Column(String(36))
+    watermark = Column(String(255))
+    last_full_sync_at = Column(DateTime)
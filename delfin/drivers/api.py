@@ -20,6 +20,7 @@ from oslo_utils import uuidutils
 from delfin import db
 from delfin.drivers import helper
 from delfin.drivers import manager
+from delfin.drivers.utils import response_cache
 
 LOG = log.getLogger(__name__)
 
@@ -27,6 +28,7 @@ LOG = log.getLogger(__name__)
 class API(object):
     def __init__(self):
         self.driver_manager = manager.DriverManager()
+        self.response_cache = response_cache.ResponseCache()
 
     def discover_storage(self, context, access_info):
         """Discover a storage system with access information."""
@@ -69,6 +71,15 @@ class API(object):
     def remove_storage(self, context, storage_id):
         """Clear driver instance from driver factory."""
         self.driver_manager.remove_driver(storage_id)
+        self.response_cache.clear(storage_id)
+
+    def start_sync_generation(self, context, storage_id):
+        """Share driver responses between the sync tasks of a storage."""
+        return self.response_cache.start_generation(storage_id)
+
+    def end_sync_generation(self, context, storage_id):
+        """Drop the driver responses shared in the sync generation."""
+        self.response_cache.end_generation(storage_id)
 
     def get_storage(self, context, storage_id):
         """Get storage device information from storage system"""
@@ -102,6 +113,41 @@ class API(object):
         driver = self.driver_manager.get_driver(context, storage_id=storage_id)
         return driver.list_disks(context)
 
+    def iter_volumes(self, context, storage_id, page_size):
+        """Yield storage volumes from storage system in pages."""
+        driver = self.driver_manager.get_driver(context, storage_id=storage_id)
+        return driver.iter_volumes(context, page_size)
+
+    def iter_ports(self, context, storage_id, page_size):
+        """Yield ports from storage system in pages."""
+        driver = self.driver_manager.get_driver(context, storage_id=storage_id)
+        return driver.iter_ports(context, page_size)
+
+    def iter_disks(self, context, storage_id, page_size):
+        """Yield disks from storage system in pages."""
+        driver = self.driver_manager.get_driver(context, storage_id=storage_id)
+        return driver.iter_disks(context, page_size)
+
+    def list_storage_pools_changes(self, context, storage_id, since):
+        """List storage pools changed since a watermark."""
+        driver = self.driver_manager.get_driver(context, storage_id=storage_id)
+        return driver.list_storage_pools_changes(context, since)
+
+    def list_volumes_changes(self, context, storage_id, since):
+        """List storage volumes changed since a watermark."""
+        driver = self.driver_manager.get_driver(context, storage_id=storage_id)
+        return driver.list_volumes_changes(context, since)
+
+    def list_ports_changes(self, context, storage_id, since):
+        """List ports changed since a watermark."""
+        driver = self.driver_manager.get_driver(context, storage_id=storage_id)
+        return driver.list_ports_changes(context, since)
+
+    def list_disks_changes(self, context, storage_id, since):
+        """List disks changed since a watermark."""
+        driver = self.driver_manager.get_driver(context, storage_id=storage_id)
+        return driver.list_disks_changes(context, since)
+
     def list_quotas(self, context, storage_id):
         """List all quotas from storage system."""
         driver = self.driver_manager.get_driver(context, storage_id=storage_id)
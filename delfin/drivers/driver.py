@@ -12,10 +12,19 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import operator
+
 import six
 import abc
 
 
+def _paginate(resources, key, page_size):
+    """Yield resources sorted by key in pages of page_size."""
+    resources = sorted(resources or [], key=operator.itemgetter(key))
+    for start in range(0, len(resources), page_size):
+        yield resources[start:start + page_size]
+
+
 @six.add_metaclass(abc.ABCMeta)
 class StorageDriver(object):
 
@@ -63,6 +72,71 @@ class StorageDriver(object):
         """List all disks from storage system."""
         pass
 
+    def iter_volumes(self, context, page_size):
+        """Yield storage volumes from storage system in pages.
+
+        Each page is a list of at most page_size volumes, volumes are yielded
+        in ascending order of native_volume_id. The default implementation
+        pages the result of list_volumes(), so the whole volume list is still
+        held in memory. Drivers of backends with a paged query API returning
+        volumes in that order should override it to bound the memory used by
+        the sync.
+        """
+        return _paginate(self.list_volumes(context), 'native_volume_id',
+                         page_size)
+
+    def iter_ports(self, context, page_size):
+        """Yield ports from storage system in pages, see iter_volumes()."""
+        return _paginate(self.list_ports(context), 'native_port_id',
+                         page_size)
+
+    def iter_disks(self, context, page_size):
+        """Yield disks from storage system in pages, see iter_volumes()."""
+        return _paginate(self.list_disks(context), 'native_disk_id',
+                         page_size)
+
+    def list_volumes_changes(self, context, since):
+        """List storage volumes changed on storage system since a watermark.
+
+        Optional, drivers of storage systems able to report changes since a
+        timestamp or generation counter implement it so that volumes are
+        synced incrementally, with a periodic full sync as fallback.
+
+        :param since: the watermark returned by the previous call, or None
+                      to only get the current watermark
+        :return: dict with keys
+                 watermark: opaque string to pass as since to the next call
+                 changed: list of volumes added or modified since since
+                 deleted: list of native_volume_id of volumes removed
+                 or None if the changes since since are no longer available
+        """
+        raise NotImplementedError(
+            "Driver API list_volumes_changes() is not Implemented")
+
+    def list_storage_pools_changes(self, context, since):
+        """List storage pools changed since a watermark.
+
+        See list_volumes_changes().
+        """
+        raise NotImplementedError(
+            "Driver API list_storage_pools_changes() is not Implemented")
+
+    def list_ports_changes(self, context, since):
+        """List ports changed since a watermark.
+
+        See list_volumes_changes().
+        """
+        raise NotImplementedError(
+            "Driver API list_ports_changes() is not Implemented")
+
+    def list_disks_changes(self, context, since):
+        """List disks changed since a watermark.
+
+        See list_volumes_changes().
+        """
+        raise NotImplementedError(
+            "Driver API list_disks_changes() is not Implemented")
+
     @abc.abstractmethod
     def add_trap_config(self, context, trap_config):
         """Config the trap receiver in storage system."""
@@ -125,6 +199,9 @@ class StorageDriver(object):
         context: context information
         storage_id: storage identifier
         resource_metrics: dictionary represents the collection configuration
+                    With a collection profile set for the storage, it only
+                    holds the resource types due in the time range and
+                    their allowed metrics
         Example:
         resource_metrics =
               {'storagePool':
@@ -151,6 +228,10 @@ class StorageDriver(object):
                      labels={'storage_id': '1f8d6982-2ac2-4fa9-95ef-78f359de',
                              'resource_type': 'storagePool'},
                      values={1616560337249: 90.08194398331271})]
+
+        The metrics may also be returned as a
+        delfin.common.metric_batch.MetricBatch, which shares the label sets
+        of the series and keeps the samples in arrays.
         """
         pass
 
@@ -11,7 +11,6 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
-import copy
 import random
 import decorator
 
@@ -26,6 +25,7 @@ from oslo_utils import uuidutils
 
 from delfin import exception, db
 from delfin.common import constants
+from delfin.common import metric_batch
 from delfin.drivers import driver
 
 CONF = cfg.CONF
@@ -521,7 +521,7 @@ class FakeStorageDriver(driver.StorageDriver):
                                   resource_type, metric_list):
         LOG.info("###########collecting metrics for resource %s: from"
                  " storage  %s" % (resource_type, self.storage_id))
-        resource_metrics = []
+        resource_metrics = metric_batch.MetricBatch()
         resource_count = RESOURCE_COUNT_DICT[resource_type]
 
         for i in range(resource_count):
@@ -533,9 +533,7 @@ class FakeStorageDriver(driver.StorageDriver):
                                                         start_time, end_time)
             for key in metric_list.keys():
                 labels['unit'] = metric_list[key]['unit']
-                m = constants.metric_struct(name=key, labels=labels,
-                                            values=fake_metrics[key])
-                resource_metrics.append(copy.deepcopy(m))
+                resource_metrics.append(key, labels, fake_metrics[key])
         return resource_metrics
 
     @wait_random(MIN_WAIT, MAX_WAIT)
@@ -543,13 +541,13 @@ class FakeStorageDriver(driver.StorageDriver):
                              resource_metrics, start_time,
                              end_time):
         """Collects performance metric for the given interval"""
-        merged_metrics = []
+        merged_metrics = metric_batch.MetricBatch()
         for key in resource_metrics.keys():
             m = self.get_resource_perf_metrics(storage_id,
                                                start_time,
                                                end_time, key,
                                                resource_metrics[key])
-            merged_metrics += m
+            merged_metrics.extend(m)
         return merged_metrics
 
     @staticmethod
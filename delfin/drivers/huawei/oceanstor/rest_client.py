@@ -26,6 +26,7 @@ from delfin.common import constants
 from delfin import cryptor
 from delfin import exception
 from delfin.drivers.huawei.oceanstor import consts
+from delfin.drivers.utils import response_cache
 from delfin.ssl_utils import HostNameIgnoreAdapter
 from delfin.i18n import _
 
@@ -58,6 +59,7 @@ class RestClient(object):
         rest_access = kwargs.get('rest')
         if rest_access is None:
             raise exception.InvalidInput('Input rest_access is missing')
+        self.storage_id = kwargs.get('storage_id')
         self.rest_host = rest_access.get('host')
         self.rest_port = rest_access.get('port')
         self.rest_username = rest_access.get('username')
@@ -326,10 +328,14 @@ class RestClient(object):
         url = "/disk"
         return self.paginated_call(url, None, "GET", log_filter_flag=True)
 
+    # Pools are also listed by performance collection, which may reuse the
+    # response of a recent sync
+    @response_cache.cached_response(reusable=True)
     def get_all_pools(self):
         url = "/storagepool"
         return self.paginated_call(url, None, "GET", log_filter_flag=True)
 
+    @response_cache.cached_response()
     def get_all_filesystems(self):
         url = "/filesystem"
         return self.paginated_call(url, None, "GET", log_filter_flag=True)
@@ -24,6 +24,7 @@ from oslo_utils import units
 from delfin.drivers.netapp.dataontap import constants as constant
 from delfin import exception, utils
 from delfin.common import constants
+from delfin.drivers.utils import response_cache
 from delfin.drivers.utils.ssh_client import SSHPool
 from delfin.drivers.utils.tools import Tools
 
@@ -450,6 +451,7 @@ class NetAppHandler(object):
             disks_list.append(disk_model)
         return disks_list
 
+    @response_cache.cached_response()
     def get_filesystems(self, storage_id):
         fs_list = []
         fs_info = self.ssh_do_exec(
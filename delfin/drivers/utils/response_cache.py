@@ -0,0 +1,176 @@
+# Copyright 2021 The SODA Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Share backend responses between the resource tasks of one sync cycle.
+
+Resource tasks of a storage run concurrently and several of them need the
+same backend data, e.g. the pool list to resolve the pool of each volume.
+Driver methods decorated with :func:`cached_response` are called once per
+sync generation of the storage, the other callers of the generation get a
+copy of the first response. Responses of the methods marked as reusable
+are kept after the generation ends for driver_response_cache_ttl seconds,
+so that telemetry collection can reuse them.
+"""
+
+import copy
+import inspect
+import threading
+import time
+
+import decorator
+from eventlet import semaphore
+import six
+from oslo_config import cfg
+from oslo_log import log
+
+from delfin import utils
+
+LOG = log.getLogger(__name__)
+CONF = cfg.CONF
+
+response_cache_opts = [
+    cfg.IntOpt('driver_response_cache_ttl',
+               default=0,
+               min=0,
+               help='Seconds to keep the reusable driver responses of a '
+                    'resource sync for telemetry collection, 0 means the '
+                    'responses are only shared within the sync'),
+]
+
+CONF.register_opts(response_cache_opts)
+
+
+class _Entry(object):
+    def __init__(self, generation, expires_at, value):
+        self.generation = generation
+        self.expires_at = expires_at
+        self.value = value
+
+
+@six.add_metaclass(utils.Singleton)
+class ResponseCache(object):
+    """Cache of backend responses keyed by (storage_id, call, args)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # storage_id -> active generation number
+        self._generations = {}
+        self._counter = 0
+        self._entries = {}
+        self._key_locks = {}
+
+    def start_generation(self, storage_id):
+        """Start a sync generation, responses fetched before are ignored."""
+        with self._lock:
+            self._counter += 1
+            self._generations[storage_id] = self._counter
+            self._purge(storage_id)
+            return self._counter
+
+    def end_generation(self, storage_id):
+        """End the sync generation, only the entries with a ttl are kept."""
+        with self._lock:
+            self._generations.pop(storage_id, None)
+            self._purge(storage_id)
+
+    def clear(self, storage_id):
+        with self._lock:
+            self._generations.pop(storage_id, None)
+            for key in [k for k in self._entries if k[0] == storage_id]:
+                self._entries.pop(key, None)
+                self._key_locks.pop(key, None)
+
+    def _purge(self, storage_id):
+        generation = self._generations.get(storage_id)
+        for key, entry in list(self._entries.items()):
+            if key[0] == storage_id and not self._is_valid(entry, generation):
+                self._entries.pop(key, None)
+                self._key_locks.pop(key, None)
+
+    @staticmethod
+    def _is_valid(entry, generation):
+        if entry.expires_at is not None and entry.expires_at <= time.time():
+            return False
+        if generation is not None:
+            # A sync must see the backend as of its own generation
+            return entry.generation == generation
+        return entry.expires_at is not None
+
+    def _lookup(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return False, None
+            if not self._is_valid(entry, self._generations.get(key[0])):
+                self._entries.pop(key, None)
+                return False, None
+            return True, entry.value
+
+    def get_or_call(self, key, ttl, func, *args, **kwargs):
+        """Return the cached response of key, or call func to fetch it."""
+        storage_id = key[0]
+        with self._lock:
+            generation = self._generations.get(storage_id)
+            if generation is None and not ttl:
+                # Nothing to share the response with
+                return func(*args, **kwargs)
+            key_lock = self._key_locks.setdefault(
+                key, semaphore.Semaphore())
+
+        # Concurrent callers of the same key wait for the first fetch
+        with key_lock:
+            found, value = self._lookup(key)
+            if not found:
+                value = func(*args, **kwargs)
+                expires_at = time.time() + ttl if ttl else None
+                with self._lock:
+                    self._entries[key] = _Entry(generation, expires_at, value)
+            else:
+                LOG.debug('Reuse response of %s for storage %s',
+                          key[1], storage_id)
+        return copy.deepcopy(value)
+
+
+def cached_response(reusable=False):
+    """Share the response of a driver method within a sync generation.
+
+    The storage is taken from the storage_id argument of the method, or
+    from the storage_id attribute of the object.
+
+    :param reusable: keep the response after the generation ends, for
+                     driver_response_cache_ttl seconds
+    """
+    def _cached_response(func):
+        signature = inspect.signature(func)
+        call = func.__qualname__
+
+        def _wrapper(func, *args, **kwargs):
+            arguments = signature.bind(*args, **kwargs).arguments
+            obj = arguments.pop('self', None)
+            storage_id = arguments.get('storage_id') or \
+                getattr(obj, 'storage_id', None)
+            key = (storage_id, call, tuple(sorted(arguments.items())))
+            try:
+                hash(key)
+            except TypeError:
+                storage_id = None
+            if not storage_id:
+                return func(*args, **kwargs)
+            ttl = CONF.driver_response_cache_ttl if reusable else None
+            return ResponseCache().get_or_call(key, ttl, func,
+                                               *args, **kwargs)
+
+        return decorator.decorator(_wrapper, func)
+
+    return _cached_response
@@ -370,5 +370,9 @@ class TelemetryTaskExecError(DelfinException):
     msg_fmt = _("Failure in telemetry task execution")
 
 
+class ExportFailed(DelfinException):
+    msg_fmt = _("Failed to export data to {0}: {1}")
+
+
 class ComponentNotFound(NotFound):
     msg_fmt = _("Component {0} could not be found.")
@@ -13,12 +13,17 @@
 # limitations under the License.
 
 
+import functools
+
 from oslo_config import cfg
 from oslo_log import log
 import six
 from stevedore import extension
 
 from delfin import exception
+from delfin.common import metric_batch
+from delfin.exporter import dispatch_queue
+from delfin.exporter import rollup
 from delfin.i18n import _
 
 LOG = log.getLogger(__name__)
@@ -30,6 +35,20 @@ exporter_opts = [
     cfg.ListOpt('performance_exporters',
                 default=['PerformanceExporterExample'],
                 help="Which exporters for performance push."),
+    cfg.DictOpt('performance_exporter_resolutions',
+                default={},
+                help="Resolution in seconds of the performance metrics "
+                     "pushed to each exporter, e.g. "
+                     "PerformanceExporterKafka:300. Metrics are rolled up "
+                     "to min, max, avg and last over windows of that "
+                     "resolution. Exporters not listed get the metrics at "
+                     "the resolution of the collection. Windows are kept "
+                     "in the memory of the process collecting the "
+                     "storage: when the collection of a window is split "
+                     "over several processes or nodes, e.g. the task "
+                     "moved to another node or a failed collection was "
+                     "retried elsewhere, each of them emits the window "
+                     "aggregated over its own samples only."),
 ]
 
 CONF = cfg.CONF
@@ -42,8 +61,9 @@ class BaseExporter(object):
     def dispatch(self, ctxt, data):
         """Dispatch data to the third platforms.
             :param ctxt: delfin.RequestContext
-            :param data: The data to be pushed, it's a list with dict item.
-            :type data: list
+            :param data: The data to be pushed, it's a list with dict item,
+                         or a MetricBatch of performance metrics.
+            :type data: list or MetricBatch
         """
         raise NotImplementedError()
 
@@ -54,17 +74,34 @@ class BaseManager(BaseExporter):
         self.exporters = self._get_exporters()
 
     def dispatch(self, ctxt, data):
-        if not isinstance(data, (list, tuple)):
+        if not isinstance(data, (list, tuple, metric_batch.MetricBatch)):
             data = [data]
         for exporter in self.exporters:
-            try:
-                exporter.dispatch(ctxt, data)
-            except exception.DelfinException as e:
-                err_msg = _("Failed to export data (%s).") % e.msg
-                LOG.exception(err_msg)
-            except Exception as e:
-                err_msg = six.text_type(e)
-                LOG.exception(err_msg)
+            self._export(exporter, ctxt, data)
+
+    def _export(self, exporter, ctxt, data):
+        if not CONF.exporter_async_dispatch:
+            self._export_now(exporter, ctxt, data)
+            return
+        # Exporters of the same name share the queue of the process
+        name = type(exporter).__name__
+        dispatch_queue.DispatchQueues().get(
+            name, functools.partial(self._export_now, exporter)).put(
+            ctxt, data)
+
+    @staticmethod
+    def _export_now(exporter, ctxt, data):
+        """Dispatch data to the exporter, return True on success."""
+        try:
+            exporter.dispatch(ctxt, data)
+            return True
+        except exception.DelfinException as e:
+            err_msg = _("Failed to export data (%s).") % e.msg
+            LOG.exception(err_msg)
+        except Exception as e:
+            err_msg = six.text_type(e)
+            LOG.exception(err_msg)
+        return False
 
     def _get_exporters(self):
         """Get exporters from configuration file which
@@ -99,6 +136,43 @@ class PerformanceExporterManager(BaseManager):
 
     def __init__(self):
         super(PerformanceExporterManager, self).__init__(self.NAMESPACE)
+        self.resolutions = self._get_resolutions()
+
+    def dispatch(self, ctxt, data):
+        if not self.resolutions:
+            return super(PerformanceExporterManager, self).dispatch(ctxt,
+                                                                    data)
+
+        if not isinstance(data, (list, tuple, metric_batch.MetricBatch)):
+            data = [data]
+        rollups = rollup.MetricRollup().feed(
+            data, set(self.resolutions.values()))
+        for exporter in self.exporters:
+            resolution = self.resolutions.get(type(exporter).__name__)
+            if not resolution:
+                self._export(exporter, ctxt, data)
+            elif len(rollups[resolution]):
+                self._export(exporter, ctxt, rollups[resolution])
 
     def _get_configured_exporters(self):
         return CONF.performance_exporters
+
+    def _get_resolutions(self):
+        """Get the rollup resolution of the exporters, in seconds."""
+        resolutions = {}
+        exporter_names = [type(exporter).__name__
+                          for exporter in self.exporters]
+        for name, resolution in \
+                CONF.performance_exporter_resolutions.items():
+            if name not in exporter_names:
+                continue
+            try:
+                resolution = int(resolution)
+            except ValueError:
+                resolution = 0
+            if resolution <= 0:
+                LOG.warning("Invalid resolution %s of exporter %s, raw "
+                            "metrics are exported", resolution, name)
+                continue
+            resolutions[name] = resolution
+        return resolutions
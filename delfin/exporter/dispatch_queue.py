@@ -0,0 +1,412 @@
+# Copyright 2021 The SODA Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Asynchronous dispatch of the exported data.
+
+With exporter_async_dispatch, a dispatch to an exporter only queues the
+data. Every exporter has a bounded queue served by exporter_workers
+threads, so a slow exporter delays its own data but neither the collection,
+the alert processing nor the other exporters. When the queue of an exporter
+is full, exporter_overflow_policy decides what happens:
+
+* block: the dispatch waits up to exporter_block_timeout seconds for room,
+  the data is dropped after.
+* drop_oldest: the oldest queued data is dropped for the new one.
+* spill: the data is written to exporter_spill_dir, and loaded by the
+  workers once the queue is drained. The data spilled by a process which
+  stopped is loaded by the next process serving the exporter.
+
+The queue depth, the dispatched, failed, dropped and spilled counts, the
+time waited in queue and the dispatch latency of every exporter are logged
+every exporter_stats_interval seconds and returned by stats().
+"""
+
+import atexit
+import os
+import threading
+import time
+
+import six
+from six.moves import queue as six_queue
+from oslo_config import cfg
+from oslo_log import log
+from oslo_serialization import jsonutils
+
+from delfin import context
+from delfin import utils
+from delfin.common import metric_batch
+from delfin.common.constants import metric_struct
+
+LOG = log.getLogger(__name__)
+CONF = cfg.CONF
+
+dispatch_queue_opts = [
+    cfg.BoolOpt('exporter_async_dispatch',
+                default=False,
+                help='Queue the data dispatched to each exporter and send '
+                     'it from background workers, instead of waiting for '
+                     'every exporter in turn'),
+    cfg.IntOpt('exporter_queue_size',
+               default=1000,
+               min=1,
+               help='Maximum number of dispatches queued per exporter'),
+    cfg.IntOpt('exporter_workers',
+               default=1,
+               min=1,
+               help='Number of threads sending the queued data of each '
+                    'exporter, data is sent in order with a single one'),
+    cfg.StrOpt('exporter_overflow_policy',
+               default='drop_oldest',
+               choices=['block', 'drop_oldest', 'spill'],
+               help='What to do with a dispatch when the queue of the '
+                    'exporter is full: wait for room, drop the oldest '
+                    'queued data, or spill the data to disk'),
+    cfg.IntOpt('exporter_block_timeout',
+               default=10,
+               min=0,
+               help='Seconds a dispatch waits for room in a full queue '
+                    'with the block policy, before the data is dropped'),
+    cfg.StrOpt('exporter_spill_dir',
+               default='/var/lib/delfin/exporter_spill',
+               help='Directory of the data spilled by full exporter '
+                    'queues'),
+    cfg.IntOpt('exporter_stats_interval',
+               default=300,
+               min=0,
+               help='Seconds between two logs of the exporter queue '
+                    'statistics, 0 disables them'),
+]
+
+CONF.register_opts(dispatch_queue_opts)
+
+SPILL_SUFFIX = '.spill'
+# Seconds a worker waits for data before checking the spilled data
+SPILL_POLL_INTERVAL = 1.0
+
+_STOP = object()
+
+
+def _dump_context(ctxt):
+    # Callers may pass anything as context, only a RequestContext is kept
+    to_dict = getattr(ctxt, 'to_dict', None)
+    if not callable(to_dict):
+        return None
+    try:
+        return to_dict()
+    except Exception:
+        return None
+
+
+def _load_context(values):
+    if not values:
+        return None
+    try:
+        return context.RequestContext.from_dict(values)
+    except Exception as e:
+        LOG.warning('Spilled context can not be restored: %s',
+                    six.text_type(e))
+        return None
+
+
+def _dump_data(data):
+    """Return the spilled form of the dispatched data, JSON serializable."""
+    if isinstance(data, metric_batch.MetricBatch) or (
+            data and isinstance(data, (list, tuple)) and
+            all(isinstance(item, metric_struct) for item in data)):
+        return {'metrics': [
+            [name, dict(labels), [list(sample) for sample in samples]]
+            for name, labels, samples in metric_batch.iter_series(data)]}
+    return {'items': list(data) if isinstance(data, (list, tuple))
+            else data}
+
+
+def _load_data(values):
+    if 'metrics' not in values:
+        return values['items']
+    batch = metric_batch.MetricBatch()
+    for name, labels, samples in values['metrics']:
+        batch.append(name, labels, samples)
+    return batch
+
+
+class ExporterQueue(object):
+    """Bounded queue and workers of one exporter.
+
+    :param name: name of the exporter, unique in the process
+    :param export: callable(ctxt, data) sending data to the exporter
+    """
+
+    def __init__(self, name, export):
+        self.name = name
+        self.export = export
+        self.spill_dir = os.path.join(CONF.exporter_spill_dir, name)
+        self._lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._queue = None
+        self._threads = []
+        self._pid = None
+        self._spill_pending = False
+        self._spill_seq = 0
+        self._spill_generation = 0
+        self.dispatched = 0
+        self.failed = 0
+        self.dropped = 0
+        self.spilled = 0
+        self.wait_time = 0.0
+        self.latency = 0.0
+        self.max_latency = 0.0
+        self._stats_time = time.time()
+
+    def put(self, ctxt, data):
+        item = (time.time(), ctxt, data)
+        data_queue = self._get_queue()
+        policy = CONF.exporter_overflow_policy
+        if policy == 'block':
+            try:
+                data_queue.put(item, timeout=CONF.exporter_block_timeout)
+            except six_queue.Full:
+                self._count_dropped()
+            return
+
+        if policy == 'spill':
+            # Data is not queued ahead of the data spilled before it
+            if not self._spill_pending:
+                try:
+                    data_queue.put_nowait(item)
+                    return
+                except six_queue.Full:
+                    pass
+            if not self._spill(item):
+                self._count_dropped()
+            return
+
+        while True:
+            try:
+                data_queue.put_nowait(item)
+                return
+            except six_queue.Full:
+                try:
+                    data_queue.get_nowait()
+                    self._count_dropped()
+                except six_queue.Empty:
+                    pass
+
+    def _count_dropped(self):
+        with self._stats_lock:
+            self.dropped += 1
+        LOG.warning('Queue of exporter %s is full, dispatched data dropped',
+                    self.name)
+
+    def _get_queue(self):
+        with self._lock:
+            # Threads do not survive a fork
+            if self._pid != os.getpid() or not self._threads or not all(
+                    thread.is_alive() for thread in self._threads):
+                self._start()
+            return self._queue
+
+    def _start(self):
+        # Spilled data may be left by a previous process
+        self._spill_pending = self._has_spilled_data()
+        self._queue = six_queue.Queue(maxsize=CONF.exporter_queue_size)
+        self._threads = []
+        for _ in range(CONF.exporter_workers):
+            thread = threading.Thread(target=self._run, args=(self._queue,))
+            thread.daemon = True
+            thread.start()
+            self._threads.append(thread)
+        self._pid = os.getpid()
+
+    def _run(self, data_queue):
+        while True:
+            item = None
+            if CONF.exporter_overflow_policy != 'spill':
+                item = data_queue.get()
+            else:
+                try:
+                    item = data_queue.get(timeout=SPILL_POLL_INTERVAL)
+                except six_queue.Empty:
+                    if self._spill_pending:
+                        item = self._unspill()
+            if item is _STOP:
+                return
+            if item is not None:
+                self._dispatch(item)
+
+    def _dispatch(self, item):
+        queued_time, ctxt, data = item
+        start = time.time()
+        done = self.export(ctxt, data)
+        end = time.time()
+        with self._stats_lock:
+            self.dispatched += 1
+            if not done:
+                self.failed += 1
+            self.wait_time += start - queued_time
+            self.latency += end - start
+            self.max_latency = max(self.max_latency, end - start)
+            interval = CONF.exporter_stats_interval
+            if not interval or end - self._stats_time < interval:
+                return
+            self._stats_time = end
+        LOG.info('Exporter %(name)s queue stats: %(stats)s',
+                 {'name': self.name, 'stats': self.stats()})
+
+    def _spill(self, item):
+        queued_time, ctxt, data = item
+        try:
+            if not os.path.exists(self.spill_dir):
+                os.makedirs(self.spill_dir)
+            with self._lock:
+                self._spill_seq += 1
+                # Names sort in the order of the dispatches
+                name = '%020d-%d-%010d' % (int(queued_time * 1000000),
+                                           os.getpid(), self._spill_seq)
+            path = os.path.join(self.spill_dir, name)
+            temp_path = path + '.temp'
+            # JSON, spilled files are read back from a shared directory
+            spilled = jsonutils.dumps({'queued_time': queued_time,
+                                       'context': _dump_context(ctxt),
+                                       'data': _dump_data(data)})
+            try:
+                with open(temp_path, 'w') as f:
+                    f.write(spilled)
+                os.rename(temp_path, path + SPILL_SUFFIX)
+            finally:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+            with self._lock:
+                self._spill_generation += 1
+                self._spill_pending = True
+        except Exception as e:
+            LOG.error('Failed to spill data of exporter %s, reason: %s',
+                      self.name, six.text_type(e))
+            return False
+        with self._stats_lock:
+            self.spilled += 1
+        return True
+
+    def _has_spilled_data(self):
+        try:
+            return any(name.endswith(SPILL_SUFFIX)
+                       for name in os.listdir(self.spill_dir))
+        except OSError:
+            return False
+
+    def _unspill(self):
+        """Return the oldest spilled data, None when there is none."""
+        with self._lock:
+            generation = self._spill_generation
+        try:
+            names = sorted(name for name in os.listdir(self.spill_dir)
+                           if name.endswith(SPILL_SUFFIX))
+        except OSError:
+            names = []
+        for name in names:
+            path = os.path.join(self.spill_dir, name)
+            claimed_path = '%s.%d.%d' % (path, os.getpid(),
+                                         threading.current_thread().ident)
+            try:
+                # Claimed by one worker of one process
+                os.rename(path, claimed_path)
+            except OSError:
+                continue
+            try:
+                with open(claimed_path, 'r') as f:
+                    spilled = jsonutils.loads(f.read())
+                queued_time = float(spilled['queued_time'])
+                ctxt = _load_context(spilled.get('context'))
+                data = _load_data(spilled['data'])
+            except Exception as e:
+                LOG.error('Dropping unreadable spilled data %s of exporter '
+                          '%s, reason: %s', name, self.name,
+                          six.text_type(e))
+                continue
+            finally:
+                os.remove(claimed_path)
+            return queued_time, ctxt, data
+
+        with self._lock:
+            # Unless data was spilled meanwhile
+            if generation == self._spill_generation:
+                self._spill_pending = False
+        return None
+
+    def stats(self):
+        with self._stats_lock:
+            dispatched = self.dispatched
+            return {
+                'depth': self._queue.qsize() if self._queue else 0,
+                'dispatched': dispatched,
+                'failed': self.failed,
+                'dropped': self.dropped,
+                'spilled': self.spilled,
+                'avg_wait_time': self.wait_time / dispatched
+                if dispatched else 0.0,
+                'avg_latency': self.latency / dispatched
+                if dispatched else 0.0,
+                'max_latency': self.max_latency,
+            }
+
+    def stop(self, timeout=None):
+        """Send the queued data and stop the workers."""
+        with self._lock:
+            threads, self._threads = self._threads, []
+            if self._pid != os.getpid():
+                return
+            for thread in threads:
+                try:
+                    self._queue.put(_STOP, timeout=timeout)
+                except six_queue.Full:
+                    LOG.warning('Queue of exporter %s is full, queued data '
+                                'is dropped', self.name)
+                    break
+        for thread in threads:
+            thread.join(timeout)
+
+
+@six.add_metaclass(utils.Singleton)
+class DispatchQueues(object):
+    """Queues of the exporters of the process, shared by the managers."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._queues = {}
+
+    def get(self, name, export):
+        with self._lock:
+            exporter_queue = self._queues.get(name)
+            if exporter_queue is None:
+                exporter_queue = ExporterQueue(name, export)
+                self._queues[name] = exporter_queue
+            return exporter_queue
+
+    def stats(self):
+        """Return the statistics of the queue of every exporter."""
+        with self._lock:
+            queues = list(self._queues.values())
+        return dict((exporter_queue.name, exporter_queue.stats())
+                    for exporter_queue in queues)
+
+    def stop(self, timeout=None):
+        with self._lock:
+            queues, self._queues = list(self._queues.values()), {}
+        for exporter_queue in queues:
+            exporter_queue.stop(timeout)
+
+
+@atexit.register
+def _cleanup():
+    if DispatchQueues in utils.Singleton._instances:
+        DispatchQueues().stop(timeout=CONF.exporter_block_timeout)
@@ -18,7 +18,9 @@ from delfin.exporter.kafka import kafka
 
 class AlertExporterKafka(base_exporter.BaseExporter):
     def dispatch(self, ctxt, data):
-        pass
+        # Sent in the background, alert processing does not wait for kafka
+        kafka.KafkaAlertBatcher.get_instance().put(
+            [dict(alert) for alert in data])
 
 
 class PerformanceExporterKafka(base_exporter.BaseExporter):
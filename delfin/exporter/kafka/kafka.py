@@ -12,13 +12,24 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import atexit
 import json
+import os
+import threading
+import time
+
+import six
+from six.moves import queue as six_queue
+from kafka import KafkaProducer
 from oslo_config import cfg
 from oslo_log import log
-from kafka import KafkaProducer
+
+from delfin import exception
+from delfin.common import metric_batch
+from delfin.common.constants import metric_struct
 
 """"
-The metrics received from driver is should be in this format
+The metrics received from driver is should be a MetricBatch, or in this format
 
 storage_metrics = [Metric(name='response_time',
      labels={'storage_id': '1', 'resource_type': 'array'},
@@ -51,21 +62,273 @@ kafka_opts = [
                help='The kafka server IP'),
     cfg.StrOpt('kafka_port', default='9092',
                help='The kafka server port'),
+    cfg.IntOpt('kafka_linger_ms', default=100, min=0,
+               help='Time (in ms) the producer waits for more messages to '
+                    'send them in one batch'),
+    cfg.IntOpt('kafka_batch_size', default=65536, min=0,
+               help='Maximum size (in bytes) of a batch of messages sent '
+                    'to a partition'),
+    cfg.StrOpt('kafka_compression_type', default='gzip',
+               choices=['none', 'gzip', 'snappy', 'lz4', 'zstd'],
+               help='Compression of the batches of messages'),
+    cfg.StrOpt('kafka_acks', default='1', choices=['0', '1', 'all'],
+               help='Acknowledgments the producer requires from the '
+                    'brokers for a message to be sent'),
+    cfg.BoolOpt('kafka_flush_on_dispatch', default=True,
+                help='Wait until the messages of every dispatch are '
+                     'acknowledged, a failure is then reported to the '
+                     'caller. Otherwise the messages are sent in the '
+                     'background and failures are only logged'),
+    cfg.IntOpt('kafka_flush_timeout', default=30, min=1,
+               help='Maximum time (in sec) waited for the messages of a '
+                    'dispatch to be acknowledged'),
+    cfg.StrOpt('kafka_message_key', default='storage_id',
+               choices=['storage_id', 'resource_id', 'none'],
+               help='Key of the messages, the series of a storage, or of '
+                    'a resource, go to the same partition'),
+    cfg.IntOpt('kafka_series_per_message', default=0, min=0,
+               help='Maximum number of metric series in a message, 0 '
+                    'sends all the series of a key in one message'),
+    cfg.StrOpt('kafka_alert_topic_name', default='delfin-alert',
+               help='The topic of kafka for alerts'),
+    cfg.IntOpt('kafka_alert_batch_size', default=100, min=1,
+               help='Maximum number of alerts sent at a time, the alerts '
+                    'of a storage are sent in one message keyed by the '
+                    'storage id'),
+    cfg.IntOpt('kafka_alert_batch_interval', default=200, min=0,
+               help='Time (in ms) alerts are gathered before they are '
+                    'sent, alerts of a burst are then sent together'),
+    cfg.IntOpt('kafka_alert_queue_size', default=10000, min=1,
+               help='Maximum number of alerts waiting to be sent, the '
+                    'alerts received when the queue is full are dropped'),
 ]
 
 CONF.register_opts(kafka_opts, "KAFKA_EXPORTER")
 kafka = CONF.KAFKA_EXPORTER
 
 
+def _serialize_key(key):
+    return key.encode('utf-8') if key is not None else None
+
+
+def _serialize_value(value):
+    return json.dumps(value).encode('utf-8')
+
+
 class KafkaExporter(object):
+    """Send metrics to kafka with a producer shared in the process.
+
+    The producer keeps its connections to the brokers between dispatches
+    and sends the messages in batches.
+    """
+
+    _producer = None
+    _producer_pid = None
+    _producer_lock = threading.Lock()
+
+    @classmethod
+    def get_producer(cls):
+        with cls._producer_lock:
+            # A producer can not be used in a forked process
+            if cls._producer is None or cls._producer_pid != os.getpid():
+                cls._producer = KafkaProducer(**cls._get_producer_config())
+                cls._producer_pid = os.getpid()
+            return cls._producer
+
+    @staticmethod
+    def _get_producer_config():
+        compression_type = kafka.kafka_compression_type
+        acks = kafka.kafka_acks
+        return {
+            'bootstrap_servers': [kafka.kafka_ip + ':' + kafka.kafka_port],
+            'key_serializer': _serialize_key,
+            'value_serializer': _serialize_value,
+            'linger_ms': kafka.kafka_linger_ms,
+            'batch_size': kafka.kafka_batch_size,
+            'compression_type': None if compression_type == 'none'
+            else compression_type,
+            'acks': acks if acks == 'all' else int(acks),
+        }
+
+    @classmethod
+    def close_producer(cls, timeout=None):
+        if timeout is None:
+            timeout = kafka.kafka_flush_timeout
+        with cls._producer_lock:
+            producer, cls._producer = cls._producer, None
+            if producer is not None and cls._producer_pid == os.getpid():
+                producer.close(timeout=timeout)
+
+    def send(self, topic, messages):
+        """Send the (key, value) messages to the topic.
+
+        :raises ExportFailed: when the messages are flushed on dispatch
+                              and some are not acknowledged
+        """
+        producer = self.get_producer()
+        futures = []
+        for key, value in messages:
+            future = producer.send(topic, key=key, value=value)
+            if not kafka.kafka_flush_on_dispatch:
+                future.add_errback(self._log_error, topic)
+            futures.append(future)
+        if not kafka.kafka_flush_on_dispatch:
+            return
+
+        try:
+            producer.flush(timeout=kafka.kafka_flush_timeout)
+        except Exception as e:
+            raise exception.ExportFailed('kafka', six.text_type(e))
+        failed = [future for future in futures
+                  if not future.is_done or future.failed()]
+        if failed:
+            reason = failed[0].exception if failed[0].is_done \
+                else 'not acknowledged'
+            raise exception.ExportFailed(
+                'kafka', '{0} of {1} messages not sent, {2}'.format(
+                    len(failed), len(futures), reason))
+
+    @staticmethod
+    def _log_error(error, topic):
+        LOG.error('Failed to send message to kafka topic %s: %s', topic,
+                  six.text_type(error))
+
+    @staticmethod
+    def _get_key(labels):
+        if kafka.kafka_message_key == 'none':
+            return None
+        storage_id = labels.get('storage_id')
+        if kafka.kafka_message_key == 'resource_id':
+            return '{0}:{1}'.format(storage_id, labels.get('resource_id'))
+        return storage_id
+
+    def get_messages(self, data):
+        """Group the series of data by key, in messages of limited size."""
+        groups = {}
+        for name, labels, samples in metric_batch.iter_series(data):
+            groups.setdefault(self._get_key(labels), []).append(
+                metric_struct(name=name, labels=labels,
+                              values=dict(samples)))
+
+        size = kafka.kafka_series_per_message
+        for key, metrics in groups.items():
+            if not size:
+                yield key, metrics
+                continue
+            for index in range(0, len(metrics), size):
+                yield key, metrics[index:index + size]
 
     def push_to_kafka(self, data):
-        topic = kafka.kafka_topic_name
-        ip = kafka.kafka_ip
-        port = kafka.kafka_port
-        bootstrap_server = ip + ':' + port
-        producer = KafkaProducer(
-            bootstrap_servers=[bootstrap_server],
-            value_serializer=lambda v: json.dumps(v).encode('utf-8'))
-
-        producer.send(topic, value=data)
+        self.send(kafka.kafka_topic_name, self.get_messages(data))
+
+
+_STOP = object()
+
+
+class KafkaAlertBatcher(object):
+    """Send alerts to kafka in batches from a background thread.
+
+    Alerts are queued without waiting for the brokers. A single thread
+    sends them in order, so the alerts of a storage keep their order in
+    the partition of the storage.
+    """
+
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._queue = None
+        self._thread = None
+        self._pid = None
+        self.exporter = KafkaExporter()
+
+    @classmethod
+    def get_instance(cls):
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = cls()
+            return cls._instance
+
+    def put(self, alerts):
+        alert_queue = self._get_queue()
+        dropped = 0
+        for alert in alerts:
+            try:
+                alert_queue.put_nowait(alert)
+            except six_queue.Full:
+                dropped += 1
+        if dropped:
+            LOG.warning('Kafka alert queue is full, dropped %d alerts',
+                        dropped)
+
+    def _get_queue(self):
+        with self._lock:
+            if self._thread is None or self._pid != os.getpid() or \
+                    not self._thread.is_alive():
+                self._queue = six_queue.Queue(
+                    maxsize=kafka.kafka_alert_queue_size)
+                self._thread = threading.Thread(target=self._run,
+                                                args=(self._queue,))
+                self._thread.daemon = True
+                self._thread.start()
+                self._pid = os.getpid()
+            return self._queue
+
+    def _run(self, alert_queue):
+        stopped = False
+        while not stopped:
+            alert = alert_queue.get()
+            if alert is _STOP:
+                return
+            alerts = [alert]
+            deadline = time.time() + \
+                kafka.kafka_alert_batch_interval / 1000.0
+            while len(alerts) < kafka.kafka_alert_batch_size:
+                timeout = deadline - time.time()
+                if timeout <= 0:
+                    break
+                try:
+                    alert = alert_queue.get(timeout=timeout)
+                except six_queue.Empty:
+                    break
+                if alert is _STOP:
+                    stopped = True
+                    break
+                alerts.append(alert)
+            self._send(alerts)
+
+    def _send(self, alerts):
+        groups = {}
+        for alert in alerts:
+            groups.setdefault(alert.get('storage_id'), []).append(alert)
+        try:
+            self.exporter.send(kafka.kafka_alert_topic_name, groups.items())
+        except Exception as e:
+            LOG.error('Failed to send %d alerts to kafka: %s', len(alerts),
+                      six.text_type(e))
+
+    def stop(self, timeout=None):
+        """Send the queued alerts and stop the thread."""
+        if timeout is None:
+            timeout = kafka.kafka_flush_timeout
+        with self._lock:
+            thread, self._thread = self._thread, None
+            if thread is None or self._pid != os.getpid() or \
+                    not thread.is_alive():
+                return
+            try:
+                self._queue.put(_STOP, timeout=timeout)
+            except six_queue.Full:
+                LOG.warning('Kafka alert queue is full, queued alerts are '
+                            'dropped')
+                return
+        thread.join(timeout)
+
+
+@atexit.register
+def _cleanup():
+    # Queued alerts are sent before the producer is closed
+    if KafkaAlertBatcher._instance is not None:
+        KafkaAlertBatcher._instance.stop()
+    KafkaExporter.close_producer()
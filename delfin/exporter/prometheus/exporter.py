@@ -14,7 +14,8 @@
 
 from oslo_log import log
 from delfin.exporter import base_exporter
-from delfin.exporter.prometheus import prometheus, alert_manager
+from delfin.exporter.prometheus import prometheus, alert_manager, \
+    remote_write
 
 LOG = log.getLogger(__name__)
 
@@ -29,3 +30,9 @@ class PerformanceExporterPrometheus(base_exporter.BaseExporter):
     def dispatch(self, ctxt, data):
         prometheus_obj = prometheus.PrometheusExporter()
         prometheus_obj.push_to_prometheus(data)
+
+
+class PerformanceExporterPromRemoteWrite(base_exporter.BaseExporter):
+    def dispatch(self, ctxt, data):
+        # Sent in the background by the shards of the remote write queues
+        remote_write.RemoteWriteSender.get_instance().put(data)
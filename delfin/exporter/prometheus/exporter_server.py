@@ -20,6 +20,8 @@ from oslo_config import cfg
 import sys
 from oslo_log import log
 
+from delfin.exporter.prometheus import registry
+
 LOG = log.getLogger(__name__)
 
 app = Flask(__name__)
@@ -52,6 +54,15 @@ def getfile():
     except OSError as e:
         LOG.error('Error opening metrics folder')
         raise Exception(e)
+    if cfg.CONF.PROMETHEUS_EXPORTER.metrics_mode == 'registry':
+        try:
+            # The current series of all the storages in one scrape
+            return registry.read_snapshots(
+                cfg.CONF.PROMETHEUS_EXPORTER.metrics_dir)
+        except Exception as e:
+            LOG.error('Error while reading metric snapshots %s',
+                      six.text_type(e))
+            return ''
     try:
         files = glob.glob("*.prom")
         data = ''
@@ -19,6 +19,9 @@ import six
 from oslo_config import cfg
 from oslo_log import log
 
+from delfin.common import metric_batch
+from delfin.exporter.prometheus import registry
+
 LOG = log.getLogger(__name__)
 
 grp = cfg.OptGroup('PROMETHEUS_EXPORTER')
@@ -37,7 +40,7 @@ prometheus_opts = [
 cfg.CONF.register_opts(prometheus_opts, group=grp)
 
 """"
-The metrics received from driver is should be in this format
+The metrics received from driver is should be a MetricBatch, or in this format
 storage_metrics = [Metric(name='response_time',
      labels={'storage_id': '1', 'resource_type': 'array'},
      values={16009988175: 74.10422968341392, 16009988180: 74.10422968341392}),
@@ -53,6 +56,29 @@ storage_metrics = [Metric(name='response_time',
 """
 
 
+def get_prom_name(name, labels):
+    return labels.get('resource_type') + '_' + name
+
+
+def get_prom_labels(labels):
+    """Return the (name, value) pairs of the labels of a series."""
+    prom_labels = [
+        ('storage_id', labels.get('storage_id')),
+        ('storage_name', labels.get('name')),
+        ('storage_sn', labels.get('serial_number')),
+        ('resource_type', labels.get('resource_type')),
+        ('resource_id', labels.get('resource_id')),
+        ('type', labels.get('type', 'RAW')),
+        ('unit', labels.get('unit')),
+        ('value_type', labels.get('value_type', 'gauge')),
+    ]
+    # Rolled up series must not collide with the raw ones
+    for key in ('resolution', 'aggregation'):
+        if key in labels:
+            prom_labels.append((key, labels[key]))
+    return prom_labels
+
+
 class PrometheusExporter(object):
 
     def __init__(self):
@@ -77,7 +103,9 @@ class PrometheusExporter(object):
                    labels.get('resource_id')))
         f.write("# TYPE %s gauge\n" % metric)
 
-        for timestamp, value in values.items():
+        for timestamp, value in values:
+            if not metric_batch.is_number(value):
+                continue
             f.write("%s{%s} %f %d\n" % (metric, prom_labels,
                                         value, timestamp))
 
@@ -99,9 +127,38 @@ class PrometheusExporter(object):
                          " as it crossed the retention period", file)
                 os.remove(file)
 
+    @staticmethod
+    def _get_prom_series(name, labels):
+        prom_labels = ','.join('%s="%s"' % label
+                               for label in get_prom_labels(labels))
+        return get_prom_name(name, labels), prom_labels
+
+    def push_to_registry(self, storage_metrics):
+        """Update the series of the metrics in the shared registry."""
+        samples = []
+        for name, labels, values in metric_batch.iter_series(
+                storage_metrics):
+            latest = None
+            for timestamp, value in values:
+                if not metric_batch.is_number(value):
+                    continue
+                if latest is None or timestamp > latest[0]:
+                    latest = (timestamp, value)
+            if latest is None:
+                continue
+            name, prom_labels = self._get_prom_series(name, labels)
+            samples.append((labels.get('storage_id'), name, prom_labels)
+                           + latest)
+        metric_registry = registry.MetricRegistry()
+        metric_registry.write_snapshots(self.metrics_dir,
+                                        metric_registry.update(samples))
+
     def push_to_prometheus(self, storage_metrics):
         if not self.check_metrics_dir_exists(self.metrics_dir):
             return
+        if cfg.CONF.PROMETHEUS_EXPORTER.metrics_mode == 'registry':
+            self.push_to_registry(storage_metrics)
+            return
         try:
             self.clean_old_metric_files(self.metrics_dir)
         except Exception:
@@ -113,31 +170,9 @@ class PrometheusExporter(object):
                                         time_stamp + ".prom")
         # make a temp  file with current timestamp
         with open(temp_file_name, "w") as f:
-            for metric in storage_metrics:
-                name = metric.name
-                labels = metric.labels
-                values = metric.values
-                storage_id = labels.get('storage_id')
-                storage_name = labels.get('name')
-                storage_sn = labels.get('serial_number')
-                resource_type = labels.get('resource_type')
-                resource_id = labels.get('resource_id')
-                unit = labels.get('unit')
-                m_type = labels.get('type', 'RAW')
-                value_type = labels.get('value_type', 'gauge')
-                prom_labels = (
-                    "storage_id=\"%s\","
-                    "storage_name=\"%s\","
-                    "storage_sn=\"%s\","
-                    "resource_type=\"%s\","
-                    "resource_id=\"%s\","
-                    "type=\"%s\","
-                    "unit=\"%s\","
-                    "value_type=\"%s\"" %
-                    (storage_id, storage_name, storage_sn, resource_type,
-                        resource_id,
-                        m_type, unit, value_type))
-                name = labels.get('resource_type') + '_' + name
+            for name, labels, values in metric_batch.iter_series(
+                    storage_metrics):
+                name, prom_labels = self._get_prom_series(name, labels)
                 self._write_to_prometheus_format(f, name, labels, prom_labels,
                                                  values)
         # this is done so that the exporter server never see an incomplete file
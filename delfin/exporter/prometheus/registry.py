@@ -0,0 +1,235 @@
+# Copyright 2021 The SODA Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Registry of the latest sample of every Prometheus series.
+
+In the 'registry' metrics mode the performance exporter keeps the newest
+sample of each series instead of writing a file per collection. The series
+of a storage are written to a snapshot file in metrics_dir, replaced
+atomically on every push of the storage, so that the exporter server and
+every delfin process collecting metrics share the registry through the
+metrics_dir. A process only writes and removes its own snapshot files,
+named after its host and pid, as the collection of a storage may move to
+another process. A scrape of the exporter server returns the series of all
+the snapshot files, the newest sample of a series found in several files.
+
+Series without a sample newer than metrics_staleness seconds are evicted,
+and the exporter server removes the snapshot files not updated for as long,
+e.g. the ones of a removed storage. The staleness is twice the performance
+collection interval by default, as collections start with a jitter and
+samples are older than their push.
+"""
+
+import glob
+import os
+import socket
+import threading
+import time
+
+import six
+from oslo_config import cfg
+from oslo_log import log
+
+from delfin import utils
+from delfin.common import config  # noqa
+
+LOG = log.getLogger(__name__)
+CONF = cfg.CONF
+
+grp = cfg.OptGroup('PROMETHEUS_EXPORTER')
+registry_opts = [
+    cfg.StrOpt('metrics_mode',
+               default='files',
+               choices=['files', 'registry'],
+               help='files: write a metric file per collection, served '
+                    'once by the exporter server. registry: keep the '
+                    'latest sample of every series, all of them served '
+                    'on every scrape'),
+    cfg.IntOpt('metrics_staleness',
+               min=1,
+               help='Seconds after which a series without a newer sample '
+                    'is evicted from the registry, twice the performance '
+                    'collection interval by default. It must be longer '
+                    'than the collection interval of every resource type'),
+]
+CONF.register_opts(registry_opts, group=grp)
+
+SNAPSHOT_SUFFIX = '.prom.snapshot'
+# Seconds between two sweeps of the whole registry for stale series
+EVICT_INTERVAL = 60
+
+
+def get_staleness():
+    """Return the seconds after which a series without sample is stale."""
+    interval = CONF.telemetry.performance_collection_interval
+    staleness = CONF.PROMETHEUS_EXPORTER.metrics_staleness
+    if staleness is None:
+        return 2 * interval
+    if staleness <= interval:
+        LOG.warning('metrics_staleness %s is not longer than the performance '
+                    'collection interval %s, using %s', staleness, interval,
+                    2 * interval)
+        return 2 * interval
+    return staleness
+
+
+def snapshot_path(metrics_dir, storage_id):
+    """Return the path of the snapshot of a storage for this process."""
+    return os.path.join(metrics_dir, '%s.%s-%d%s' % (
+        storage_id, socket.gethostname(), os.getpid(), SNAPSHOT_SUFFIX))
+
+
+@six.add_metaclass(utils.Singleton)
+class MetricRegistry(object):
+    """Latest sample of the series exported by this process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # storage_id -> {(name, prom_labels): (timestamp, value)}
+        self._series = {}
+        self._next_evict_time = 0
+
+    def __len__(self):
+        return sum(len(series) for series in self._series.values())
+
+    def update(self, samples):
+        """Keep the samples newer than the ones of their series.
+
+        :param samples: iterable of (storage_id, name, prom_labels,
+                        timestamp, value), timestamp in milliseconds
+        :return: set of the storage ids having a series updated
+        """
+        cutoff = self._cutoff()
+        updated = set()
+        with self._lock:
+            for storage_id, name, prom_labels, timestamp, value in samples:
+                if timestamp < cutoff:
+                    continue
+                series = self._series.setdefault(storage_id, {})
+                key = (name, prom_labels)
+                latest = series.get(key)
+                if latest and latest[0] >= timestamp:
+                    continue
+                series[key] = (timestamp, value)
+                updated.add(storage_id)
+        return updated
+
+    def evict(self, storage_ids=None):
+        """Remove the stale series, of all the storages by default.
+
+        :return: set of the storage ids having a series removed
+        """
+        cutoff = self._cutoff()
+        evicted = set()
+        with self._lock:
+            if storage_ids is None:
+                storage_ids = list(self._series)
+            for storage_id in storage_ids:
+                series = self._series.get(storage_id)
+                if not series:
+                    continue
+                for key, (timestamp, _) in list(series.items()):
+                    if timestamp < cutoff:
+                        del series[key]
+                        evicted.add(storage_id)
+                if not series:
+                    del self._series[storage_id]
+        return evicted
+
+    def render(self, storage_id):
+        """Return the series of a storage as text format sample lines."""
+        with self._lock:
+            series = sorted(self._series.get(storage_id, {}).items())
+        return ''.join('%s{%s} %f %d\n' % (name, prom_labels, value, timestamp)
+                       for (name, prom_labels), (timestamp, value) in series)
+
+    def write_snapshots(self, metrics_dir, storage_ids):
+        """Replace the snapshot files of the storages updated or evicted.
+
+        The stale series of all the storages are evicted at most once per
+        EVICT_INTERVAL, a storage left without series has its file removed.
+        """
+        storage_ids = set(storage_ids)
+        storage_ids.update(self.evict(storage_ids))
+        now = time.time()
+        if now >= self._next_evict_time:
+            self._next_evict_time = now + EVICT_INTERVAL
+            storage_ids.update(self.evict())
+
+        for storage_id in storage_ids:
+            path = snapshot_path(metrics_dir, storage_id)
+            try:
+                data = self.render(storage_id)
+                if not data:
+                    if os.path.exists(path):
+                        os.remove(path)
+                    continue
+                # The exporter server never sees an incomplete file
+                temp_path = '%s.%d.temp' % (path, os.getpid())
+                with open(temp_path, 'w') as f:
+                    f.write(data)
+                os.rename(temp_path, path)
+            except Exception as e:
+                LOG.error('Error while writing metric snapshot %s, '
+                          'reason: %s', path, six.text_type(e))
+
+    def clear(self):
+        with self._lock:
+            self._series.clear()
+            self._next_evict_time = 0
+
+    @staticmethod
+    def _cutoff():
+        return (time.time() - get_staleness()) * 1000
+
+
+def read_snapshots(metrics_dir):
+    """Return the series of all the snapshot files in text format.
+
+    The snapshot files not updated for metrics_staleness are removed.
+    """
+    cutoff = time.time() - get_staleness()
+    # name -> {series: (timestamp, line)}
+    families = {}
+    for path in glob.glob(os.path.join(metrics_dir, '*' + SNAPSHOT_SUFFIX)):
+        try:
+            if os.path.getmtime(path) < cutoff:
+                LOG.info('Removing stale metric snapshot %s', path)
+                os.remove(path)
+                continue
+            with open(path, 'r') as f:
+                lines = f.read().splitlines()
+        except OSError as e:
+            # Replaced or removed meanwhile by its writer
+            LOG.debug('Skipping metric snapshot %s, reason: %s',
+                      path, six.text_type(e))
+            continue
+        for line in lines:
+            if not line:
+                continue
+            # Lines are 'name{labels} value timestamp'
+            series, _, timestamp = line.rsplit(' ', 2)
+            timestamp = int(timestamp)
+            family = families.setdefault(series.split('{', 1)[0], {})
+            latest = family.get(series)
+            if not latest or latest[0] < timestamp:
+                family[series] = (timestamp, line)
+
+    # A metric family has one TYPE line for the series of all the storages
+    data = []
+    for name in sorted(families):
+        family = families[name]
+        data.append('# TYPE %s gauge' % name)
+        data.extend(family[series][1] for series in sorted(family))
+    return '\n'.join(data) + '\n' if data else ''
@@ -0,0 +1,305 @@
+# Copyright 2021 The SODA Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Push performance metrics with the Prometheus remote write protocol.
+
+The series are spread over remote_write_shards shards by a hash of their
+labels, so that the samples of a series are always sent in order by the
+same shard. Every shard has a bounded queue and a thread sending the
+queued series in WriteRequests of at most remote_write_max_samples_per_send
+samples, protobuf encoded and snappy compressed. Requests failing with a
+connection error, 429 or 5xx are retried with an exponential backoff.
+"""
+
+import atexit
+import os
+import struct
+import threading
+import time
+import zlib
+
+import requests
+import six
+from six.moves import queue as six_queue
+from oslo_config import cfg
+from oslo_log import log
+
+from delfin.common import metric_batch
+from delfin.exporter.prometheus import prometheus
+from delfin.exporter.prometheus import snappy_codec
+
+LOG = log.getLogger(__name__)
+CONF = cfg.CONF
+
+remote_write_opts = [
+    cfg.StrOpt('remote_write_url',
+               default='http://localhost:9090/api/v1/write',
+               help='The remote write endpoint of the receiver, e.g. '
+                    'Prometheus, Cortex, Thanos or VictoriaMetrics'),
+    cfg.IntOpt('remote_write_shards', default=4, min=1,
+               help='Number of queues sending requests concurrently'),
+    cfg.IntOpt('remote_write_queue_size', default=10000, min=1,
+               help='Maximum number of series waiting in the queue of a '
+                    'shard, the series received when the queue is full '
+                    'are dropped'),
+    cfg.IntOpt('remote_write_max_samples_per_send', default=2000, min=1,
+               help='Maximum number of samples in a request'),
+    cfg.IntOpt('remote_write_batch_send_deadline', default=5000, min=0,
+               help='Time (in ms) a shard waits for more series to fill a '
+                    'request'),
+    cfg.IntOpt('remote_write_timeout', default=30, min=1,
+               help='Timeout (in sec) of a request'),
+    cfg.IntOpt('remote_write_max_retries', default=5, min=0,
+               help='Maximum number of retries of a failed request'),
+    cfg.IntOpt('remote_write_min_backoff', default=30, min=0,
+               help='Time (in ms) waited before the first retry, doubled '
+                    'on every retry'),
+    cfg.IntOpt('remote_write_max_backoff', default=5000, min=0,
+               help='Maximum time (in ms) waited before a retry'),
+]
+
+CONF.register_opts(remote_write_opts, "PROMETHEUS_REMOTE_WRITE")
+remote_write = CONF.PROMETHEUS_REMOTE_WRITE
+
+HEADERS = {
+    'Content-Encoding': 'snappy',
+    'Content-Type': 'application/x-protobuf',
+    'User-Agent': 'delfin',
+    'X-Prometheus-Remote-Write-Version': '0.1.0',
+}
+
+
+def _varint(value):
+    # int64 values are encoded as their unsigned two's complement
+    value &= 0xffffffffffffffff
+    out = bytearray()
+    while value > 0x7f:
+        out.append(value & 0x7f | 0x80)
+        value >>= 7
+    out.append(value)
+    return out
+
+
+def _field(number, data):
+    # Length delimited field
+    return _varint(number << 3 | 2) + _varint(len(data)) + data
+
+
+def encode_write_request(series):
+    """Encode a prometheus.WriteRequest.
+
+    :param series: list of (labels, samples), labels a list of (name,
+                   value) pairs sorted by name, samples a list of
+                   (timestamp in ms, value) sorted by timestamp
+    """
+    request = bytearray()
+    for labels, samples in series:
+        time_series = bytearray()
+        for name, value in labels:
+            time_series += _field(1, _field(1, name.encode('utf-8')) +
+                                  _field(2, value.encode('utf-8')))
+        for timestamp, value in samples:
+            # double value = 1; int64 timestamp = 2;
+            time_series += _field(2, b'\x09' + struct.pack('<d', value) +
+                                  b'\x10' + _varint(timestamp))
+        request += _field(1, time_series)
+    return bytes(request)
+
+
+def get_series(data):
+    """Iterate the (labels, samples) of the metrics to remote write."""
+    for name, labels, values in metric_batch.iter_series(data):
+        samples = sorted((int(timestamp), value)
+                         for timestamp, value in values
+                         if metric_batch.is_number(value))
+        if not samples:
+            continue
+        series_labels = [(key, six.text_type(value)) for key, value in
+                         prometheus.get_prom_labels(labels)
+                         if value is not None]
+        series_labels.append(
+            ('__name__', prometheus.get_prom_name(name, labels)))
+        yield sorted(series_labels), samples
+
+
+_STOP = object()
+
+
+class RemoteWriteSender(object):
+    """Send metrics to the remote write endpoint from background shards.
+
+    Metrics are queued without waiting for the receiver, a slow or
+    unavailable receiver delays and drops samples but never the
+    collection.
+    """
+
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._queues = []
+        self._threads = []
+        self._pid = None
+
+    @classmethod
+    def get_instance(cls):
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = cls()
+            return cls._instance
+
+    def put(self, data):
+        queues = self._get_queues()
+        dropped = 0
+        for labels, samples in get_series(data):
+            shard = zlib.crc32(repr(labels).encode('utf-8')) % len(queues)
+            try:
+                queues[shard].put_nowait((labels, samples))
+            except six_queue.Full:
+                dropped += 1
+        if dropped:
+            LOG.warning('Remote write queues are full, dropped %d series',
+                        dropped)
+
+    def _get_queues(self):
+        with self._lock:
+            # Threads do not survive a fork
+            if self._pid != os.getpid() or not self._threads or not all(
+                    thread.is_alive() for thread in self._threads):
+                self._start()
+            return self._queues
+
+    def _start(self):
+        self._queues = []
+        self._threads = []
+        for _ in range(remote_write.remote_write_shards):
+            shard_queue = six_queue.Queue(
+                maxsize=remote_write.remote_write_queue_size)
+            thread = threading.Thread(target=self._run, args=(shard_queue,))
+            thread.daemon = True
+            thread.start()
+            self._queues.append(shard_queue)
+            self._threads.append(thread)
+        self._pid = os.getpid()
+
+    def _run(self, shard_queue):
+        # Connections to the receiver are kept alive by the shard
+        session = requests.Session()
+        max_samples = remote_write.remote_write_max_samples_per_send
+        stopped = False
+        pending = None
+        while not stopped:
+            item = pending or shard_queue.get()
+            pending = None
+            if item is _STOP:
+                return
+            series = [item]
+            count = len(item[1])
+            deadline = time.time() + \
+                remote_write.remote_write_batch_send_deadline / 1000.0
+            while count < max_samples:
+                timeout = deadline - time.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = shard_queue.get(timeout=timeout)
+                except six_queue.Empty:
+                    break
+                if item is _STOP:
+                    stopped = True
+                    break
+                if count + len(item[1]) > max_samples:
+                    # Sent in the next request
+                    pending = item
+                    break
+                series.append(item)
+                count += len(item[1])
+            self._send(session, series)
+
+    def _send(self, session, series):
+        """Send the series in requests of max_samples_per_send samples."""
+        max_samples = remote_write.remote_write_max_samples_per_send
+        batch = []
+        count = 0
+        for labels, samples in series:
+            # A series with too many samples is split over requests
+            for index in range(0, len(samples), max_samples):
+                chunk = samples[index:index + max_samples]
+                if batch and count + len(chunk) > max_samples:
+                    self._post(session, batch, count)
+                    batch = []
+                    count = 0
+                batch.append((labels, chunk))
+                count += len(chunk)
+        if batch:
+            self._post(session, batch, count)
+
+    def _post(self, session, series, count):
+        body = snappy_codec.compress(encode_write_request(series))
+        retries = remote_write.remote_write_max_retries
+        for attempt in range(retries + 1):
+            try:
+                response = session.post(
+                    remote_write.remote_write_url, data=body,
+                    headers=HEADERS,
+                    timeout=remote_write.remote_write_timeout)
+            except requests.RequestException as e:
+                reason = six.text_type(e)
+            else:
+                if response.status_code < 300:
+                    return True
+                reason = 'HTTP {0}: {1}'.format(response.status_code,
+                                                response.text[:256])
+                # Only throttling and server errors are recoverable
+                if response.status_code != 429 and \
+                        response.status_code < 500:
+                    break
+            if attempt < retries:
+                time.sleep(self._get_backoff(attempt))
+        LOG.error('Failed to remote write %d samples to %s, reason: %s',
+                  count, remote_write.remote_write_url, reason)
+        return False
+
+    @staticmethod
+    def _get_backoff(attempt):
+        backoff = min(remote_write.remote_write_min_backoff * 2 ** attempt,
+                      remote_write.remote_write_max_backoff)
+        return backoff / 1000.0
+
+    def stop(self, timeout=None):
+        """Send the queued series and stop the shards."""
+        if timeout is None:
+            timeout = remote_write.remote_write_timeout
+        with self._lock:
+            threads, self._threads = self._threads, []
+            queues = self._queues
+            if self._pid != os.getpid():
+                return
+            for shard_queue, thread in zip(queues, threads):
+                if not thread.is_alive():
+                    continue
+                try:
+                    shard_queue.put(_STOP, timeout=timeout)
+                except six_queue.Full:
+                    LOG.warning('Remote write queue is full, queued series '
+                                'are dropped')
+        for thread in threads:
+            thread.join(timeout)
+
+
+@atexit.register
+def _cleanup():
+    if RemoteWriteSender._instance is not None:
+        RemoteWriteSender._instance.stop()
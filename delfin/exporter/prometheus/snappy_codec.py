@@ -0,0 +1,149 @@
+# Copyright 2021 The SODA Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Snappy block format, as used by the Prometheus remote write protocol.
+
+python-snappy is used when it is installed. Otherwise the blocks are
+compressed by a simple greedy matcher: the output is valid snappy and
+compresses the repeated label names and values of remote write requests,
+though slower and less tightly than the C implementation.
+"""
+
+try:
+    import snappy
+except ImportError:
+    snappy = None
+
+# Copies refer at most this far back, to keep the 2 bytes offset encoding
+MAX_OFFSET = 0xffff
+MIN_MATCH = 4
+
+
+def _varint(value):
+    out = bytearray()
+    while value > 0x7f:
+        out.append(value & 0x7f | 0x80)
+        value >>= 7
+    out.append(value)
+    return out
+
+
+def _emit_literal(out, data, start, end):
+    length = end - start
+    if not length:
+        return
+    n = length - 1
+    if n < 60:
+        out.append(n << 2)
+    else:
+        size = (n.bit_length() + 7) // 8
+        out.append((59 + size) << 2)
+        out += n.to_bytes(size, 'little')
+    out += data[start:end]
+
+
+def _emit_copy(out, offset, length):
+    while length > 0:
+        chunk = min(length, 64)
+        if MIN_MATCH <= chunk <= 11 and offset < 2048:
+            out.append((offset >> 8) << 5 | (chunk - 4) << 2 | 1)
+            out.append(offset & 0xff)
+        else:
+            out.append((chunk - 1) << 2 | 2)
+            out += offset.to_bytes(2, 'little')
+        length -= chunk
+
+
+def _compress(data):
+    data = bytes(data)
+    size = len(data)
+    out = _varint(size)
+    # Last position of every 4 bytes sequence
+    table = {}
+    literal_start = pos = 0
+    while pos + MIN_MATCH <= size:
+        key = data[pos:pos + MIN_MATCH]
+        candidate = table.get(key)
+        table[key] = pos
+        if candidate is None or pos - candidate > MAX_OFFSET:
+            pos += 1
+            continue
+        length = MIN_MATCH
+        while pos + length < size and \
+                data[candidate + length] == data[pos + length]:
+            length += 1
+        _emit_literal(out, data, literal_start, pos)
+        _emit_copy(out, pos - candidate, length)
+        pos += length
+        literal_start = pos
+    _emit_literal(out, data, literal_start, size)
+    return bytes(out)
+
+
+def _decompress(data):
+    data = bytes(data)
+    size = shift = pos = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        size |= (byte & 0x7f) << shift
+        shift += 7
+        if not byte & 0x80:
+            break
+
+    out = bytearray()
+    while pos < len(data):
+        tag = data[pos]
+        pos += 1
+        kind = tag & 3
+        if kind == 0:
+            length = tag >> 2
+            if length >= 60:
+                width = length - 59
+                length = int.from_bytes(data[pos:pos + width], 'little')
+                pos += width
+            length += 1
+            out += data[pos:pos + length]
+            pos += length
+            continue
+        if kind == 1:
+            length = (tag >> 2 & 7) + 4
+            offset = (tag >> 5) << 8 | data[pos]
+            pos += 1
+        else:
+            width = 2 if kind == 2 else 4
+            length = (tag >> 2) + 1
+            offset = int.from_bytes(data[pos:pos + width], 'little')
+            pos += width
+        if not 0 < offset <= len(out):
+            raise ValueError('Invalid snappy copy offset %d' % offset)
+        # The copied bytes may overlap the bytes being written
+        for _ in range(length):
+            out.append(out[-offset])
+    if len(out) != size:
+        raise ValueError('Snappy data of %d bytes, expected %d'
+                         % (len(out), size))
+    return bytes(out)
+
+
+def compress(data):
+    if snappy is not None:
+        return snappy.compress(data)
+    return _compress(data)
+
+
+def decompress(data):
+    if snappy is not None:
+        return snappy.uncompress(data)
+    return _decompress(data)
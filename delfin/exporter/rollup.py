@@ -0,0 +1,177 @@
+# Copyright 2021 The SODA Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Streaming rollup of performance metrics.
+
+The samples of every series are aggregated over windows aligned to
+multiples of a resolution, e.g. 300 or 3600 seconds. Only the open window
+of a series is kept per resolution: it is updated with every sample and
+emitted as min, max, avg and last once a sample of a later window arrives,
+or once the series is not updated for two collection intervals after the
+end of the window. Samples of a window already emitted are not rolled up:
+the start of the last window emitted of a series is kept until no sample
+of it can be collected anymore, after max_backfill_duration.
+
+Every rolled up series keeps the name and labels of the raw series, with
+a 'resolution' label (in seconds) and an 'aggregation' label. Its single
+sample is timestamped with the start of the window.
+
+Windows are kept per process. Samples of a window collected by another
+process, after the task of the storage moved to another node or by a retry
+of a failed collection, are rolled up there in a window of their own: each
+process then emits partial aggregates for the same window start.
+"""
+
+import threading
+import time
+
+import six
+from oslo_config import cfg
+from oslo_log import log
+
+from delfin import utils
+from delfin.common import metric_batch
+
+LOG = log.getLogger(__name__)
+CONF = cfg.CONF
+
+AGGREGATIONS = ('min', 'max', 'avg', 'last')
+
+
+class _Window(object):
+    __slots__ = ('start', 'min', 'max', 'sum', 'count', 'last',
+                 'last_timestamp')
+
+    def __init__(self, start):
+        self.start = start
+        self.min = float('inf')
+        self.max = float('-inf')
+        self.sum = 0.0
+        self.count = 0
+        self.last = None
+        self.last_timestamp = None
+
+    def add(self, timestamp, value):
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+        self.sum += value
+        self.count += 1
+        if self.last_timestamp is None or timestamp >= self.last_timestamp:
+            self.last = value
+            self.last_timestamp = timestamp
+
+    def aggregates(self):
+        return {'min': self.min, 'max': self.max,
+                'avg': self.sum / self.count, 'last': self.last}
+
+
+@six.add_metaclass(utils.Singleton)
+class MetricRollup(object):
+    """Open rollup windows of the series collected by this process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # (resolution, name, label key) -> (labels, open _Window or None,
+        #                                   start of last window emitted)
+        self._windows = {}
+
+    def __len__(self):
+        return sum(1 for _, window, _ in self._windows.values() if window)
+
+    def feed(self, metrics, resolutions):
+        """Add the samples of metrics to the windows of each resolution.
+
+        :param metrics: MetricBatch or list of Metric
+        :param resolutions: the resolutions to roll up, in seconds
+        :return: dict of resolution to the MetricBatch of the windows
+                 closed by the samples or by expiry
+        """
+        rollups = dict((resolution, metric_batch.MetricBatch())
+                       for resolution in resolutions)
+        with self._lock:
+            for name, labels, samples in metric_batch.iter_series(metrics):
+                samples = sorted((timestamp, value)
+                                 for timestamp, value in samples
+                                 if metric_batch.is_number(value))
+                if not samples:
+                    continue
+                try:
+                    label_key = tuple(sorted(labels.items()))
+                    hash(label_key)
+                except TypeError:
+                    LOG.debug('Series %s with unhashable labels is not '
+                              'rolled up', name)
+                    continue
+                for resolution in resolutions:
+                    self._add(rollups[resolution], resolution, name, labels,
+                              label_key, samples)
+            self._expire(rollups)
+        return rollups
+
+    def _add(self, rollup, resolution, name, labels, label_key, samples):
+        key = (resolution, name, label_key)
+        window_size = resolution * 1000
+        entry = self._windows.get(key)
+        if entry:
+            labels, window, emitted_start = entry
+        else:
+            labels, window, emitted_start = dict(labels), None, None
+        for timestamp, value in samples:
+            start = timestamp - timestamp % window_size
+            if (window and start < window.start) or \
+                    (emitted_start is not None and start <= emitted_start):
+                # The window was already emitted
+                continue
+            if window and start > window.start:
+                self._emit(rollup, resolution, name, labels, window)
+                emitted_start, window = window.start, None
+            if not window:
+                window = _Window(start)
+            window.add(timestamp, value)
+        self._windows[key] = (labels, window, emitted_start)
+
+    def _expire(self, rollups):
+        # Series not collected anymore must not hold their window forever
+        now = time.time() * 1000
+        grace = 2 * CONF.telemetry.performance_collection_interval * 1000
+        backfill = CONF.telemetry.max_backfill_duration * 1000
+        for key, (labels, window, emitted_start) in \
+                list(self._windows.items()):
+            resolution, name, _ = key
+            if not window:
+                # Drop the emitted window start once no late sample of it
+                # can be collected anymore
+                if emitted_start + resolution * 1000 + grace + backfill \
+                        <= now:
+                    del self._windows[key]
+                continue
+            if window.start + resolution * 1000 + grace > now:
+                continue
+            self._windows[key] = (labels, None, window.start)
+            rollup = rollups.get(resolution)
+            if rollup is not None:
+                self._emit(rollup, resolution, name, labels, window)
+
+    @staticmethod
+    def _emit(rollup, resolution, name, labels, window):
+        aggregates = window.aggregates()
+        for aggregation in AGGREGATIONS:
+            rollup.append(name,
+                          dict(labels, resolution=str(resolution),
+                               aggregation=aggregation),
+                          [(window.start, aggregates[aggregation])])
+
+    def clear(self):
+        with self._lock:
+            self._windows.clear()
@@ -12,11 +12,17 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+from oslo_config import cfg
+
 from delfin.leader_election.tooz.callback import ToozLeaderElectionCallback
 from delfin.leader_election.tooz.leader_elector import Elector
+from delfin.leader_election.tooz.partition_elector import PartitionElector
 from delfin.task_manager.scheduler.schedule_manager import SchedulerManager
 
+CONF = cfg.CONF
+
 LEADER_ELECTION_KEY = "delfin-performance-metric-collection"
+PARTITION_KEY = "delfin-performance-metric-partition"
 
 
 class LeaderElectionFactory:
@@ -41,6 +47,12 @@ class LeaderElectionFactory:
                 on_leading_callback=scheduler_mgr.start,
                 on_stop_callback=scheduler_mgr.stop)
 
+            if CONF.telemetry.partitioned_scheduling:
+                # Every task node schedules its partition of the tasks
+                elector = PartitionElector(callback, PARTITION_KEY)
+                scheduler_mgr.partitioner = elector
+                return elector
+
             return Elector(callback, leader_election_key)
         else:
             raise ValueError(plugin)
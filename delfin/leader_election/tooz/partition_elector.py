@@ -0,0 +1,94 @@
+# Copyright 2021 The SODA Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Partition elector makes every member the leader of its own partition"""
+
+import threading
+
+from oslo_log import log
+from oslo_utils import timeutils
+
+from delfin.coordination import PartitionCoordinator
+from delfin.leader_election.interface import LeaderElector
+
+LOG = log.getLogger(__name__)
+
+
+class PartitionElector(LeaderElector):
+
+    def __init__(self, callbacks, partition_key):
+        key = partition_key.encode('ascii')
+        super(PartitionElector, self).__init__(callbacks, key)
+
+        self._coordinator = None
+        self.leader = False
+        self._stop = threading.Event()
+
+    def run(self):
+        if self._coordinator:
+            return
+
+        self._stop.clear()
+
+        self._coordinator = PartitionCoordinator()
+        self._coordinator.start()
+        self._coordinator.join_partitioned_group(self.election_key)
+
+        # Every member leads the objects of its partition
+        self.leader = True
+        self.callbacks.on_started_leading()
+
+        while not self._stop.is_set():
+            with timeutils.StopWatch() as w:
+                LOG.debug("sending heartbeats for partition membership")
+                wait_until_next_beat = self._coordinator.send_heartbeat()
+
+            ran_for = w.elapsed()
+            has_to_sleep_for = wait_until_next_beat - ran_for
+            if has_to_sleep_for < 0:
+                LOG.warning(
+                    "Heart beating took too long to execute (it ran for"
+                    " %0.2f seconds which is %0.2f seconds longer than"
+                    " the next heartbeat idle time). This may cause"
+                    " partition ownership to move to other members.",
+                    ran_for, ran_for - wait_until_next_beat)
+
+            # Update the hash ring with the members joined or left
+            self._coordinator.run_watchers()
+
+            self._stop.wait(has_to_sleep_for / 2)
+
+    def belongs_to_self(self, obj):
+        """Whether the object is in the partition of this member."""
+        if not self._coordinator:
+            return False
+        return self._coordinator.belongs_to_self(obj)
+
+    def get_members(self):
+        """Members sharing the partitions, including this one."""
+        if not self._coordinator:
+            return frozenset()
+        return self._coordinator.get_members()
+
+    def cleanup(self):
+        if not self._stop.is_set():
+            self._stop.set()
+
+        if self.leader:
+            self.callbacks.on_stopped_leading()
+            self.leader = False
+
+        if self._coordinator:
+            self._coordinator.stop()
+            self._coordinator = None
@@ -20,8 +20,10 @@ from oslo_log import log
 from oslo_utils import importutils
 
 from delfin import manager
+from delfin.common import storage_cache
 from delfin.drivers import manager as driver_manager
-from delfin.task_manager.tasks import alerts, telemetry
+from delfin.task_manager.scheduler import schedule_manager
+from delfin.task_manager.tasks import alerts, orchestrator, telemetry
 
 LOG = log.getLogger(__name__)
 
@@ -29,7 +31,7 @@ LOG = log.getLogger(__name__)
 class TaskManager(manager.Manager):
     """manage periodical tasks"""
 
-    RPC_API_VERSION = '1.0'
+    RPC_API_VERSION = '1.1'
 
     def __init__(self, service_name=None, *args, **kwargs):
         self.alert_task = alerts.AlertSyncTask()
@@ -43,6 +45,13 @@ class TaskManager(manager.Manager):
         device_obj = cls(context, storage_id)
         device_obj.sync()
 
+    def sync_storage_resources(self, context, storage_id, resource_tasks):
+        LOG.debug("Received the sync_storage tasks: {0} request for storage"
+                  " id:{1}".format(resource_tasks, storage_id))
+        sync_orchestrator = orchestrator.StorageSyncOrchestrator(context,
+                                                                 storage_id)
+        sync_orchestrator.sync(resource_tasks)
+
     def collect_telemetry(self, context, storage_id, telemetry_task,
                           args, start_time, end_time):
         LOG.debug("Collecting resource metrics: {0} request for storage"
@@ -52,6 +61,17 @@ class TaskManager(manager.Manager):
         return device_obj.collect(context, storage_id, args, start_time,
                                   end_time)
 
+    def collect_telemetry_async(self, context, storage_id, telemetry_task,
+                                args, start_time, end_time, result_handler,
+                                handler_id):
+        status = self.collect_telemetry(context, storage_id, telemetry_task,
+                                        args, start_time, end_time)
+        # The scheduler does not wait for the collection, the result is
+        # recorded by the handler which dispatched it
+        cls = importutils.import_class(result_handler)
+        cls.handle_result(context, handler_id, storage_id, status,
+                          start_time, end_time)
+
     def remove_storage_resource(self, context, storage_id, resource_task):
         cls = importutils.import_class(resource_task)
         device_obj = cls(context, storage_id)
@@ -62,14 +82,30 @@ class TaskManager(manager.Manager):
                  .format(storage_id))
         drivers = driver_manager.DriverManager()
         drivers.remove_driver(storage_id)
+        storage_cache.StorageMetadataCache().invalidate(storage_id)
 
     def remove_telemetry_instances(self, context, storage_id, telemetry_task):
         LOG.info('Remove telemetry instances for storage id:{0}')
         cls = importutils.import_class(telemetry_task)
         device_obj = cls()
-        return device_obj.remove_telemetry(context,
-                                           storage_id,
-                                           )
+        result = device_obj.remove_telemetry(context,
+                                             storage_id,
+                                             )
+        # Drop the jobs of the storage if this node schedules them
+        schedule_manager.SchedulerManager().unschedule_storage(storage_id)
+        return result
+
+    def schedule_telemetry_task(self, context, task_id):
+        LOG.debug('Schedule telemetry task called for task id:{0}'
+                  .format(task_id))
+        schedule_manager.SchedulerManager().schedule_task(task_id)
+
+    def schedule_failed_telemetry_task(self, context, failed_task_id,
+                                       task_id):
+        LOG.debug('Schedule failed telemetry task called for failed task '
+                  'id:{0}'.format(failed_task_id))
+        schedule_manager.SchedulerManager().schedule_failed_task(
+            failed_task_id, task_id)
 
     def sync_storage_alerts(self, context, storage_id, query_para):
         LOG.info('Alert sync called for storage id:{0}'
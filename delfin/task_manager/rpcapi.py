@@ -30,15 +30,18 @@ class TaskAPI(object):
     API version history:
 
         1.0 - Initial version.
+        1.1 - Add sync_storage_resources.
     """
 
-    RPC_API_VERSION = '1.0'
+    RPC_API_VERSION = '1.1'
 
     def __init__(self):
         super(TaskAPI, self).__init__()
         target = messaging.Target(topic=CONF.delfin_task_topic,
                                   version=self.RPC_API_VERSION)
-        self.client = rpc.get_client(target, version_cap=self.RPC_API_VERSION)
+        version_cap = CONF.task_manager_rpc_version_cap or \
+            self.RPC_API_VERSION
+        self.client = rpc.get_client(target, version_cap=version_cap)
 
     def sync_storage_resource(self, context, storage_id, resource_task):
         call_context = self.client.prepare(version='1.0')
@@ -47,6 +50,19 @@ class TaskAPI(object):
                                  storage_id=storage_id,
                                  resource_task=resource_task)
 
+    def sync_storage_resources(self, context, storage_id, resource_tasks):
+        if not self.client.can_send_version('1.1'):
+            # Task managers older than 1.1 sync the resources one by one
+            for resource_task in resource_tasks:
+                self.sync_storage_resource(context, storage_id,
+                                           resource_task)
+            return
+        call_context = self.client.prepare(version='1.1')
+        return call_context.cast(context,
+                                 'sync_storage_resources',
+                                 storage_id=storage_id,
+                                 resource_tasks=resource_tasks)
+
     def collect_telemetry(self, context, storage_id, telemetry_task, args,
                           start_time, end_time):
         call_context = self.client.prepare(version='1.0')
@@ -58,6 +74,20 @@ class TaskAPI(object):
                                  start_time=start_time,
                                  end_time=end_time)
 
+    def collect_telemetry_async(self, context, storage_id, telemetry_task,
+                                args, start_time, end_time, result_handler,
+                                handler_id):
+        call_context = self.client.prepare(version='1.0')
+        return call_context.cast(context,
+                                 'collect_telemetry_async',
+                                 storage_id=storage_id,
+                                 telemetry_task=telemetry_task,
+                                 args=args,
+                                 start_time=start_time,
+                                 end_time=end_time,
+                                 result_handler=result_handler,
+                                 handler_id=handler_id)
+
     def remove_storage_resource(self, context, storage_id, resource_task):
         call_context = self.client.prepare(version='1.0')
         return call_context.cast(context,
@@ -78,6 +108,20 @@ class TaskAPI(object):
                                  storage_id=storage_id,
                                  telemetry_task=telemetry_task)
 
+    def schedule_telemetry_task(self, context, task_id):
+        call_context = self.client.prepare(version='1.0', fanout=True)
+        return call_context.cast(context,
+                                 'schedule_telemetry_task',
+                                 task_id=task_id)
+
+    def schedule_failed_telemetry_task(self, context, failed_task_id,
+                                       task_id):
+        call_context = self.client.prepare(version='1.0', fanout=True)
+        return call_context.cast(context,
+                                 'schedule_failed_telemetry_task',
+                                 failed_task_id=failed_task_id,
+                                 task_id=task_id)
+
     def sync_storage_alerts(self, context, storage_id, query_para):
         call_context = self.client.prepare(version='1.0')
         return call_context.cast(context,
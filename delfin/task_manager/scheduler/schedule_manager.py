@@ -46,6 +46,46 @@ class SchedulerManager(object):
         self.boot_jobs = dict()
         self.boot_jobs_scheduled = False
         self.ctx = context.get_admin_context()
+        # Set in partitioned scheduling, it tells which tasks are owned
+        self.partitioner = None
+
+    def owns_task(self, task_id):
+        """Whether the task is scheduled by this node."""
+        if self.partitioner is None:
+            return True
+        return self.partitioner.belongs_to_self(task_id)
+
+    def partition_members(self):
+        """Members sharing the tasks, None without partitioned scheduling."""
+        if self.partitioner is None:
+            return None
+        return self.partitioner.get_members()
+
+    def _get_boot_job(self, job_class):
+        for job in self.boot_jobs.values():
+            if isinstance(job, job_class):
+                return job
+        return None
+
+    def schedule_task(self, task_id):
+        """Schedule a task created or updated, if this node owns it."""
+        job = self._get_boot_job(TelemetryJob)
+        if job is None or not self.owns_task(task_id):
+            return
+        job.schedule(task_id)
+
+    def unschedule_storage(self, storage_id):
+        """Remove the jobs of the tasks of a storage deleted."""
+        job = self._get_boot_job(TelemetryJob)
+        if job is not None:
+            job.unschedule_storage(storage_id)
+
+    def schedule_failed_task(self, failed_task_id, task_id):
+        """Queue a failed task for retry, if this node owns its task."""
+        job = self._get_boot_job(FailedTelemetryJob)
+        if job is None or not self.owns_task(task_id):
+            return
+        job.queue_failed_task(failed_task_id)
 
     def start(self):
         """ Initialise the schedulers for periodic job creation
@@ -23,27 +23,31 @@ from delfin.db.sqlalchemy.models import FailedTask
 from delfin.db.sqlalchemy.models import Task
 from delfin.i18n import _
 from delfin.task_manager import rpcapi as task_rpcapi
-from delfin.task_manager.scheduler import schedule_manager
 from delfin.task_manager.tasks.telemetry import PerformanceCollectionTask
+from delfin.task_manager.tasks.telemetry import get_collected_end_time
 
 LOG = log.getLogger(__name__)
 CONF = cfg.CONF
 
 
 class FailedPerformanceCollectionHandler(object):
-    def __init__(self, ctx, failed_task_id, storage_id, args, job_id,
+    """Retry the collection of the failed time range of a task.
+
+    Called by the retry queue of FailedTelemetryJob, every call is one
+    retry of the whole failed range.
+    """
+
+    def __init__(self, ctx, failed_task_id, task_id, storage_id, args,
                  retry_count, start_time, end_time):
         self.ctx = ctx
         self.failed_task_id = failed_task_id
+        self.task_id = task_id
         self.retry_count = retry_count
         self.storage_id = storage_id
-        self.job_id = job_id
         self.args = args
         self.start_time = start_time
         self.end_time = end_time
         self.task_rpcapi = task_rpcapi.TaskAPI()
-        self.scheduler_instance = \
-            schedule_manager.SchedulerManager().get_scheduler()
         self.result = TelemetryJobStatus.FAILED_JOB_STATUS_INIT
 
     @staticmethod
@@ -53,40 +57,112 @@ class FailedPerformanceCollectionHandler(object):
         return FailedPerformanceCollectionHandler(
             ctx,
             failed_task[FailedTask.id.name],
+            failed_task[FailedTask.task_id.name],
             task[Task.storage_id.name],
             task[Task.args.name],
-            failed_task[FailedTask.job_id.name],
             failed_task[FailedTask.retry_count.name],
             failed_task[FailedTask.start_time.name],
             failed_task[FailedTask.end_time.name],
         )
 
+    @classmethod
+    def record_failure(cls, ctx, task_id, storage_id, start_time, end_time):
+        """Queue the failed range of a task for retry.
+
+        The range is merged into the failed range of the task it overlaps
+        or adjoins, so that a storage has one retry for a whole outage.
+        A new failed task is pushed to the retry queue of the node which
+        schedules the task.
+        """
+        filters = {FailedTask.task_id.name: task_id,
+                   FailedTask.deleted.name: False}
+        for failed_task in db.failed_task_get_all(ctx, filters=filters):
+            failed_start = failed_task[FailedTask.start_time.name]
+            failed_end = failed_task[FailedTask.end_time.name]
+            if start_time <= failed_end and failed_start <= end_time:
+                db.failed_task_update(
+                    ctx, failed_task[FailedTask.id.name],
+                    {FailedTask.start_time.name: min(start_time,
+                                                     failed_start),
+                     FailedTask.end_time.name: max(end_time, failed_end)})
+                return
+
+        failed_task = {
+            FailedTask.storage_id.name: storage_id,
+            FailedTask.task_id.name: task_id,
+            FailedTask.start_time.name: start_time,
+            FailedTask.end_time.name: end_time,
+            FailedTask.interval.name:
+                CONF.telemetry.performance_collection_interval,
+            FailedTask.retry_count.name: 0,
+            FailedTask.method.name: cls.__module__ + '.' + cls.__name__,
+            FailedTask.result.name:
+                TelemetryJobStatus.FAILED_JOB_STATUS_INIT,
+        }
+        failed_task = db.failed_task_create(ctx, failed_task)
+        try:
+            task_rpcapi.TaskAPI().schedule_failed_telemetry_task(
+                ctx, failed_task[FailedTask.id.name], task_id)
+        except Exception as e:
+            # Queued on the next reconcile of the failed tasks
+            LOG.warning("Failed to queue failed task of task id:{0}, "
+                        "reason:{1}".format(task_id, six.text_type(e)))
+
     def __call__(self):
-        # Upon periodic job callback, if storage is already deleted or soft
-        # deleted,do not proceed with failed performance collection flow
+        """Retry the collection, return True when the failed task is done."""
+        # If storage is already deleted or soft deleted, do not proceed
+        # with failed performance collection flow
         try:
             failed_task = db.failed_task_get(self.ctx, self.failed_task_id)
             if failed_task["deleted"]:
                 LOG.debug('Storage %s getting deleted, ignoring '
                           'performance collection cycle for failed task id %s.'
                           % (self.storage_id, self.failed_task_id))
-                return
-        except exception.FailedTaskNotFound:
+                return True
+            task = db.task_get(self.ctx, self.task_id)
+        except (exception.FailedTaskNotFound, exception.TaskNotFound):
             LOG.debug('Storage %s already deleted, ignoring '
                       'performance collection cycle for failed task id %s.'
                       % (self.storage_id, self.failed_task_id))
-            return
+            return True
+
+        if failed_task[FailedTask.retry_count.name] >= \
+                TelemetryCollection.MAX_FAILED_JOB_RETRY_COUNT:
+            self._give_up()
+            return True
+
+        # The periodic collection may have recovered the range meanwhile.
+        # Async periodic collections go on past a failed window and move
+        # the watermark past it, so only this retry collects the range.
+        watermark = 0
+        if not CONF.telemetry.async_collection:
+            watermark = task.get(Task.collected_end_time.name) or 0
+        if watermark >= self.end_time:
+            LOG.info("Failed range of task id:{0} collected by the periodic "
+                     "collection".format(self.task_id))
+            db.failed_task_delete(self.ctx, self.failed_task_id)
+            return True
+        start_time = max(self.start_time, watermark)
 
-        # Pull performance collection info
         self.retry_count = self.retry_count + 1
+        self.result = TelemetryJobStatus.FAILED_JOB_STATUS_RETRYING
+        if CONF.telemetry.async_collection:
+            self._dispatch_async(start_time)
+            return False
+
         try:
             status = self.task_rpcapi.collect_telemetry(
                 self.ctx, self.storage_id,
                 PerformanceCollectionTask.__module__ + '.' +
                 PerformanceCollectionTask.__name__,
-                self.args, self.start_time, self.end_time)
+                self.args, start_time, self.end_time)
 
-            if not status:
+            collected_end_time = get_collected_end_time(
+                status, start_time, self.end_time)
+            if collected_end_time < self.end_time:
+                self._collected_part(self.ctx, self.failed_task_id,
+                                     self.task_id, start_time,
+                                     collected_end_time)
                 raise exception.TelemetryTaskExecError()
         except Exception as e:
             LOG.error(e)
@@ -97,28 +173,88 @@ class FailedPerformanceCollectionHandler(object):
         else:
             LOG.info("Successfully completed Performance metrics collection "
                      "for storage id :{0} ".format(self.storage_id))
-            self.result = TelemetryJobStatus.FAILED_JOB_STATUS_SUCCESS
-            self._stop_task()
-            return
+            self._complete(self.ctx, self.failed_task_id, self.task_id,
+                           start_time, self.end_time)
+            return True
 
         if self.retry_count >= TelemetryCollection.MAX_FAILED_JOB_RETRY_COUNT:
-            msg = _(
-                "Failed to collect performance metrics of task instance "
-                "id:{0} for start time:{1} and end time:{2} with "
-                "maximum retry. Giving up on "
-                "retry".format(self.failed_task_id, self.start_time,
-                               self.end_time))
-            LOG.error(msg)
-            self._stop_task()
-            return
+            self._give_up()
+            return True
 
-        self.result = TelemetryJobStatus.FAILED_JOB_STATUS_RETRYING
         db.failed_task_update(self.ctx, self.failed_task_id,
                               {FailedTask.retry_count.name: self.retry_count,
                                FailedTask.result.name: self.result})
+        return False
 
-    def _stop_task(self):
+    def _dispatch_async(self, start_time):
+        try:
+            self.task_rpcapi.collect_telemetry_async(
+                self.ctx, self.storage_id,
+                PerformanceCollectionTask.__module__ + '.' +
+                PerformanceCollectionTask.__name__,
+                self.args, start_time, self.end_time,
+                self.__module__ + '.' + self.__class__.__name__,
+                self.failed_task_id)
+        except Exception as e:
+            LOG.error("Failed to dispatch performance collection for storage "
+                      "id:{0}, reason:{1}".format(self.storage_id,
+                                                  six.text_type(e)))
+
+        # The retry is counted when dispatched, handle_result removes the
+        # failed task when the retry succeeds
         db.failed_task_update(self.ctx, self.failed_task_id,
                               {FailedTask.retry_count.name: self.retry_count,
                                FailedTask.result.name: self.result})
-        self.scheduler_instance.pause_job(self.job_id)
+
+    def _give_up(self):
+        msg = _(
+            "Failed to collect performance metrics of task instance "
+            "id:{0} for start time:{1} and end time:{2} with "
+            "maximum retry. Giving up on "
+            "retry".format(self.failed_task_id, self.start_time,
+                           self.end_time))
+        LOG.error(msg)
+        db.failed_task_delete(self.ctx, self.failed_task_id)
+
+    @staticmethod
+    def _complete(ctx, failed_task_id, task_id, start_time, end_time):
+        # Move the watermark only when no gap is left before the range
+        db.task_collected_end_time_advance(ctx, task_id, end_time,
+                                           start_time=start_time)
+        db.failed_task_delete(ctx, failed_task_id)
+
+    @staticmethod
+    def _collected_part(ctx, failed_task_id, task_id, start_time,
+                        collected_end_time):
+        # Only the rest of the failed range is retried
+        if collected_end_time <= start_time:
+            return
+        db.task_collected_end_time_advance(ctx, task_id, collected_end_time,
+                                           start_time=start_time)
+        db.failed_task_update(ctx, failed_task_id,
+                              {FailedTask.start_time.name:
+                               collected_end_time})
+
+    @classmethod
+    def handle_result(cls, ctx, failed_task_id, storage_id, status,
+                      start_time, end_time):
+        """Record the result of a retry dispatched asynchronously."""
+        collected_end_time = get_collected_end_time(status, start_time,
+                                                    end_time)
+        try:
+            failed_task = db.failed_task_get(ctx, failed_task_id)
+            if collected_end_time < end_time:
+                LOG.error("Failed to collect performance metrics of failed "
+                          "task id:{0}".format(failed_task_id))
+                cls._collected_part(ctx, failed_task_id,
+                                    failed_task[FailedTask.task_id.name],
+                                    start_time, collected_end_time)
+                return
+            cls._complete(ctx, failed_task_id,
+                          failed_task[FailedTask.task_id.name],
+                          start_time, end_time)
+        except (exception.FailedTaskNotFound, exception.TaskNotFound):
+            LOG.debug('Failed task %s already removed', failed_task_id)
+        else:
+            LOG.info("Successfully completed Performance metrics collection "
+                     "for storage id :{0} ".format(storage_id))
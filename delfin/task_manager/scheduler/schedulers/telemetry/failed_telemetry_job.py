@@ -12,31 +12,58 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from datetime import datetime
+import heapq
+import random
+import threading
+import time
 
 import six
 from oslo_config import cfg
 from oslo_log import log
 from oslo_utils import importutils
-from oslo_utils import uuidutils
 
 from delfin import db
-from delfin.common.constants import TelemetryJobStatus, TelemetryCollection
+from delfin.common.constants import TelemetryCollection
 from delfin.db.sqlalchemy.models import FailedTask
-from delfin.exception import TaskNotFound
+from delfin.exception import FailedTaskNotFound, TaskNotFound
 from delfin.task_manager.scheduler import schedule_manager
 
 CONF = cfg.CONF
 LOG = log.getLogger(__name__)
 
 
+def get_retry_delay(retry_count):
+    """Exponential backoff with jitter, in seconds, of the next retry."""
+    backoff = min(CONF.telemetry.retry_backoff_base * 2 ** retry_count,
+                  CONF.telemetry.retry_backoff_max)
+    # The jitter spreads the retries of storages which failed together
+    return random.uniform(backoff / 2.0, backoff)
+
+
 class FailedTelemetryJob(object):
+    """Retry queue of the failed performance collections.
+
+    The failed tasks are stored in the database. At most retry_queue_size
+    of them are held in a heap ordered by their next retry time, and
+    every run of the job retries the failed tasks which are due. Failed
+    tasks are queued when they are recorded, the database is scanned for
+    the others every task_reconcile_interval, when the members sharing
+    the tasks change, or while the queue has room for the failed tasks
+    left in the database.
+    """
+
     def __init__(self, ctx):
-        # create the object of periodic scheduler
-        self.scheduler = schedule_manager.SchedulerManager().get_scheduler()
+        self.scheduler_manager = schedule_manager.SchedulerManager()
         self.ctx = ctx
         self.stopped = False
-        self.job_ids = set()
+        # Heap of (retry time, failed task id)
+        self.queue = []
+        self.queued = set()
+        self.last_reconcile_time = None
+        self.partition_members = None
+        # Failed tasks were left in the database when the queue was full
+        self.overflow = False
+        self._lock = threading.Lock()
 
     def __call__(self):
         """
@@ -46,102 +73,147 @@ class FailedTelemetryJob(object):
         if self.stopped:
             return
 
+        members = self.scheduler_manager.partition_members()
+        if self._is_reconcile_due(members):
+            self._reconcile()
+            self.partition_members = members
+        try:
+            if not self.queue:
+                LOG.debug("No failed task queued for performance "
+                          "collection")
+                return
+
+            LOG.debug("Retry performance collection triggered: total "
+                      "queued failed tasks:%s" % len(self.queue))
+            self._retry_due_tasks()
+        except Exception as e:
+            LOG.error("Failed to retry failed tasks of performance "
+                      "collection, reason: %s", six.text_type(e))
+        else:
+            LOG.debug("Retry of failed collections completed")
+
+    def _is_reconcile_due(self, members):
+        if self.last_reconcile_time is None:
+            return True
+        if members != self.partition_members:
+            return True
+        if self.overflow and \
+                len(self.queue) < CONF.telemetry.retry_queue_size:
+            return True
+        return time.time() - self.last_reconcile_time >= \
+            CONF.telemetry.task_reconcile_interval
+
+    def _reconcile(self):
+        self.last_reconcile_time = time.time()
         try:
-            # Remove jobs from scheduler when marked for delete
+            # Remove failed tasks marked for delete
             filters = {'deleted': True}
             failed_tasks = db.failed_task_get_all(self.ctx, filters=filters)
             LOG.debug("Total failed_tasks found deleted "
                       "in this cycle:%s" % len(failed_tasks))
             for failed_task in failed_tasks:
-                job_id = failed_task['job_id']
-                self.remove_scheduled_job(job_id)
                 db.failed_task_delete(self.ctx, failed_task['id'])
         except Exception as e:
-            LOG.error("Failed to remove periodic scheduling job , reason: %s.",
+            LOG.error("Failed to remove deleted failed tasks, reason: %s.",
                       six.text_type(e))
         try:
-            # Create the object of periodic scheduler
-            failed_tasks = db.failed_task_get_all(self.ctx)
-
-            if not len(failed_tasks):
-                LOG.info("No failed task found for performance collection")
-                return
-
-            LOG.debug("Schedule performance collection triggered: total "
-                      "failed tasks:%s" % len(failed_tasks))
-
-            for failed_task in failed_tasks:
-                failed_task_id = failed_task[FailedTask.id.name]
-                LOG.info("Processing failed task : %s" % failed_task_id)
-
-                # Get failed jobs, if retry count has reached max,
-                # remove job and delete db entry
-                retry_count = failed_task[FailedTask.retry_count.name]
-                result = failed_task[FailedTask.result.name]
-                job_id = failed_task[FailedTask.job_id.name]
-                if retry_count >= \
-                        TelemetryCollection.MAX_FAILED_JOB_RETRY_COUNT or \
-                        result == TelemetryJobStatus.FAILED_JOB_STATUS_SUCCESS:
-                    LOG.info("Exiting Failure task processing for task [%d] "
-                             "with result [%s] and retry count [%d] "
-                             % (failed_task_id, result, retry_count))
-                    # task ID is same as job id
-                    self._teardown_task(self.ctx, failed_task_id, job_id)
-                    continue
-
-                # If job already scheduled, skip
-                if job_id and self.scheduler.get_job(job_id):
-                    continue
-
-                try:
-                    db.task_get(self.ctx,
-                                failed_task[FailedTask.task_id.name])
-                except TaskNotFound as e:
-                    LOG.info("Removing failed telemetry job as parent job "
-                             "do not exist: %s", six.text_type(e))
-                    # tear down if original task is not available
-                    self._teardown_task(self.ctx, failed_task_id,
-                                        job_id)
-                    continue
-
-                if not job_id:
-                    job_id = uuidutils.generate_uuid()
-                    db.failed_task_update(self.ctx, failed_task_id,
-                                          {FailedTask.job_id.name: job_id})
-
-                collection_class = importutils.import_class(
-                    failed_task[FailedTask.method.name])
-                instance = \
-                    collection_class.get_instance(self.ctx, failed_task_id)
-                self.scheduler.add_job(
-                    instance, 'interval',
-                    seconds=failed_task[FailedTask.interval.name],
-                    next_run_time=datetime.now(), id=job_id,
-                    misfire_grace_time=int(
-                        CONF.telemetry.performance_collection_interval / 2)
-                )
-                self.job_ids.add(job_id)
-
+            with self._lock:
+                self._load_failed_tasks()
         except Exception as e:
-            LOG.error("Failed to schedule retry tasks for performance "
+            LOG.error("Failed to load failed tasks of performance "
                       "collection, reason: %s", six.text_type(e))
-        else:
-            LOG.info("Schedule collection completed")
 
-    def _teardown_task(self, ctx, failed_task_id, job_id):
-        db.failed_task_delete(ctx, failed_task_id)
-        self.remove_scheduled_job(job_id)
+    def queue_failed_task(self, failed_task_id):
+        """Queue a failed task recorded for the first time."""
+        if self.stopped:
+            return
+        with self._lock:
+            if failed_task_id in self.queued:
+                return
+            if len(self.queue) >= CONF.telemetry.retry_queue_size:
+                # Loaded from the database once the queue has room
+                self.overflow = True
+                return
+            self._push(failed_task_id, 0)
+
+    def _load_failed_tasks(self):
+        self.overflow = False
+        free = CONF.telemetry.retry_queue_size - len(self.queue)
+        if free <= 0:
+            self.overflow = True
+            return
 
-    def remove_scheduled_job(self, job_id):
-        if job_id in self.job_ids:
-            self.job_ids.remove(job_id)
-        if job_id and self.scheduler.get_job(job_id):
-            self.scheduler.remove_job(job_id)
+        filters = {'deleted': False}
+        failed_tasks = db.failed_task_get_all(
+            self.ctx, sort_keys=[FailedTask.id.name], sort_dirs=['asc'],
+            filters=filters)
+        for failed_task in failed_tasks:
+            failed_task_id = failed_task[FailedTask.id.name]
+            if failed_task_id in self.queued:
+                continue
+            # Failed tasks are retried by the owner of their parent task
+            if not self.scheduler_manager.owns_task(
+                    failed_task[FailedTask.task_id.name]):
+                continue
+            if not free:
+                self.overflow = True
+                break
+            self._push(failed_task_id,
+                       failed_task[FailedTask.retry_count.name])
+            free -= 1
+
+    def _push(self, failed_task_id, retry_count):
+        retry_time = time.time() + get_retry_delay(retry_count)
+        heapq.heappush(self.queue, (retry_time, failed_task_id))
+        self.queued.add(failed_task_id)
+
+    def _retry_due_tasks(self):
+        # Failed tasks queued again by this run wait for the next run
+        now = time.time()
+        due_task_ids = []
+        with self._lock:
+            while self.queue and self.queue[0][0] <= now:
+                _, failed_task_id = heapq.heappop(self.queue)
+                self.queued.discard(failed_task_id)
+                due_task_ids.append(failed_task_id)
+
+        for failed_task_id in due_task_ids:
+            if self.stopped:
+                return
+            try:
+                failed_task = db.failed_task_get(self.ctx, failed_task_id)
+            except FailedTaskNotFound:
+                continue
+            if not self.scheduler_manager.owns_task(
+                    failed_task[FailedTask.task_id.name]):
+                continue
+
+            LOG.info("Processing failed task : %s" % failed_task_id)
+            collection_class = importutils.import_class(
+                failed_task[FailedTask.method.name])
+            try:
+                instance = collection_class.get_instance(self.ctx,
+                                                         failed_task_id)
+            except TaskNotFound as e:
+                LOG.info("Removing failed telemetry task as parent task "
+                         "do not exist: %s", six.text_type(e))
+                db.failed_task_delete(self.ctx, failed_task_id)
+                continue
+
+            try:
+                done = instance()
+            except Exception as e:
+                LOG.error("Failed to retry failed task %s, reason: %s",
+                          failed_task_id, six.text_type(e))
+                done = False
+            if not done:
+                with self._lock:
+                    self._push(failed_task_id, instance.retry_count)
 
     def stop(self):
         self.stopped = True
-        for job_id in self.job_ids.copy():
-            self.remove_scheduled_job(job_id)
+        self.queue = []
+        self.queued.clear()
 
     @classmethod
     def job_interval(cls):
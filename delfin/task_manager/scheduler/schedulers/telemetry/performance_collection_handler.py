@@ -15,18 +15,18 @@
 from datetime import datetime
 
 import six
+from oslo_config import cfg
 from oslo_log import log
 
 from delfin import db
 from delfin import exception
-from delfin.common.constants import TelemetryCollection
-from delfin.db.sqlalchemy.models import FailedTask
 from delfin.task_manager import rpcapi as task_rpcapi
 from delfin.task_manager.scheduler.schedulers.telemetry. \
     failed_performance_collection_handler import \
     FailedPerformanceCollectionHandler
 from delfin.task_manager.tasks import telemetry
 
+CONF = cfg.CONF
 LOG = log.getLogger(__name__)
 
 
@@ -38,6 +38,8 @@ class PerformanceCollectionHandler(object):
         self.args = args
         self.interval = interval
         self.task_rpcapi = task_rpcapi.TaskAPI()
+        # End time of the last collection dispatched asynchronously
+        self.dispatched_end_time = None
 
     @staticmethod
     def get_instance(ctx, task_id):
@@ -71,37 +73,92 @@ class PerformanceCollectionHandler(object):
 
             # Times are epoch time in milliseconds
             end_time = current_time * 1000
-            start_time = end_time - (self.interval * 1000)
-            status = self.task_rpcapi. \
-                collect_telemetry(self.ctx, self.storage_id,
-                                  telemetry.TelemetryTask.__module__ + '.' +
-                                  'PerformanceCollectionTask', self.args,
-                                  start_time, end_time)
+            # The collection profile of the task may have been updated
+            self.args = task['args']
+            self.interval = task['interval']
+            start_time = self._get_start_time(task, end_time)
+            telemetry_task = telemetry.TelemetryTask.__module__ + '.' + \
+                'PerformanceCollectionTask'
+            if CONF.telemetry.async_collection:
+                # The next window starts where this one ends, a failure of
+                # this collection, dispatch included, is only collected
+                # again from the retry queue
+                self.dispatched_end_time = end_time
+                # The watermark is moved by handle_result
+                self.task_rpcapi.collect_telemetry_async(
+                    self.ctx, self.storage_id, telemetry_task, self.args,
+                    start_time, end_time,
+                    self.__module__ + '.' + self.__class__.__name__,
+                    self.task_id)
+                status = True
+            else:
+                status = self.task_rpcapi. \
+                    collect_telemetry(self.ctx, self.storage_id,
+                                      telemetry_task, self.args,
+                                      start_time, end_time)
+                self.handle_result(self.ctx, self.task_id, self.storage_id,
+                                   status, start_time, end_time)
 
             db.task_update(self.ctx, self.task_id,
                            {'last_run_time': current_time})
-
-            if not status:
-                raise exception.TelemetryTaskExecError()
         except Exception as e:
+            # Next cycle collects again from the watermark, the retry queue
+            # may recover the range before
             LOG.error("Failed to collect performance metrics for "
                       "task id :{0}, reason:{1}".format(self.task_id,
                                                         six.text_type(e)))
-            self._handle_task_failure(start_time, end_time)
-        else:
-            LOG.debug("Performance collection done for storage id :{0}"
-                      ",task id :{1} and interval(in sec):{2}"
-                      .format(self.storage_id, self.task_id, self.interval))
-
-    def _handle_task_failure(self, start_time, end_time):
-        failed_task = {FailedTask.storage_id.name: self.storage_id,
-                       FailedTask.task_id.name: self.task_id,
-                       FailedTask.interval.name:
-                           TelemetryCollection.PERIODIC_JOB_INTERVAL,
-                       FailedTask.end_time.name: end_time,
-                       FailedTask.start_time.name: start_time,
-                       FailedTask.method.name:
-                           FailedPerformanceCollectionHandler.__module__ +
-                           '.' + FailedPerformanceCollectionHandler.__name__,
-                       FailedTask.retry_count.name: 0}
-        db.failed_task_create(self.ctx, failed_task)
+            if start_time is not None:
+                self._record_failure(self.ctx, self.task_id, self.storage_id,
+                                     start_time, end_time)
+
+    def _get_start_time(self, task, end_time):
+        watermark = max(task.get('collected_end_time') or 0,
+                        self.dispatched_end_time or 0)
+        if not watermark:
+            return end_time - (self.interval * 1000)
+
+        backfill_start = end_time - \
+            CONF.telemetry.max_backfill_duration * 1000
+        if watermark < backfill_start:
+            LOG.warning('Performance metrics of task id %s are not collected '
+                        'from %s to %s, the gap is longer than the maximum '
+                        'backfill duration', self.task_id, watermark,
+                        backfill_start)
+            return backfill_start
+        return watermark
+
+    @staticmethod
+    def _update_watermark(ctx, task_id, end_time):
+        # Results of async collections may arrive out of order
+        db.task_collected_end_time_advance(ctx, task_id, end_time)
+
+    @staticmethod
+    def _record_failure(ctx, task_id, storage_id, start_time, end_time):
+        try:
+            FailedPerformanceCollectionHandler.record_failure(
+                ctx, task_id, storage_id, start_time, end_time)
+        except Exception as e:
+            LOG.error("Failed to queue retry of task id :{0}, reason:{1}"
+                      .format(task_id, six.text_type(e)))
+
+    @classmethod
+    def handle_result(cls, ctx, task_id, storage_id, status, start_time,
+                      end_time):
+        """Record the result of a collection of the task.
+
+        The watermark is moved to the end of the range collected, the rest
+        of the range is queued for retry.
+        """
+        collected_end_time = telemetry.get_collected_end_time(
+            status, start_time, end_time)
+        if collected_end_time > start_time:
+            cls._update_watermark(ctx, task_id, collected_end_time)
+        if collected_end_time < end_time:
+            LOG.error("Failed to collect performance metrics for task id :{0}"
+                      " from {1} to {2}".format(task_id, collected_end_time,
+                                                end_time))
+            cls._record_failure(ctx, task_id, storage_id, collected_end_time,
+                                end_time)
+            return
+        LOG.debug("Performance collection done for storage id :{0}"
+                  ",task id :{1}".format(storage_id, task_id))
@@ -12,6 +12,10 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import hashlib
+import random
+import threading
+import time
 from datetime import datetime
 
 import six
@@ -21,6 +25,7 @@ from oslo_utils import importutils
 from oslo_utils import uuidutils
 
 from delfin import db
+from delfin import exception
 from delfin.common.constants import TelemetryCollection
 from delfin.task_manager.scheduler import schedule_manager
 
@@ -28,19 +33,62 @@ CONF = cfg.CONF
 LOG = log.getLogger(__name__)
 
 
+def get_next_run_time(storage_id, interval, current_time):
+    """Return the epoch time of the first collection of a storage.
+
+    With phase spreading, the collections of a storage happen at an offset
+    within the interval derived from the storage id. The offset does not
+    change on restart or failover, and the collections of all the storages
+    spread evenly across the interval.
+    """
+    if CONF.telemetry.phase_spread_collection:
+        digest = hashlib.md5(storage_id.encode('utf-8')).hexdigest()
+        offset = int(digest, 16) % interval
+        next_run_time = current_time - (current_time - offset) % interval
+        if next_run_time <= current_time:
+            next_run_time += interval
+    else:
+        next_run_time = current_time + interval
+
+    jitter = min(CONF.telemetry.collection_start_jitter, interval)
+    if jitter:
+        next_run_time += random.randint(0, jitter)
+    return next_run_time
+
+
 class TelemetryJob(object):
+    """Schedule the collection jobs of the tasks.
+
+    Tasks are scheduled and unscheduled when storages are registered,
+    updated or deleted. Every job_interval, the job also checks whether
+    the tasks must be reconciled with the database: every
+    task_reconcile_interval, and when the members sharing the tasks change.
+    """
+
     def __init__(self, ctx):
         self.ctx = ctx
-        self.scheduler = schedule_manager.SchedulerManager().get_scheduler()
+        self.scheduler_manager = schedule_manager.SchedulerManager()
+        self.scheduler = self.scheduler_manager.get_scheduler()
+        self.partitioned = self.scheduler_manager.partitioner is not None
 
-        # Reset last run time of tasks to restart scheduling and
-        # start the failed task job
-        task_list = db.task_get_all(ctx)
-        for task in task_list:
-            db.task_update(ctx, task['id'], {'last_run_time': None})
+        if not self.partitioned:
+            # Reset last run time of tasks to restart scheduling and
+            # start the failed task job
+            task_list = db.task_get_all(ctx)
+            for task in task_list:
+                db.task_update(ctx, task['id'], {'last_run_time': None})
 
         self.stopped = False
         self.job_ids = set()
+        # task id -> job id of the tasks scheduled by this node
+        self.task_jobs = dict()
+        # task id -> interval the task is scheduled at
+        self.task_intervals = dict()
+        # task id -> storage id of the tasks scheduled by this node
+        self.task_storages = dict()
+        self.last_reconcile_time = None
+        self.partition_members = None
+        self._lock = threading.Lock()
 
     def __call__(self):
         """ Schedule the collection tasks based on interval """
@@ -49,6 +97,24 @@ class TelemetryJob(object):
             """If Job is stopped return immediately"""
             return
 
+        members = self.scheduler_manager.partition_members()
+        if not self._is_reconcile_due(members):
+            return
+        with self._lock:
+            self._reconcile()
+        self.last_reconcile_time = time.time()
+        self.partition_members = members
+
+    def _is_reconcile_due(self, members):
+        if self.last_reconcile_time is None:
+            return True
+        if members != self.partition_members:
+            LOG.info('Members sharing the tasks changed, reconcile tasks')
+            return True
+        return time.time() - self.last_reconcile_time >= \
+            CONF.telemetry.task_reconcile_interval
+
+    def _reconcile(self):
         try:
             # Remove jobs from scheduler when marked for delete
             filters = {'deleted': True}
@@ -56,55 +122,150 @@ class TelemetryJob(object):
             LOG.debug("Total tasks found deleted "
                       "in this cycle:%s" % len(tasks))
             for task in tasks:
-                job_id = task['job_id']
-                if job_id and self.scheduler.get_job(job_id):
-                    self.remove_scheduled_job(job_id)
+                self._unschedule_task(task['id'], task['job_id'])
                 db.task_delete(self.ctx, task['id'])
         except Exception as e:
             LOG.error("Failed to remove periodic scheduling job , reason: %s.",
                       six.text_type(e))
         try:
-
-            filters = {'last_run_time': None}
-            tasks = db.task_get_all(self.ctx, filters=filters)
+            if self.partitioned:
+                tasks = self._rebalance_tasks()
+            else:
+                filters = {'last_run_time': None}
+                tasks = db.task_get_all(self.ctx, filters=filters)
+            tasks = tasks + self._unschedule_updated_tasks()
             LOG.debug("Schedule performance collection triggered: total "
                       "tasks to be handled:%s" % len(tasks))
             for task in tasks:
-                # Get current time in epoch format in seconds. Here method
-                # indicates the specific collection task to be triggered
-                current_time = int(datetime.now().timestamp())
-                last_run_time = current_time
-                next_collection_time = last_run_time + task['interval']
-                task_id = task['id']
-                job_id = uuidutils.generate_uuid()
-                next_collection_time = datetime \
-                    .fromtimestamp(next_collection_time) \
-                    .strftime('%Y-%m-%d %H:%M:%S')
-
-                collection_class = importutils.import_class(task['method'])
-                instance = collection_class.get_instance(self.ctx, task_id)
-                self.scheduler.add_job(
-                    instance, 'interval', seconds=task['interval'],
-                    next_run_time=next_collection_time, id=job_id,
-                    misfire_grace_time=int(
-                        CONF.telemetry.performance_collection_interval / 2))
-
-                # jobs book keeping
-                self.job_ids.add(job_id)
-
-                update_task_dict = {'job_id': job_id,
-                                    'last_run_time': last_run_time}
-                db.task_update(self.ctx, task_id, update_task_dict)
-                LOG.info('Periodic collection task triggered for for task id: '
-                         '%s ' % task['id'])
+                self._schedule_task(task)
         except Exception as e:
             LOG.error("Failed to trigger periodic collection, reason: %s.",
                       six.text_type(e))
         else:
             LOG.debug("Periodic collection task Scheduling completed.")
 
+    def _rebalance_tasks(self):
+        """Return the owned tasks to schedule, drop the tasks moved away.
+
+        Each task node schedules the tasks of its partition, which changes
+        when task nodes join or leave.
+        """
+        tasks = db.task_get_all(self.ctx, filters={'deleted': False})
+        owned_tasks = [task for task in tasks
+                       if self.scheduler_manager.owns_task(task['id'])]
+        owned_ids = set(task['id'] for task in owned_tasks)
+        for task_id, job_id in list(self.task_jobs.items()):
+            if task_id not in owned_ids:
+                LOG.info('Task %s moved out of the partition of this node',
+                         task_id)
+                self._unschedule_task(task_id, job_id)
+        return [task for task in owned_tasks
+                if task['id'] not in self.task_jobs]
+
+    def _unschedule_updated_tasks(self):
+        """Remove the jobs of the tasks whose interval was updated.
+
+        The interval of a task changes with its collection profile, the
+        returned tasks are scheduled again at their new interval.
+        """
+        if not self.task_jobs:
+            return []
+        tasks = db.task_get_all(self.ctx, filters={'deleted': False})
+        updated_tasks = []
+        for task in tasks:
+            interval = self.task_intervals.get(task['id'])
+            if interval is None or interval == task['interval']:
+                continue
+            LOG.info('Interval of task %s updated from %s to %s',
+                     task['id'], interval, task['interval'])
+            self._unschedule_task(task['id'])
+            updated_tasks.append(task)
+        return updated_tasks
+
+    def schedule(self, task_id):
+        """Schedule a task created or updated, unschedule a task deleted."""
+        if self.stopped:
+            return
+        with self._lock:
+            try:
+                task = db.task_get(self.ctx, task_id)
+            except exception.TaskNotFound:
+                task = None
+            if not task or task['deleted']:
+                self._unschedule_task(task_id)
+                return
+            interval = self.task_intervals.get(task_id)
+            if interval == task['interval']:
+                return
+            if interval is not None:
+                LOG.info('Interval of task %s updated from %s to %s',
+                         task_id, interval, task['interval'])
+                self._unschedule_task(task_id)
+            try:
+                self._schedule_task(task)
+            except Exception as e:
+                LOG.error("Failed to schedule task %s, reason: %s.",
+                          task_id, six.text_type(e))
+
+    def unschedule_storage(self, storage_id):
+        """Remove the jobs of the tasks of a storage and the tasks."""
+        if self.stopped:
+            return
+        with self._lock:
+            task_ids = [task_id for task_id, task_storage_id
+                        in self.task_storages.items()
+                        if task_storage_id == storage_id]
+            for task_id in task_ids:
+                self._unschedule_task(task_id)
+                db.task_delete(self.ctx, task_id)
+                LOG.info('Unscheduled task %s of storage %s', task_id,
+                         storage_id)
+
+    def _unschedule_task(self, task_id, job_id=None):
+        job_id = self.task_jobs.pop(task_id, job_id)
+        self.task_intervals.pop(task_id, None)
+        self.task_storages.pop(task_id, None)
+        if job_id:
+            self.remove_scheduled_job(job_id)
+
+    def _schedule_task(self, task):
+        # Get current time in epoch format in seconds. Here method
+        # indicates the specific collection task to be triggered
+        current_time = int(datetime.now().timestamp())
+        last_run_time = current_time
+        next_collection_time = get_next_run_time(
+            task['storage_id'], task['interval'], current_time)
+        task_id = task['id']
+        job_id = uuidutils.generate_uuid()
+        next_collection_time = datetime \
+            .fromtimestamp(next_collection_time) \
+            .strftime('%Y-%m-%d %H:%M:%S')
+
+        collection_class = importutils.import_class(task['method'])
+        instance = collection_class.get_instance(self.ctx, task_id)
+        self.scheduler.add_job(
+            instance, 'interval', seconds=task['interval'],
+            next_run_time=next_collection_time, id=job_id,
+            misfire_grace_time=int(
+                CONF.telemetry.performance_collection_interval / 2))
+
+        # jobs book keeping
+        self.job_ids.add(job_id)
+        self.task_jobs[task_id] = job_id
+        self.task_intervals[task_id] = task['interval']
+        self.task_storages[task_id] = task['storage_id']
+
+        update_task_dict = {'job_id': job_id,
+                            'last_run_time': last_run_time}
+        db.task_update(self.ctx, task_id, update_task_dict)
+        LOG.info('Periodic collection task triggered for for task id: '
+                 '%s ' % task['id'])
+
     def stop(self):
         self.stopped = True
+        self.task_jobs.clear()
+        self.task_intervals.clear()
+        self.task_storages.clear()
         for job_id in self.job_ids.copy():
             self.remove_scheduled_job(job_id)
         LOG.info("Stopping telemetry jobs")
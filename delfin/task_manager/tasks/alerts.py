@@ -15,9 +15,9 @@
 import six
 from oslo_log import log
 
-from delfin import db
 from delfin import exception
 from delfin.common import alert_util
+from delfin.common import storage_cache
 from delfin.drivers import api as driver_manager
 from delfin.exporter import base_exporter
 from delfin.i18n import _
@@ -36,7 +36,8 @@ class AlertSyncTask(object):
 
         LOG.info('Syncing alerts for storage id:{0}'.format(storage_id))
         try:
-            storage = db.storage_get(ctx, storage_id)
+            storage = storage_cache.StorageMetadataCache().get(ctx,
+                                                               storage_id)
 
             current_alert_list = self.driver_manager.list_alerts(ctx,
                                                                  storage_id,
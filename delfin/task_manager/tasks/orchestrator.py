@@ -0,0 +1,99 @@
+# Copyright 2021 The SODA Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import copy
+import weakref
+
+import eventlet
+from eventlet import semaphore
+from oslo_config import cfg
+from oslo_log import log
+from oslo_utils import importutils
+
+from delfin.drivers import api as driverapi
+
+LOG = log.getLogger(__name__)
+CONF = cfg.CONF
+
+orchestrator_opts = [
+    cfg.IntOpt('resource_sync_concurrency',
+               default=4,
+               min=1,
+               help='The maximum number of resource sync tasks running '
+                    'in parallel against one storage backend'),
+]
+
+CONF.register_opts(orchestrator_opts)
+
+# Storage id -> semaphore shared by the syncs of the storage in this process
+_storage_semaphores = weakref.WeakValueDictionary()
+
+
+def _get_storage_semaphore(storage_id, concurrency):
+    storage_semaphore = _storage_semaphores.get(storage_id)
+    if storage_semaphore is None:
+        storage_semaphore = semaphore.Semaphore(concurrency)
+        _storage_semaphores[storage_id] = storage_semaphore
+    return storage_semaphore
+
+
+class StorageSyncOrchestrator(object):
+    """Run the resource sync tasks of one storage in a green thread pool.
+
+    All the tasks of a storage are handled by the same task manager, so they
+    share the cached driver of the storage. The syncs of a storage running
+    in the same process share a semaphore, which caps the number of tasks
+    sent to the backend at the same time.
+    """
+
+    def __init__(self, context, storage_id, concurrency=None):
+        self.context = context
+        self.storage_id = storage_id
+        self.concurrency = concurrency or CONF.resource_sync_concurrency
+        self.semaphore = _get_storage_semaphore(storage_id,
+                                                self.concurrency)
+        self.driver_api = driverapi.API()
+
+    def _run_task(self, resource_task):
+        # Tasks switch read_deleted on their context, so they must not share
+        # the same context object
+        cls = importutils.import_class(resource_task)
+        device_obj = cls(copy.deepcopy(self.context), self.storage_id)
+        device_obj.sync()
+
+    def _run_task_safe(self, resource_task):
+        try:
+            with self.semaphore:
+                self._run_task(resource_task)
+        except Exception as e:
+            LOG.error('Failed to run sync task %s for storage %s: %s',
+                      resource_task, self.storage_id, e)
+
+    def sync(self, resource_tasks):
+        """Run the given resource tasks and wait until all of them end.
+
+        :param resource_tasks: full class names of the resource tasks
+        """
+        LOG.info('Sync %d resource tasks for storage %s with concurrency %d',
+                 len(resource_tasks), self.storage_id, self.concurrency)
+        # Responses of the backend are shared by the tasks of this sync
+        self.driver_api.start_sync_generation(self.context, self.storage_id)
+        try:
+            pool = eventlet.GreenPool(self.concurrency)
+            for resource_task in resource_tasks:
+                pool.spawn_n(self._run_task_safe, resource_task)
+            pool.waitall()
+        finally:
+            self.driver_api.end_sync_generation(self.context,
+                                                self.storage_id)
@@ -13,18 +13,55 @@
 # limitations under the License.
 
 import inspect
+import operator
 
 import decorator
+from oslo_config import cfg
 from oslo_log import log
+from oslo_utils import timeutils
 
-from delfin import coordination
 from delfin import db
 from delfin import exception
+from delfin.alert_manager import rpcapi as alert_rpcapi
 from delfin.common import constants
+from delfin.common import storage_cache
+from delfin.db.sqlalchemy import api as sqlalchemy_api
 from delfin.drivers import api as driverapi
 from delfin.i18n import _
 
 LOG = log.getLogger(__name__)
+CONF = cfg.CONF
+
+resource_opts = [
+    cfg.IntOpt('resource_sync_chunk_size',
+               default=0,
+               min=0,
+               help='Number of resources fetched from driver and database '
+                    'and written to database at a time when syncing large '
+                    'resource types (volumes, ports, disks). 0 disables the '
+                    'chunked sync, the whole resource list is then diffed '
+                    'in memory'),
+    cfg.IntOpt('resource_full_sync_interval',
+               default=86400,
+               min=0,
+               help='Interval in seconds between full syncs of resources '
+                    'whose driver reports changes since the last sync. '
+                    'Syncs in between only apply the reported changes'),
+]
+
+CONF.register_opts(resource_opts)
+
+_MISSING = object()
+
+
+class _SortOrderMismatch(Exception):
+    """Resources were not streamed in ascending order of native id."""
+
+
+def _created_at(db_resource):
+    # Rows without creation time sort first
+    created_at = db_resource.get('created_at')
+    return (created_at is not None, created_at)
 
 
 def set_synced_after():
@@ -38,20 +75,14 @@ def set_synced_after():
             ret = func(*args, **kwargs)
         except Exception:
             sync_result = constants.ResourceSync.FAILED
-        lock = coordination.Lock(self.storage_id)
-        with lock:
-            try:
-                storage = db.storage_get(self.context, self.storage_id)
-            except exception.StorageNotFound:
-                LOG.warn('Storage %s not found when set synced'
-                         % self.storage_id)
-            else:
-                # One sync task done, sync status minus 1
-                # When sync status get to 0
-                # means all the sync tasks are completed
-                if storage['sync_status'] != constants.SyncStatus.SYNCED:
-                    storage['sync_status'] -= sync_result
-                    db.storage_update(self.context, self.storage_id, storage)
+        # One sync task done, sync status minus its result
+        # When sync status get to 0
+        # means all the sync tasks are completed
+        if not db.storage_sync_status_decrease(self.context,
+                                               self.storage_id,
+                                               sync_result):
+            LOG.warn('Storage %s not found or not syncing when set synced'
+                     % self.storage_id)
 
         return ret
 
@@ -87,32 +118,251 @@ class StorageResourceTask(object):
         self.context = context
         self.driver_api = driverapi.API()
 
+    @staticmethod
+    def _is_resource_changed(resource, db_resource):
+        """Check whether any field reported by driver differs from DB.
+
+        Fields which are not columns of the db model are not saved, they
+        are not compared.
+        """
+        table = getattr(db_resource, '__table__', None)
+        for field, value in resource.items():
+            if field == 'id':
+                continue
+            if table is not None and field not in table.columns:
+                continue
+            if db_resource.get(field, _MISSING) != value:
+                return True
+        return False
+
     def _classify_resources(self, storage_resources, db_resources, key):
         """
         :param storage_resources:
         :param db_resources:
         :return: it will return three list add_list: the items present in
         storage but not in current_db. update_list:the items present in
-        storage and in current_db. delete_id_list:the items present not in
-        storage but present in current_db.
+        storage and in current_db whose field values have changed.
+        delete_id_list:the items present not in storage but present in
+        current_db.
         """
-        original_ids_in_db = [resource[key]
-                              for resource in db_resources]
-        delete_id_list = [resource['id'] for resource in db_resources]
+        # Index db resources by native id so that every lookup is O(1),
+        # duplicated native ids in db are stale and will be deleted
+        db_resources_map = {}
+        delete_id_list = []
+        for db_resource in db_resources:
+            kept = db_resources_map.get(db_resource[key])
+            if kept is None:
+                db_resources_map[db_resource[key]] = db_resource
+                continue
+            # Keep the oldest row, so that the resource keeps its id when
+            # an interrupted sync added it again
+            if _created_at(db_resource) < _created_at(kept):
+                db_resources_map[db_resource[key]] = db_resource
+                kept, db_resource = db_resource, kept
+            delete_id_list.append(db_resource['id'])
         add_list = []
         update_list = []
 
         for resource in storage_resources:
-            if resource[key] in original_ids_in_db:
-                resource['id'] = db_resources[original_ids_in_db.index(
-                    resource[key])]['id']
-                delete_id_list.remove(resource['id'])
-                update_list.append(resource)
-            else:
+            db_resource = db_resources_map.pop(resource[key], None)
+            if db_resource is None:
                 add_list.append(resource)
+                continue
+            resource['id'] = db_resource['id']
+            if self._is_resource_changed(resource, db_resource):
+                update_list.append(resource)
+
+        delete_id_list.extend(db_resource['id']
+                              for db_resource in db_resources_map.values())
 
         return add_list, update_list, delete_id_list
 
+    def _apply_changes(self, changes, key, db_get_all, db_create,
+                       db_update, db_delete):
+        """Save resources changed and deleted on storage system to db."""
+        changed = changes.get('changed') or []
+        native_ids = [resource[key] for resource in changed]
+        native_ids.extend(changes.get('deleted') or [])
+        db_resources_map = {}
+        # Stay below the limit of bind parameters of the database
+        chunk_size = sqlalchemy_api.BULK_CHUNK_SIZE
+        for index in range(0, len(native_ids), chunk_size):
+            db_resources = db_get_all(
+                self.context,
+                filters={'storage_id': self.storage_id,
+                         key: native_ids[index:index + chunk_size]})
+            for db_resource in db_resources:
+                db_resources_map.setdefault(db_resource[key], []).append(
+                    db_resource)
+
+        add_list = []
+        update_list = []
+        delete_id_list = []
+        for resource in changed:
+            db_resources = db_resources_map.pop(resource[key], None)
+            if not db_resources:
+                add_list.append(resource)
+                continue
+            resource['id'] = db_resources[0]['id']
+            delete_id_list.extend(duplicate['id']
+                                  for duplicate in db_resources[1:])
+            if self._is_resource_changed(resource, db_resources[0]):
+                update_list.append(resource)
+        for db_resources in db_resources_map.values():
+            delete_id_list.extend(db_resource['id']
+                                  for db_resource in db_resources)
+
+        LOG.info('###%s delta sync for %s:add=%s,delete=%s,update=%s',
+                 self.__class__.__name__, self.storage_id, len(add_list),
+                 len(delete_id_list), len(update_list))
+        if delete_id_list:
+            db_delete(self.context, delete_id_list)
+        if update_list:
+            db_update(self.context, update_list)
+        if add_list:
+            db_create(self.context, add_list)
+
+    def _list_changes(self, list_changes, since):
+        try:
+            return list_changes(self.context, self.storage_id, since)
+        except NotImplementedError:
+            return None
+
+    def _sync_delta(self, resource_type, list_changes, key, db_get_all,
+                    db_create, db_update, db_delete, sync_all):
+        """Sync only the resources changed since the last sync.
+
+        A full sync through sync_all() is done instead when the driver does
+        not report changes, when there is no valid watermark yet, and every
+        resource_full_sync_interval seconds to reconcile missed changes.
+        """
+        now = timeutils.utcnow()
+        watermark = db.sync_watermark_get(self.context, self.storage_id,
+                                          resource_type)
+        if watermark and watermark['watermark'] is not None and \
+                watermark['last_full_sync_at'] and \
+                (now - watermark['last_full_sync_at']).total_seconds() < \
+                CONF.resource_full_sync_interval:
+            changes = self._list_changes(list_changes,
+                                         watermark['watermark'])
+            if changes is not None:
+                self._apply_changes(changes, key, db_get_all, db_create,
+                                    db_update, db_delete)
+                db.sync_watermark_update(self.context, self.storage_id,
+                                         resource_type,
+                                         {'watermark': changes['watermark']})
+                return
+
+        # Take the watermark before listing, changes made during the full
+        # sync are then applied again by the next delta sync
+        changes = self._list_changes(list_changes, None)
+        sync_all()
+        if changes is not None:
+            db.sync_watermark_update(self.context, self.storage_id,
+                                     resource_type,
+                                     {'watermark': changes['watermark'],
+                                      'last_full_sync_at': now})
+
+    def _iter_db_resources(self, db_get_all, key, chunk_size):
+        """Yield db resources of the storage in ascending order of key.
+
+        Resources are read in chunks through keyset pagination. The next
+        chunk is only read once the previous one is consumed, rows created
+        meanwhile with a key lower than the last row read are not returned.
+        """
+        filters = {'storage_id': self.storage_id}
+        marker = {}
+        last_key = None
+        while True:
+            db_resources = db_get_all(self.context, marker, chunk_size,
+                                      [key], ['asc'], filters)
+            for db_resource in db_resources:
+                if last_key is not None and db_resource[key] < last_key:
+                    raise _SortOrderMismatch()
+                last_key = db_resource[key]
+                yield db_resource
+            if len(db_resources) < chunk_size:
+                return
+            marker = {sort_key: db_resources[-1][sort_key]
+                      for sort_key in [key] + constants.KEYSET_SORT_KEYS}
+
+    def _sync_chunked(self, iter_resources, key, db_get_all, db_create,
+                      db_update, db_delete):
+        """Diff and save resources in chunks of resource_sync_chunk_size.
+
+        Pages of resources from driver are merged with the db resources read
+        in the same order. New and updated resources are written chunk by
+        chunk, an update only ever pairs resources of the same key. Deletes
+        are held until both streams were found in order: a merge of unsorted
+        streams misses resources of the db, the full sync done instead then
+        removes the resources added again and keeps the existing ids.
+
+        Memory use is bounded by the chunk size and the ids to delete only
+        for drivers overriding iter_*() with a paged backend query. The
+        default iter_*() pages the full list_*() result, which is then
+        still held in memory during the sync.
+
+        :return: False if chunked sync is disabled or resources were not
+        in the expected order, the caller should then do a full sync.
+        """
+        chunk_size = CONF.resource_sync_chunk_size
+        if not chunk_size:
+            return False
+
+        counts = {'add': 0, 'update': 0, 'delete': 0}
+        pending = {'add': [], 'update': [], 'delete': []}
+        writers = {'add': db_create, 'update': db_update,
+                   'delete': db_delete}
+
+        def _flush(action):
+            items, pending[action] = pending[action], []
+            for index in range(0, len(items), chunk_size):
+                writers[action](self.context,
+                                items[index:index + chunk_size])
+            counts[action] += len(items)
+
+        def _append(action, item):
+            pending[action].append(item)
+            if action != 'delete' and len(pending[action]) >= chunk_size:
+                _flush(action)
+
+        try:
+            db_iter = self._iter_db_resources(db_get_all, key, chunk_size)
+            db_resource = next(db_iter, None)
+            last_key = None
+            for page in iter_resources(self.context, self.storage_id,
+                                       chunk_size):
+                for resource in sorted(page, key=operator.itemgetter(key)):
+                    if last_key is not None and resource[key] < last_key:
+                        raise _SortOrderMismatch()
+                    last_key = resource[key]
+                    while db_resource is not None and \
+                            db_resource[key] < resource[key]:
+                        _append('delete', db_resource['id'])
+                        db_resource = next(db_iter, None)
+                    if db_resource is None or \
+                            db_resource[key] != resource[key]:
+                        _append('add', resource)
+                        continue
+                    resource['id'] = db_resource['id']
+                    if self._is_resource_changed(resource, db_resource):
+                        _append('update', resource)
+                    db_resource = next(db_iter, None)
+            while db_resource is not None:
+                _append('delete', db_resource['id'])
+                db_resource = next(db_iter, None)
+        except _SortOrderMismatch:
+            LOG.warning('Resources of storage %s are not sorted by %s, '
+                        'fall back to full sync', self.storage_id, key)
+            return False
+
+        for action in ('delete', 'update', 'add'):
+            _flush(action)
+        LOG.info('###%s chunked sync for %s:add=%s,delete=%s,update=%s',
+                 self.__class__.__name__, self.storage_id, counts['add'],
+                 counts['delete'], counts['update'])
+        return True
+
 
 class StorageDeviceTask(StorageResourceTask):
     def __init__(self, context, storage_id):
@@ -131,6 +381,10 @@ class StorageDeviceTask(StorageResourceTask):
                                                   self.storage_id)
 
             db.storage_update(self.context, self.storage_id, storage)
+            storage_cache.StorageMetadataCache().invalidate(self.storage_id)
+            # Alert managers label the traps with the storage metadata
+            alert_rpcapi.AlertAPI().remove_storage_in_cache(self.context,
+                                                            self.storage_id)
         except Exception as e:
             msg = _('Failed to update storage entry in DB: {0}'
                     .format(e))
@@ -146,6 +400,9 @@ class StorageDeviceTask(StorageResourceTask):
             db.storage_delete(self.context, self.storage_id)
             db.access_info_delete(self.context, self.storage_id)
             db.alert_source_delete(self.context, self.storage_id)
+            db.sync_watermark_delete_by_storage(self.context,
+                                                self.storage_id)
+            storage_cache.StorageMetadataCache().invalidate(self.storage_id)
         except Exception as e:
             LOG.error('Failed to update storage entry in DB: {0}'.format(e))
 
@@ -163,25 +420,11 @@ class StoragePoolTask(StorageResourceTask):
         LOG.info('Syncing storage pool for storage id:{0}'.format(
             self.storage_id))
         try:
-            # collect the storage pools list from driver and database
-            storage_pools = self.driver_api.list_storage_pools(self.context,
-                                                               self.storage_id)
-            db_pools = db.storage_pool_get_all(self.context,
-                                               filters={"storage_id":
-                                                        self.storage_id})
-
-            add_list, update_list, delete_id_list = self._classify_resources(
-                storage_pools, db_pools, 'native_storage_pool_id'
-            )
-
-            if delete_id_list:
-                db.storage_pools_delete(self.context, delete_id_list)
-
-            if update_list:
-                db.storage_pools_update(self.context, update_list)
-
-            if add_list:
-                db.storage_pools_create(self.context, add_list)
+            self._sync_delta(constants.ResourceType.STORAGE_POOL,
+                             self.driver_api.list_storage_pools_changes,
+                             'native_storage_pool_id', db.storage_pool_get_all,
+                             db.storage_pools_create, db.storage_pools_update,
+                             db.storage_pools_delete, self._sync_all)
         except Exception as e:
             msg = _('Failed to sync pools entry in DB: {0}'
                     .format(e))
@@ -190,6 +433,27 @@ class StoragePoolTask(StorageResourceTask):
         else:
             LOG.info("Syncing storage pools successful!!!")
 
+    def _sync_all(self):
+        # collect the storage pools list from driver and database
+        storage_pools = self.driver_api.list_storage_pools(self.context,
+                                                           self.storage_id)
+        db_pools = db.storage_pool_get_all(self.context,
+                                           filters={"storage_id":
+                                                    self.storage_id})
+
+        add_list, update_list, delete_id_list = self._classify_resources(
+            storage_pools, db_pools, 'native_storage_pool_id'
+        )
+
+        if delete_id_list:
+            db.storage_pools_delete(self.context, delete_id_list)
+
+        if update_list:
+            db.storage_pools_update(self.context, update_list)
+
+        if add_list:
+            db.storage_pools_create(self.context, add_list)
+
     def remove(self):
         LOG.info('Remove storage pools for storage id:{0}'.format(
             self.storage_id))
@@ -208,29 +472,11 @@ class StorageVolumeTask(StorageResourceTask):
         """
         LOG.info('Syncing volumes for storage id:{0}'.format(self.storage_id))
         try:
-            # collect the volumes list from driver and database
-            storage_volumes = self.driver_api.list_volumes(self.context,
-                                                           self.storage_id)
-            db_volumes = db.volume_get_all(self.context,
-                                           filters={"storage_id":
-                                                    self.storage_id})
-
-            add_list, update_list, delete_id_list = self._classify_resources(
-                storage_volumes, db_volumes, 'native_volume_id'
-            )
-            LOG.info('###StorageVolumeTask for {0}:add={1},delete={2},'
-                     'update={3}'.format(self.storage_id,
-                                         len(add_list),
-                                         len(delete_id_list),
-                                         len(update_list)))
-            if delete_id_list:
-                db.volumes_delete(self.context, delete_id_list)
-
-            if update_list:
-                db.volumes_update(self.context, update_list)
-
-            if add_list:
-                db.volumes_create(self.context, add_list)
+            self._sync_delta(constants.ResourceType.VOLUME,
+                             self.driver_api.list_volumes_changes,
+                             'native_volume_id', db.volume_get_all,
+                             db.volumes_create, db.volumes_update,
+                             db.volumes_delete, self._sync_all)
         except Exception as e:
             msg = _('Failed to sync volumes entry in DB: {0}'
                     .format(e))
@@ -239,6 +485,36 @@ class StorageVolumeTask(StorageResourceTask):
         else:
             LOG.info("Syncing volumes successful!!!")
 
+    def _sync_all(self):
+        if self._sync_chunked(self.driver_api.iter_volumes,
+                              'native_volume_id', db.volume_get_all,
+                              db.volumes_create, db.volumes_update,
+                              db.volumes_delete):
+            return
+        # collect the volumes list from driver and database
+        storage_volumes = self.driver_api.list_volumes(self.context,
+                                                       self.storage_id)
+        db_volumes = db.volume_get_all(self.context,
+                                       filters={"storage_id":
+                                                self.storage_id})
+
+        add_list, update_list, delete_id_list = self._classify_resources(
+            storage_volumes, db_volumes, 'native_volume_id'
+        )
+        LOG.info('###StorageVolumeTask for {0}:add={1},delete={2},'
+                 'update={3}'.format(self.storage_id,
+                                     len(add_list),
+                                     len(delete_id_list),
+                                     len(update_list)))
+        if delete_id_list:
+            db.volumes_delete(self.context, delete_id_list)
+
+        if update_list:
+            db.volumes_update(self.context, update_list)
+
+        if add_list:
+            db.volumes_create(self.context, add_list)
+
     def remove(self):
         LOG.info('Remove volumes for storage id:{0}'.format(self.storage_id))
         db.volume_delete_by_storage(self.context, self.storage_id)
@@ -308,30 +584,11 @@ class StoragePortTask(StorageResourceTask):
         """
         LOG.info('Syncing ports for storage id:{0}'.format(self.storage_id))
         try:
-            # collect the ports list from driver and database
-            storage_ports = self.driver_api.list_ports(self.context,
-                                                       self.storage_id)
-            db_ports = db.port_get_all(self.context,
-                                       filters={"storage_id":
-                                                self.storage_id})
-
-            add_list, update_list, delete_id_list = self._classify_resources(
-                storage_ports, db_ports, 'native_port_id'
-            )
-
-            LOG.info('###StoragePortTask for {0}:add={1},delete={2},'
-                     'update={3}'.format(self.storage_id,
-                                         len(add_list),
-                                         len(delete_id_list),
-                                         len(update_list)))
-            if delete_id_list:
-                db.ports_delete(self.context, delete_id_list)
-
-            if update_list:
-                db.ports_update(self.context, update_list)
-
-            if add_list:
-                db.ports_create(self.context, add_list)
+            self._sync_delta(constants.ResourceType.PORT,
+                             self.driver_api.list_ports_changes,
+                             'native_port_id', db.port_get_all,
+                             db.ports_create, db.ports_update,
+                             db.ports_delete, self._sync_all)
         except AttributeError as e:
             LOG.error(e)
         except Exception as e:
@@ -341,6 +598,36 @@ class StoragePortTask(StorageResourceTask):
         else:
             LOG.info("Syncing ports successful!!!")
 
+    def _sync_all(self):
+        if self._sync_chunked(self.driver_api.iter_ports, 'native_port_id',
+                              db.port_get_all, db.ports_create,
+                              db.ports_update, db.ports_delete):
+            return
+        # collect the ports list from driver and database
+        storage_ports = self.driver_api.list_ports(self.context,
+                                                   self.storage_id)
+        db_ports = db.port_get_all(self.context,
+                                   filters={"storage_id":
+                                            self.storage_id})
+
+        add_list, update_list, delete_id_list = self._classify_resources(
+            storage_ports, db_ports, 'native_port_id'
+        )
+
+        LOG.info('###StoragePortTask for {0}:add={1},delete={2},'
+                 'update={3}'.format(self.storage_id,
+                                     len(add_list),
+                                     len(delete_id_list),
+                                     len(update_list)))
+        if delete_id_list:
+            db.ports_delete(self.context, delete_id_list)
+
+        if update_list:
+            db.ports_update(self.context, update_list)
+
+        if add_list:
+            db.ports_create(self.context, add_list)
+
     def remove(self):
         LOG.info('Remove ports for storage id:{0}'.format(self.storage_id))
         db.port_delete_by_storage(self.context, self.storage_id)
@@ -358,30 +645,11 @@ class StorageDiskTask(StorageResourceTask):
         """
         LOG.info('Syncing disks for storage id:{0}'.format(self.storage_id))
         try:
-            # collect the disks list from driver and database
-            storage_disks = self.driver_api.list_disks(self.context,
-                                                       self.storage_id)
-            db_disks = db.disk_get_all(self.context,
-                                       filters={"storage_id":
-                                                self.storage_id})
-
-            add_list, update_list, delete_id_list = self._classify_resources(
-                storage_disks, db_disks, 'native_disk_id'
-            )
-
-            LOG.info('###StorageDiskTask for {0}:add={1},delete={2},'
-                     'update={3}'.format(self.storage_id,
-                                         len(add_list),
-                                         len(delete_id_list),
-                                         len(update_list)))
-            if delete_id_list:
-                db.disks_delete(self.context, delete_id_list)
-
-            if update_list:
-                db.disks_update(self.context, update_list)
-
-            if add_list:
-                db.disks_create(self.context, add_list)
+            self._sync_delta(constants.ResourceType.DISK,
+                             self.driver_api.list_disks_changes,
+                             'native_disk_id', db.disk_get_all,
+                             db.disks_create, db.disks_update,
+                             db.disks_delete, self._sync_all)
         except AttributeError as e:
             LOG.error(e)
         except Exception as e:
@@ -391,6 +659,36 @@ class StorageDiskTask(StorageResourceTask):
         else:
             LOG.info("Syncing disks successful!!!")
 
+    def _sync_all(self):
+        if self._sync_chunked(self.driver_api.iter_disks, 'native_disk_id',
+                              db.disk_get_all, db.disks_create,
+                              db.disks_update, db.disks_delete):
+            return
+        # collect the disks list from driver and database
+        storage_disks = self.driver_api.list_disks(self.context,
+                                                   self.storage_id)
+        db_disks = db.disk_get_all(self.context,
+                                   filters={"storage_id":
+                                            self.storage_id})
+
+        add_list, update_list, delete_id_list = self._classify_resources(
+            storage_disks, db_disks, 'native_disk_id'
+        )
+
+        LOG.info('###StorageDiskTask for {0}:add={1},delete={2},'
+                 'update={3}'.format(self.storage_id,
+                                     len(add_list),
+                                     len(delete_id_list),
+                                     len(update_list)))
+        if delete_id_list:
+            db.disks_delete(self.context, delete_id_list)
+
+        if update_list:
+            db.disks_update(self.context, update_list)
+
+        if add_list:
+            db.disks_create(self.context, add_list)
+
     def remove(self):
         LOG.info('Remove disks for storage id:{0}'.format(self.storage_id))
         db.disk_delete_by_storage(self.context, self.storage_id)
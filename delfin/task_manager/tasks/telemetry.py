@@ -15,17 +15,89 @@
 import abc
 
 import six
+from oslo_config import cfg
 from oslo_log import log
 
-from delfin import context, db
+from delfin import db
+from delfin.common import metric_batch
+from delfin.common import storage_cache
 from delfin.common.constants import TelemetryTaskStatus
 from delfin.drivers import api as driver_api
 from delfin.exporter import base_exporter
 from delfin.i18n import _
 
+CONF = cfg.CONF
 LOG = log.getLogger(__name__)
 
 
+def get_collection_profile(args):
+    """Return the resource metrics and the collection profile of a task.
+
+    The args of a performance task are the resource metrics of the storage
+    capabilities. Once a collection profile is set, they hold both under
+    the 'resource_metrics' and 'collection_profile' keys.
+    """
+    if 'resource_metrics' in args:
+        return args['resource_metrics'], args.get('collection_profile') or {}
+    return args, {}
+
+
+def get_task_interval(profile):
+    """Return the interval (in sec) a task runs at to honor its profile."""
+    intervals = [type_profile['interval'] for type_profile in profile.values()
+                 if type_profile.get('interval')]
+    return min(intervals + [CONF.telemetry.performance_collection_interval])
+
+
+def get_collections(resource_metrics, profile, start_time, end_time):
+    """Group the resource types due in a time range by collection range.
+
+    A resource type is collected when the range crosses a multiple of its
+    interval, for the range between those multiples, so that it is
+    collected at its own interval without gap. Resource types without an
+    interval in the profile are collected at performance_collection_interval
+    rather than at the task interval. Metrics missing from the allow-list of
+    a resource type are not collected.
+
+    :return: list of (resource_metrics, start_time, end_time)
+    """
+    if not profile:
+        return [(resource_metrics, start_time, end_time)]
+
+    collections = {}
+    for resource_type, metrics in resource_metrics.items():
+        type_profile = profile.get(resource_type) or {}
+        allowed = type_profile.get('metrics')
+        if allowed is not None:
+            metrics = dict((name, spec) for name, spec in metrics.items()
+                           if name in allowed)
+            if not metrics:
+                continue
+
+        interval = (type_profile.get('interval') or
+                    CONF.telemetry.performance_collection_interval) * 1000
+        start = start_time // interval * interval
+        end = end_time // interval * interval
+        if start == end:
+            continue
+        collections.setdefault((start, end), {})[resource_type] = metrics
+    return [(metrics, start, end)
+            for (start, end), metrics in sorted(collections.items())]
+
+
+def get_collected_end_time(status, start_time, end_time):
+    """Return the end of the range collected by a collection of status.
+
+    A collection of several windows failing after some of them were
+    dispatched returns the end time of the last window dispatched instead
+    of TASK_EXEC_STATUS_FAILURE, only the rest of the range is collected
+    again.
+    """
+    if isinstance(status, bool) or not status:
+        return end_time if status else start_time
+    return min(max(status, start_time), end_time)
+
+
 class TelemetryTask(object):
     @abc.abstractmethod
     def collect(self, ctx, storage_id, args, start_time, end_time):
@@ -42,34 +114,83 @@ class PerformanceCollectionTask(TelemetryTask):
         self.perf_exporter = base_exporter.PerformanceExporterManager()
 
     def collect(self, ctx, storage_id, args, start_time, end_time):
+        """Collect and export the performance metrics of a time range.
+
+        :return: TASK_EXEC_STATUS_SUCCESS, TASK_EXEC_STATUS_FAILURE, or
+                 the end time of the last window dispatched when a later
+                 window fails, see get_collected_end_time()
+        """
+        # Windows before this time were dispatched to the exporters
+        collected_end_time = start_time
         try:
             LOG.debug("Performance collection for storage [%s] with start time"
                       " [%s] and end time [%s]"
                       % (storage_id, start_time, end_time))
-            perf_metrics = self.driver_api \
-                .collect_perf_metrics(ctx, storage_id,
-                                      args,
-                                      start_time, end_time)
-
-            # Fill extra labels to metric by fetching metadata from resource DB
-            try:
-                storage_details = db.storage_get(ctx, storage_id)
-                for m in perf_metrics:
-                    m.labels["name"] = storage_details.name
-                    m.labels["serial_number"] = storage_details.serial_number
-            except Exception as e:
-                msg = _('Failed to add extra labels to performance '
-                        'metrics: {0}'.format(e))
-                LOG.error(msg)
-                return TelemetryTaskStatus.TASK_EXEC_STATUS_FAILURE
-
-            self.perf_exporter.dispatch(context, perf_metrics)
+            storage_details = None
+            resource_metrics, profile = get_collection_profile(args)
+            for window_start, window_end in self._get_windows(
+                    ctx, storage_id, start_time, end_time):
+                collections = get_collections(resource_metrics, profile,
+                                              window_start, window_end)
+                if not collections:
+                    collected_end_time = window_end
+                    continue
+                # Drivers may return a MetricBatch or a list of Metric
+                perf_metrics = metric_batch.MetricBatch()
+                for metrics, collection_start, collection_end in collections:
+                    perf_metrics.extend(self.driver_api.collect_perf_metrics(
+                        ctx, storage_id, metrics, collection_start,
+                        collection_end))
+
+                # Fill extra labels to metric from the storage metadata,
+                # once per label set of the batch
+                try:
+                    if storage_details is None:
+                        storage_details = \
+                            storage_cache.StorageMetadataCache().get(
+                                ctx, storage_id)
+                    perf_metrics.update_labels(
+                        name=storage_details['name'],
+                        serial_number=storage_details['serial_number'])
+                except Exception as e:
+                    msg = _('Failed to add extra labels to performance '
+                            'metrics: {0}'.format(e))
+                    LOG.error(msg)
+                    return self._failure_status(start_time,
+                                                collected_end_time)
+
+                self.perf_exporter.dispatch(ctx, perf_metrics)
+                collected_end_time = window_end
             return TelemetryTaskStatus.TASK_EXEC_STATUS_SUCCESS
         except Exception as e:
             LOG.error("Failed to collect performance metrics for "
                       "storage id :{0}, reason:{1}".format(storage_id,
                                                            six.text_type(e)))
-            return TelemetryTaskStatus.TASK_EXEC_STATUS_FAILURE
+            return self._failure_status(start_time, collected_end_time)
+
+    @staticmethod
+    def _failure_status(start_time, collected_end_time):
+        if collected_end_time > start_time:
+            # The windows already dispatched are not collected again
+            return collected_end_time
+        return TelemetryTaskStatus.TASK_EXEC_STATUS_FAILURE
+
+    def _get_windows(self, ctx, storage_id, start_time, end_time):
+        """Split a backfill range into the windows asked to the driver.
+
+        Drivers keeping historic metrics are asked for the whole range,
+        others for one collection interval at a time.
+        """
+        window = CONF.telemetry.performance_collection_interval * 1000
+        if end_time - start_time <= window:
+            return [(start_time, end_time)]
+        capabilities = self.driver_api.get_capabilities(ctx, storage_id)
+        if capabilities.get('is_historic'):
+            return [(start_time, end_time)]
+        LOG.info("Backfill performance metrics of storage %s from %s to %s",
+                 storage_id, start_time, end_time)
+        return [(window_start, min(window_start + window, end_time))
+                for window_start in range(start_time, end_time, window)]
 
     def remove_telemetry(self, ctx, storage_id):
         try:
@@ -20,6 +20,7 @@ from oslo_utils import importutils
 from delfin import context
 from delfin import exception
 from delfin.common import constants
+from delfin.common import storage_cache
 from delfin.tests.unit.alert_manager import fakes
 
 
@@ -27,6 +28,10 @@ class AlertProcessorTestCase(unittest.TestCase):
     ALERT_PROCESSOR_CLASS = 'delfin.alert_manager.alert_processor' \
                             '.AlertProcessor'
 
+    def setUp(self):
+        super(AlertProcessorTestCase, self).setUp()
+        storage_cache.StorageMetadataCache().clear()
+
     def _get_alert_processor(self):
         alert_processor_class = importutils.import_class(
             self.ALERT_PROCESSOR_CLASS)
@@ -27,9 +27,11 @@ class TestStorageController(test.TestCase):
     def setUp(self):
         super(TestStorageController, self).setUp()
         self.task_rpcapi = mock.Mock()
+        self.alert_rpcapi = mock.Mock()
         self.driver_api = mock.Mock()
         self.controller = StorageController()
         self.mock_object(self.controller, 'task_rpcapi', self.task_rpcapi)
+        self.mock_object(self.controller, 'alert_rpcapi', self.alert_rpcapi)
         self.mock_object(self.controller, 'driver_api', self.driver_api)
 
     @mock.patch.object(db, 'storage_get',
@@ -45,6 +47,8 @@ class TestStorageController(test.TestCase):
             ctxt, 'fake_id', mock.ANY)
         self.task_rpcapi.remove_storage_in_cache.assert_called_once_with(
             ctxt, 'fake_id')
+        self.alert_rpcapi.remove_storage_in_cache.assert_called_once_with(
+            ctxt, 'fake_id')
 
     def test_delete_with_invalid_id(self):
         self.mock_object(
@@ -527,3 +531,60 @@ class TestStorageController(test.TestCase):
         }
 
         self.assertDictEqual(expctd_dict, res_dict)
+
+    def test_update_collection_profile(self):
+        self.mock_object(db, 'storage_get', fakes.fake_storages_show)
+        resource_metrics = {
+            'storage': {'iops': {'unit': 'IOPS'}},
+            'volume': {'iops': {'unit': 'IOPS'},
+                       'throughput': {'unit': 'MB/s'}},
+        }
+        task = {'id': 1, 'args': resource_metrics, 'interval': 900}
+        self.mock_object(db, 'task_get_all', mock.Mock(return_value=[task]))
+        mock_task_update = self.mock_object(db, 'task_update')
+        req = fakes.HTTPRequest.blank(
+            '/storages/12c2d52f-01bc-41f5-b73f-7abf6f38a2a6/'
+            'collection-profile')
+        storage_id = '12c2d52f-01bc-41f5-b73f-7abf6f38a2a6'
+        profile = {'storage': {'interval': 60},
+                   'volume': {'interval': 3600, 'metrics': ['iops']}}
+
+        resp = self.controller.update_collection_profile(
+            req, storage_id, body={'collection_profile': profile})
+
+        self.assertEqual({'collection_profile': profile}, resp)
+        mock_task_update.assert_called_once_with(
+            req.environ['delfin.context'], 1,
+            {'args': {'resource_metrics': resource_metrics,
+                      'collection_profile': profile},
+             'interval': 60})
+        self.task_rpcapi.schedule_telemetry_task.assert_called_once_with(
+            req.environ['delfin.context'], 1)
+
+        # the profile is shown from the task
+        task['args'] = mock_task_update.call_args[0][2]['args']
+        resp = self.controller.get_collection_profile(req, storage_id)
+        self.assertEqual({'collection_profile': profile}, resp)
+
+        # metrics must be supported by the storage
+        profile = {'volume': {'metrics': ['responseTime']}}
+        self.assertRaises(exception.InvalidInput,
+                          self.controller.update_collection_profile,
+                          req, storage_id,
+                          body={'collection_profile': profile})
+        profile = {'disk': {'interval': 60}}
+        self.assertRaises(exception.InvalidInput,
+                          self.controller.update_collection_profile,
+                          req, storage_id,
+                          body={'collection_profile': profile})
+
+    def test_update_collection_profile_without_monitoring(self):
+        self.mock_object(db, 'storage_get', fakes.fake_storages_show)
+        self.mock_object(db, 'task_get_all', mock.Mock(return_value=[]))
+        req = fakes.HTTPRequest.blank(
+            '/storages/12c2d52f-01bc-41f5-b73f-7abf6f38a2a6/'
+            'collection-profile')
+        self.assertRaises(exception.InvalidInput,
+                          self.controller.update_collection_profile,
+                          req, '12c2d52f-01bc-41f5-b73f-7abf6f38a2a6',
+                          body={'collection_profile': {}})
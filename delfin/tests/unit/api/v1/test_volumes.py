@@ -129,6 +129,34 @@ class TestVolumeController(test.TestCase):
 
         self.assertDictEqual(expctd_dict, res_dict)
 
+    def test_list_with_cursor(self):
+        mock_get_all = self.mock_object(
+            db, 'volume_get_all',
+            mock.Mock(side_effect=fakes.fake_volume_get_all))
+        req = fakes.HTTPRequest.blank('/volumes?cursor=&limit=2')
+
+        res_dict = self.controller.index(req)
+        mock_get_all.assert_called_with(mock.ANY, {}, 2, ['created_at'],
+                                        ['desc'], {}, 0)
+        self.assertEqual(2, len(res_dict['volumes']))
+        cursor = res_dict['next_cursor']
+        self.assertIsNotNone(cursor)
+
+        req = fakes.HTTPRequest.blank('/volumes?limit=3&cursor=' + cursor)
+        res_dict = self.controller.index(req)
+        expected_marker = {
+            'created_at': '2020-06-10T07:17:31.157079',
+            'id': 'dad84a1f-db8d-49ab-af40-048fc3544c12'}
+        mock_get_all.assert_called_with(mock.ANY, expected_marker, 3,
+                                        ['created_at'], ['desc'], {}, 0)
+        self.assertIsNone(res_dict['next_cursor'])
+
+    def test_list_with_invalid_cursor(self):
+        for query in ('cursor=invalid', 'cursor=&offset=1'):
+            req = fakes.HTTPRequest.blank('/volumes?' + query)
+            self.assertRaises(exception.InvalidInput,
+                              self.controller.index, req)
+
     def test_show(self):
         self.mock_object(
             db, 'volume_get',
@@ -32,6 +32,8 @@ def set_defaults(conf):
                      '..')))
     _safe_set_of_opts(conf, 'connection', "sqlite://", group='database')
     _safe_set_of_opts(conf, 'sqlite_synchronous', False)
+    # Tests mock the storage read from db
+    _safe_set_of_opts(conf, 'storage_metadata_cache_ttl', 0)
     _API_PASTE_PATH = os.path.abspath(
         os.path.join(CONF.state_path,
                      'etc/delfin/api-paste.ini'))
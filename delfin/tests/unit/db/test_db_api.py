@@ -12,8 +12,11 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import datetime
 from unittest import mock
 
+from oslo_utils import timeutils
+
 from delfin import context, exception
 from delfin import test
 from delfin.db import api as db_api
@@ -1166,3 +1169,186 @@ class TestSIMDBAPI(test.TestCase):
         result = db_api.masking_views_delete_by_storage(
             ctxt, masking_view_lst[0]['storage_id'])
         assert result is None
+
+
+class TestBulkResourcesDBAPI(test.TestCase):
+
+    def _fake_volumes(self, count):
+        return [{'storage_id': 'c5c91c98-91aa-40e6-85ac-37a1d3b32bda',
+                 'native_volume_id': 'volume_%s' % i,
+                 'name': 'volume_%s' % i,
+                 'status': 'normal'} for i in range(count)]
+
+    @mock.patch.object(api, 'BULK_CHUNK_SIZE', 2)
+    def test_volumes_bulk_create_update_delete(self):
+        volumes = self._fake_volumes(5)
+        db_api.volumes_create(ctxt, volumes)
+        got = db_api.volume_get_all(ctxt)
+        self.assertEqual(5, len(got))
+
+        volumes[0]['status'] = 'abnormal'
+        volumes[1]['name'] = 'renamed'
+        volumes[1]['unknown'] = 'ignored'
+        db_api.volumes_update(ctxt, volumes[:2])
+        self.assertEqual('abnormal',
+                         db_api.volume_get(ctxt, volumes[0]['id'])['status'])
+        self.assertEqual('renamed',
+                         db_api.volume_get(ctxt, volumes[1]['id'])['name'])
+
+        db_api.volumes_delete(ctxt, [vol['id'] for vol in volumes[:3]])
+        got = db_api.volume_get_all(ctxt)
+        self.assertEqual(sorted(vol['id'] for vol in volumes[3:]),
+                         sorted(vol['id'] for vol in got))
+
+    def test_volume_get_all_keyset(self):
+        volumes = self._fake_volumes(5)
+        for volume in volumes:
+            volume['storage_id'] = 'keyset_storage'
+        db_api.volumes_create(ctxt, volumes)
+        filters = {'storage_id': 'keyset_storage'}
+        expected = [vol['id'] for vol in
+                    db_api.volume_get_all(ctxt, sort_keys=['name', 'id'],
+                                          sort_dirs=['asc', 'desc'],
+                                          filters=filters)]
+
+        got = []
+        marker = {}
+        while True:
+            page = db_api.volume_get_all(ctxt, marker, 2, ['name'], ['asc'],
+                                         filters)
+            got.extend(vol['id'] for vol in page)
+            if len(page) < 2:
+                break
+            marker = {key: page[-1][key]
+                      for key in ('name', 'created_at', 'id')}
+        self.assertEqual(expected, got)
+
+        self.assertRaises(exception.InvalidInput, db_api.volume_get_all,
+                          ctxt, {'name': 'volume_1'}, 2, ['name'], ['asc'],
+                          filters)
+
+    def test_volume_get_all_keyset_nullable_key(self):
+        volumes = self._fake_volumes(5)
+        for index, volume in enumerate(volumes):
+            volume['storage_id'] = 'keyset_null_storage'
+            volume['wwn'] = 'wwn_%s' % (index % 2) if index > 1 else None
+        db_api.volumes_create(ctxt, volumes)
+        filters = {'storage_id': 'keyset_null_storage'}
+
+        for sort_dir in ('asc', 'desc'):
+            expected = [vol['id'] for vol in db_api.volume_get_all(
+                ctxt, sort_keys=['wwn', 'created_at', 'id'],
+                sort_dirs=[sort_dir] * 3, filters=filters)]
+            got = []
+            marker = {}
+            while True:
+                page = db_api.volume_get_all(ctxt, marker, 2, ['wwn'],
+                                             [sort_dir], filters)
+                got.extend(vol['id'] for vol in page)
+                if len(page) < 2:
+                    break
+                marker = {key: page[-1][key]
+                          for key in ('wwn', 'created_at', 'id')}
+            self.assertEqual(expected, got)
+
+    def test_volume_get_all_with_list_filter(self):
+        volumes = self._fake_volumes(3)
+        for volume in volumes:
+            volume['storage_id'] = 'list_filter_storage'
+        db_api.volumes_create(ctxt, volumes)
+        got = db_api.volume_get_all(
+            ctxt, filters={'storage_id': 'list_filter_storage',
+                           'native_volume_id': ['volume_0', 'volume_2']})
+        self.assertEqual(['volume_0', 'volume_2'],
+                         sorted(vol['native_volume_id'] for vol in got))
+        self.assertEqual([], db_api.volume_get_all(
+            ctxt, filters={'unknown': ['volume_0']}))
+
+
+class TestSyncWatermarkDBAPI(test.TestCase):
+
+    def test_sync_watermark(self):
+        storage_id = 'c5c91c98-91aa-40e6-85ac-37a1d3b32bda'
+        self.assertIsNone(
+            db_api.sync_watermark_get(ctxt, storage_id, 'volume'))
+
+        db_api.sync_watermark_update(ctxt, storage_id, 'volume',
+                                     {'watermark': '100'})
+        db_api.sync_watermark_update(ctxt, storage_id, 'volume',
+                                     {'watermark': '200'})
+        db_api.sync_watermark_update(ctxt, storage_id, 'disk',
+                                     {'watermark': '300'})
+        self.assertEqual(
+            '200',
+            db_api.sync_watermark_get(ctxt, storage_id, 'volume')['watermark'])
+
+        db_api.sync_watermark_delete_by_storage(ctxt, storage_id)
+        self.assertIsNone(db_api.sync_watermark_get(ctxt, storage_id, 'disk'))
+
+
+class TestStorageSyncStatusDBAPI(test.TestCase):
+
+    def test_storage_sync_status(self):
+        storage = db_api.storage_create(ctxt, {'name': 'sync_status'})
+        now = timeutils.utcnow()
+        expired_before = now - datetime.timedelta(seconds=1800)
+
+        self.assertEqual(0, db_api.storage_sync_status_decrease(
+            ctxt, storage['id'], 100))
+        self.assertEqual(1, db_api.storage_sync_status_start(
+            ctxt, storage['id'], 200, expired_before))
+        # Storage is being synced
+        self.assertEqual(0, db_api.storage_sync_status_start(
+            ctxt, storage['id'], 200, expired_before))
+        # Last sync expired
+        self.assertEqual(1, db_api.storage_sync_status_start(
+            ctxt, storage['id'], 200, now + datetime.timedelta(seconds=1)))
+
+        self.assertEqual(1, db_api.storage_sync_status_decrease(
+            ctxt, storage['id'], 100))
+        self.assertEqual(1, db_api.storage_sync_status_decrease(
+            ctxt, storage['id'], 101))
+        self.assertEqual(0, db_api.storage_sync_status_decrease(
+            ctxt, storage['id'], 100))
+        storage = db_api.storage_get(ctxt, storage['id'])
+        self.assertEqual(-1, storage['sync_status'])
+        self.assertEqual(0, db_api.storage_sync_status_start(
+            ctxt, 'unknown', 200, expired_before))
+
+
+class TestTaskCollectedEndTimeDBAPI(test.TestCase):
+
+    def test_task_collected_end_time_advance(self):
+        task = db_api.task_create(ctxt, {'storage_id': 'end_time_storage',
+                                         'interval': 900})
+
+        self.assertEqual(1, db_api.task_collected_end_time_advance(
+            ctxt, task['id'], 2000))
+        # Older results never move it backwards
+        self.assertEqual(0, db_api.task_collected_end_time_advance(
+            ctxt, task['id'], 1000))
+        self.assertEqual(
+            2000, db_api.task_get(ctxt, task['id'])['collected_end_time'])
+        self.assertEqual(1, db_api.task_collected_end_time_advance(
+            ctxt, task['id'], 3000))
+        self.assertEqual(0, db_api.task_collected_end_time_advance(
+            ctxt, 'unknown', 3000))
+
+    def test_task_collected_end_time_advance_from_start_time(self):
+        task = db_api.task_create(ctxt, {'storage_id': 'end_time_storage',
+                                         'interval': 900})
+
+        self.assertEqual(1, db_api.task_collected_end_time_advance(
+            ctxt, task['id'], 2000, start_time=1000))
+        # A gap is left between the watermark and the start time
+        self.assertEqual(0, db_api.task_collected_end_time_advance(
+            ctxt, task['id'], 4000, start_time=3000))
+        self.assertEqual(
+            2000, db_api.task_get(ctxt, task['id'])['collected_end_time'])
+        self.assertEqual(1, db_api.task_collected_end_time_advance(
+            ctxt, task['id'], 4000, start_time=1500))
+        # Never moved backwards
+        self.assertEqual(0, db_api.task_collected_end_time_advance(
+            ctxt, task['id'], 3000, start_time=1000))
+        self.assertEqual(
+            4000, db_api.task_get(ctxt, task['id'])['collected_end_time'])
@@ -0,0 +1,66 @@
+# Copyright 2021 The SODA Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+
+import fixtures
+import sqlalchemy
+
+from delfin import test
+from delfin.db.sqlalchemy import migration
+
+
+class TestMigration(test.TestCase):
+
+    def setUp(self):
+        super(TestMigration, self).setUp()
+        path = self.useFixture(fixtures.TempDir()).path
+        self.engine = sqlalchemy.create_engine(
+            'sqlite:///' + os.path.join(path, 'delfin.sqlite'))
+        self.addCleanup(self.engine.dispose)
+
+    def test_db_sync_adds_indexes_to_existing_tables(self):
+        # Tables of a deployment created before the indexes were added
+        self.engine.execute('CREATE TABLE volumes (id VARCHAR(36), '
+                            'storage_id VARCHAR(36), '
+                            'native_volume_id VARCHAR(255), '
+                            'created_at DATETIME)')
+        self.engine.execute('CREATE TABLE alert_source '
+                            '(storage_id VARCHAR(36), host VARCHAR(255))')
+        self.engine.execute('CREATE TABLE tasks (id INTEGER, '
+                            'storage_id VARCHAR(36))')
+        self.assertIsNone(migration.db_version(self.engine))
+
+        migration.db_sync(self.engine)
+
+        inspector = sqlalchemy.inspect(self.engine)
+        volume_indexes = {index['name']: index['column_names']
+                          for index in inspector.get_indexes('volumes')}
+        self.assertEqual(
+            {'ix_volumes_storage_created_id': ['storage_id', 'created_at',
+                                               'id'],
+             'ix_volumes_storage_native_id': ['storage_id',
+                                              'native_volume_id']},
+            volume_indexes)
+        self.assertEqual(['ix_alert_source_host'],
+                         [index['name'] for index in
+                          inspector.get_indexes('alert_source')])
+        self.assertIn('sync_watermarks', inspector.get_table_names())
+        self.assertIn('collected_end_time',
+                      [column['name'] for column in
+                       inspector.get_columns('tasks')])
+        self.assertIsNotNone(migration.db_version(self.engine))
+
+        # Upgrading an up to date database is a no-op
+        migration.db_sync(self.engine)
@@ -0,0 +1,117 @@
+# Copyright 2021 The SODA Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import eventlet
+
+from delfin import test
+from delfin.drivers.utils import response_cache
+
+fake_storage_id = '12c2d52f-01bc-41f5-b73f-7abf6f38a2a6'
+
+
+class FakeClient(object):
+
+    def __init__(self, storage_id):
+        self.storage_id = storage_id
+        self.calls = 0
+
+    @response_cache.cached_response()
+    def get_all_pools(self):
+        self.calls += 1
+        eventlet.sleep(0.01)
+        return [{'id': self.calls}]
+
+    @response_cache.cached_response(reusable=True)
+    def get_all_filesystems(self, fs_type=None):
+        self.calls += 1
+        return [{'id': self.calls, 'type': fs_type}]
+
+
+class FakeHandler(object):
+
+    def __init__(self):
+        self.calls = 0
+
+    @response_cache.cached_response()
+    def get_filesystems(self, storage_id):
+        self.calls += 1
+        return [{'storage_id': storage_id}]
+
+
+class TestResponseCache(test.TestCase):
+
+    def setUp(self):
+        super(TestResponseCache, self).setUp()
+        self.cache = response_cache.ResponseCache()
+        self.addCleanup(self.cache.clear, fake_storage_id)
+
+    def test_no_generation(self):
+        client = FakeClient(fake_storage_id)
+        self.assertEqual([{'id': 1}], client.get_all_pools())
+        self.assertEqual([{'id': 2}], client.get_all_pools())
+
+    def test_shared_in_generation(self):
+        client = FakeClient(fake_storage_id)
+        self.cache.start_generation(fake_storage_id)
+        pools = client.get_all_pools()
+        pools.append({'id': 'changed'})
+        self.assertEqual([{'id': 1}], client.get_all_pools())
+        self.assertEqual(1, client.calls)
+
+        # A new generation fetches the response again
+        self.cache.start_generation(fake_storage_id)
+        self.assertEqual([{'id': 2}], client.get_all_pools())
+        self.cache.end_generation(fake_storage_id)
+        self.assertEqual([{'id': 3}], client.get_all_pools())
+
+    def test_concurrent_calls(self):
+        client = FakeClient(fake_storage_id)
+        self.cache.start_generation(fake_storage_id)
+        pool = eventlet.GreenPool(4)
+        results = list(pool.imap(lambda _: client.get_all_pools(), range(4)))
+        self.assertEqual([[{'id': 1}]] * 4, results)
+        self.assertEqual(1, client.calls)
+
+    def test_keyed_by_args(self):
+        client = FakeClient(fake_storage_id)
+        self.cache.start_generation(fake_storage_id)
+        client.get_all_filesystems('thin')
+        client.get_all_filesystems(fs_type='thin')
+        client.get_all_filesystems('thick')
+        self.assertEqual(2, client.calls)
+
+    def test_storage_id_argument(self):
+        handler = FakeHandler()
+        self.cache.start_generation(fake_storage_id)
+        handler.get_filesystems(fake_storage_id)
+        handler.get_filesystems(storage_id=fake_storage_id)
+        handler.get_filesystems('other_storage')
+        self.assertEqual(2, handler.calls)
+
+    def test_reusable_after_generation(self):
+        self.flags(driver_response_cache_ttl=60)
+        client = FakeClient(fake_storage_id)
+        self.cache.start_generation(fake_storage_id)
+        client.get_all_filesystems()
+        client.get_all_pools()
+        self.cache.end_generation(fake_storage_id)
+        client.get_all_filesystems()
+        self.assertEqual(2, client.calls)
+        client.get_all_pools()
+        self.assertEqual(3, client.calls)
+
+        # Removing the storage drops its responses
+        self.cache.clear(fake_storage_id)
+        client.get_all_filesystems()
+        self.assertEqual(4, client.calls)
@@ -0,0 +1,194 @@
+# Copyright 2021 The SODA Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+from unittest import mock
+
+from six.moves import queue as six_queue
+
+from delfin import context
+from delfin import exception
+from delfin import test
+from delfin.common import metric_batch
+from delfin.exporter.kafka import exporter
+from delfin.exporter.kafka import kafka
+
+
+def _get_batch():
+    batch = metric_batch.MetricBatch()
+    for resource_id in ('volume0', 'volume1'):
+        labels = {'storage_id': '12345', 'resource_type': 'volume',
+                  'resource_id': resource_id, 'type': 'RAW', 'unit': 'IOPS'}
+        batch.append('iops', labels, {1622808000000: 10.0})
+        batch.append('readIops', labels, {1622808000000: 4.0})
+    return batch
+
+
+class TestKafkaExporter(test.TestCase):
+
+    def setUp(self):
+        super(TestKafkaExporter, self).setUp()
+        self.producer_cls = self.mock_object(kafka, 'KafkaProducer')
+        self.producer = self.producer_cls.return_value
+        self.future = self.producer.send.return_value
+        self.future.is_done = True
+        self.future.failed.return_value = False
+        kafka.KafkaExporter._producer = None
+        self.addCleanup(setattr, kafka.KafkaExporter, '_producer', None)
+
+    def test_dispatch(self):
+        kafka_exporter = exporter.PerformanceExporterKafka()
+        ctxt = context.get_admin_context()
+        kafka_exporter.dispatch(ctxt, _get_batch())
+        kafka_exporter.dispatch(ctxt, _get_batch().to_metrics())
+
+        # the producer is kept between dispatches
+        self.producer_cls.assert_called_once_with(
+            bootstrap_servers=['localhost:9092'],
+            key_serializer=mock.ANY, value_serializer=mock.ANY,
+            linger_ms=100, batch_size=65536, compression_type='gzip',
+            acks=1)
+        # the series of a storage are sent in one message
+        self.assertEqual(2, self.producer.send.call_count)
+        self.producer.send.assert_called_with(
+            'delfin-kafka', key='12345', value=_get_batch().to_metrics())
+        self.assertEqual(2, self.producer.flush.call_count)
+
+        value_serializer = \
+            self.producer_cls.call_args[1]['value_serializer']
+        message = json.loads(value_serializer(
+            self.producer.send.call_args[1]['value']))
+        self.assertEqual(['iops', _get_batch()[0].labels,
+                          {'1622808000000': 10.0}], message[0])
+
+    def test_dispatch_none_value(self):
+        batch = metric_batch.MetricBatch()
+        batch.append('iops', _get_batch()[0].labels, {1622808000000: None})
+        exporter.PerformanceExporterKafka().dispatch(
+            context.get_admin_context(), batch)
+
+        value_serializer = \
+            self.producer_cls.call_args[1]['value_serializer']
+        # null, the bare NaN token is not valid JSON
+        message = value_serializer(
+            self.producer.send.call_args[1]['value']).decode('utf-8')
+        self.assertIn('{"1622808000000": null}', message)
+
+    def test_dispatch_per_resource(self):
+        self.override_config('kafka_message_key', 'resource_id',
+                             group='KAFKA_EXPORTER')
+        self.override_config('kafka_series_per_message', 1,
+                             group='KAFKA_EXPORTER')
+        self.override_config('kafka_compression_type', 'none',
+                             group='KAFKA_EXPORTER')
+        metrics = _get_batch().to_metrics()
+        kafka.KafkaExporter().push_to_kafka(_get_batch())
+
+        self.assertIsNone(
+            self.producer_cls.call_args[1]['compression_type'])
+        self.assertEqual(
+            [mock.call('delfin-kafka', key='12345:volume0',
+                       value=[metrics[0]]),
+             mock.call('delfin-kafka', key='12345:volume0',
+                       value=[metrics[1]]),
+             mock.call('delfin-kafka', key='12345:volume1',
+                       value=[metrics[2]]),
+             mock.call('delfin-kafka', key='12345:volume1',
+                       value=[metrics[3]])],
+            self.producer.send.call_args_list)
+
+    def test_dispatch_failed(self):
+        self.future.failed.return_value = True
+        self.future.exception = Exception('broker down')
+        self.assertRaisesRegex(exception.ExportFailed,
+                               '1 of 1 messages not sent, broker down',
+                               kafka.KafkaExporter().push_to_kafka,
+                               _get_batch())
+
+        self.producer.flush.side_effect = Exception('flush timed out')
+        self.assertRaisesRegex(exception.ExportFailed, 'flush timed out',
+                               kafka.KafkaExporter().push_to_kafka,
+                               _get_batch())
+
+    def test_dispatch_without_flush(self):
+        self.override_config('kafka_flush_on_dispatch', False,
+                             group='KAFKA_EXPORTER')
+        kafka.KafkaExporter().push_to_kafka(_get_batch())
+        self.assertEqual(0, self.producer.flush.call_count)
+        self.future.add_errback.assert_called_once_with(
+            kafka.KafkaExporter._log_error, 'delfin-kafka')
+
+    def test_close_producer(self):
+        kafka.KafkaExporter.get_producer()
+        kafka.KafkaExporter.close_producer()
+        self.producer.close.assert_called_once_with(timeout=30)
+        self.assertIsNone(kafka.KafkaExporter._producer)
+
+
+class TestKafkaAlertBatcher(test.TestCase):
+
+    def setUp(self):
+        super(TestKafkaAlertBatcher, self).setUp()
+        self.batcher = kafka.KafkaAlertBatcher()
+        self.send = self.mock_object(self.batcher.exporter, 'send')
+
+    def test_dispatch(self):
+        mock_put = self.mock_object(kafka.KafkaAlertBatcher, 'put')
+        alert = {'storage_id': '12345', 'alert_id': '1'}
+        exporter.AlertExporterKafka().dispatch(context.get_admin_context(),
+                                               [alert])
+        mock_put.assert_called_once_with([alert])
+        # the alert is copied before it is queued
+        self.assertIsNot(alert, mock_put.call_args[0][0][0])
+
+    def test_run(self):
+        self.override_config('kafka_alert_batch_size', 3,
+                             group='KAFKA_EXPORTER')
+        alert_queue = six_queue.Queue()
+        alerts = [{'storage_id': storage_id, 'alert_id': alert_id}
+                  for alert_id, storage_id in enumerate(
+                      ['12345', '67890', '12345', '12345', '12345'])]
+        for alert in alerts:
+            alert_queue.put(alert)
+        alert_queue.put(kafka._STOP)
+
+        self.batcher._run(alert_queue)
+
+        # alerts are sent in batches, grouped by storage in order
+        self.assertEqual(2, self.send.call_count)
+        self.assertEqual(
+            [('12345', [alerts[0], alerts[2]]), ('67890', [alerts[1]])],
+            list(self.send.call_args_list[0][0][1]))
+        self.assertEqual([('12345', [alerts[3], alerts[4]])],
+                         list(self.send.call_args_list[1][0][1]))
+        self.assertEqual('delfin-alert', self.send.call_args[0][0])
+
+    def test_send_failed(self):
+        self.send.side_effect = exception.ExportFailed('kafka', 'timeout')
+        with mock.patch.object(kafka.LOG, 'error') as mock_log_error:
+            self.batcher._send([{'storage_id': '12345'}])
+        self.assertEqual(1, mock_log_error.call_count)
+
+    def test_put(self):
+        self.override_config('kafka_alert_queue_size', 1,
+                             group='KAFKA_EXPORTER')
+        self.mock_object(kafka.threading.Thread, 'start')
+        self.mock_object(kafka.threading.Thread, 'is_alive',
+                         mock.Mock(return_value=True))
+        with mock.patch.object(kafka.LOG, 'warning') as mock_log_warning:
+            self.batcher.put([{'storage_id': '12345'},
+                              {'storage_id': '67890'}])
+        # the alert which does not fit in the queue is dropped
+        self.assertEqual(1, self.batcher._queue.qsize())
+        mock_log_warning.assert_called_once_with(mock.ANY, 1)
@@ -15,6 +15,7 @@ import glob
 import os
 from unittest import TestCase
 
+from delfin.common import metric_batch
 from delfin.exporter.prometheus import prometheus
 from delfin.common.constants import metric_struct
 
@@ -33,3 +34,10 @@ class TestPrometheusExporter(TestCase):
         prometheus_obj.metrics_dir = os.getcwd()
         prometheus_obj.push_to_prometheus(fake_metrics)
         self.assertTrue(glob.glob(prometheus_obj.metrics_dir + '/' + '*.prom'))
+
+    def test_push_metric_batch_to_prometheus(self):
+        prometheus_obj = prometheus.PrometheusExporter()
+        prometheus_obj.metrics_dir = os.getcwd()
+        prometheus_obj.push_to_prometheus(
+            metric_batch.as_batch(fake_metrics))
+        self.assertTrue(glob.glob(prometheus_obj.metrics_dir + '/' + '*.prom'))
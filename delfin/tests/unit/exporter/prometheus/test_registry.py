@@ -0,0 +1,137 @@
+# Copyright 2021 The SODA Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import shutil
+import tempfile
+import time
+
+from delfin import test
+from delfin.common import metric_batch
+from delfin.exporter.prometheus import prometheus
+from delfin.exporter.prometheus import registry
+
+NOW = int(time.time() * 1000)
+
+
+def fake_metrics(storage_id, samples):
+    batch = metric_batch.MetricBatch()
+    batch.append('throughput', {'storage_id': storage_id,
+                                'resource_type': 'storage',
+                                'resource_id': 'storage0',
+                                'type': 'RAW', 'unit': 'MB/s'}, samples)
+    return batch
+
+
+class TestMetricRegistry(test.TestCase):
+
+    def setUp(self):
+        super(TestMetricRegistry, self).setUp()
+        self.override_config('metrics_mode', 'registry',
+                             group='PROMETHEUS_EXPORTER')
+        self.override_config('performance_collection_interval', 30,
+                             group='telemetry')
+        self.metrics_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.metrics_dir)
+        registry.MetricRegistry().clear()
+        self.addCleanup(registry.MetricRegistry().clear)
+        self.exporter = prometheus.PrometheusExporter()
+        self.exporter.metrics_dir = self.metrics_dir
+
+    def test_push_keeps_latest_sample(self):
+        self.exporter.push_to_prometheus(
+            fake_metrics('1', {NOW - 2000: 10.0, NOW - 1000: 20.0}))
+        # Older sample, e.g. of a retried collection
+        self.exporter.push_to_prometheus(
+            fake_metrics('1', {NOW - 3000: 30.0}))
+
+        self.assertEqual(1, len(registry.MetricRegistry()))
+        data = registry.read_snapshots(self.metrics_dir)
+        self.assertEqual(2, len(data.splitlines()))
+        self.assertIn('# TYPE storage_throughput gauge', data)
+        self.assertIn(' 20.000000 %d' % (NOW - 1000), data)
+        self.assertEqual(
+            [os.path.basename(registry.snapshot_path(self.metrics_dir, '1'))],
+            os.listdir(self.metrics_dir))
+
+    def test_scrape_returns_all_storages(self):
+        self.exporter.push_to_prometheus(fake_metrics('1', {NOW: 1.0}))
+        self.exporter.push_to_prometheus(fake_metrics('2', {NOW: 2.0}))
+
+        data = registry.read_snapshots(self.metrics_dir)
+        # One TYPE line for the family, one sample line per storage
+        self.assertEqual(1, data.count('# TYPE'))
+        self.assertIn('storage_id="1"', data)
+        self.assertIn('storage_id="2"', data)
+        # A scrape does not consume the series
+        self.assertEqual(data, registry.read_snapshots(self.metrics_dir))
+
+    def test_snapshot_of_other_process_kept(self):
+        # The collection of the storage moved to another process
+        other_path = os.path.join(
+            self.metrics_dir, '1.otherhost-1' + registry.SNAPSHOT_SUFFIX)
+        self.exporter.push_to_prometheus(
+            fake_metrics('1', {NOW - 2000: 10.0}))
+        with open(registry.snapshot_path(self.metrics_dir, '1')) as f:
+            data = f.read()
+        with open(other_path, 'w') as f:
+            f.write(data.replace('10.000000 %d' % (NOW - 2000),
+                                 '20.000000 %d' % (NOW - 1000)))
+
+        # Only the newest sample of the series is served
+        data = registry.read_snapshots(self.metrics_dir)
+        self.assertEqual(2, len(data.splitlines()))
+        self.assertIn(' 20.000000 %d' % (NOW - 1000), data)
+
+        # Evicting its own series does not remove the other snapshot
+        self.override_config('metrics_staleness', 60,
+                             group='PROMETHEUS_EXPORTER')
+        self.mock_object(time, 'time', lambda: NOW / 1000.0 + 120)
+        registry.MetricRegistry().write_snapshots(self.metrics_dir, [])
+        self.assertEqual([os.path.basename(other_path)],
+                         os.listdir(self.metrics_dir))
+
+    def test_staleness(self):
+        # Twice the collection interval by default
+        self.assertEqual(60, registry.get_staleness())
+        self.override_config('metrics_staleness', 120,
+                             group='PROMETHEUS_EXPORTER')
+        self.assertEqual(120, registry.get_staleness())
+        # Not evicted before the next collection
+        self.override_config('metrics_staleness', 30,
+                             group='PROMETHEUS_EXPORTER')
+        self.assertEqual(60, registry.get_staleness())
+
+    def test_stale_series_evicted(self):
+        self.override_config('metrics_staleness', 60,
+                             group='PROMETHEUS_EXPORTER')
+        self.exporter.push_to_prometheus(fake_metrics('1', {NOW: 1.0}))
+        self.exporter.push_to_prometheus(
+            fake_metrics('2', {NOW - 120000: 2.0}))
+        self.assertEqual(1, len(registry.MetricRegistry()))
+
+        self.mock_object(time, 'time', lambda: NOW / 1000.0 + 120)
+        registry.MetricRegistry().write_snapshots(self.metrics_dir, [])
+        self.assertEqual(0, len(registry.MetricRegistry()))
+        self.assertEqual([], os.listdir(self.metrics_dir))
+
+    def test_stale_snapshot_removed_on_scrape(self):
+        self.override_config('metrics_staleness', 60,
+                             group='PROMETHEUS_EXPORTER')
+        self.exporter.push_to_prometheus(fake_metrics('1', {NOW: 1.0}))
+        path = registry.snapshot_path(self.metrics_dir, '1')
+        os.utime(path, (time.time() - 120, time.time() - 120))
+
+        self.assertEqual('', registry.read_snapshots(self.metrics_dir))
+        self.assertFalse(os.path.exists(path))
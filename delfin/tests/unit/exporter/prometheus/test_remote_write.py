@@ -0,0 +1,213 @@
+# Copyright 2021 The SODA Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import struct
+import threading
+from http import server
+
+from delfin import test
+from delfin.common import metric_batch
+from delfin.exporter.prometheus import exporter
+from delfin.exporter.prometheus import remote_write
+from delfin.exporter.prometheus import snappy_codec
+
+
+def _read_varint(data, pos):
+    value = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7f) << shift
+        shift += 7
+        if not byte & 0x80:
+            return value, pos
+
+
+def _read_fields(data):
+    pos = 0
+    while pos < len(data):
+        key, pos = _read_varint(data, pos)
+        number, wire_type = key >> 3, key & 7
+        if wire_type == 2:
+            length, pos = _read_varint(data, pos)
+            value = data[pos:pos + length]
+            pos += length
+        elif wire_type == 1:
+            value = struct.unpack('<d', data[pos:pos + 8])[0]
+            pos += 8
+        else:
+            value, pos = _read_varint(data, pos)
+        yield number, value
+
+
+def decode_write_request(data):
+    series = []
+    for _, time_series in _read_fields(data):
+        labels, samples = [], []
+        for number, value in _read_fields(time_series):
+            fields = dict(_read_fields(value))
+            if number == 1:
+                labels.append((fields[1].decode(), fields[2].decode()))
+            else:
+                samples.append((fields[2], fields[1]))
+        series.append((labels, samples))
+    return series
+
+
+class FakeReceiver(server.HTTPServer):
+    """Remote write receiver answering with the queued status codes."""
+
+    timeout = 0.05
+
+    def __init__(self):
+        server.HTTPServer.__init__(self, ('127.0.0.1', 0), _Handler)
+        self.requests = []
+        self.statuses = []
+        self.stopped = False
+        self.thread = threading.Thread(target=self._serve)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def _serve(self):
+        # Not serve_forever, its shutdown event may be green when
+        # eventlet patched socketserver
+        while not self.stopped:
+            self.handle_request()
+
+    @property
+    def url(self):
+        return 'http://127.0.0.1:%d/api/v1/write' % self.server_port
+
+    def stop(self):
+        self.stopped = True
+        self.thread.join()
+        self.server_close()
+
+
+class _Handler(server.BaseHTTPRequestHandler):
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        self.server.requests.append(
+            (dict(self.headers),
+             decode_write_request(snappy_codec.decompress(body))))
+        status = self.server.statuses.pop(0) if self.server.statuses \
+            else 204
+        self.send_response(status)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+def fake_metrics(count=1, samples=None):
+    batch = metric_batch.MetricBatch()
+    for index in range(count):
+        batch.append('throughput',
+                     {'storage_id': '12345', 'resource_type': 'storage',
+                      'resource_id': 'storage%d' % index, 'type': 'RAW',
+                      'unit': 'MB/s'},
+                     samples or {1622808060000: 2.5, 1622808000000: 1.5})
+    return batch
+
+
+class TestRemoteWrite(test.TestCase):
+
+    def setUp(self):
+        super(TestRemoteWrite, self).setUp()
+        self.receiver = FakeReceiver()
+        self.addCleanup(self.receiver.stop)
+        for name, value in (('remote_write_url', self.receiver.url),
+                            ('remote_write_batch_send_deadline', 10),
+                            ('remote_write_min_backoff', 1),
+                            ('remote_write_max_backoff', 1)):
+            self.override_config(name, value,
+                                 group='PROMETHEUS_REMOTE_WRITE')
+        self.sender = remote_write.RemoteWriteSender()
+        self.addCleanup(self.sender.stop)
+
+    def test_encode_write_request(self):
+        series = [([('__name__', 'storage_iops'), ('storage_id', '1')],
+                   [(1622808000000, 1.5), (1622808060000, -2.0)])]
+        self.assertEqual(series, decode_write_request(
+            remote_write.encode_write_request(series)))
+
+    def test_snappy_round_trip(self):
+        for data in (b'', b'a', b'storage_iops' * 1000, os.urandom(3000)):
+            compressed = snappy_codec._compress(data)
+            self.assertEqual(data, snappy_codec._decompress(compressed))
+        self.assertLess(len(snappy_codec._compress(b'storage_iops' * 1000)),
+                        1000)
+
+    def test_dispatch_to_receiver(self):
+        self.mock_object(remote_write.RemoteWriteSender, '_instance',
+                         self.sender)
+        exporter.PerformanceExporterPromRemoteWrite().dispatch(
+            None, fake_metrics())
+        self.sender.stop()
+
+        self.assertEqual(1, len(self.receiver.requests))
+        headers, series = self.receiver.requests[0]
+        self.assertEqual('snappy', headers['Content-Encoding'])
+        self.assertEqual('application/x-protobuf', headers['Content-Type'])
+        labels, samples = series[0]
+        self.assertEqual(sorted(labels), labels)
+        self.assertIn(('__name__', 'storage_throughput'), labels)
+        self.assertIn(('resource_id', 'storage0'), labels)
+        # Labels without value are not sent
+        self.assertNotIn('storage_name', dict(labels))
+        self.assertEqual([(1622808000000, 1.5), (1622808060000, 2.5)],
+                         samples)
+
+    def test_requests_limited_by_max_samples(self):
+        self.override_config('remote_write_shards', 1,
+                             group='PROMETHEUS_REMOTE_WRITE')
+        self.override_config('remote_write_max_samples_per_send', 3,
+                             group='PROMETHEUS_REMOTE_WRITE')
+        self.sender.put(fake_metrics(count=4))
+        self.sender.stop()
+
+        sent = [sum(len(samples) for _, samples in series)
+                for _, series in self.receiver.requests]
+        self.assertEqual(8, sum(sent))
+        self.assertTrue(all(count <= 3 for count in sent))
+
+    def test_retry_on_server_error(self):
+        self.receiver.statuses = [503, 429]
+        self.sender.put(fake_metrics())
+        self.sender.stop()
+
+        self.assertEqual(3, len(self.receiver.requests))
+
+    def test_no_retry_on_client_error(self):
+        self.receiver.statuses = [400]
+        self.sender.put(fake_metrics())
+        self.sender.stop()
+
+        self.assertEqual(1, len(self.receiver.requests))
+
+    def test_full_queue_drops_series(self):
+        self.override_config('remote_write_shards', 1,
+                             group='PROMETHEUS_REMOTE_WRITE')
+        self.override_config('remote_write_queue_size', 1,
+                             group='PROMETHEUS_REMOTE_WRITE')
+        self.mock_object(self.sender, '_run', lambda shard_queue: None)
+        mock_warning = self.mock_object(remote_write.LOG, 'warning')
+
+        self.sender.put(fake_metrics(count=3))
+
+        mock_warning.assert_called_once_with(
+            'Remote write queues are full, dropped %d series', 2)
@@ -0,0 +1,190 @@
+# Copyright 2021 The SODA Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import os
+import shutil
+import tempfile
+import threading
+from unittest import mock
+
+from delfin import context
+from delfin import test
+from delfin.common import metric_batch
+from delfin.exporter import base_exporter
+from delfin.exporter import dispatch_queue
+
+TIMEOUT = 10
+
+
+class FakeExport(object):
+    """Export blocked until released, recording the dispatched data."""
+
+    def __init__(self):
+        self.data = []
+        self.started = threading.Event()
+        self.released = threading.Event()
+        self.done = threading.Event()
+        self.expected = None
+
+    def __call__(self, ctxt, data):
+        self.started.set()
+        self.released.wait(TIMEOUT)
+        self.data.append((ctxt, data))
+        if len(self.data) == self.expected:
+            self.done.set()
+        return data != 'fail'
+
+
+class TestExporterQueue(test.TestCase):
+
+    def setUp(self):
+        super(TestExporterQueue, self).setUp()
+        self.spill_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.spill_dir)
+        self.override_config('exporter_spill_dir', self.spill_dir)
+        self.override_config('exporter_queue_size', 1)
+        self.mock_object(dispatch_queue, 'SPILL_POLL_INTERVAL', 0.01)
+        self.context = context.get_admin_context()
+        self.export = FakeExport()
+        self.queue = dispatch_queue.ExporterQueue('FakeExporter',
+                                                  self.export)
+        self.addCleanup(self.queue.stop, TIMEOUT)
+        self.addCleanup(self.export.released.set)
+
+    def _put_while_blocked(self, count):
+        # The first data is held by the worker, the others wait in queue
+        self.queue.put(self.context, 0)
+        self.assertTrue(self.export.started.wait(TIMEOUT))
+        for data in range(1, count):
+            self.queue.put(self.context, data)
+
+    def _release(self, expected):
+        self.export.expected = expected
+        self.export.released.set()
+        self.assertTrue(self.export.done.wait(TIMEOUT))
+        return [data for _, data in self.export.data]
+
+    def test_put_does_not_wait_for_export(self):
+        self.queue.put(self.context, 'data')
+        self.assertTrue(self.export.started.wait(TIMEOUT))
+
+        self.assertEqual(['data'], self._release(1))
+        self.assertIs(self.context, self.export.data[0][0])
+
+    def test_drop_oldest(self):
+        self._put_while_blocked(4)
+
+        self.assertEqual([0, 3], self._release(2))
+        self.assertEqual(2, self.queue.stats()['dropped'])
+
+    def test_block(self):
+        self.override_config('exporter_overflow_policy', 'block')
+        self.override_config('exporter_block_timeout', 0)
+        self._put_while_blocked(3)
+
+        self.assertEqual([0, 1], self._release(2))
+        self.assertEqual(1, self.queue.stats()['dropped'])
+
+    def test_spill(self):
+        self.override_config('exporter_overflow_policy', 'spill')
+        self._put_while_blocked(4)
+        self.assertEqual(2, len(os.listdir(self.queue.spill_dir)))
+
+        # The spilled data is dispatched after the queued data, in order
+        self.assertEqual([0, 1, 2, 3], self._release(4))
+        self.assertEqual(2, self.queue.stats()['spilled'])
+        self.assertEqual(self.context.to_dict(),
+                         self.export.data[-1][0].to_dict())
+        self.assertEqual([], os.listdir(self.queue.spill_dir))
+
+    def test_spill_metrics_without_request_context(self):
+        self.override_config('exporter_overflow_policy', 'spill')
+        batch = metric_batch.MetricBatch()
+        batch.append('iops', {'storage_id': '1'}, {1000: 1.5, 2000: None})
+        previous = dispatch_queue.ExporterQueue('FakeExporter', None)
+        self.assertTrue(previous._spill((0, context, batch)))
+
+        names = os.listdir(self.queue.spill_dir)
+        self.assertEqual(1, len(names))
+        self.assertTrue(names[0].endswith(dispatch_queue.SPILL_SUFFIX))
+        with open(os.path.join(self.queue.spill_dir, names[0])) as f:
+            self.assertIsNone(json.load(f)['context'])
+
+        self.queue.put(self.context, 'new')
+        self.assertEqual(2, len(self._release(2)))
+        ctxt, data = self.export.data[0]
+        self.assertIsNone(ctxt)
+        self.assertEqual([('iops', {'storage_id': '1'},
+                           [(1000, 1.5), (2000, None)])],
+                         [(name, labels, list(samples)) for name, labels,
+                          samples in metric_batch.iter_series(data)])
+
+    def test_spill_failure_removes_temp_file(self):
+        self.override_config('exporter_overflow_policy', 'spill')
+        self.mock_object(dispatch_queue.os, 'rename',
+                         mock.Mock(side_effect=OSError('disk full')))
+
+        self.assertFalse(self.queue._spill((0, self.context, 'data')))
+        self.assertEqual([], os.listdir(self.queue.spill_dir))
+
+    def test_spill_left_by_previous_process(self):
+        self.override_config('exporter_overflow_policy', 'spill')
+        previous = dispatch_queue.ExporterQueue('FakeExporter', None)
+        previous._spill((0, None, 'left'))
+
+        self.queue.put(self.context, 'new')
+        self.assertEqual(['left', 'new'], self._release(2))
+
+    def test_stats(self):
+        self.queue.put(self.context, 'fail')
+        self._release(1)
+        self.queue.stop(TIMEOUT)
+
+        stats = self.queue.stats()
+        self.assertEqual(0, stats['depth'])
+        self.assertEqual(1, stats['dispatched'])
+        self.assertEqual(1, stats['failed'])
+        self.assertGreaterEqual(stats['max_latency'], stats['avg_latency'])
+
+
+class FakeExporter(base_exporter.BaseExporter):
+    dispatch = mock.Mock()
+
+
+class TestAsyncDispatch(test.TestCase):
+
+    def setUp(self):
+        super(TestAsyncDispatch, self).setUp()
+        FakeExporter.dispatch.reset_mock()
+        self.mock_object(
+            base_exporter.AlertExporterManager, '_get_exporters',
+            mock.Mock(return_value=[FakeExporter()]))
+        self.addCleanup(dispatch_queue.DispatchQueues().stop, TIMEOUT)
+        self.context = context.get_admin_context()
+
+    def test_sync_dispatch(self):
+        base_exporter.AlertExporterManager().dispatch(self.context, [{}])
+
+        FakeExporter.dispatch.assert_called_once_with(self.context, [{}])
+        self.assertEqual({}, dispatch_queue.DispatchQueues().stats())
+
+    def test_async_dispatch(self):
+        self.override_config('exporter_async_dispatch', True)
+        base_exporter.AlertExporterManager().dispatch(self.context, [{}])
+        base_exporter.AlertExporterManager().dispatch(self.context, [{}])
+        # The managers share the queue of the exporter
+        dispatch_queue.DispatchQueues().stop(TIMEOUT)
+
+        self.assertEqual(2, FakeExporter.dispatch.call_count)
@@ -0,0 +1,180 @@
+# Copyright 2021 The SODA Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from unittest import mock
+
+from delfin import context
+from delfin import test
+from delfin.common import metric_batch
+from delfin.exporter import base_exporter
+from delfin.exporter import rollup
+
+labels = {'storage_id': '12345', 'resource_type': 'storage',
+          'resource_id': 'storage0', 'type': 'RAW', 'unit': 'IOPS'}
+# The windows of the samples do not expire within two collection intervals
+# of 1h
+NOW = 3600
+
+
+def _get_batch(samples):
+    batch = metric_batch.MetricBatch()
+    batch.append('iops', labels, samples)
+    return batch
+
+
+def _get_rollups(batch):
+    return dict(((metric.labels['aggregation'], metric.labels['resolution'],
+                  list(metric.values)[0]), list(metric.values.values())[0])
+                for metric in batch)
+
+
+class FakeRawExporter(base_exporter.BaseExporter):
+    dispatch = mock.Mock()
+
+
+class FakeRollupExporter(base_exporter.BaseExporter):
+    dispatch = mock.Mock()
+
+
+@mock.patch('time.time', mock.Mock(return_value=NOW))
+class TestMetricRollup(test.TestCase):
+
+    def setUp(self):
+        super(TestMetricRollup, self).setUp()
+        self.override_config('performance_collection_interval', 3600,
+                             group='telemetry')
+        self.rollup = rollup.MetricRollup()
+        self.rollup.clear()
+        self.addCleanup(self.rollup.clear)
+
+    def test_feed(self):
+        rollups = self.rollup.feed(
+            _get_batch({0: 1.0, 60000: 3.0, 120000: None}), [300])
+        # The window is still open
+        self.assertEqual(0, len(rollups[300]))
+        self.assertEqual(1, len(self.rollup))
+
+        rollups = self.rollup.feed(
+            _get_batch({240000: 2.0, 300000: 10.0}), [300])
+        self.assertEqual({('min', '300', 0): 1.0, ('max', '300', 0): 3.0,
+                          ('avg', '300', 0): 2.0, ('last', '300', 0): 2.0},
+                         _get_rollups(rollups[300]))
+        metric = rollups[300][0]
+        self.assertEqual(dict(labels, resolution='300', aggregation='min'),
+                         metric.labels)
+        self.assertEqual('iops', metric.name)
+        self.assertEqual(1, len(self.rollup))
+
+    def test_feed_several_resolutions(self):
+        samples = dict((minute * 60000, float(minute))
+                       for minute in range(61))
+        rollups = self.rollup.feed(_get_batch(samples), [300, 3600])
+        self.assertEqual(12 * 4, len(rollups[300]))
+        self.assertEqual({('min', '3600', 0): 0.0, ('max', '3600', 0): 59.0,
+                          ('avg', '3600', 0): 29.5,
+                          ('last', '3600', 0): 59.0},
+                         _get_rollups(rollups[3600]))
+        self.assertEqual(2, len(self.rollup))
+
+    def test_feed_late_samples(self):
+        self.rollup.feed(_get_batch({300000: 1.0}), [300])
+        rollups = self.rollup.feed(_get_batch({0: 5.0, 360000: 3.0}), [300])
+        self.assertEqual(0, len(rollups[300]))
+        rollups = self.rollup.feed(_get_batch({600000: 3.0}), [300])
+        self.assertEqual({('min', '300', 300000): 1.0,
+                          ('max', '300', 300000): 3.0,
+                          ('avg', '300', 300000): 2.0,
+                          ('last', '300', 300000): 3.0},
+                         _get_rollups(rollups[300]))
+
+    def test_feed_expired_window(self):
+        self.rollup.feed(_get_batch({0: 1.0}), [300])
+        with mock.patch('time.time', return_value=300 + 7200):
+            rollups = self.rollup.feed([], [300])
+        self.assertEqual(4, len(rollups[300]))
+        self.assertEqual(0, len(self.rollup))
+
+        # A late sample of the emitted window is not rolled up again
+        with mock.patch('time.time', return_value=300 + 7200):
+            rollups = self.rollup.feed(_get_batch({60000: 2.0}), [300])
+        self.assertEqual(0, len(rollups[300]))
+        self.assertEqual(0, len(self.rollup))
+
+        # Its start is kept until no sample of it can be collected anymore
+        self.override_config('max_backfill_duration', 3600,
+                             group='telemetry')
+        with mock.patch('time.time', return_value=300 + 7200 + 3599):
+            self.rollup.feed([], [300])
+        self.assertEqual(1, len(self.rollup._windows))
+        with mock.patch('time.time', return_value=300 + 7200 + 3600):
+            self.rollup.feed([], [300])
+        self.assertEqual({}, self.rollup._windows)
+
+    def test_feed_window_split_over_processes(self):
+        self.rollup.feed(_get_batch({0: 1.0}), [300])
+        # The collection moved, the windows of this process are lost
+        self.rollup.clear()
+
+        rollups = self.rollup.feed(_get_batch({100000: 3.0, 300000: 5.0}),
+                                   [300])
+        # Only the samples collected by this process are aggregated
+        self.assertEqual({('min', '300', 0): 3.0,
+                          ('max', '300', 0): 3.0,
+                          ('avg', '300', 0): 3.0,
+                          ('last', '300', 0): 3.0},
+                         _get_rollups(rollups[300]))
+
+
+class TestPerformanceExporterManager(test.TestCase):
+
+    def setUp(self):
+        super(TestPerformanceExporterManager, self).setUp()
+        FakeRawExporter.dispatch.reset_mock()
+        FakeRollupExporter.dispatch.reset_mock()
+        self.mock_object(
+            base_exporter.PerformanceExporterManager, '_get_exporters',
+            mock.Mock(return_value=[FakeRawExporter(),
+                                    FakeRollupExporter()]))
+        self.rollups = {300: metric_batch.MetricBatch()}
+        self.feed = self.mock_object(rollup.MetricRollup, 'feed',
+                                     mock.Mock(return_value=self.rollups))
+        self.context = context.get_admin_context()
+
+    def test_dispatch_without_resolution(self):
+        batch = _get_batch({0: 1.0})
+        base_exporter.PerformanceExporterManager().dispatch(self.context,
+                                                            batch)
+        FakeRawExporter.dispatch.assert_called_once_with(self.context, batch)
+        FakeRollupExporter.dispatch.assert_called_once_with(self.context,
+                                                            batch)
+        self.feed.assert_not_called()
+
+    def test_dispatch_with_resolution(self):
+        self.override_config('performance_exporter_resolutions',
+                             {'FakeRollupExporter': '300',
+                              'FakeRawExporter': 'raw'})
+        batch = _get_batch({0: 1.0})
+        manager = base_exporter.PerformanceExporterManager()
+        self.assertEqual({'FakeRollupExporter': 300}, manager.resolutions)
+
+        manager.dispatch(self.context, batch)
+        self.feed.assert_called_once_with(batch, {300})
+        FakeRawExporter.dispatch.assert_called_once_with(self.context, batch)
+        # Nothing rolled up yet
+        FakeRollupExporter.dispatch.assert_not_called()
+
+        self.rollups[300].append('iops', labels, {0: 1.0})
+        manager.dispatch(self.context, batch)
+        FakeRollupExporter.dispatch.assert_called_once_with(
+            self.context, self.rollups[300])
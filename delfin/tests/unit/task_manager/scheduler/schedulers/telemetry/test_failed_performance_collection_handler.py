@@ -23,11 +23,14 @@ from delfin import exception
 from delfin import test
 from delfin.common.constants import TelemetryCollection
 from delfin.common.constants import TelemetryTaskStatus, TelemetryJobStatus
+from delfin.db.sqlalchemy import api as db_api
 from delfin.db.sqlalchemy.models import FailedTask
 from delfin.db.sqlalchemy.models import Task
 from delfin.task_manager.scheduler.schedulers.telemetry. \
     failed_performance_collection_handler import \
     FailedPerformanceCollectionHandler
+from delfin.task_manager.scheduler.schedulers.telemetry. \
+    performance_collection_handler import PerformanceCollectionHandler
 
 fake_failed_job_id = 43
 
@@ -78,39 +81,44 @@ class TestFailedPerformanceCollectionHandler(test.TestCase):
                        mock.Mock(return_value=fake_telemetry_job))
     @mock.patch.object(db, 'failed_task_get',
                        mock.Mock(return_value=fake_failed_job))
-    @mock.patch(
-        'apscheduler.schedulers.background.BackgroundScheduler.pause_job')
+    @mock.patch('delfin.db.failed_task_delete')
+    @mock.patch('delfin.db.task_collected_end_time_advance')
     @mock.patch('delfin.db.failed_task_update')
     @mock.patch('delfin.task_manager.rpcapi.TaskAPI.collect_telemetry')
     def test_failed_job_success(self, mock_collect_telemetry,
-                                mock_failed_task_update, mock_pause_job):
+                                mock_failed_task_update, mock_advance,
+                                mock_failed_task_delete):
         mock_collect_telemetry.return_value = TelemetryTaskStatus. \
             TASK_EXEC_STATUS_SUCCESS
         ctx = context.get_admin_context()
         failed_job_handler = FailedPerformanceCollectionHandler.get_instance(
             ctx, fake_failed_job_id)
         # call failed job
-        failed_job_handler()
+        self.assertTrue(failed_job_handler())
 
-        self.assertEqual(mock_pause_job.call_count, 1)
-        mock_failed_task_update.assert_called_once_with(
-            ctx,
-            fake_failed_job_id,
-            {
-                FailedTask.retry_count.name: 1,
-                FailedTask.result.name:
-                    TelemetryJobStatus.FAILED_JOB_STATUS_SUCCESS})
+        # the whole failed range is collected, then the watermark is moved
+        # and the failed task removed
+        start_time, end_time = mock_collect_telemetry.call_args[0][4:6]
+        self.assertEqual(fake_failed_job[FailedTask.start_time.name],
+                         start_time)
+        self.assertEqual(fake_failed_job[FailedTask.end_time.name], end_time)
+        mock_advance.assert_called_once_with(
+            ctx, fake_failed_job[FailedTask.task_id.name], end_time,
+            start_time=start_time)
+        mock_failed_task_delete.assert_called_once_with(
+            ctx, fake_failed_job_id)
+        self.assertEqual(mock_failed_task_update.call_count, 0)
 
     @mock.patch.object(db, 'task_get',
                        mock.Mock(return_value=fake_telemetry_job))
     @mock.patch.object(db, 'failed_task_get',
                        mock.Mock(return_value=fake_failed_job))
-    @mock.patch(
-        'apscheduler.schedulers.background.BackgroundScheduler.pause_job')
+    @mock.patch('delfin.db.failed_task_delete')
     @mock.patch('delfin.db.failed_task_update')
     @mock.patch('delfin.task_manager.rpcapi.TaskAPI.collect_telemetry')
     def test_failed_job_failure(self, mock_collect_telemetry,
-                                mock_failed_task_update, mock_pause_job):
+                                mock_failed_task_update,
+                                mock_failed_task_delete):
         mock_collect_telemetry.return_value = TelemetryTaskStatus. \
             TASK_EXEC_STATUS_FAILURE
         ctx = context.get_admin_context()
@@ -118,9 +126,9 @@ class TestFailedPerformanceCollectionHandler(test.TestCase):
             ctx, fake_failed_job_id)
         # retry
         # call failed job
-        failed_job_handler()
+        self.assertFalse(failed_job_handler())
 
-        self.assertEqual(mock_pause_job.call_count, 0)
+        self.assertEqual(mock_failed_task_delete.call_count, 0)
         mock_failed_task_update.assert_called_once_with(
             ctx,
             fake_failed_job_id,
@@ -129,15 +137,44 @@ class TestFailedPerformanceCollectionHandler(test.TestCase):
                 FailedTask.result.name:
                     TelemetryJobStatus.FAILED_JOB_STATUS_RETRYING})
 
+    @mock.patch.object(db, 'task_get',
+                       mock.Mock(return_value=fake_telemetry_job))
+    @mock.patch.object(db, 'failed_task_get',
+                       mock.Mock(return_value=fake_failed_job))
+    @mock.patch('delfin.db.failed_task_delete')
+    @mock.patch('delfin.db.task_collected_end_time_advance')
+    @mock.patch('delfin.db.failed_task_update')
+    @mock.patch('delfin.task_manager.rpcapi.TaskAPI.collect_telemetry')
+    def test_failed_job_partial(self, mock_collect_telemetry,
+                                mock_failed_task_update, mock_advance,
+                                mock_failed_task_delete):
+        start_time = fake_failed_job[FailedTask.start_time.name]
+        # the first windows of the range were dispatched
+        mock_collect_telemetry.return_value = start_time + 10
+        ctx = context.get_admin_context()
+        failed_job_handler = FailedPerformanceCollectionHandler.get_instance(
+            ctx, fake_failed_job_id)
+        self.assertFalse(failed_job_handler())
+
+        # the next retry starts after them
+        mock_advance.assert_called_once_with(
+            ctx, fake_failed_job[FailedTask.task_id.name], start_time + 10,
+            start_time=start_time)
+        self.assertIn(
+            mock.call(ctx, fake_failed_job_id,
+                      {FailedTask.start_time.name: start_time + 10}),
+            mock_failed_task_update.call_args_list)
+        self.assertEqual(mock_failed_task_delete.call_count, 0)
+
     @mock.patch.object(db, 'task_get',
                        mock.Mock(return_value=fake_telemetry_job))
     @mock.patch.object(db, 'failed_task_get')
-    @mock.patch(
-        'apscheduler.schedulers.background.BackgroundScheduler.pause_job')
+    @mock.patch('delfin.db.failed_task_delete')
     @mock.patch('delfin.db.failed_task_update')
     @mock.patch('delfin.task_manager.rpcapi.TaskAPI.collect_telemetry')
     def test_failed_job_fail_max_times(self, mock_collect_telemetry,
-                                       mock_failed_task_update, mock_pause_job,
+                                       mock_failed_task_update,
+                                       mock_failed_task_delete,
                                        mock_failed_task_get):
         mock_collect_telemetry.return_value = TelemetryTaskStatus. \
             TASK_EXEC_STATUS_FAILURE
@@ -153,33 +190,25 @@ class TestFailedPerformanceCollectionHandler(test.TestCase):
         failed_job_handler = FailedPerformanceCollectionHandler.get_instance(
             ctx, fake_failed_job_id)
         # call failed job
-        failed_job_handler()
+        self.assertTrue(failed_job_handler())
 
-        self.assertEqual(mock_pause_job.call_count, 1)
-        mock_failed_task_update.assert_called_once_with(
-            ctx,
-            fake_failed_job_id,
-            {
-                FailedTask.retry_count.name:
-                    TelemetryCollection.MAX_FAILED_JOB_RETRY_COUNT,
-                FailedTask.result.name:
-                    TelemetryJobStatus.FAILED_JOB_STATUS_INIT})
+        # the failed task is given up
+        self.assertEqual(mock_failed_task_update.call_count, 0)
+        mock_failed_task_delete.assert_called_once_with(
+            ctx, fake_failed_job_id)
 
     @mock.patch.object(db, 'task_get',
                        mock.Mock(return_value=fake_telemetry_job))
     @mock.patch.object(db, 'failed_task_get',
                        mock.Mock(return_value=fake_deleted_storage_failed_job))
-    @mock.patch(
-        'apscheduler.schedulers.background.BackgroundScheduler.pause_job')
     @mock.patch('delfin.db.failed_task_update')
     @mock.patch('delfin.task_manager.rpcapi.TaskAPI.collect_telemetry')
     def test_failed_job_deleted_storage(self, mock_collect_telemetry,
-                                        mock_failed_task_update,
-                                        mock_pause_job):
+                                        mock_failed_task_update):
         ctx = context.get_admin_context()
         failed_job_handler = FailedPerformanceCollectionHandler.get_instance(
             ctx, fake_failed_job_id)
-        failed_job_handler()
+        self.assertTrue(failed_job_handler())
 
         # Verify that no action performed for deleted storage failed tasks
         self.assertEqual(mock_collect_telemetry.call_count, 0)
@@ -188,19 +217,165 @@ class TestFailedPerformanceCollectionHandler(test.TestCase):
     @mock.patch.object(db, 'task_get',
                        mock.Mock(return_value=fake_telemetry_job))
     @mock.patch.object(db, 'failed_task_get', failed_task_not_found_exception)
-    @mock.patch(
-        'apscheduler.schedulers.background.BackgroundScheduler.pause_job',
-        mock.Mock())
     @mock.patch('delfin.db.failed_task_update')
     @mock.patch('delfin.task_manager.rpcapi.TaskAPI.collect_telemetry')
     def test_deleted_storage_exception(self, mock_collect_telemetry,
                                        mock_failed_task_update):
         ctx = context.get_admin_context()
         failed_job_handler = FailedPerformanceCollectionHandler(
-            ctx, 1122, '12c2d52f-01bc-41f5-b73f-7abf6f38a2a6', '',
-            1234, 2, 1122334400, 1122334800)
-        failed_job_handler()
+            ctx, 1122, 2, '12c2d52f-01bc-41f5-b73f-7abf6f38a2a6', '',
+            2, 1122334400, 1122334800)
+        self.assertTrue(failed_job_handler())
 
         # Verify that no action performed for deleted storage failed tasks
         self.assertEqual(mock_collect_telemetry.call_count, 0)
         self.assertEqual(mock_failed_task_update.call_count, 0)
+
+    @mock.patch.object(db, 'failed_task_get',
+                       mock.Mock(return_value=fake_failed_job))
+    @mock.patch('delfin.db.failed_task_delete')
+    @mock.patch('delfin.task_manager.rpcapi.TaskAPI.collect_telemetry')
+    def test_failed_job_collected_by_periodic(self, mock_collect_telemetry,
+                                              mock_failed_task_delete):
+        task = dict(fake_telemetry_job)
+        task[Task.collected_end_time.name] = \
+            fake_failed_job[FailedTask.end_time.name]
+        self.mock_object(db, 'task_get', mock.Mock(return_value=task))
+        ctx = context.get_admin_context()
+        failed_job_handler = FailedPerformanceCollectionHandler.get_instance(
+            ctx, fake_failed_job_id)
+        self.assertTrue(failed_job_handler())
+
+        # the watermark is past the failed range, nothing left to retry
+        self.assertEqual(mock_collect_telemetry.call_count, 0)
+        mock_failed_task_delete.assert_called_once_with(
+            ctx, fake_failed_job_id)
+
+    @mock.patch.object(db, 'task_get',
+                       mock.Mock(return_value=fake_telemetry_job))
+    @mock.patch.object(db, 'failed_task_get',
+                       mock.Mock(return_value=fake_failed_job))
+    @mock.patch('delfin.db.failed_task_update')
+    @mock.patch('delfin.task_manager.rpcapi.TaskAPI.collect_telemetry_async')
+    def test_failed_job_async(self, mock_collect_telemetry_async,
+                              mock_failed_task_update):
+        self.override_config('async_collection', True, group='telemetry')
+        ctx = context.get_admin_context()
+        failed_job_handler = FailedPerformanceCollectionHandler.get_instance(
+            ctx, fake_failed_job_id)
+        # call failed job
+        self.assertFalse(failed_job_handler())
+
+        self.assertEqual(mock_collect_telemetry_async.call_count, 1)
+        self.assertEqual(fake_failed_job_id,
+                         mock_collect_telemetry_async.call_args[0][7])
+        mock_failed_task_update.assert_called_once_with(
+            ctx,
+            fake_failed_job_id,
+            {
+                FailedTask.retry_count.name: 1,
+                FailedTask.result.name:
+                    TelemetryJobStatus.FAILED_JOB_STATUS_RETRYING})
+
+    @mock.patch('delfin.task_manager.rpcapi.TaskAPI'
+                '.schedule_failed_telemetry_task', mock.Mock())
+    @mock.patch('delfin.task_manager.rpcapi.TaskAPI.collect_telemetry_async')
+    def test_async_failed_window_retried_after_next_window(
+            self, mock_collect_telemetry_async):
+        self.override_config('async_collection', True, group='telemetry')
+        ctx = context.get_admin_context()
+        task = db_api.task_create(ctx, {
+            Task.storage_id.name: 'fake_storage_id',
+            Task.interval.name: 900,
+            Task.args.name: {}})
+        filters = {FailedTask.task_id.name: task['id'],
+                   FailedTask.deleted.name: False}
+
+        # window A fails, window B after it succeeds
+        PerformanceCollectionHandler.handle_result(
+            ctx, task['id'], 'fake_storage_id',
+            TelemetryTaskStatus.TASK_EXEC_STATUS_FAILURE, 1000, 2000)
+        PerformanceCollectionHandler.handle_result(
+            ctx, task['id'], 'fake_storage_id',
+            TelemetryTaskStatus.TASK_EXEC_STATUS_SUCCESS, 2000, 3000)
+        self.assertEqual(3000, db.task_get(
+            ctx, task['id'])[Task.collected_end_time.name])
+        failed_tasks = db.failed_task_get_all(ctx, filters=filters)
+        self.assertEqual(1, len(failed_tasks))
+
+        # window A is retried although the watermark is past it
+        failed_job_handler = FailedPerformanceCollectionHandler.get_instance(
+            ctx, failed_tasks[0][FailedTask.id.name])
+        self.assertFalse(failed_job_handler())
+        self.assertEqual(
+            (1000, 2000), mock_collect_telemetry_async.call_args[0][4:6])
+        self.assertEqual(1, len(db.failed_task_get_all(ctx, filters=filters)))
+
+        FailedPerformanceCollectionHandler.handle_result(
+            ctx, failed_tasks[0][FailedTask.id.name], 'fake_storage_id',
+            TelemetryTaskStatus.TASK_EXEC_STATUS_SUCCESS, 1000, 2000)
+        self.assertEqual([], db.failed_task_get_all(ctx, filters=filters))
+        self.assertEqual(3000, db.task_get(
+            ctx, task['id'])[Task.collected_end_time.name])
+
+    @mock.patch.object(db, 'task_get',
+                       mock.Mock(return_value=fake_telemetry_job))
+    @mock.patch.object(db, 'failed_task_get',
+                       mock.Mock(return_value=fake_failed_job))
+    @mock.patch('delfin.db.failed_task_delete')
+    @mock.patch('delfin.db.task_collected_end_time_advance')
+    def test_handle_result(self, mock_advance, mock_failed_task_delete):
+        ctx = context.get_admin_context()
+        FailedPerformanceCollectionHandler.handle_result(
+            ctx, fake_failed_job_id, 'fake_storage_id',
+            TelemetryTaskStatus.TASK_EXEC_STATUS_FAILURE, 1000, 2000)
+        self.assertEqual(mock_failed_task_delete.call_count, 0)
+
+        FailedPerformanceCollectionHandler.handle_result(
+            ctx, fake_failed_job_id, 'fake_storage_id',
+            TelemetryTaskStatus.TASK_EXEC_STATUS_SUCCESS, 1000, 2000)
+        mock_advance.assert_called_once_with(
+            ctx, fake_failed_job[FailedTask.task_id.name], 2000,
+            start_time=1000)
+        mock_failed_task_delete.assert_called_once_with(
+            ctx, fake_failed_job_id)
+
+    @mock.patch('delfin.task_manager.rpcapi.TaskAPI'
+                '.schedule_failed_telemetry_task')
+    @mock.patch('delfin.db.failed_task_create')
+    @mock.patch('delfin.db.failed_task_update')
+    @mock.patch('delfin.db.failed_task_get_all')
+    def test_record_failure(self, mock_failed_task_get_all,
+                            mock_failed_task_update,
+                            mock_failed_task_create,
+                            mock_schedule_failed_task):
+        ctx = context.get_admin_context()
+        failed_job = fake_failed_job.copy()
+        failed_job[FailedTask.start_time.name] = 1000
+        failed_job[FailedTask.end_time.name] = 2000
+        mock_failed_task_get_all.return_value = [failed_job]
+
+        # an adjacent range is merged into the failed task
+        FailedPerformanceCollectionHandler.record_failure(
+            ctx, failed_job[FailedTask.task_id.name], 'fake_storage_id',
+            2000, 3000)
+        mock_failed_task_update.assert_called_once_with(
+            ctx, fake_failed_job_id,
+            {FailedTask.start_time.name: 1000,
+             FailedTask.end_time.name: 3000})
+        self.assertEqual(mock_failed_task_create.call_count, 0)
+        self.assertEqual(mock_schedule_failed_task.call_count, 0)
+
+        # a disjoint range is queued on its own
+        FailedPerformanceCollectionHandler.record_failure(
+            ctx, failed_job[FailedTask.task_id.name], 'fake_storage_id',
+            5000, 6000)
+        self.assertEqual(mock_failed_task_create.call_count, 1)
+        failed_task = mock_failed_task_create.call_args[0][1]
+        self.assertEqual(5000, failed_task[FailedTask.start_time.name])
+        self.assertEqual(6000, failed_task[FailedTask.end_time.name])
+        self.assertEqual(0, failed_task[FailedTask.retry_count.name])
+        # and pushed to the retry queue of the owner of the task
+        mock_schedule_failed_task.assert_called_once_with(
+            ctx, mock_failed_task_create.return_value[FailedTask.id.name],
+            failed_job[FailedTask.task_id.name])
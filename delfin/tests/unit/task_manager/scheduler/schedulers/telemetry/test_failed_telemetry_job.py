@@ -12,6 +12,7 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import time
 from datetime import datetime
 from unittest import mock
 
@@ -19,15 +20,19 @@ from oslo_utils import uuidutils
 
 from delfin import context
 from delfin import db
+from delfin import exception
 from delfin import test
 from delfin.common.constants import TelemetryCollection
 from delfin.db.sqlalchemy.models import FailedTask
 from delfin.db.sqlalchemy.models import Task
+from delfin.task_manager.scheduler import schedule_manager
 from delfin.task_manager.scheduler.schedulers.telemetry. \
     failed_performance_collection_handler import \
     FailedPerformanceCollectionHandler
+from delfin.task_manager.scheduler.schedulers.telemetry import \
+    failed_telemetry_job
 from delfin.task_manager.scheduler.schedulers.telemetry.failed_telemetry_job \
-    import FailedTelemetryJob
+    import FailedTelemetryJob, get_retry_delay
 
 fake_failed_job = {
     FailedTask.id.name: 43,
@@ -57,86 +62,156 @@ fake_telemetry_job = {
 
 class TestFailedTelemetryJob(test.TestCase):
 
-    @mock.patch.object(db, 'failed_task_get_all',
-                       mock.Mock(return_value=fake_failed_jobs))
-    @mock.patch.object(db, 'failed_task_update',
-                       mock.Mock(return_value=fake_failed_job))
-    @mock.patch.object(db, 'task_get',
-                       mock.Mock(return_value=fake_telemetry_job))
-    @mock.patch.object(db, 'failed_task_get',
-                       mock.Mock(return_value=fake_failed_job))
-    @mock.patch(
-        'apscheduler.schedulers.background.BackgroundScheduler.add_job')
-    def test_failed_job_scheduling(self, mock_add_job):
+    def setUp(self):
+        super(TestFailedTelemetryJob, self).setUp()
+        self.failed_task = dict(fake_failed_job)
+        self.mock_object(db, 'failed_task_get',
+                         mock.Mock(return_value=self.failed_task))
+        self.mock_object(db, 'task_get',
+                         mock.Mock(return_value=fake_telemetry_job))
+        self.mock_failed_task_get_all = self.mock_object(
+            db, 'failed_task_get_all',
+            mock.Mock(side_effect=lambda ctx, filters=None, **kwargs:
+                      [] if filters.get('deleted') else [self.failed_task]))
+        self.mock_get_retry_delay = self.mock_object(
+            failed_telemetry_job, 'get_retry_delay',
+            mock.Mock(return_value=0))
+
+    @mock.patch.object(db, 'failed_task_delete')
+    @mock.patch.object(db, 'task_update', mock.Mock())
+    @mock.patch('delfin.task_manager.rpcapi.TaskAPI.collect_telemetry')
+    def test_failed_job_retry(self, mock_collect_telemetry,
+                              mock_failed_task_delete):
+        mock_collect_telemetry.return_value = True
         failed_job = FailedTelemetryJob(context.get_admin_context())
-        # call failed job scheduling
+        # call failed job retry
+        failed_job()
+
+        self.assertEqual(mock_collect_telemetry.call_count, 1)
+        mock_failed_task_delete.assert_called_once_with(
+            mock.ANY, fake_failed_job[FailedTask.id.name])
+        self.assertEqual([], failed_job.queue)
+
+    @mock.patch.object(db, 'failed_task_update', mock.Mock())
+    @mock.patch('delfin.task_manager.rpcapi.TaskAPI.collect_telemetry')
+    def test_failed_job_backoff(self, mock_collect_telemetry):
+        mock_collect_telemetry.return_value = False
+        failed_job = FailedTelemetryJob(context.get_admin_context())
+        failed_job()
+
+        # the failed task is queued again, with the delay of its retry count
+        self.assertEqual(mock_collect_telemetry.call_count, 1)
+        self.mock_get_retry_delay.assert_called_with(1)
+        self.assertEqual(1, len(failed_job.queue))
+
+        self.mock_get_retry_delay.return_value = 100
+        failed_job()
+        self.assertEqual(mock_collect_telemetry.call_count, 2)
+        self.assertGreater(failed_job.queue[0][0], time.time())
+
+        # the failed task is not retried before its retry time
         failed_job()
-        self.assertEqual(mock_add_job.call_count, 1)
+        self.assertEqual(mock_collect_telemetry.call_count, 2)
+        self.assertEqual(1, len(failed_job.queue))
+
+    def test_get_retry_delay(self):
+        self.override_config('retry_backoff_base', 60, group='telemetry')
+        self.override_config('retry_backoff_max', 3600, group='telemetry')
+        self.assertTrue(30 <= get_retry_delay(0) <= 60)
+        self.assertTrue(240 <= get_retry_delay(3) <= 480)
+        self.assertTrue(1800 <= get_retry_delay(10) <= 3600)
+
+    def test_failed_job_queue_bounded(self):
+        self.override_config('retry_queue_size', 2, group='telemetry')
+        self.mock_get_retry_delay.return_value = 100
+        failed_tasks = []
+        for failed_task_id in range(3):
+            failed_task = dict(fake_failed_job)
+            failed_task[FailedTask.id.name] = failed_task_id
+            failed_tasks.append(failed_task)
+        self.mock_failed_task_get_all.side_effect = \
+            lambda ctx, filters=None, **kwargs: \
+            [] if filters.get('deleted') else failed_tasks
+
+        failed_job = FailedTelemetryJob(context.get_admin_context())
+        failed_job()
+        failed_job()
+
+        # the other failed tasks wait in the database
+        self.assertEqual([0, 1],
+                         sorted(entry[1] for entry in failed_job.queue))
+        self.assertTrue(failed_job.overflow)
+
+        # they are loaded once the queue has room
+        failed_job.queue.pop()
+        failed_job.queued.discard(1)
+        failed_job()
+        self.assertEqual([0, 1],
+                         sorted(entry[1] for entry in failed_job.queue))
+
+    def test_failed_job_queue_failed_task(self):
+        self.mock_get_retry_delay.return_value = 100
+        self.mock_failed_task_get_all.side_effect = \
+            lambda ctx, filters=None, **kwargs: []
+        failed_job = FailedTelemetryJob(context.get_admin_context())
+        failed_job()
+        self.assertEqual(2, self.mock_failed_task_get_all.call_count)
+
+        # a failed task recorded is queued without reading the database
+        failed_job.queue_failed_task(43)
+        failed_job.queue_failed_task(43)
+        failed_job()
+        self.assertEqual([43], [entry[1] for entry in failed_job.queue])
+        self.assertEqual(2, self.mock_failed_task_get_all.call_count)
+
+        self.override_config('retry_queue_size', 1, group='telemetry')
+        failed_job.queue_failed_task(44)
+        self.assertEqual([43], [entry[1] for entry in failed_job.queue])
+        self.assertTrue(failed_job.overflow)
 
-    @mock.patch(
-        'apscheduler.schedulers.background.BackgroundScheduler.remove_job')
-    @mock.patch(
-        'apscheduler.schedulers.background.BackgroundScheduler.get_job')
     @mock.patch.object(db, 'failed_task_delete')
-    @mock.patch.object(db, 'failed_task_get_all')
-    def test_failed_job_with_max_retry(self, mock_failed_get_all,
-                                       mock_failed_task_delete,
-                                       mock_get_job,
-                                       mock_remove_job):
+    @mock.patch('delfin.task_manager.rpcapi.TaskAPI.collect_telemetry')
+    def test_failed_job_with_max_retry(self, mock_collect_telemetry,
+                                       mock_failed_task_delete):
         # configure to return entry with max retry count
-        failed_jobs = fake_failed_jobs.copy()
-        failed_jobs[0][FailedTask.retry_count.name] = \
+        self.failed_task[FailedTask.retry_count.name] = \
             TelemetryCollection.MAX_FAILED_JOB_RETRY_COUNT
-        mock_failed_get_all.return_value = failed_jobs
 
         failed_job = FailedTelemetryJob(context.get_admin_context())
-        # call failed job scheduling
         failed_job()
 
-        mock_get_job.return_value = True
-
-        # entry get deleted and job get removed
-        self.assertEqual(mock_failed_task_delete.call_count, 2)
-        self.assertEqual(mock_remove_job.call_count, 2)
-
-    @mock.patch(
-        'apscheduler.schedulers.background.BackgroundScheduler.get_job')
-    @mock.patch(
-        'apscheduler.schedulers.background.BackgroundScheduler.add_job')
-    @mock.patch.object(db, 'failed_task_get_all')
-    def test_failed_job_with_job_already_scheduled(self, mock_failed_get_all,
-                                                   mock_add_job,
-                                                   mock_get_job):
-        # configure to return entry with job id
-        failed_jobs = fake_failed_jobs.copy()
-        failed_jobs[0][FailedTask.job_id.name] = uuidutils.generate_uuid()
-        mock_failed_get_all.return_value = failed_jobs
-        # configure to have job in scheduler
-        mock_get_job.return_value = failed_jobs
+        # entry get deleted without retry
+        self.assertEqual(mock_collect_telemetry.call_count, 0)
+        self.assertEqual(mock_failed_task_delete.call_count, 1)
+        self.assertEqual([], failed_job.queue)
+
+    @mock.patch.object(db, 'failed_task_delete')
+    @mock.patch('delfin.task_manager.rpcapi.TaskAPI.collect_telemetry')
+    def test_failed_job_scheduling_with_no_task(self, mock_collect_telemetry,
+                                                mock_failed_task_delete):
+        db.task_get.side_effect = exception.TaskNotFound('fake_task_id')
 
         failed_job = FailedTelemetryJob(context.get_admin_context())
-        # call failed job scheduling
         failed_job()
 
-        # the job will not be scheduled
-        self.assertEqual(mock_add_job.call_count, 0)
+        # entry get deleted as the parent task does not exist
+        self.assertEqual(mock_collect_telemetry.call_count, 0)
+        self.assertEqual(mock_failed_task_delete.call_count, 1)
 
-    @mock.patch(
-        'apscheduler.schedulers.background.BackgroundScheduler.remove_job')
     @mock.patch.object(db, 'failed_task_delete')
-    @mock.patch.object(db, 'failed_task_get_all')
-    def test_failed_job_scheduling_with_no_task(self, mock_failed_get_all,
-                                                mock_failed_task_delete,
-                                                mock_remove_job):
-        # configure to return entry with max retry count
-        failed_jobs = fake_failed_jobs.copy()
-        failed_jobs[0][FailedTask.job_id.name] = uuidutils.generate_uuid()
-        mock_failed_get_all.return_value = failed_jobs
+    @mock.patch('delfin.task_manager.rpcapi.TaskAPI.collect_telemetry')
+    def test_failed_job_not_owned(self, mock_collect_telemetry,
+                                  mock_failed_task_delete):
+        scheduler_manager = schedule_manager.SchedulerManager()
+        self.addCleanup(setattr, scheduler_manager, 'partitioner', None)
+        scheduler_manager.partitioner = mock.Mock()
+        scheduler_manager.partitioner.belongs_to_self.return_value = False
 
         failed_job = FailedTelemetryJob(context.get_admin_context())
-        # call failed job scheduling
         failed_job()
 
-        # entry get deleted and job get removed
-        self.assertEqual(mock_failed_task_delete.call_count, 2)
-        self.assertEqual(mock_remove_job.call_count, 0)
+        # the failed task is left to the owner of its parent task
+        scheduler_manager.partitioner.belongs_to_self.assert_called_once_with(
+            self.failed_task[FailedTask.task_id.name])
+        self.assertEqual(mock_collect_telemetry.call_count, 0)
+        self.assertEqual(mock_failed_task_delete.call_count, 0)
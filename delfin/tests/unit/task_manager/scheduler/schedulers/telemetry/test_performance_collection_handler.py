@@ -22,6 +22,7 @@ from delfin import exception
 from delfin import test
 from delfin.common import constants
 from delfin.common.constants import TelemetryTaskStatus
+from delfin.db.sqlalchemy.models import FailedTask
 from delfin.db.sqlalchemy.models import Task
 from delfin.task_manager.scheduler.schedulers.telemetry. \
     performance_collection_handler import \
@@ -56,10 +57,12 @@ class TestPerformanceCollectionHandler(test.TestCase):
 
     @mock.patch.object(db, 'task_get',
                        mock.Mock(return_value=fake_telemetry_job))
+    @mock.patch('delfin.db.task_collected_end_time_advance')
     @mock.patch('delfin.db.task_update')
     @mock.patch('delfin.task_manager.rpcapi.TaskAPI.collect_telemetry')
     def test_performance_collection_success(self, mock_collect_telemetry,
-                                            mock_task_update):
+                                            mock_task_update,
+                                            mock_advance):
         mock_collect_telemetry.return_value = TelemetryTaskStatus. \
             TASK_EXEC_STATUS_SUCCESS
         ctx = context.get_admin_context()
@@ -70,13 +73,20 @@ class TestPerformanceCollectionHandler(test.TestCase):
 
         self.assertEqual(mock_collect_telemetry.call_count, 1)
         self.assertEqual(mock_task_update.call_count, 1)
+        # the watermark is moved to the end of the collected window
+        start_time, end_time = mock_collect_telemetry.call_args[0][4:6]
+        self.assertEqual(10 * 1000, end_time - start_time)
+        mock_advance.assert_called_once_with(ctx, fake_task_id, end_time)
 
     @mock.patch.object(db, 'task_get',
                        mock.Mock(return_value=fake_telemetry_job))
+    @mock.patch.object(db, 'failed_task_get_all', mock.Mock(return_value=[]))
+    @mock.patch('delfin.db.task_update')
     @mock.patch('delfin.db.failed_task_create')
     @mock.patch('delfin.task_manager.rpcapi.TaskAPI.collect_telemetry')
     def test_performance_collection_failure(self, mock_collect_telemetry,
-                                            mock_failed_task_create):
+                                            mock_failed_task_create,
+                                            mock_task_update):
         mock_collect_telemetry.return_value = TelemetryTaskStatus. \
             TASK_EXEC_STATUS_FAILURE
         ctx = context.get_admin_context()
@@ -85,8 +95,17 @@ class TestPerformanceCollectionHandler(test.TestCase):
         # call performance collection handler
         perf_collection_handler()
 
-        # Verify that failed task create is called if collect telemetry fails
+        # Verify that the watermark is kept if collect telemetry fails, and
+        # the failed range is queued for retry
+        mock_task_update.assert_called_once_with(
+            ctx, fake_task_id, {'last_run_time': mock.ANY})
+        start_time, end_time = mock_collect_telemetry.call_args[0][4:6]
         self.assertEqual(mock_failed_task_create.call_count, 1)
+        failed_task = mock_failed_task_create.call_args[0][1]
+        self.assertEqual(fake_task_id, failed_task[FailedTask.task_id.name])
+        self.assertEqual(start_time, failed_task[FailedTask.start_time.name])
+        self.assertEqual(end_time, failed_task[FailedTask.end_time.name])
+        self.assertEqual(0, failed_task[FailedTask.retry_count.name])
 
     @mock.patch.object(db, 'task_get',
                        mock.Mock(return_value=fake_deleted_telemetry_job))
@@ -120,3 +139,97 @@ class TestPerformanceCollectionHandler(test.TestCase):
 
         # Verify that collect telemetry for deleted storage
         self.assertEqual(mock_collect_telemetry.call_count, 0)
+
+    @mock.patch.object(db, 'task_get',
+                       mock.Mock(return_value=fake_telemetry_job))
+    @mock.patch('delfin.db.failed_task_create')
+    @mock.patch('delfin.db.task_collected_end_time_advance')
+    @mock.patch('delfin.db.task_update')
+    @mock.patch('delfin.task_manager.rpcapi.TaskAPI.collect_telemetry_async')
+    def test_performance_collection_async(self, mock_collect_telemetry_async,
+                                          mock_task_update, mock_advance,
+                                          mock_failed_task_create):
+        self.override_config('async_collection', True, group='telemetry')
+        ctx = context.get_admin_context()
+        perf_collection_handler = PerformanceCollectionHandler.get_instance(
+            ctx, fake_task_id)
+        # call performance collection handler
+        perf_collection_handler()
+
+        self.assertEqual(mock_collect_telemetry_async.call_count, 1)
+        args = mock_collect_telemetry_async.call_args[0]
+        self.assertEqual(PerformanceCollectionHandler.__module__ + '.' +
+                         PerformanceCollectionHandler.__name__, args[6])
+        self.assertEqual(fake_task_id, args[7])
+        self.assertEqual(mock_task_update.call_count, 1)
+        self.assertEqual(mock_failed_task_create.call_count, 0)
+        # The watermark is moved when the result arrives
+        self.assertEqual(mock_advance.call_count, 0)
+
+        # The next window starts at the end of the one still in flight
+        self.override_config('max_backfill_duration', 10 ** 10,
+                             group='telemetry')
+        perf_collection_handler()
+        next_args = mock_collect_telemetry_async.call_args[0]
+        self.assertEqual(args[5], next_args[4])
+
+    @mock.patch.object(db, 'failed_task_get_all', mock.Mock(return_value=[]))
+    @mock.patch('delfin.db.failed_task_create')
+    @mock.patch('delfin.db.task_collected_end_time_advance')
+    def test_handle_result(self, mock_advance, mock_failed_task_create):
+        ctx = context.get_admin_context()
+        PerformanceCollectionHandler.handle_result(
+            ctx, fake_task_id, fake_storage_id,
+            TelemetryTaskStatus.TASK_EXEC_STATUS_FAILURE, 1000, 2000)
+        self.assertEqual(mock_advance.call_count, 0)
+        self.assertEqual(mock_failed_task_create.call_count, 1)
+
+        PerformanceCollectionHandler.handle_result(
+            ctx, fake_task_id, fake_storage_id,
+            TelemetryTaskStatus.TASK_EXEC_STATUS_SUCCESS, 1000, 2000)
+        mock_advance.assert_called_once_with(ctx, fake_task_id, 2000)
+
+    @mock.patch.object(db, 'failed_task_get_all', mock.Mock(return_value=[]))
+    @mock.patch('delfin.db.failed_task_create')
+    @mock.patch('delfin.db.task_collected_end_time_advance')
+    def test_handle_result_partial(self, mock_advance,
+                                   mock_failed_task_create):
+        ctx = context.get_admin_context()
+        # the windows before 1500 were dispatched before a failure
+        PerformanceCollectionHandler.handle_result(
+            ctx, fake_task_id, fake_storage_id, 1500, 1000, 2000)
+
+        mock_advance.assert_called_once_with(ctx, fake_task_id, 1500)
+        # only the rest of the range is retried
+        failed_task = mock_failed_task_create.call_args[0][1]
+        self.assertEqual(1500, failed_task[FailedTask.start_time.name])
+        self.assertEqual(2000, failed_task[FailedTask.end_time.name])
+
+    @mock.patch('delfin.db.task_collected_end_time_advance', mock.Mock())
+    @mock.patch('delfin.db.task_update')
+    @mock.patch('delfin.task_manager.rpcapi.TaskAPI.collect_telemetry')
+    def test_performance_collection_from_watermark(self,
+                                                   mock_collect_telemetry,
+                                                   mock_task_update):
+        mock_collect_telemetry.return_value = TelemetryTaskStatus. \
+            TASK_EXEC_STATUS_SUCCESS
+        ctx = context.get_admin_context()
+        perf_collection_handler = PerformanceCollectionHandler(
+            ctx, fake_task_id, fake_storage_id, {}, 10)
+        task = dict(fake_telemetry_job)
+        task['collected_end_time'] = 1000
+        self.mock_object(db, 'task_get', mock.Mock(return_value=task))
+
+        # the metrics missed since the watermark are collected
+        self.override_config('max_backfill_duration', 10 ** 10,
+                             group='telemetry')
+        perf_collection_handler()
+        start_time, end_time = mock_collect_telemetry.call_args[0][4:6]
+        self.assertEqual(1000, start_time)
+
+        # a gap longer than the maximum backfill duration is skipped
+        self.override_config('max_backfill_duration', 3600,
+                             group='telemetry')
+        perf_collection_handler()
+        start_time, end_time = mock_collect_telemetry.call_args[0][4:6]
+        self.assertEqual(3600 * 1000, end_time - start_time)
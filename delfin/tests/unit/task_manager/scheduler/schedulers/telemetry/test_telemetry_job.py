@@ -21,6 +21,8 @@ from delfin import db
 from delfin import test
 from delfin.common import constants
 from delfin.db.sqlalchemy.models import Task
+from delfin.task_manager.scheduler import schedule_manager
+from delfin.task_manager.scheduler.schedulers.telemetry import telemetry_job
 from delfin.task_manager.scheduler.schedulers.telemetry.telemetry_job import \
     TelemetryJob
 
@@ -117,3 +119,181 @@ class TestTelemetryJob(test.TestCase):
         # call telemetry job scheduling
         telemetry_job()
         self.assertEqual(mock_log_error.call_count, 1)
+
+    @mock.patch.object(db, 'task_get',
+                       mock.Mock(return_value=fake_telemetry_job))
+    @mock.patch.object(db, 'task_update')
+    @mock.patch.object(db, 'task_get_all')
+    @mock.patch(
+        'apscheduler.schedulers.background.BackgroundScheduler.remove_job')
+    @mock.patch(
+        'apscheduler.schedulers.background.BackgroundScheduler.get_job')
+    @mock.patch(
+        'apscheduler.schedulers.background.BackgroundScheduler.add_job')
+    def test_telemetry_job_partitioned(self, mock_add_job, mock_get_job,
+                                       mock_remove_job, mock_task_get_all,
+                                       mock_task_update):
+        tasks = [dict(fake_telemetry_job, id=1),
+                 dict(fake_telemetry_job, id=2)]
+        mock_task_get_all.side_effect = \
+            lambda ctx, filters=None: [] if filters.get('deleted') else tasks
+        owned = {1}
+        scheduler_manager = schedule_manager.SchedulerManager()
+        self.addCleanup(setattr, scheduler_manager, 'partitioner', None)
+        scheduler_manager.partitioner = mock.Mock()
+        scheduler_manager.partitioner.belongs_to_self.side_effect = \
+            lambda task_id: task_id in owned
+        scheduler_manager.partitioner.get_members.return_value = \
+            frozenset(['node-1'])
+
+        telemetry_job = TelemetryJob(context.get_admin_context())
+        # the last run time of tasks is not reset in partitioned scheduling
+        self.assertEqual(mock_task_update.call_count, 0)
+        telemetry_job()
+        self.assertEqual(mock_add_job.call_count, 1)
+        self.assertEqual([1], list(telemetry_job.task_jobs))
+
+        # the scheduled task is kept on the next cycle
+        self.override_config('task_reconcile_interval', 0,
+                             group='telemetry')
+        telemetry_job()
+        self.assertEqual(mock_add_job.call_count, 1)
+
+        # the partition changes after a task node joined
+        self.override_config('task_reconcile_interval', 1800,
+                             group='telemetry')
+        owned = {2}
+        scheduler_manager.partitioner.get_members.return_value = \
+            frozenset(['node-1', 'node-2'])
+        telemetry_job()
+        self.assertEqual(mock_add_job.call_count, 2)
+        self.assertEqual(mock_remove_job.call_count, 1)
+        self.assertEqual([2], list(telemetry_job.task_jobs))
+
+    @mock.patch.object(db, 'task_get',
+                       mock.Mock(return_value=fake_telemetry_job))
+    @mock.patch.object(db, 'task_update', mock.Mock())
+    @mock.patch.object(db, 'task_get_all')
+    @mock.patch(
+        'apscheduler.schedulers.background.BackgroundScheduler.remove_job')
+    @mock.patch(
+        'apscheduler.schedulers.background.BackgroundScheduler.get_job')
+    @mock.patch(
+        'apscheduler.schedulers.background.BackgroundScheduler.add_job')
+    def test_telemetry_job_interval_updated(self, mock_add_job, mock_get_job,
+                                            mock_remove_job,
+                                            mock_task_get_all):
+        task = dict(fake_telemetry_job)
+        mock_task_get_all.side_effect = \
+            lambda ctx, filters=None: \
+            [task] if filters == {'deleted': False} or \
+            filters == {'last_run_time': None} and \
+            not mock_add_job.call_count else []
+
+        self.override_config('task_reconcile_interval', 0,
+                             group='telemetry')
+        telemetry_job = TelemetryJob(context.get_admin_context())
+        telemetry_job()
+        self.assertEqual(mock_add_job.call_count, 1)
+        self.assertEqual(10, mock_add_job.call_args[1]['seconds'])
+
+        # the task is kept while its interval is the same
+        telemetry_job()
+        self.assertEqual(mock_add_job.call_count, 1)
+
+        # the task is scheduled again after its interval was updated
+        task[Task.interval.name] = 60
+        telemetry_job()
+        self.assertEqual(mock_remove_job.call_count, 1)
+        self.assertEqual(mock_add_job.call_count, 2)
+        self.assertEqual(60, mock_add_job.call_args[1]['seconds'])
+
+    @mock.patch.object(db, 'task_get_all')
+    @mock.patch(
+        'apscheduler.schedulers.background.BackgroundScheduler.add_job')
+    def test_telemetry_job_reconcile_interval(self, mock_add_job,
+                                              mock_task_get_all):
+        telemetry_job = TelemetryJob(context.get_admin_context())
+        mock_task_get_all.reset_mock()
+        mock_task_get_all.return_value = []
+        telemetry_job()
+        self.assertEqual(2, mock_task_get_all.call_count)
+
+        # the tasks are not read again before the reconcile interval
+        telemetry_job()
+        self.assertEqual(2, mock_task_get_all.call_count)
+
+        telemetry_job.last_reconcile_time -= 1800
+        telemetry_job()
+        self.assertEqual(4, mock_task_get_all.call_count)
+
+    @mock.patch.object(db, 'task_delete')
+    @mock.patch.object(db, 'task_update', mock.Mock())
+    @mock.patch.object(db, 'task_get_all', mock.Mock(return_value=[]))
+    @mock.patch.object(db, 'task_get')
+    @mock.patch(
+        'apscheduler.schedulers.background.BackgroundScheduler.remove_job')
+    @mock.patch(
+        'apscheduler.schedulers.background.BackgroundScheduler.get_job')
+    @mock.patch(
+        'apscheduler.schedulers.background.BackgroundScheduler.add_job')
+    def test_telemetry_job_schedule(self, mock_add_job, mock_get_job,
+                                    mock_remove_job, mock_task_get,
+                                    mock_task_delete):
+        task = dict(fake_telemetry_job, deleted=False)
+        mock_task_get.return_value = task
+        telemetry_job = TelemetryJob(context.get_admin_context())
+        telemetry_job.schedule(task['id'])
+        self.assertEqual(mock_add_job.call_count, 1)
+        self.assertEqual([task['id']], list(telemetry_job.task_jobs))
+
+        # the event of a task already scheduled is ignored
+        telemetry_job.schedule(task['id'])
+        self.assertEqual(mock_add_job.call_count, 1)
+
+        # the task is scheduled again after its interval was updated
+        task[Task.interval.name] = 60
+        telemetry_job.schedule(task['id'])
+        self.assertEqual(mock_remove_job.call_count, 1)
+        self.assertEqual(mock_add_job.call_count, 2)
+        self.assertEqual(60, mock_add_job.call_args[1]['seconds'])
+
+        # the jobs of a storage deleted are removed
+        telemetry_job.unschedule_storage('other_storage')
+        self.assertEqual(mock_remove_job.call_count, 1)
+        telemetry_job.unschedule_storage(task['storage_id'])
+        self.assertEqual(mock_remove_job.call_count, 2)
+        mock_task_delete.assert_called_once_with(mock.ANY, task['id'])
+        self.assertEqual({}, telemetry_job.task_jobs)
+
+    def test_get_next_run_time(self):
+        storage_id = fake_telemetry_job[Task.storage_id.name]
+        self.assertEqual(1000 + 900,
+                         telemetry_job.get_next_run_time(storage_id, 900,
+                                                         1000))
+
+        self.override_config('phase_spread_collection', True,
+                             group='telemetry')
+        next_run_time = telemetry_job.get_next_run_time(storage_id, 900,
+                                                        1000)
+        self.assertTrue(1000 < next_run_time <= 1900)
+        # the phase of a storage is the same whenever it is scheduled
+        for current_time in (next_run_time - 1, next_run_time + 10,
+                             next_run_time + 5000):
+            self.assertEqual(
+                next_run_time % 900,
+                telemetry_job.get_next_run_time(storage_id, 900,
+                                                current_time) % 900)
+
+        # storages are spread across the interval
+        offsets = [telemetry_job.get_next_run_time(
+            uuidutils.generate_uuid(), 900, 1000) for _ in range(100)]
+        self.assertGreater(len(set(offsets)), 50)
+
+    def test_get_next_run_time_with_jitter(self):
+        self.override_config('collection_start_jitter', 10000,
+                             group='telemetry')
+        for _ in range(20):
+            next_run_time = telemetry_job.get_next_run_time('storage', 900,
+                                                            1000)
+            self.assertTrue(1900 <= next_run_time <= 2800)
@@ -12,6 +12,8 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+from unittest import mock
+
 from apscheduler.schedulers.background import BackgroundScheduler
 
 from delfin import test
@@ -28,3 +30,32 @@ class TestScheduler(test.TestCase):
         self.assertIsInstance(second_instance, BackgroundScheduler)
 
         self.assertEqual(first_instance, second_instance)
+
+    def test_schedule_task(self):
+        manager = schedule_manager.SchedulerManager()
+        telemetry_job = mock.Mock(spec=schedule_manager.TelemetryJob)
+        failed_job = mock.Mock(spec=schedule_manager.FailedTelemetryJob)
+
+        # events are ignored when the boot jobs are not scheduled here
+        manager.schedule_task('task_id')
+        manager.unschedule_storage('storage_id')
+
+        self.mock_object(manager, 'boot_jobs',
+                         {'job_1': telemetry_job, 'job_2': failed_job})
+        manager.schedule_task('task_id')
+        telemetry_job.schedule.assert_called_once_with('task_id')
+        manager.unschedule_storage('storage_id')
+        telemetry_job.unschedule_storage.assert_called_once_with(
+            'storage_id')
+        manager.schedule_failed_task('failed_task_id', 'task_id')
+        failed_job.queue_failed_task.assert_called_once_with(
+            'failed_task_id')
+
+        # tasks of other partitions are left to their owner
+        self.addCleanup(setattr, manager, 'partitioner', None)
+        manager.partitioner = mock.Mock()
+        manager.partitioner.belongs_to_self.return_value = False
+        manager.schedule_task('task_id')
+        manager.schedule_failed_task('failed_task_id', 'task_id')
+        self.assertEqual(1, telemetry_job.schedule.call_count)
+        self.assertEqual(1, failed_job.queue_failed_task.call_count)
@@ -0,0 +1,95 @@
+# Copyright 2021 The SODA Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from unittest import mock
+
+import eventlet
+
+from delfin import context
+from delfin import test
+from delfin.task_manager.tasks import orchestrator
+
+fake_storage_id = '12c2d52f-01bc-41f5-b73f-7abf6f38a2a6'
+
+
+class FakeSyncTask(object):
+    running = 0
+    max_running = 0
+    synced = []
+
+    def __init__(self, context, storage_id):
+        self.context = context
+        self.storage_id = storage_id
+
+    def sync(self):
+        cls = FakeSyncTask
+        cls.running += 1
+        cls.max_running = max(cls.max_running, cls.running)
+        eventlet.sleep(0.01)
+        cls.running -= 1
+        cls.synced.append(self.storage_id)
+
+
+class FakeFailedSyncTask(FakeSyncTask):
+
+    def sync(self):
+        raise Exception('fake sync error')
+
+
+class TestStorageSyncOrchestrator(test.TestCase):
+
+    def setUp(self):
+        super(TestStorageSyncOrchestrator, self).setUp()
+        FakeSyncTask.running = 0
+        FakeSyncTask.max_running = 0
+        FakeSyncTask.synced = []
+
+    def test_sync_concurrency(self):
+        task = __name__ + '.FakeSyncTask'
+        sync_orchestrator = orchestrator.StorageSyncOrchestrator(
+            context.get_admin_context(), fake_storage_id, concurrency=2)
+        sync_orchestrator.sync([task] * 5)
+        self.assertEqual([fake_storage_id] * 5, FakeSyncTask.synced)
+        self.assertEqual(2, FakeSyncTask.max_running)
+
+    def test_sync_concurrency_per_storage(self):
+        task = __name__ + '.FakeSyncTask'
+        pool = eventlet.GreenPool()
+        # Two syncs of the same storage share its limit
+        for _ in range(2):
+            sync_orchestrator = orchestrator.StorageSyncOrchestrator(
+                context.get_admin_context(), fake_storage_id, concurrency=2)
+            pool.spawn_n(sync_orchestrator.sync, [task] * 3)
+        pool.waitall()
+        self.assertEqual([fake_storage_id] * 6, FakeSyncTask.synced)
+        self.assertEqual(2, FakeSyncTask.max_running)
+
+    def test_sync_with_failed_task(self):
+        self.flags(resource_sync_concurrency=1)
+        tasks = [__name__ + '.FakeFailedSyncTask', __name__ + '.FakeSyncTask']
+        sync_orchestrator = orchestrator.StorageSyncOrchestrator(
+            context.get_admin_context(), fake_storage_id)
+        self.assertEqual(1, sync_orchestrator.concurrency)
+        sync_orchestrator.sync(tasks)
+        self.assertEqual([fake_storage_id], FakeSyncTask.synced)
+
+    @mock.patch('delfin.drivers.api.API.end_sync_generation')
+    @mock.patch('delfin.drivers.api.API.start_sync_generation')
+    def test_sync_generation(self, start_generation, end_generation):
+        ctxt = context.get_admin_context()
+        sync_orchestrator = orchestrator.StorageSyncOrchestrator(
+            ctxt, fake_storage_id)
+        sync_orchestrator.sync([__name__ + '.FakeSyncTask'])
+        start_generation.assert_called_once_with(ctxt, fake_storage_id)
+        end_generation.assert_called_once_with(ctxt, fake_storage_id)
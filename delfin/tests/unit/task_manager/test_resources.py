@@ -13,13 +13,18 @@
 # limitations under the License.
 
 
+import datetime
 from unittest import mock
+
+from oslo_utils import timeutils
+
 from delfin.common import config # noqa
+from delfin.db.sqlalchemy import models
 from delfin.drivers import fake_storage
 from delfin.task_manager.tasks import resources
 from delfin.task_manager.tasks.resources import StorageDeviceTask
 
-from delfin import test, context, coordination
+from delfin import test, context
 
 storage = {
     'id': '12c2d52f-01bc-41f5-b73f-7abf6f38a2a6',
@@ -240,6 +245,283 @@ masking_views_list = [{
 ]
 
 
+class TestStorageResourceTask(test.TestCase):
+    def test_classify_resources(self):
+        task = resources.StorageResourceTask(
+            context, 'c5c91c98-91aa-40e6-85ac-37a1d3b32bda')
+        db_vols = [
+            {'id': 'id_1', 'native_volume_id': 'vol_1', 'name': 'vol_1'},
+            {'id': 'id_2', 'native_volume_id': 'vol_2', 'name': 'vol_2'},
+            {'id': 'id_3', 'native_volume_id': 'vol_3', 'name': 'vol_3'},
+        ]
+        storage_vols = [
+            {'native_volume_id': 'vol_1', 'name': 'vol_1'},
+            {'native_volume_id': 'vol_2', 'name': 'vol_2_renamed'},
+            {'native_volume_id': 'vol_4', 'name': 'vol_4'},
+        ]
+
+        add_list, update_list, delete_id_list = task._classify_resources(
+            storage_vols, db_vols, 'native_volume_id')
+
+        self.assertEqual([storage_vols[2]], add_list)
+        self.assertEqual([{'id': 'id_2', 'native_volume_id': 'vol_2',
+                           'name': 'vol_2_renamed'}], update_list)
+        self.assertEqual(['id_3'], delete_id_list)
+
+    def test_classify_resources_unchanged(self):
+        task = resources.StorageResourceTask(
+            context, 'c5c91c98-91aa-40e6-85ac-37a1d3b32bda')
+        storage_vols = [dict(vol) for vol in vols_list]
+
+        add_list, update_list, delete_id_list = task._classify_resources(
+            storage_vols, vols_list, 'native_volume_id')
+
+        self.assertEqual([], add_list)
+        self.assertEqual([], update_list)
+        self.assertEqual([], delete_id_list)
+
+    def test_classify_resources_extra_driver_key(self):
+        task = resources.StorageResourceTask(
+            context, 'c5c91c98-91aa-40e6-85ac-37a1d3b32bda')
+        db_disks = [models.Disk(id='id_1', native_disk_id='disk_1',
+                                name='disk_1')]
+        # Keys which are not columns of the model are not saved
+        storage_disks = [{'native_disk_id': 'disk_1', 'name': 'disk_1',
+                          'native_diskgroup_id': 'group_1'}]
+
+        add_list, update_list, delete_id_list = task._classify_resources(
+            storage_disks, db_disks, 'native_disk_id')
+
+        self.assertEqual([], add_list)
+        self.assertEqual([], update_list)
+        self.assertEqual([], delete_id_list)
+
+    def test_classify_resources_keeps_oldest_duplicate(self):
+        task = resources.StorageResourceTask(
+            context, 'c5c91c98-91aa-40e6-85ac-37a1d3b32bda')
+        db_vols = [
+            {'id': 'id_new', 'native_volume_id': 'vol_1', 'name': 'vol_1',
+             'created_at': datetime.datetime(2021, 6, 2)},
+            {'id': 'id_old', 'native_volume_id': 'vol_1', 'name': 'vol_1',
+             'created_at': datetime.datetime(2021, 6, 1)},
+        ]
+        storage_vols = [{'native_volume_id': 'vol_1', 'name': 'vol_1'}]
+
+        add_list, update_list, delete_id_list = task._classify_resources(
+            storage_vols, db_vols, 'native_volume_id')
+
+        self.assertEqual([], add_list)
+        self.assertEqual([], update_list)
+        self.assertEqual(['id_new'], delete_id_list)
+        self.assertEqual('id_old', storage_vols[0]['id'])
+
+    @staticmethod
+    def _fake_get_all(db_vols):
+        def _get_all(ctxt, marker, limit, sort_keys, sort_dirs, filters):
+            key = sort_keys[0]
+            rows = [vol for vol in db_vols
+                    if not marker or vol[key] > marker[key]]
+            return rows[:limit]
+        return _get_all
+
+    @staticmethod
+    def _fake_iter_volumes(storage_vols, page_size=2):
+        def _iter_volumes(ctxt, storage_id, chunk_size):
+            for start in range(0, len(storage_vols), page_size):
+                yield storage_vols[start:start + page_size]
+        return _iter_volumes
+
+    def test_sync_chunked(self):
+        self.flags(resource_sync_chunk_size=2)
+        task = resources.StorageResourceTask(
+            context, 'c5c91c98-91aa-40e6-85ac-37a1d3b32bda')
+        db_vols = [
+            {'id': 'id_%s' % i, 'native_volume_id': 'vol_%s' % i,
+             'name': 'vol_%s' % i, 'created_at': None}
+            for i in (1, 2, 3, 5, 7)]
+        storage_vols = [
+            {'native_volume_id': 'vol_%s' % i, 'name': 'vol_%s' % i}
+            for i in (1, 4, 5, 6, 7)]
+        storage_vols[2]['name'] = 'vol_5_renamed'
+        create, update, delete = mock.Mock(), mock.Mock(), mock.Mock()
+
+        self.assertTrue(task._sync_chunked(
+            self._fake_iter_volumes(storage_vols), 'native_volume_id',
+            self._fake_get_all(db_vols), create, update, delete))
+
+        created = [vol['native_volume_id']
+                   for call in create.call_args_list for vol in call[0][1]]
+        self.assertEqual(['vol_4', 'vol_6'], created)
+        update.assert_called_once_with(
+            context, [{'id': 'id_5', 'native_volume_id': 'vol_5',
+                       'name': 'vol_5_renamed'}])
+        deleted = [vol_id for call in delete.call_args_list
+                   for vol_id in call[0][1]]
+        self.assertEqual(['id_2', 'id_3'], deleted)
+
+    def test_sync_chunked_not_sorted(self):
+        task = resources.StorageResourceTask(
+            context, 'c5c91c98-91aa-40e6-85ac-37a1d3b32bda')
+        storage_vols = [{'native_volume_id': 'vol_%s' % i} for i in (3, 4, 1)]
+        args = (self._fake_iter_volumes(storage_vols), 'native_volume_id',
+                self._fake_get_all([]), mock.Mock(), mock.Mock(),
+                mock.Mock())
+
+        # Chunked sync is disabled by default
+        self.assertFalse(task._sync_chunked(*args))
+        self.flags(resource_sync_chunk_size=2)
+        self.assertFalse(task._sync_chunked(*args))
+
+    def test_sync_chunked_db_not_sorted(self):
+        self.flags(resource_sync_chunk_size=2)
+        task = resources.StorageResourceTask(
+            context, 'c5c91c98-91aa-40e6-85ac-37a1d3b32bda')
+        # The database orders vol_1 after vol_3, e.g. another collation
+        db_get_all = mock.Mock(side_effect=[
+            [{'id': 'id_%s' % i, 'native_volume_id': 'vol_%s' % i,
+              'name': 'vol_%s' % i, 'created_at': None} for i in (0, 3)],
+            [{'id': 'id_1', 'native_volume_id': 'vol_1', 'name': 'vol_1',
+              'created_at': None}]])
+        storage_vols = [
+            {'native_volume_id': 'vol_1', 'name': 'vol_1'},
+            {'native_volume_id': 'vol_3', 'name': 'vol_3_renamed'}]
+        update, delete = mock.Mock(), mock.Mock()
+
+        self.assertFalse(task._sync_chunked(
+            self._fake_iter_volumes(storage_vols), 'native_volume_id',
+            db_get_all, mock.Mock(), update, delete))
+
+        # Nothing was deleted before the mismatch was found
+        self.assertFalse(delete.called)
+
+    def test_sync_chunked_writes_updates_per_chunk(self):
+        self.flags(resource_sync_chunk_size=2)
+        task = resources.StorageResourceTask(
+            context, 'c5c91c98-91aa-40e6-85ac-37a1d3b32bda')
+        db_vols = [
+            {'id': 'id_%s' % i, 'native_volume_id': 'vol_%s' % i,
+             'name': 'vol_%s' % i, 'created_at': None} for i in range(6)]
+        storage_vols = [
+            {'native_volume_id': 'vol_%s' % i, 'name': 'renamed_%s' % i}
+            for i in range(6)]
+        update = mock.Mock()
+        update_counts = []
+
+        def _iter_volumes(ctxt, storage_id, chunk_size):
+            for start in range(0, len(storage_vols), chunk_size):
+                update_counts.append(update.call_count)
+                yield storage_vols[start:start + chunk_size]
+
+        self.assertTrue(task._sync_chunked(
+            _iter_volumes, 'native_volume_id', self._fake_get_all(db_vols),
+            mock.Mock(), update, mock.Mock()))
+
+        # Updates are written while the next pages are read
+        self.assertEqual([0, 1, 2], update_counts)
+        self.assertEqual(3, update.call_count)
+
+    @mock.patch('delfin.db.sync_watermark_update')
+    @mock.patch('delfin.db.sync_watermark_get')
+    def test_sync_delta(self, mock_watermark_get, mock_watermark_update):
+        task = resources.StorageResourceTask(
+            context, 'c5c91c98-91aa-40e6-85ac-37a1d3b32bda')
+        mock_watermark_get.return_value = {
+            'watermark': '100',
+            'last_full_sync_at': timeutils.utcnow()}
+        db_vols = [
+            {'id': 'id_1', 'native_volume_id': 'vol_1', 'name': 'vol_1'},
+            {'id': 'id_2', 'native_volume_id': 'vol_2', 'name': 'vol_2'},
+        ]
+        list_changes = mock.Mock(return_value={
+            'watermark': '200',
+            'changed': [{'native_volume_id': 'vol_1', 'name': 'renamed'},
+                        {'native_volume_id': 'vol_3', 'name': 'vol_3'}],
+            'deleted': ['vol_2']})
+        db_get_all = mock.Mock(return_value=db_vols)
+        create, update, delete = mock.Mock(), mock.Mock(), mock.Mock()
+        sync_all = mock.Mock()
+
+        task._sync_delta('volume', list_changes, 'native_volume_id',
+                         db_get_all, create, update, delete, sync_all)
+
+        list_changes.assert_called_once_with(context, task.storage_id, '100')
+        db_get_all.assert_called_once_with(
+            context, filters={'storage_id': task.storage_id,
+                              'native_volume_id': ['vol_1', 'vol_3',
+                                                   'vol_2']})
+        create.assert_called_once_with(
+            context, [{'native_volume_id': 'vol_3', 'name': 'vol_3'}])
+        update.assert_called_once_with(
+            context, [{'id': 'id_1', 'native_volume_id': 'vol_1',
+                       'name': 'renamed'}])
+        delete.assert_called_once_with(context, ['id_2'])
+        self.assertFalse(sync_all.called)
+        mock_watermark_update.assert_called_once_with(
+            context, task.storage_id, 'volume', {'watermark': '200'})
+
+    @mock.patch('delfin.db.sqlalchemy.api.BULK_CHUNK_SIZE', 2)
+    def test_apply_changes_lookup_in_chunks(self):
+        task = resources.StorageResourceTask(
+            context, 'c5c91c98-91aa-40e6-85ac-37a1d3b32bda')
+        changes = {
+            'changed': [{'native_volume_id': 'vol_%s' % i, 'name': 'vol'}
+                        for i in range(3)],
+            'deleted': ['vol_3', 'vol_4']}
+        db_get_all = mock.Mock(side_effect=[
+            [{'id': 'id_0', 'native_volume_id': 'vol_0', 'name': 'vol'}],
+            [{'id': 'id_3', 'native_volume_id': 'vol_3', 'name': 'vol_3'}],
+            []])
+        create, update, delete = mock.Mock(), mock.Mock(), mock.Mock()
+
+        task._apply_changes(changes, 'native_volume_id', db_get_all, create,
+                            update, delete)
+
+        # The native ids are looked up at most BULK_CHUNK_SIZE at a time
+        self.assertEqual(
+            [['vol_0', 'vol_1'], ['vol_2', 'vol_3'], ['vol_4']],
+            [call[1]['filters']['native_volume_id']
+             for call in db_get_all.call_args_list])
+        self.assertEqual(['vol_1', 'vol_2'],
+                         [vol['native_volume_id']
+                          for vol in create.call_args[0][1]])
+        self.assertFalse(update.called)
+        delete.assert_called_once_with(context, ['id_3'])
+
+    @mock.patch('delfin.db.sync_watermark_update')
+    @mock.patch('delfin.db.sync_watermark_get')
+    def test_sync_delta_full_sync(self, mock_watermark_get,
+                                  mock_watermark_update):
+        task = resources.StorageResourceTask(
+            context, 'c5c91c98-91aa-40e6-85ac-37a1d3b32bda')
+        list_changes = mock.Mock(return_value={'watermark': '100'})
+        sync_all = mock.Mock()
+        args = ('volume', list_changes, 'native_volume_id', mock.Mock(),
+                mock.Mock(), mock.Mock(), mock.Mock())
+
+        # No watermark yet
+        mock_watermark_get.return_value = None
+        task._sync_delta(*args, sync_all)
+        list_changes.assert_called_once_with(context, task.storage_id, None)
+        self.assertEqual(1, sync_all.call_count)
+        self.assertEqual({'watermark': '100', 'last_full_sync_at': mock.ANY},
+                         mock_watermark_update.call_args[0][3])
+
+        # Periodic full reconcile
+        mock_watermark_get.return_value = {
+            'watermark': '100',
+            'last_full_sync_at': timeutils.utcnow() - datetime.timedelta(
+                seconds=resources.CONF.resource_full_sync_interval)}
+        task._sync_delta(*args, sync_all)
+        self.assertEqual(2, sync_all.call_count)
+
+        # Driver does not report changes
+        list_changes.side_effect = NotImplementedError
+        mock_watermark_update.reset_mock()
+        task._sync_delta(*args, sync_all)
+        self.assertEqual(3, sync_all.call_count)
+        self.assertFalse(mock_watermark_update.called)
+
+
 class TestStorageDeviceTask(test.TestCase):
     def setUp(self):
         super(TestStorageDeviceTask, self).setUp()
@@ -248,21 +530,24 @@ class TestStorageDeviceTask(test.TestCase):
             context, "12c2d52f-01bc-41f5-b73f-7abf6f38a2a6")
         self.mock_object(self.task_manager, 'driver_api', self.driver_api)
 
-    @mock.patch.object(coordination.LOCK_COORDINATOR, 'get_lock')
+    @mock.patch('delfin.db.storage_sync_status_decrease')
     @mock.patch('delfin.drivers.api.API.get_storage')
     @mock.patch('delfin.db.storage_update')
     @mock.patch('delfin.db.storage_get')
     @mock.patch('delfin.db.storage_delete')
     @mock.patch('delfin.db.access_info_delete')
     @mock.patch('delfin.db.alert_source_delete')
-    def test_sync_successful(self, alert_source_delete, access_info_delete,
-                             mock_storage_delete, mock_storage_get,
-                             mock_storage_update, mock_get_storage, get_lock):
+    @mock.patch('delfin.alert_manager.rpcapi.AlertAPI'
+                '.remove_storage_in_cache')
+    def test_sync_successful(self, mock_remove_in_cache, alert_source_delete,
+                             access_info_delete, mock_storage_delete,
+                             mock_storage_get, mock_storage_update,
+                             mock_get_storage, set_synced):
         storage_obj = resources.StorageDeviceTask(
             context, 'c5c91c98-91aa-40e6-85ac-37a1d3b32bda')
 
         storage_obj.sync()
-        self.assertTrue(get_lock.called)
+        self.assertTrue(set_synced.called)
         self.assertTrue(mock_storage_get.called)
         self.assertTrue(mock_storage_delete.called)
         self.assertTrue(access_info_delete.called)
@@ -270,6 +555,9 @@ class TestStorageDeviceTask(test.TestCase):
         self.assertTrue(mock_storage_update.called)
         mock_get_storage.assert_called_with(
             context, 'c5c91c98-91aa-40e6-85ac-37a1d3b32bda')
+        # The alert managers drop the storage metadata they cached
+        mock_remove_in_cache.assert_called_with(
+            context, 'c5c91c98-91aa-40e6-85ac-37a1d3b32bda')
 
         fake_storage_obj = fake_storage.FakeStorageDriver()
         mock_get_storage.return_value = fake_storage_obj.get_storage(context)
@@ -289,7 +577,10 @@ class TestStorageDeviceTask(test.TestCase):
 
 
 class TestStoragePoolTask(test.TestCase):
-    @mock.patch.object(coordination.LOCK_COORDINATOR, 'get_lock')
+    @mock.patch('delfin.drivers.api.API.list_storage_pools_changes',
+                mock.Mock(side_effect=NotImplementedError))
+    @mock.patch('delfin.db.sync_watermark_get', mock.Mock(return_value=None))
+    @mock.patch('delfin.db.storage_sync_status_decrease')
     @mock.patch('delfin.drivers.api.API.list_storage_pools')
     @mock.patch('delfin.db.storage_pool_get_all')
     @mock.patch('delfin.db.storage_pools_delete')
@@ -297,14 +588,14 @@ class TestStoragePoolTask(test.TestCase):
     @mock.patch('delfin.db.storage_pools_create')
     def test_sync_successful(self, mock_pool_create, mock_pool_update,
                              mock_pool_del, mock_pool_get_all,
-                             mock_list_pools, get_lock):
+                             mock_list_pools, set_synced):
         pool_obj = resources.StoragePoolTask(
             context, 'c5c91c98-91aa-40e6-85ac-37a1d3b32bda')
         pool_obj.sync()
 
         self.assertTrue(mock_list_pools.called)
         self.assertTrue(mock_pool_get_all.called)
-        self.assertTrue(get_lock.called)
+        self.assertTrue(set_synced.called)
 
         # collect the pools from fake_storage
         fake_storage_obj = fake_storage.FakeStorageDriver()
@@ -317,7 +608,8 @@ class TestStoragePoolTask(test.TestCase):
         self.assertTrue(mock_pool_create.called)
 
         # update the new pool of DB
-        mock_list_pools.return_value = pools_list
+        mock_list_pools.return_value = \
+            [dict(pools_list[0], name='new_name')]
         mock_pool_get_all.return_value = pools_list
         pool_obj.sync()
         self.assertTrue(mock_pool_update.called)
@@ -337,7 +629,10 @@ class TestStoragePoolTask(test.TestCase):
 
 
 class TestStorageVolumeTask(test.TestCase):
-    @mock.patch.object(coordination.LOCK_COORDINATOR, 'get_lock')
+    @mock.patch('delfin.drivers.api.API.list_volumes_changes',
+                mock.Mock(side_effect=NotImplementedError))
+    @mock.patch('delfin.db.sync_watermark_get', mock.Mock(return_value=None))
+    @mock.patch('delfin.db.storage_sync_status_decrease')
     @mock.patch('delfin.drivers.api.API.list_volumes')
     @mock.patch('delfin.db.volume_get_all')
     @mock.patch('delfin.db.volumes_delete')
@@ -345,13 +640,13 @@ class TestStorageVolumeTask(test.TestCase):
     @mock.patch('delfin.db.volumes_create')
     def test_sync_successful(self, mock_vol_create, mock_vol_update,
                              mock_vol_del, mock_vol_get_all, mock_list_vols,
-                             get_lock):
+                             set_synced):
         vol_obj = resources.StorageVolumeTask(
             context, 'c5c91c98-91aa-40e6-85ac-37a1d3b32bda')
         vol_obj.sync()
         self.assertTrue(mock_list_vols.called)
         self.assertTrue(mock_vol_get_all.called)
-        self.assertTrue(get_lock.called)
+        self.assertTrue(set_synced.called)
 
         # collect the volumes from fake_storage
         fake_storage_obj = fake_storage.FakeStorageDriver()
@@ -363,7 +658,8 @@ class TestStorageVolumeTask(test.TestCase):
         self.assertTrue(mock_vol_create.called)
 
         # update the volumes to DB
-        mock_list_vols.return_value = vols_list
+        mock_list_vols.return_value = \
+            [dict(vols_list[0], name='new_name')]
         mock_vol_get_all.return_value = vols_list
         vol_obj.sync()
         self.assertTrue(mock_vol_update.called)
@@ -383,7 +679,7 @@ class TestStorageVolumeTask(test.TestCase):
 
 
 class TestStoragecontrollerTask(test.TestCase):
-    @mock.patch.object(coordination.LOCK_COORDINATOR, 'get_lock')
+    @mock.patch('delfin.db.storage_sync_status_decrease')
     @mock.patch('delfin.drivers.api.API.list_controllers')
     @mock.patch('delfin.db.controller_get_all')
     @mock.patch('delfin.db.controllers_delete')
@@ -392,14 +688,14 @@ class TestStoragecontrollerTask(test.TestCase):
     def test_sync_successful(self,
                              mock_controller_create, mock_controller_update,
                              mock_controller_del, mock_controller_get_all,
-                             mock_list_controllers, get_lock):
+                             mock_list_controllers, set_synced):
         controller_obj = resources.StorageControllerTask(
             context, 'c5c91c98-91aa-40e6-85ac-37a1d3b32bda')
         controller_obj.sync()
 
         self.assertTrue(mock_list_controllers.called)
         self.assertTrue(mock_controller_get_all.called)
-        self.assertTrue(get_lock.called)
+        self.assertTrue(set_synced.called)
 
         # collect the controllers from fake_storage
         fake_storage_obj = fake_storage.FakeStorageDriver()
@@ -412,7 +708,8 @@ class TestStoragecontrollerTask(test.TestCase):
         self.assertTrue(mock_controller_create.called)
 
         # update the new controller of DB
-        mock_list_controllers.return_value = controllers_list
+        mock_list_controllers.return_value = \
+            [dict(controllers_list[0], name='new_name')]
         mock_controller_get_all.return_value = controllers_list
         controller_obj.sync()
         self.assertTrue(mock_controller_update.called)
@@ -432,7 +729,10 @@ class TestStoragecontrollerTask(test.TestCase):
 
 
 class TestStoragePortTask(test.TestCase):
-    @mock.patch.object(coordination.LOCK_COORDINATOR, 'get_lock')
+    @mock.patch('delfin.drivers.api.API.list_ports_changes',
+                mock.Mock(side_effect=NotImplementedError))
+    @mock.patch('delfin.db.sync_watermark_get', mock.Mock(return_value=None))
+    @mock.patch('delfin.db.storage_sync_status_decrease')
     @mock.patch('delfin.drivers.api.API.list_ports')
     @mock.patch('delfin.db.port_get_all')
     @mock.patch('delfin.db.ports_delete')
@@ -440,13 +740,13 @@ class TestStoragePortTask(test.TestCase):
     @mock.patch('delfin.db.ports_create')
     def test_sync_successful(self, mock_port_create, mock_port_update,
                              mock_port_del, mock_port_get_all, mock_list_ports,
-                             get_lock):
+                             set_synced):
         port_obj = resources.StoragePortTask(
             context, 'c5c91c98-91aa-40e6-85ac-37a1d3b32bda')
         port_obj.sync()
         self.assertTrue(mock_list_ports.called)
         self.assertTrue(mock_port_get_all.called)
-        self.assertTrue(get_lock.called)
+        self.assertTrue(set_synced.called)
 
         # collect the ports from fake_storage
         fake_storage_obj = fake_storage.FakeStorageDriver()
@@ -458,7 +758,8 @@ class TestStoragePortTask(test.TestCase):
         self.assertTrue(mock_port_create.called)
 
         # update the ports to DB
-        mock_list_ports.return_value = ports_list
+        mock_list_ports.return_value = \
+            [dict(ports_list[0], name='new_name')]
         mock_port_get_all.return_value = ports_list
         port_obj.sync()
         self.assertTrue(mock_port_update.called)
@@ -478,7 +779,10 @@ class TestStoragePortTask(test.TestCase):
 
 
 class TestStorageDiskTask(test.TestCase):
-    @mock.patch.object(coordination.LOCK_COORDINATOR, 'get_lock')
+    @mock.patch('delfin.drivers.api.API.list_disks_changes',
+                mock.Mock(side_effect=NotImplementedError))
+    @mock.patch('delfin.db.sync_watermark_get', mock.Mock(return_value=None))
+    @mock.patch('delfin.db.storage_sync_status_decrease')
     @mock.patch('delfin.drivers.api.API.list_disks')
     @mock.patch('delfin.db.disk_get_all')
     @mock.patch('delfin.db.disks_delete')
@@ -486,13 +790,13 @@ class TestStorageDiskTask(test.TestCase):
     @mock.patch('delfin.db.disks_create')
     def test_sync_successful(self, mock_disk_create, mock_disk_update,
                              mock_disk_del, mock_disk_get_all, mock_list_disks,
-                             get_lock):
+                             set_synced):
         disk_obj = resources.StorageDiskTask(
             context, 'c5c91c98-91aa-40e6-85ac-37a1d3b32bda')
         disk_obj.sync()
         self.assertTrue(mock_list_disks.called)
         self.assertTrue(mock_disk_get_all.called)
-        self.assertTrue(get_lock.called)
+        self.assertTrue(set_synced.called)
 
         # collect the disks from fake_storage
         fake_storage_obj = fake_storage.FakeStorageDriver()
@@ -504,7 +808,8 @@ class TestStorageDiskTask(test.TestCase):
         self.assertTrue(mock_disk_create.called)
 
         # update the disks to DB
-        mock_list_disks.return_value = disks_list
+        mock_list_disks.return_value = \
+            [dict(disks_list[0], name='new_name')]
         mock_disk_get_all.return_value = disks_list
         disk_obj.sync()
         self.assertTrue(mock_disk_update.called)
@@ -524,8 +829,8 @@ class TestStorageDiskTask(test.TestCase):
 
 
 class TestStorageQuotaTask(test.TestCase):
-    # @mock.patch('delfin.drivers.api.API.list_quotas', 'get_lock')
-    @mock.patch.object(coordination.LOCK_COORDINATOR, 'get_lock')
+    # @mock.patch('delfin.drivers.api.API.list_quotas', 'set_synced')
+    @mock.patch('delfin.db.storage_sync_status_decrease')
     @mock.patch('delfin.drivers.api.API.list_quotas')
     @mock.patch('delfin.db.quota_get_all')
     @mock.patch('delfin.db.quotas_delete')
@@ -535,13 +840,13 @@ class TestStorageQuotaTask(test.TestCase):
                              mock_quota_update,
                              mock_quota_del, mock_quota_get_all,
                              mock_list_quotas,
-                             get_lock):
+                             set_synced):
         quota_obj = resources.StorageQuotaTask(
             context, 'c5c91c98-91aa-40e6-85ac-37a1d3b32bda')
         quota_obj.sync()
         self.assertTrue(mock_list_quotas.called)
         self.assertTrue(mock_quota_get_all.called)
-        self.assertTrue(get_lock.called)
+        self.assertTrue(set_synced.called)
 
         # collect the quotas from fake_storage
         fake_storage_obj = fake_storage.FakeStorageDriver()
@@ -554,7 +859,8 @@ class TestStorageQuotaTask(test.TestCase):
         self.assertTrue(mock_quota_create.called)
 
         # update the quotas to DB
-        mock_list_quotas.return_value = quotas_list
+        mock_list_quotas.return_value = \
+            [dict(quotas_list[0], name='new_name')]
         mock_quota_get_all.return_value = quotas_list
         quota_obj.sync()
         self.assertTrue(mock_quota_update.called)
@@ -574,7 +880,7 @@ class TestStorageQuotaTask(test.TestCase):
 
 
 class TestStorageFilesystemTask(test.TestCase):
-    @mock.patch.object(coordination.LOCK_COORDINATOR, 'get_lock')
+    @mock.patch('delfin.db.storage_sync_status_decrease')
     @mock.patch('delfin.drivers.api.API.list_filesystems')
     @mock.patch('delfin.db.filesystem_get_all')
     @mock.patch('delfin.db.filesystems_delete')
@@ -584,13 +890,13 @@ class TestStorageFilesystemTask(test.TestCase):
                              mock_filesystem_update,
                              mock_filesystem_del, mock_filesystem_get_all,
                              mock_list_filesystems,
-                             get_lock):
+                             set_synced):
         filesystem_obj = resources.StorageFilesystemTask(
             context, 'c5c91c98-91aa-40e6-85ac-37a1d3b32bda')
         filesystem_obj.sync()
         self.assertTrue(mock_list_filesystems.called)
         self.assertTrue(mock_filesystem_get_all.called)
-        self.assertTrue(get_lock.called)
+        self.assertTrue(set_synced.called)
 
         # collect the filesystems from fake_storage
         fake_storage_obj = fake_storage.FakeStorageDriver()
@@ -603,7 +909,8 @@ class TestStorageFilesystemTask(test.TestCase):
         self.assertTrue(mock_filesystem_create.called)
 
         # update the filesystems to DB
-        mock_list_filesystems.return_value = filesystems_list
+        mock_list_filesystems.return_value = \
+            [dict(filesystems_list[0], name='new_name')]
         mock_filesystem_get_all.return_value = filesystems_list
         filesystem_obj.sync()
         self.assertTrue(mock_filesystem_update.called)
@@ -623,8 +930,8 @@ class TestStorageFilesystemTask(test.TestCase):
 
 
 class TestStorageQtreeTask(test.TestCase):
-    # @mock.patch('delfin.drivers.api.API.list_qtrees', 'get_lock')
-    @mock.patch.object(coordination.LOCK_COORDINATOR, 'get_lock')
+    # @mock.patch('delfin.drivers.api.API.list_qtrees', 'set_synced')
+    @mock.patch('delfin.db.storage_sync_status_decrease')
     @mock.patch('delfin.drivers.api.API.list_qtrees')
     @mock.patch('delfin.db.qtree_get_all')
     @mock.patch('delfin.db.qtrees_delete')
@@ -634,13 +941,13 @@ class TestStorageQtreeTask(test.TestCase):
                              mock_qtree_update,
                              mock_qtree_del, mock_qtree_get_all,
                              mock_list_qtrees,
-                             get_lock):
+                             set_synced):
         qtree_obj = resources.StorageQtreeTask(
             context, 'c5c91c98-91aa-40e6-85ac-37a1d3b32bda')
         qtree_obj.sync()
         self.assertTrue(mock_list_qtrees.called)
         self.assertTrue(mock_qtree_get_all.called)
-        self.assertTrue(get_lock.called)
+        self.assertTrue(set_synced.called)
 
         # collect the qtrees from fake_storage
         fake_storage_obj = fake_storage.FakeStorageDriver()
@@ -653,7 +960,8 @@ class TestStorageQtreeTask(test.TestCase):
         self.assertTrue(mock_qtree_create.called)
 
         # update the qtrees to DB
-        mock_list_qtrees.return_value = qtrees_list
+        mock_list_qtrees.return_value = \
+            [dict(qtrees_list[0], name='new_name')]
         mock_qtree_get_all.return_value = qtrees_list
         qtree_obj.sync()
         self.assertTrue(mock_qtree_update.called)
@@ -673,7 +981,7 @@ class TestStorageQtreeTask(test.TestCase):
 
 
 class TestStorageShareTask(test.TestCase):
-    @mock.patch.object(coordination.LOCK_COORDINATOR, 'get_lock')
+    @mock.patch('delfin.db.storage_sync_status_decrease')
     @mock.patch('delfin.drivers.api.API.list_shares')
     @mock.patch('delfin.db.share_get_all')
     @mock.patch('delfin.db.shares_delete')
@@ -681,13 +989,13 @@ class TestStorageShareTask(test.TestCase):
     @mock.patch('delfin.db.shares_create')
     def test_sync_successful(self, mock_share_create, mock_share_update,
                              mock_share_del, mock_share_get_all,
-                             mock_list_shares, get_lock):
+                             mock_list_shares, set_synced):
         share_obj = resources.StorageShareTask(
             context, 'c5c91c98-91aa-40e6-85ac-37a1d3b32bda')
         share_obj.sync()
         self.assertTrue(mock_list_shares.called)
         self.assertTrue(mock_share_get_all.called)
-        self.assertTrue(get_lock.called)
+        self.assertTrue(set_synced.called)
 
         # collect the shares from fake_storage
         fake_storage_obj = fake_storage.FakeStorageDriver()
@@ -699,7 +1007,8 @@ class TestStorageShareTask(test.TestCase):
         self.assertTrue(mock_share_create.called)
 
         # update the shares to DB
-        mock_list_shares.return_value = shares_list
+        mock_list_shares.return_value = \
+            [dict(shares_list[0], name='new_name')]
         mock_share_get_all.return_value = shares_list
         share_obj.sync()
         self.assertTrue(mock_share_update.called)
@@ -719,7 +1028,7 @@ class TestStorageShareTask(test.TestCase):
 
 
 class TestStorageHostInitiatorTask(test.TestCase):
-    @mock.patch.object(coordination.LOCK_COORDINATOR, 'get_lock')
+    @mock.patch('delfin.db.storage_sync_status_decrease')
     @mock.patch('delfin.drivers.api.API.list_storage_host_initiators')
     @mock.patch('delfin.db.storage_host_initiators_get_all')
     @mock.patch('delfin.db.storage_host_initiators_delete')
@@ -729,13 +1038,13 @@ class TestStorageHostInitiatorTask(test.TestCase):
                              mock_storage_host_initiator_update,
                              mock_storage_host_initiator_del,
                              mock_storage_host_initiators_get_all,
-                             mock_list_storage_host_initiators, get_lock):
+                             mock_list_storage_host_initiators, set_synced):
         storage_host_initiator_obj = resources.StorageHostInitiatorTask(
             context, 'c5c91c98-91aa-40e6-85ac-37a1d3b32bda')
         storage_host_initiator_obj.sync()
         self.assertTrue(mock_list_storage_host_initiators.called)
         self.assertTrue(mock_storage_host_initiators_get_all.called)
-        self.assertTrue(get_lock.called)
+        self.assertTrue(set_synced.called)
 
         # Collect the storage host initiators from fake_storage
         fake_storage_obj = fake_storage.FakeStorageDriver()
@@ -749,7 +1058,7 @@ class TestStorageHostInitiatorTask(test.TestCase):
 
         # Update the storage host initiators to DB
         mock_list_storage_host_initiators.return_value \
-            = storage_host_initiators_list
+            = [dict(storage_host_initiators_list[0], name='new_name')]
         mock_storage_host_initiators_get_all.return_value \
             = storage_host_initiators_list
         storage_host_initiator_obj.sync()
@@ -771,7 +1080,7 @@ class TestStorageHostInitiatorTask(test.TestCase):
 
 
 class TestStorageHostTask(test.TestCase):
-    @mock.patch.object(coordination.LOCK_COORDINATOR, 'get_lock')
+    @mock.patch('delfin.db.storage_sync_status_decrease')
     @mock.patch('delfin.drivers.api.API.list_storage_hosts')
     @mock.patch('delfin.db.storage_hosts_get_all')
     @mock.patch('delfin.db.storage_hosts_delete')
@@ -781,13 +1090,13 @@ class TestStorageHostTask(test.TestCase):
                              mock_storage_host_update,
                              mock_storage_host_del,
                              mock_storage_hosts_get_all,
-                             mock_list_storage_hosts, get_lock):
+                             mock_list_storage_hosts, set_synced):
         storage_host_obj = resources.StorageHostTask(
             context, 'c5c91c98-91aa-40e6-85ac-37a1d3b32bda')
         storage_host_obj.sync()
         self.assertTrue(mock_list_storage_hosts.called)
         self.assertTrue(mock_storage_hosts_get_all.called)
-        self.assertTrue(get_lock.called)
+        self.assertTrue(set_synced.called)
 
         # Collect the storage hosts from fake_storage
         fake_storage_obj = fake_storage.FakeStorageDriver()
@@ -801,7 +1110,7 @@ class TestStorageHostTask(test.TestCase):
 
         # Update the storage hosts to DB
         mock_list_storage_hosts.return_value \
-            = storage_hosts_list
+            = [dict(storage_hosts_list[0], name='new_name')]
         mock_storage_hosts_get_all.return_value \
             = storage_hosts_list
         storage_host_obj.sync()
@@ -823,7 +1132,7 @@ class TestStorageHostTask(test.TestCase):
 
 
 class TestStorageHostGroupTask(test.TestCase):
-    @mock.patch.object(coordination.LOCK_COORDINATOR, 'get_lock')
+    @mock.patch('delfin.db.storage_sync_status_decrease')
     @mock.patch('delfin.drivers.api.API.list_storage_host_groups')
     @mock.patch('delfin.db.storage_host_groups_get_all')
     @mock.patch('delfin.db.storage_host_groups_delete')
@@ -833,13 +1142,13 @@ class TestStorageHostGroupTask(test.TestCase):
                              mock_storage_host_group_update,
                              mock_storage_host_group_del,
                              mock_storage_host_groups_get_all,
-                             mock_list_storage_host_groups, get_lock):
+                             mock_list_storage_host_groups, set_synced):
         storage_host_group_obj = resources.StorageHostGroupTask(
             context, 'c5c91c98-91aa-40e6-85ac-37a1d3b32bda')
         storage_host_group_obj.sync()
         self.assertTrue(mock_list_storage_host_groups.called)
         self.assertTrue(mock_storage_host_groups_get_all.called)
-        self.assertTrue(get_lock.called)
+        self.assertTrue(set_synced.called)
 
         # Collect the storage host groups from fake_storage
         fake_storage_obj = fake_storage.FakeStorageDriver()
@@ -853,7 +1162,7 @@ class TestStorageHostGroupTask(test.TestCase):
 
         # Update the storage host groups to DB
         mock_list_storage_host_groups.return_value \
-            = storage_host_groups_list
+            = [dict(storage_host_groups_list[0], name='new_name')]
         mock_storage_host_groups_get_all.return_value \
             = storage_host_groups_list
         storage_host_group_obj.sync()
@@ -875,7 +1184,7 @@ class TestStorageHostGroupTask(test.TestCase):
 
 
 class TestVolumeGroupTask(test.TestCase):
-    @mock.patch.object(coordination.LOCK_COORDINATOR, 'get_lock')
+    @mock.patch('delfin.db.storage_sync_status_decrease')
     @mock.patch('delfin.drivers.api.API.list_volume_groups')
     @mock.patch('delfin.db.volume_groups_get_all')
     @mock.patch('delfin.db.volume_groups_delete')
@@ -885,13 +1194,13 @@ class TestVolumeGroupTask(test.TestCase):
                              mock_volume_group_update,
                              mock_volume_group_del,
                              mock_volume_groups_get_all,
-                             mock_list_volume_groups, get_lock):
+                             mock_list_volume_groups, set_synced):
         volume_group_obj = resources.VolumeGroupTask(
             context, 'c5c91c98-91aa-40e6-85ac-37a1d3b32bda')
         volume_group_obj.sync()
         self.assertTrue(mock_list_volume_groups.called)
         self.assertTrue(mock_volume_groups_get_all.called)
-        self.assertTrue(get_lock.called)
+        self.assertTrue(set_synced.called)
 
         # Collect the volume groups from fake_storage
         fake_storage_obj = fake_storage.FakeStorageDriver()
@@ -905,7 +1214,7 @@ class TestVolumeGroupTask(test.TestCase):
 
         # Update the volume groups to DB
         mock_list_volume_groups.return_value \
-            = volume_groups_list
+            = [dict(volume_groups_list[0], name='new_name')]
         mock_volume_groups_get_all.return_value \
             = volume_groups_list
         volume_group_obj.sync()
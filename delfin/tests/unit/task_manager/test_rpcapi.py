@@ -0,0 +1,48 @@
+# Copyright 2021 The SODA Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+from unittest import mock
+
+from oslo_messaging.rpc import client
+
+from delfin import context
+from delfin import test
+from delfin.task_manager import rpcapi
+
+fake_storage_id = '12c2d52f-01bc-41f5-b73f-7abf6f38a2a6'
+fake_tasks = ['fake.VolumeTask', 'fake.PortTask']
+
+
+class TestTaskAPI(test.TestCase):
+
+    @mock.patch.object(client._BaseCallContext, 'cast')
+    def test_sync_storage_resources(self, mock_cast):
+        ctxt = context.get_admin_context()
+        rpcapi.TaskAPI().sync_storage_resources(ctxt, fake_storage_id,
+                                                fake_tasks)
+        mock_cast.assert_called_once_with(
+            ctxt, 'sync_storage_resources', storage_id=fake_storage_id,
+            resource_tasks=fake_tasks)
+
+    @mock.patch.object(client._BaseCallContext, 'cast')
+    def test_sync_storage_resources_version_cap(self, mock_cast):
+        # Task managers not upgraded yet sync the resources one by one
+        self.flags(task_manager_rpc_version_cap='1.0')
+        ctxt = context.get_admin_context()
+        rpcapi.TaskAPI().sync_storage_resources(ctxt, fake_storage_id,
+                                                fake_tasks)
+        self.assertEqual(
+            [mock.call(ctxt, 'sync_storage_resource',
+                       storage_id=fake_storage_id, resource_task=task)
+             for task in fake_tasks],
+            mock_cast.call_args_list)
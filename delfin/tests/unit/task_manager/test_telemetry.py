@@ -83,3 +83,122 @@ class TestPerformanceCollectionTask(test.TestCase):
             context, 'c5c91c98-91aa-40e6-85ac-37a1d3b32bda')
         mock_failed_task_del.assert_called_with(
             context, 'c5c91c98-91aa-40e6-85ac-37a1d3b32bda')
+
+    @mock.patch.object(db, 'storage_get',
+                       mock.Mock(return_value=fake_storage))
+    @mock.patch('delfin.exporter.base_exporter.PerformanceExporterManager'
+                '.dispatch')
+    @mock.patch('delfin.drivers.api.API.get_capabilities')
+    @mock.patch('delfin.drivers.api.API.collect_perf_metrics')
+    def test_performance_collection_backfill(self, mock_collect_perf_metrics,
+                                             mock_get_capabilities,
+                                             mock_dispatch):
+        self.override_config('performance_collection_interval', 900,
+                             group='telemetry')
+        perf_task = telemetry.PerformanceCollectionTask()
+        storage_id = fake_storage['id']
+        mock_collect_perf_metrics.return_value = []
+
+        # the missed range is split in collection intervals
+        mock_get_capabilities.return_value = {'is_historic': False}
+        perf_task.collect(context, storage_id, {}, 0, 2000 * 1000)
+        self.assertEqual(
+            [mock.call(context, storage_id, {}, 0, 900000),
+             mock.call(context, storage_id, {}, 900000, 1800000),
+             mock.call(context, storage_id, {}, 1800000, 2000000)],
+            mock_collect_perf_metrics.call_args_list)
+        self.assertEqual(mock_dispatch.call_count, 3)
+
+        # drivers with historic metrics are asked for the whole range
+        mock_collect_perf_metrics.reset_mock()
+        mock_get_capabilities.return_value = {'is_historic': True}
+        perf_task.collect(context, storage_id, {}, 0, 2000 * 1000)
+        mock_collect_perf_metrics.assert_called_once_with(
+            context, storage_id, {}, 0, 2000000)
+
+    @mock.patch.object(db, 'storage_get',
+                       mock.Mock(return_value=fake_storage))
+    @mock.patch('delfin.exporter.base_exporter.PerformanceExporterManager'
+                '.dispatch')
+    @mock.patch('delfin.drivers.api.API.get_capabilities',
+                mock.Mock(return_value={'is_historic': False}))
+    @mock.patch('delfin.drivers.api.API.collect_perf_metrics')
+    def test_performance_collection_backfill_failure(
+            self, mock_collect_perf_metrics, mock_dispatch):
+        self.override_config('performance_collection_interval', 900,
+                             group='telemetry')
+        perf_task = telemetry.PerformanceCollectionTask()
+        storage_id = fake_storage['id']
+        mock_collect_perf_metrics.side_effect = [
+            [], [], exception.Invalid('Fake exception')]
+
+        # the end of the windows dispatched before the failure is returned
+        status = perf_task.collect(context, storage_id, {}, 0, 2000 * 1000)
+        self.assertEqual(1800000, status)
+        self.assertEqual(mock_dispatch.call_count, 2)
+        self.assertEqual(1800000, telemetry.get_collected_end_time(
+            status, 0, 2000 * 1000))
+
+        # nothing was dispatched
+        mock_collect_perf_metrics.side_effect = exception.Invalid('Fake')
+        status = perf_task.collect(context, storage_id, {}, 0, 2000 * 1000)
+        self.assertFalse(status)
+        self.assertEqual(0, telemetry.get_collected_end_time(
+            status, 0, 2000 * 1000))
+        self.assertEqual(2000 * 1000, telemetry.get_collected_end_time(
+            True, 0, 2000 * 1000))
+
+    @mock.patch.object(db, 'storage_get',
+                       mock.Mock(return_value=fake_storage))
+    @mock.patch('delfin.exporter.base_exporter.PerformanceExporterManager'
+                '.dispatch')
+    @mock.patch('delfin.drivers.api.API.collect_perf_metrics')
+    def test_performance_collection_profile(self, mock_collect_perf_metrics,
+                                            mock_dispatch):
+        self.override_config('performance_collection_interval', 900,
+                             group='telemetry')
+        perf_task = telemetry.PerformanceCollectionTask()
+        storage_id = fake_storage['id']
+        mock_collect_perf_metrics.return_value = []
+        iops = {'unit': 'IOPS', 'description': 'iops'}
+        throughput = {'unit': 'MB/s', 'description': 'throughput'}
+        args = {
+            'resource_metrics': {
+                'storage': {'iops': iops, 'throughput': throughput},
+                'storagePool': {'iops': iops},
+                'volume': {'iops': iops},
+            },
+            'collection_profile': {
+                'storage': {'metrics': ['iops']},
+                'volume': {'interval': 60},
+            },
+        }
+
+        # the task runs every 60 seconds for the volumes, the resource
+        # types without interval are not due
+        perf_task.collect(context, storage_id, args, 960000, 1020000)
+        mock_collect_perf_metrics.assert_called_once_with(
+            context, storage_id, {'volume': {'iops': iops}},
+            960000, 1020000)
+
+        # they are collected at the performance collection interval, since
+        # their last collection, only the allowed storage metrics
+        mock_collect_perf_metrics.reset_mock()
+        perf_task.collect(context, storage_id, args, 1770000, 1830000)
+        self.assertEqual(
+            [mock.call(context, storage_id,
+                       {'storage': {'iops': iops},
+                        'storagePool': {'iops': iops}},
+                       900000, 1800000),
+             mock.call(context, storage_id, {'volume': {'iops': iops}},
+                       1740000, 1800000)],
+            mock_collect_perf_metrics.call_args_list)
+        self.assertEqual(mock_dispatch.call_count, 2)
+
+    def test_get_task_interval(self):
+        self.override_config('performance_collection_interval', 900,
+                             group='telemetry')
+        self.assertEqual(900, telemetry.get_task_interval({}))
+        self.assertEqual(60, telemetry.get_task_interval(
+            {'storage': {'interval': 60}, 'volume': {'interval': 3600},
+             'storagePool': {'metrics': ['iops']}}))
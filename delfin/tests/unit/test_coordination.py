@@ -118,3 +118,34 @@ class CoordinationTestCase(test.TestCase):
         bar.__getitem__.return_value = 8
         func(foo, bar)
         get_lock.assert_called_with('lock-func-7-8')
+
+
+class PartitionCoordinatorTestCase(test.TestCase):
+
+    def setUp(self):
+        super(PartitionCoordinatorTestCase, self).setUp()
+        self.get_coordinator = self.mock_object(tooz_coordination,
+                                                'get_coordinator')
+
+    def test_partition(self):
+        crd = self.get_coordinator.return_value
+        partitioner = crd.join_partitioned_group.return_value
+        partitioner.belongs_to_self.return_value = True
+        partitioner.ring.nodes = {b'member-1': 1, b'member-2': 1}
+
+        agent = coordination.PartitionCoordinator()
+        self.assertFalse(agent.belongs_to_self('task'))
+        self.assertEqual(frozenset(), agent.get_members())
+        agent.start()
+        agent.join_partitioned_group(b'group')
+
+        crd.join_partitioned_group.assert_called_once_with(b'group')
+        self.assertTrue(agent.belongs_to_self('task'))
+        partitioner.belongs_to_self.assert_called_once_with('task')
+        self.assertEqual(frozenset([b'member-1', b'member-2']),
+                         agent.get_members())
+
+        agent.stop()
+        self.assertTrue(partitioner.stop.called)
+        self.assertTrue(crd.stop.called)
+        self.assertIsNone(agent.partitioner)
@@ -0,0 +1,133 @@
+# Copyright 2021 The SODA Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import math
+
+from delfin import test
+from delfin.common import constants
+from delfin.common import metric_batch
+
+volume_labels = {'resource_type': 'volume', 'resource_id': 'volume_0'}
+pool_labels = {'resource_type': 'pool', 'resource_id': 'pool_0'}
+
+
+class TestMetricBatch(test.TestCase):
+
+    def _get_batch(self):
+        batch = metric_batch.MetricBatch()
+        batch.append('iops', volume_labels, {1000: 1.0, 2000: 2.0})
+        batch.append('throughput', dict(volume_labels), [(1000, 3.0)])
+        batch.append('iops', pool_labels, {1000: 4.0})
+        return batch
+
+    def test_append(self):
+        batch = self._get_batch()
+        self.assertEqual(3, len(batch))
+        # Series with the same labels share one label set
+        self.assertEqual(2, len(batch.label_sets))
+        self.assertEqual([1000, 2000, 1000, 1000], list(batch.timestamps))
+        self.assertEqual([1.0, 2.0, 3.0, 4.0], list(batch.values))
+        self.assertEqual([0, 2, 3, 4], list(batch.offsets))
+
+    def test_append_none_value(self):
+        batch = metric_batch.MetricBatch()
+        batch.append('iops', volume_labels, {1000: None, 2000: 1.0})
+        # Read back as None, e.g. null in the JSON sent to kafka
+        self.assertEqual({1000: None, 2000: 1.0}, batch[0].values)
+        self.assertEqual('{"1000": null, "2000": 1.0}',
+                         json.dumps(batch.to_metrics()[0].values))
+
+    def test_append_nan_value(self):
+        batch = metric_batch.MetricBatch()
+        batch.append('iops', volume_labels, {1000: float('nan'), 2000: None})
+        value = batch[0].values[1000]
+        # A NaN of the driver is not read back as a missing value
+        self.assertIsInstance(value, float)
+        self.assertTrue(math.isnan(value))
+        self.assertIsNone(batch[0].values[2000])
+
+    def test_append_int_value(self):
+        batch = metric_batch.MetricBatch()
+        counters = {1000: 5, 2000: 2 ** 53 + 1, 3000: -(2 ** 63) - 1}
+        batch.append('read_count', volume_labels, counters)
+        batch.extend(batch)
+        # Ints are kept exact, also above the precision of a float
+        for _, _, samples in batch.series():
+            samples = list(samples)
+            self.assertEqual(sorted(counters.items()), samples)
+            self.assertIsInstance(samples[0][1], int)
+
+    def test_append_value_not_a_number(self):
+        batch = metric_batch.MetricBatch()
+        batch.append('status', volume_labels, {1000: 'normal', 2000: True})
+        batch.extend(batch)
+        self.assertEqual([(1000, 'normal'), (2000, True)] * 2,
+                         [sample for _, _, samples in batch.series()
+                          for sample in samples])
+        self.assertFalse(metric_batch.is_number('normal'))
+        self.assertFalse(metric_batch.is_number(float('nan')))
+        self.assertTrue(metric_batch.is_number(1))
+
+    def test_series(self):
+        series = [(name, labels, list(samples))
+                  for name, labels, samples in self._get_batch().series()]
+        self.assertEqual(
+            [('iops', volume_labels, [(1000, 1.0), (2000, 2.0)]),
+             ('throughput', volume_labels, [(1000, 3.0)]),
+             ('iops', pool_labels, [(1000, 4.0)])], series)
+
+    def test_to_metrics(self):
+        metrics = self._get_batch().to_metrics()
+        self.assertEqual(constants.metric_struct(
+            name='iops', labels=volume_labels,
+            values={1000: 1.0, 2000: 2.0}), metrics[0])
+        self.assertEqual(3, len(metrics))
+
+    def test_getitem(self):
+        batch = self._get_batch()
+        self.assertEqual(constants.metric_struct(
+            name='iops', labels=pool_labels, values={1000: 4.0}), batch[-1])
+        self.assertEqual(batch.to_metrics()[1], batch[1])
+        self.assertRaises(IndexError, batch.__getitem__, 3)
+
+    def test_extend(self):
+        batch = self._get_batch()
+        batch.extend(self._get_batch())
+        self.assertEqual(6, len(batch))
+        self.assertEqual(2, len(batch.label_sets))
+        self.assertEqual([0, 2, 3, 4, 6, 7, 8], list(batch.offsets))
+        self.assertEqual(self._get_batch().to_metrics() * 2,
+                         batch.to_metrics())
+
+    def test_extend_legacy_metrics(self):
+        batch = metric_batch.as_batch(self._get_batch().to_metrics())
+        self.assertEqual(self._get_batch().to_metrics(), batch.to_metrics())
+        self.assertEqual(2, len(batch.label_sets))
+
+    def test_update_labels(self):
+        batch = self._get_batch()
+        batch.update_labels(name='storage_0')
+        for metric in batch:
+            self.assertEqual('storage_0', metric.labels['name'])
+        batch.append('iops', dict(volume_labels, name='storage_0'),
+                     {3000: 5.0})
+        self.assertEqual(2, len(batch.label_sets))
+
+    def test_iter_series(self):
+        legacy = [(name, labels, list(samples)) for name, labels, samples in
+                  metric_batch.iter_series(self._get_batch().to_metrics())]
+        series = [(name, labels, list(samples)) for name, labels, samples in
+                  metric_batch.iter_series(self._get_batch())]
+        self.assertEqual(series, legacy)
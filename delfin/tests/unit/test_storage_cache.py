@@ -0,0 +1,97 @@
+# Copyright 2021 The SODA Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from unittest import mock
+
+from delfin import context
+from delfin import db
+from delfin import exception
+from delfin import test
+from delfin.alert_manager import trap_receiver
+from delfin.common import storage_cache
+from delfin.task_manager import manager
+
+fake_storage = {
+    'id': '12345',
+    'name': 'fake_storage',
+    'vendor': 'fake_vendor',
+    'model': 'fake_model',
+    'serial_number': 'fake_serial',
+    'description': 'fake storage',
+}
+
+
+class TestStorageMetadataCache(test.TestCase):
+
+    def setUp(self):
+        super(TestStorageMetadataCache, self).setUp()
+        self.override_config('storage_metadata_cache_ttl', 300)
+        self.context = context.get_admin_context()
+        self.cache = storage_cache.StorageMetadataCache()
+        self.cache.clear()
+        self.addCleanup(self.cache.clear)
+        self.storage_get = self.mock_object(
+            db, 'storage_get', mock.Mock(return_value=fake_storage))
+
+    def test_get(self):
+        metadata = self.cache.get(self.context, '12345')
+        self.assertEqual({'id': '12345', 'name': 'fake_storage',
+                          'vendor': 'fake_vendor', 'model': 'fake_model',
+                          'serial_number': 'fake_serial'}, metadata)
+        self.assertEqual(metadata, self.cache.get(self.context, '12345'))
+        self.storage_get.assert_called_once_with(self.context, '12345')
+
+    @mock.patch('time.time')
+    def test_get_expired(self, mock_time):
+        mock_time.return_value = 1000
+        self.cache.get(self.context, '12345')
+        mock_time.return_value = 1300
+        self.cache.get(self.context, '12345')
+        self.assertEqual(2, self.storage_get.call_count)
+
+    def test_get_without_ttl(self):
+        self.override_config('storage_metadata_cache_ttl', 0)
+        self.cache.get(self.context, '12345')
+        self.cache.get(self.context, '12345')
+        self.assertEqual(2, self.storage_get.call_count)
+
+    def test_get_not_found(self):
+        self.storage_get.side_effect = exception.StorageNotFound('12345')
+        self.assertRaises(exception.StorageNotFound, self.cache.get,
+                          self.context, '12345')
+        self.storage_get.side_effect = None
+        self.cache.get(self.context, '12345')
+        self.assertEqual(2, self.storage_get.call_count)
+
+    def test_invalidate(self):
+        self.cache.get(self.context, '12345')
+        self.cache.invalidate('12345')
+        self.cache.invalidate('67890')
+        self.cache.get(self.context, '12345')
+        self.assertEqual(2, self.storage_get.call_count)
+
+    @mock.patch('delfin.drivers.manager.DriverManager.remove_driver')
+    def test_remove_storage_in_cache(self, mock_remove_driver):
+        self.cache.get(self.context, '12345')
+        manager.TaskManager().remove_storage_in_cache(self.context, '12345')
+        mock_remove_driver.assert_called_once_with('12345')
+        self.cache.get(self.context, '12345')
+        self.assertEqual(2, self.storage_get.call_count)
+
+    def test_remove_storage_in_cache_of_alert_manager(self):
+        self.cache.get(self.context, '12345')
+        trap_receiver.TrapReceiver('127.0.0.1', '162') \
+            .remove_storage_in_cache(self.context, '12345')
+        self.cache.get(self.context, '12345')
+        self.assertEqual(2, self.storage_get.call_count)
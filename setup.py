@@ -23,18 +23,25 @@ setup(
     author_email="Opensds-tech-discuss@lists.opensds.io",
     license="Apache 2.0",
     packages=find_packages(exclude=("tests", "tests.*")),
+    package_data={
+        'delfin.db.sqlalchemy': ['alembic/*.py', 'alembic/*.mako',
+                                 'alembic/versions/*.py'],
+    },
     python_requires=">=2.7, !=3.0.*, !=3.1.*, !=3.2.*, !=3.3.*",
     entry_points={
         'delfin.alert.exporters': [
             'example = delfin.exporter.example:AlertExporterExample',
             'prometheus = delfin.exporter.prometheus.exporter'
             ':AlertExporterPrometheus',
+            'kafka = delfin.exporter.kafka.exporter:AlertExporterKafka',
         ],
         'delfin.performance.exporters': [
             'example = delfin.exporter.example:PerformanceExporterExample',
             'prometheus = delfin.exporter.prometheus.exporter'
             ':PerformanceExporterPrometheus',
-            'kafka = delfin.exporter.kafka.exporter:PerformanceExporterKafka'
+            'kafka = delfin.exporter.kafka.exporter:PerformanceExporterKafka',
+            'prometheus_remote_write = delfin.exporter.prometheus.exporter'
+            ':PerformanceExporterPromRemoteWrite',
         ],
         'delfin.storage.drivers': [
             'fake_storage fake_driver = delfin.drivers.fake_storage:FakeStorageDriver',